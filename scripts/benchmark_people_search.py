@@ -0,0 +1,155 @@
+# path: scripts/benchmark_people_search.py
+# Creado: 2026-10-17
+"""
+Benchmark: búsqueda de personas con $regex sin anclar (ruta anterior) frente a la
+búsqueda indexada de PeopleRepository.search_by_name (tokens, prefijos e ids).
+
+Genera N personas sintéticas (por defecto 1.000.000) con nombres y apellidos
+españoles acentuados, DNI válidos, números de SS y códigos de paciente, en una
+base de datos aparte ('tryag_bench' por defecto) para no tocar los datos reales.
+Para cada consulta mide la latencia (mediana y p95) de ambas rutas y, con
+explain(), los documentos examinados por la consulta principal.
+
+Necesita un servidor MongoDB real (los índices son la clave de la comparación):
+    MONGODB_URI=mongodb://localhost:27017 python scripts/benchmark_people_search.py [--records 1000000]
+
+Con --mock se ejecuta contra mongomock con pocos registros, solo para comprobar el
+propio benchmark (mongomock no usa índices, las cifras no son representativas).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+import db.repositories.people as people_module  # noqa: E402
+from utils.search_utils import build_person_search_fields  # noqa: E402
+
+NOMBRES = ["María", "José", "Antonio", "Carmen", "Manuel", "Ana", "Francisco", "Lucía", "David", "Laura",
+           "Javier", "Marta", "Daniel", "Elena", "Jesús", "Sofía", "Ángel", "Paula", "Rubén", "Nuria",
+           "Íñigo", "Begoña", "Álvaro", "Inés", "Sergio", "Raquel", "Óscar", "Noelia", "Adrián", "Rocío"]
+APELLIDOS = ["García", "Fernández", "González", "Rodríguez", "López", "Martínez", "Sánchez", "Pérez",
+             "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez",
+             "Romero", "Alonso", "Gutiérrez", "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos",
+             "Gil", "Ramírez", "Serrano", "Blanco", "Molina", "Morales", "Suárez", "Ortega", "Delgado",
+             "Castro", "Ortiz", "Rubio", "Marín", "Sanz", "Núñez", "Iglesias", "Medina", "Garrido",
+             "Cortés", "Castillo", "Santos", "Lozano", "Guerrero", "Cano", "Prieto", "Méndez", "Cruz",
+             "Calvo", "Gallego", "Vidal", "León", "Márquez", "Herrera", "Peña", "Flores", "Cabrera",
+             "Campos", "Vega", "Fuentes", "Carrasco", "Diez", "Caballero", "Reyes", "Nieto", "Aguilar",
+             "Pascual", "Santana", "Herrero", "Lorenzo", "Montero", "Hidalgo", "Giménez", "Ibáñez",
+             "Ferrer", "Durán", "Santiago", "Benítez", "Mora", "Vicente", "Vargas", "Arias", "Carmona",
+             "Crespo", "Román", "Pastor", "Soto", "Sáez", "Velasco", "Moya", "Soler", "Parra", "Esteban",
+             "Bravo", "Gallardo", "Rojas", "Echeverría", "Urquiza", "Zubizarreta", "Olabarrieta"]
+DNI_LETTERS = "TRWAGMYFPDXBNJZSQVHLCKE"
+
+
+def make_person(i, rng):
+    number = rng.randint(10_000_000, 99_999_999)
+    nombre = rng.choice(NOMBRES) + (f" {rng.choice(NOMBRES)}" if rng.random() < 0.15 else "")
+    apellido1, apellido2 = rng.choice(APELLIDOS), rng.choice(APELLIDOS)
+    person = {
+        "nombre": nombre,
+        "apellido1": apellido1,
+        "apellido2": apellido2,
+        "patient_code": f"{apellido1[:3].upper()}{i:07d}",
+        "num_ss": f"{rng.randint(1, 52):02d}/{rng.randint(10_000_000, 99_999_999)}/{rng.randint(10, 99)}",
+        "identificaciones": [{"type": "DNI", "value": f"{number}{DNI_LETTERS[number % 23]}", "inactive_at": None}],
+        "activo": rng.random() > 0.05,
+    }
+    person["search"] = build_person_search_fields(person)
+    return person
+
+
+def legacy_search(collection, query, limit=10):
+    regex = {"$regex": query, "$options": "i"}
+    fields = ["nombre", "apellido1", "apellido2", "identification_number", "identificaciones.value", "num_ss", "patient_code"]
+    return list(collection.find({"$or": [{f: regex} for f in fields], "activo": True}).limit(limit))
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0]
+
+
+def docs_examined(collection, filters):
+    try:
+        stats = collection.find(filters).limit(50).explain().get("executionStats", {})
+        return stats.get("totalDocsExamined")
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--database", default="tryag_bench")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--reuse", action="store_true", help="No regenerar si la colección ya tiene datos")
+    parser.add_argument("--mock", action="store_true", help="mongomock con pocos registros (solo comprobación)")
+    args = parser.parse_args()
+
+    if args.mock:
+        import mongomock
+        client = mongomock.MongoClient()
+        args.records = min(args.records, 20_000)
+        args.repeats = min(args.repeats, 3)
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    bench_db = client[args.database]
+    people_module.get_database = lambda: bench_db
+    collection = bench_db.people
+
+    rng = random.Random(42)
+    if not (args.reuse and collection.estimated_document_count() >= args.records):
+        collection.drop()
+        t0 = time.perf_counter()
+        batch = []
+        for i in range(args.records):
+            batch.append(make_person(i, rng))
+            if len(batch) == 10_000:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+        print(f"Generadas {args.records:,} personas en {time.perf_counter() - t0:.1f} s")
+
+    repo = people_module.PeopleRepository()  # crea los índices de búsqueda
+    sample = collection.find_one({"activo": True}, skip=args.records // 2)
+    dni = sample["identificaciones"][0]["value"]
+    queries = [
+        ("apellido común", "garcia", "garcia"),
+        ("prefijo mientras se escribe", "echev", "echev"),
+        ("nombre + apellido", "maria gom", "maria gom"),
+        ("con acentos", "Íñigo Muñoz", "Íñigo Muñoz"),
+        ("DNI exacto", dni, dni),
+        ("DNI parcial", dni[:5], dni[:5]),
+        ("código de paciente", sample["patient_code"], sample["patient_code"]),
+    ]
+
+    print(f"\n{'Consulta':<28}{'regex med/p95 (ms)':>22}{'indexada med/p95 (ms)':>26}{'docs regex':>14}{'docs índice':>14}")
+    for label, legacy_q, new_q in queries:
+        legacy_med, legacy_p95 = timed(lambda: legacy_search(collection, legacy_q), args.repeats)
+        new_med, new_p95 = timed(lambda: repo.search_by_name(new_q), args.repeats)
+        regex = {"$regex": legacy_q, "$options": "i"}
+        legacy_docs = docs_examined(collection, {"$or": [{"apellido1": regex}, {"nombre": regex}], "activo": True})
+        words = new_q.lower().split()
+        new_docs = docs_examined(collection, {"search.prefixes": {"$all": words[-1:]}, "activo": True})
+        print(f"{label:<28}{legacy_med:>10.2f} /{legacy_p95:>9.2f}{new_med:>14.2f} /{new_p95:>9.2f}"
+              f"{str(legacy_docs):>14}{str(new_docs):>14}")
+
+    # Coherencia: la búsqueda indexada encuentra a la persona por DNI y por código
+    assert repo.search_by_name(dni)[0]["_id"] == sample["_id"]
+    assert repo.search_by_name(sample["patient_code"])[0]["_id"] == sample["_id"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# path: scripts/benchmark_permissions.py
+# Creado: 2026-10-17
+"""
+Micro-benchmark: comprobación de permisos compilada (CompiledRole en caché)
+frente a la evaluación anterior (lectura del rol + recorrido del dict en cada llamada).
+
+La lectura del rol se simula en memoria; con --rtt-ms se añade una latencia por
+lectura para aproximar el find_one contra MongoDB que hacía cada comprobación.
+
+Uso:
+    python scripts/benchmark_permissions.py [--checks 200000] [--rtt-ms 0.3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+import services.permissions_service as permissions  # noqa: E402
+from db.repositories.roles import DEFAULT_ROLES  # noqa: E402
+
+ROLES = {r["code"]: r for r in DEFAULT_ROLES}
+ACTIONS = ["view", "create", "edit", "delete", "manage", "export", "general"]
+
+
+def make_lookup(rtt_s):
+    def lookup(code):
+        if rtt_s:
+            time.sleep(rtt_s)
+        return ROLES.get(code)
+    return lookup
+
+
+def legacy_check(lookup, role_code, module, action):
+    role_def = lookup(role_code)
+    if not role_def:
+        return False
+    if role_code == "superadministrador":
+        return True
+    module_perms = role_def.get("permissions", {}).get(module, {})
+    if not module_perms:
+        return False
+    if isinstance(module_perms, bool):
+        return module_perms
+    if action == "general":
+        return any(module_perms.values())
+    return module_perms.get(action, False)
+
+
+def compiled_check(role_code, module, action):
+    compiled = permissions.get_compiled_role(role_code)
+    return compiled.allows(module, action) if compiled else False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    modules = sorted({m for r in DEFAULT_ROLES for m in r["permissions"]}) + ["desconocido"]
+    checks = [(rng.choice(list(ROLES)), rng.choice(modules), rng.choice(ACTIONS)) for _ in range(args.checks)]
+    lookup = make_lookup(args.rtt_ms / 1000)
+
+    # Con latencia simulada la ruta anterior es lenta: se mide sobre una muestra
+    legacy_sample = checks if not args.rtt_ms else checks[:2000]
+    t0 = time.perf_counter()
+    legacy = [legacy_check(lookup, *c) for c in legacy_sample]
+    legacy_ns = (time.perf_counter() - t0) / len(legacy_sample) * 1e9
+
+    permissions.get_role_by_code = lookup
+    permissions.clear_permissions_cache()
+    t0 = time.perf_counter()
+    compiled = [compiled_check(*c) for c in checks]
+    compiled_ns = (time.perf_counter() - t0) / len(checks) * 1e9
+
+    assert [bool(v) for v in legacy] == compiled[:len(legacy)], "Resultados distintos"
+    print(f"Comprobaciones: {len(checks)} (lectura de rol simulada: {args.rtt_ms} ms)")
+    print(f"Evaluación anterior: {legacy_ns:>10.0f} ns/comprobación")
+    print(f"Matriz compilada:    {compiled_ns:>10.0f} ns/comprobación")
+    print(f"Aceleración:         {legacy_ns / compiled_ns:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
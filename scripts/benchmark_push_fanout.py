@@ -0,0 +1,121 @@
+# path: scripts/benchmark_push_fanout.py
+# Creado: 2026-10-17
+"""
+Benchmark: difusión Web Push a un turno completo.
+
+Levanta un servidor HTTP local que simula N endpoints de push (por defecto 500)
+con una latencia fija por petición; una fracción responde 410 Gone (suscripción
+caducada). Compara:
+- Ruta anterior: bucle secuencial con un webpush() síncrono por suscripción.
+- PushDeliveryEngine: pool de hilos acotado + sesión HTTP con pool de conexiones.
+
+Los payloads se cifran de verdad con pywebpush (claves P-256 generadas al vuelo).
+
+Uso:
+    python scripts/benchmark_push_fanout.py [--endpoints 500] [--latency-ms 40] [--workers 16]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from py_vapid import Vapid01  # noqa: E402
+from pywebpush import webpush, WebPushException  # noqa: E402
+
+from services.push_delivery import PushDeliveryEngine  # noqa: E402
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def make_subscription(base_url: str, i: int, gone: bool):
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    return {
+        "endpoint": f"{base_url}/push/{i}{'/gone' if gone else ''}",
+        "keys": {"p256dh": _b64(public), "auth": _b64(os.urandom(16))},
+    }
+
+
+def start_server(latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_s)
+            status = 410 if self.path.endswith("/gone") else 201
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_send(subscriptions, payload, vapid, claims):
+    sent, expired = 0, 0
+    for sub in subscriptions:
+        try:
+            webpush(subscription_info=sub, data=payload, vapid_private_key=vapid, vapid_claims=dict(claims))
+            sent += 1
+        except WebPushException as ex:
+            if ex.response is not None and ex.response.status_code == 410:
+                expired += 1
+    return sent, expired
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--gone-ratio", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    server = start_server(args.latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    gone_every = max(1, int(1 / args.gone_ratio)) if args.gone_ratio else 0
+    subs = [make_subscription(base_url, i, bool(gone_every) and i % gone_every == 0) for i in range(args.endpoints)]
+
+    vapid = Vapid01()
+    vapid.generate_keys()
+    claims = {"sub": "mailto:bench@tryag.local"}
+    payload = {"title": "Cambio de turno", "body": "Reunión de relevo en 10 minutos", "url": "/"}
+
+    t0 = time.perf_counter()
+    legacy_sent, legacy_expired = legacy_send(subs, json.dumps(payload), vapid, claims)
+    legacy_s = time.perf_counter() - t0
+
+    engine = PushDeliveryEngine(max_workers=args.workers)
+    targets = [(f"person{i}", sub) for i, sub in enumerate(subs)]
+    t0 = time.perf_counter()
+    result = engine.deliver(targets, payload, vapid, claims)
+    engine_s = time.perf_counter() - t0
+    engine.close()
+    server.shutdown()
+
+    assert (result.sent, result.pruned) == (legacy_sent, legacy_expired), "Resultados distintos"
+    print(f"Endpoints: {args.endpoints} (latencia {args.latency_ms} ms, {legacy_expired} caducados)")
+    print(f"Secuencial (anterior): {legacy_s:8.2f} s")
+    print(f"Motor concurrente:     {engine_s:8.2f} s  ({args.workers} workers)")
+    print(f"Aceleración:           {legacy_s / engine_s:8.1f}x")
+    print(f"Suscripciones a podar en bloque: {result.pruned} en {len(result.expired)} personas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# path: scripts/benchmark_queue_index.py
+# Creado: 2026-10-17
+"""
+Benchmark: cola priorizada incremental (PriorityQueueIndex) frente a la ruta
+anterior (sorted(...) con calculate_priority_score + get_wait_time_alert por paciente).
+
+Simula una sala de espera con miles de pacientes y, por cada "rerun", un pequeño
+número de eventos de flujo (llegadas y llamadas a box).
+
+Uso:
+    python scripts/benchmark_queue_index.py [num_pacientes] [num_reruns]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+from services.queue_manager import (  # noqa: E402
+    PriorityQueueIndex,
+    calculate_priority_score,
+    get_wait_time_alert,
+)
+
+LEVELS = ["Nivel I (Rojo)", "Nivel II (Naranja)", "Nivel III (Amarillo)", "Nivel IV (Verde)", "Nivel V (Azul)"]
+
+
+def _patient(i, rng, now):
+    return {
+        "patient_code": f"P{i}",
+        "nivel_triaje": rng.choice(LEVELS),
+        # ISO string, como llega de la vista serializada
+        "wait_start": (now - timedelta(minutes=rng.randint(0, 480))).isoformat(),
+    }
+
+
+def legacy_rerun(patients):
+    ordered = sorted(patients, key=calculate_priority_score)
+    for p in ordered:
+        p["alert_level"] = get_wait_time_alert(p)
+    return ordered
+
+
+def index_rerun(index, patients):
+    index.sync(patients)
+    now = datetime.now()
+    ordered = index.ordered()
+    for p in ordered:
+        p["alert_level"] = index.alert_for(p["patient_code"], now)
+    return ordered
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(42)
+    now = datetime.now()
+
+    patients = [_patient(i, rng, now) for i in range(n)]
+    next_id = n
+
+    index = PriorityQueueIndex()
+    index.sync(patients)
+
+    t_legacy = t_index = 0.0
+    for _ in range(reruns):
+        # 2 llamadas a box y 2 llegadas por rerun
+        for _ in range(2):
+            patients.pop(rng.randrange(len(patients)))
+            patients.append(_patient(next_id, rng, datetime.now()))
+            next_id += 1
+
+        t0 = time.perf_counter()
+        legacy_rerun([dict(p) for p in patients])
+        t_legacy += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index_rerun(index, patients)
+        t_index += time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(reruns):
+        index.alert_counts()
+    t_counts = time.perf_counter() - t0
+
+    print(f"Pacientes en espera: {n} | Reruns: {reruns}")
+    print(f"sorted() + score/alerta por paciente : {t_legacy / reruns * 1000:8.2f} ms/rerun")
+    print(f"PriorityQueueIndex (sync + orden)     : {t_index / reruns * 1000:8.2f} ms/rerun")
+    print(f"PriorityQueueIndex.alert_counts()     : {t_counts / reruns * 1e6:8.2f} µs/llamada")
+    print(f"Aceleración                           : x{t_legacy / t_index:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# path: scripts/benchmark_rag_hybrid.py
+# Creado: 2026-10-17
+"""
+Benchmark: búsqueda híbrida (BM25 + vectorial) frente a la búsqueda solo densa.
+
+Genera una biblioteca sintética de protocolos en la que cada fragmento menciona
+un fármaco, una escala o una abreviatura concreta, y lanza dos tipos de consulta:
+- Palabras clave ("noradrenalina NEWS2")            -> vía rápida léxica
+- Frase clínica que contiene el término exacto      -> fusión híbrida
+
+Mide recall@k (el fragmento esperado aparece en los k primeros) y latencia.
+
+Uso:
+    python scripts/benchmark_rag_hybrid.py [--docs 200] [--k 3] [--embedder default|hash]
+
+--embedder default usa el MiniLM de Chroma (necesita el modelo descargado);
+--embedder hash usa un embedding de n-gramas por hashing para ejecutar sin red.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+import chromadb  # noqa: E402
+from chromadb.api.types import EmbeddingFunction  # noqa: E402
+import numpy as np  # noqa: E402
+
+from services.lexical_index import LexicalIndex  # noqa: E402
+from services.rag_ingestion import RAGIngestionPipeline  # noqa: E402
+from services.rag_service import RAGService  # noqa: E402
+
+FARMACOS = ["noradrenalina", "adrenalina", "amiodarona", "midazolam", "ketamina", "fentanilo",
+            "labetalol", "urapidil", "salbutamol", "ipratropio", "metilprednisolona", "tranexamico",
+            "naloxona", "flumazenilo", "propofol", "rocuronio", "succinilcolina", "dexmedetomidina"]
+ESCALAS = ["NEWS2", "qSOFA", "Glasgow", "CURB65", "Wells", "HEART", "NIHSS", "CHA2DS2VASc",
+           "Centor", "Alvarado", "PESI", "Ottawa"]
+ABREVIATURAS = ["SCACEST", "TEP", "ACV", "EPOC", "IAM", "FA", "TCE", "HSA", "CAD", "SDRA"]
+RELLENO = ("El paciente debe ser valorado en el box de críticos con monitorización continua, "
+           "acceso venoso periférico y analítica completa. Reevaluar a los quince minutos y "
+           "registrar constantes en la historia clínica. ")
+
+
+class HashEmbedder(EmbeddingFunction):
+    """Embedding de trigramas de caracteres por hashing (sin red)."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def __call__(self, input):
+        out = []
+        for text in input:
+            vec = np.zeros(self.dim, dtype=np.float32)
+            t = f"  {text.lower()}  "
+            for i in range(len(t) - 2):
+                vec[hash(t[i:i + 3]) % self.dim] += 1.0
+            norm = np.linalg.norm(vec)
+            out.append((vec / norm if norm else vec).tolist())
+        return out
+
+    @staticmethod
+    def name():
+        return "hash-trigram"
+
+    def get_config(self):
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbedder(config.get("dim", 384))
+
+
+def build_corpus(n_docs, rng):
+    docs, targets = {}, []
+    for d in range(n_docs):
+        paragraphs = []
+        for p in range(4):
+            farmaco = rng.choice(FARMACOS)
+            escala = rng.choice(ESCALAS)
+            abrev = rng.choice(ABREVIATURAS)
+            codigo = f"P{d:03d}{p}"
+            paragraphs.append(
+                f"Protocolo {codigo} de {abrev}: si la escala {escala} es elevada administrar "
+                f"{farmaco} según pauta. " + RELLENO * 3
+            )
+            targets.append((f"protocolo_{d:03d}.md", codigo, farmaco, escala, abrev))
+        docs[f"protocolo_{d:03d}.md"] = "\n\n".join(paragraphs)
+    return docs, targets
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--embedder", choices=["default", "hash"], default="default")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    tmp = tempfile.mkdtemp(prefix="rag_bench_")
+    docs, targets = build_corpus(args.docs, rng)
+    for name, text in docs.items():
+        with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if args.embedder == "hash":
+        embedder = HashEmbedder()
+    else:
+        from chromadb.utils import embedding_functions
+        embedder = embedding_functions.DefaultEmbeddingFunction()
+
+    collection = chromadb.EphemeralClient().create_collection(
+        f"bench_{uuid.uuid4().hex}", embedding_function=embedder
+    )
+    rag = object.__new__(RAGService)
+    rag.collection = collection
+    rag.lexical_index = LexicalIndex(os.path.join(tmp, "lexical"))
+    rag.ingestion = RAGIngestionPipeline(
+        collection, os.path.join(tmp, "manifest.json"),
+        max_workers=0, lexical_index=rag.lexical_index
+    )
+
+    t0 = time.perf_counter()
+    stats = rag.ingestion.ingest_directory(tmp)
+    print(f"Ingesta: {stats['processed']} documentos, {collection.count()} fragmentos "
+          f"en {time.perf_counter() - t0:.1f}s (embedder={args.embedder})")
+
+    sample = rng.sample(targets, min(args.queries, len(targets)))
+    query_sets = {
+        "palabras clave": [(f"{codigo} {farmaco}", codigo) for _, codigo, farmaco, _, _ in sample],
+        "frase clínica": [
+            (f"paciente con sospecha de {abrev} y {escala} alterada, protocolo {codigo} con {farmaco}", codigo)
+            for _, codigo, farmaco, escala, abrev in sample
+        ],
+    }
+
+    print(f"\n{'Consulta':<16}{'Método':<10}{'Recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, queries in query_sets.items():
+        for method, fn in (("densa", rag.search_documents_dense), ("híbrida", rag.hybrid_search)):
+            hits, latencies = 0, []
+            for query, codigo in queries:
+                t0 = time.perf_counter()
+                results = fn(query, n_results=args.k)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hits += any(codigo in r["content"] for r in results)
+            print(f"{label:<16}{method:<10}{hits / len(queries):>10.2%}"
+                  f"{statistics.median(latencies):>10.2f}{percentile(latencies, 95):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
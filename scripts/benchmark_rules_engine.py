@@ -0,0 +1,119 @@
+# path: scripts/benchmark_rules_engine.py
+# Creado: 2026-10-17
+"""
+Micro-benchmark: evaluación de reglas Liquid UI compiladas (closures en caché)
+frente al intérprete anterior (lectura de reglas + recorrido recursivo por llamada).
+
+Las reglas son las de la migración inicial. La lectura de reglas del intérprete se
+simula en memoria; con --rtt-ms se añade una latencia por lectura para aproximar el
+find() contra MongoDB que hacía cada evaluación. Comprueba además que ambos
+caminos devuelven exactamente los mismos resultados.
+
+Uso:
+    python scripts/benchmark_rules_engine.py [--patients 20000] [--rtt-ms 0.5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+from db.models_rules import LogicOperator, ConditionOperator, ActionType  # noqa: E402
+from services.dynamic_ui_rules_engine import DynamicRulesEngine, compile_rule, _run_rules  # noqa: E402
+
+WORDS = ["dolor", "pecho", "fiebre", "habla", "ahogo", "tos", "mareo", "brazo", "caida", "vomitos"]
+
+
+def legacy_evaluate(rules, data):
+    results = {"alerts": [], "highlights": [], "suggestions": []}
+    for rule in rules:
+        if legacy_condition(rule.conditions, data):
+            for action in rule.actions:
+                if action.type == ActionType.ALERT:
+                    results["alerts"].append({"type": action.level, "message": action.message})
+                elif action.type == ActionType.HIGHLIGHT and action.fields:
+                    results["highlights"].extend(action.fields)
+                elif action.type == ActionType.SUGGEST and action.protocol:
+                    results["suggestions"].append(action.protocol)
+    return results
+
+
+def legacy_condition(condition, data):
+    if condition.field:
+        current_val = data
+        try:
+            for part in condition.field.split('.'):
+                if current_val is None: break
+                current_val = current_val.get(part)
+        except Exception:
+            current_val = None
+        if current_val is None:
+            return False
+        op, target = condition.operator, condition.value
+        try:
+            if isinstance(target, (int, float)) and isinstance(current_val, str):
+                current_val = float(current_val)
+            if isinstance(current_val, (int, float)) and isinstance(target, str):
+                target = float(target)
+        except Exception:
+            pass
+        try:
+            if op == ConditionOperator.GREATER_THAN: return current_val > target
+            if op == ConditionOperator.LESS_THAN: return current_val < target
+            if op == ConditionOperator.CONTAINS: return str(target).lower() in str(current_val).lower()
+        except Exception:
+            return False
+        return False
+    if condition.logic and condition.rules:
+        results = [legacy_condition(sub, data) for sub in condition.rules]
+        return all(results) if condition.logic == LogicOperator.AND else any(results)
+    return False
+
+
+def make_patient(rng):
+    return {
+        "edad": rng.randint(0, 99),
+        "texto_medico": " ".join(rng.sample(WORDS, 3)),
+        "vital_signs": {
+            "temperature": round(rng.uniform(35.5, 40.5), 1),
+            "heart_rate": rng.randint(50, 140),
+            "systolic_bp": rng.randint(70, 170),
+            "oxygen_saturation": str(rng.randint(85, 100)),  # formularios: a veces llega como texto
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rules = DynamicRulesEngine._get_default_rules(None)
+    rng = random.Random(7)
+    patients = [make_patient(rng) for _ in range(args.patients)]
+    rtt_s = args.rtt_ms / 1000
+
+    t0 = time.perf_counter()
+    legacy = []
+    for p in patients:
+        if rtt_s:
+            time.sleep(rtt_s)
+        legacy.append(legacy_evaluate(rules, p))
+    legacy_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    compiled = tuple(compile_rule(r) for r in rules)
+    fast = [_run_rules(compiled, p) for p in patients]
+    compiled_s = time.perf_counter() - t0
+
+    assert fast == legacy, "compiled rules diverge from the interpreter"
+    print(f"Pacientes: {args.patients:,}  reglas: {len(rules)}  rtt: {args.rtt_ms} ms")
+    print(f"Intérprete anterior: {legacy_s * 1e6 / args.patients:8.2f} µs/paciente")
+    print(f"Reglas compiladas:   {compiled_s * 1e6 / args.patients:8.2f} µs/paciente  (x{legacy_s / compiled_s:.1f})")
+
+
+if __name__ == "__main__":
+    main()
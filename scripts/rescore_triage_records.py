@@ -0,0 +1,145 @@
+# path: scripts/rescore_triage_records.py
+# Creado: 2026-10-17
+"""
+Re-scoring "what-if" del histórico de triaje con el scoring vectorizado.
+
+Puntúa los registros de 'triage_records' del periodo con la configuración actual
+(PTR y rangos de signos vitales) y con una propuesta, y muestra cuántos pacientes
+cambiarían de nivel. La propuesta se construye sobre la actual con:
+  --set gcs.base_multiplier=5         (campos escalares de PTRConfig; 'none' = sin valor)
+  --ptr-config propuesta_ptr.json     (lista de PTRConfig, sustituye por metric_key)
+  --vital-config propuesta_vs.json    (lista de VitalSignReference, sustituye por key)
+
+--verify K recalcula K registros con las funciones por paciente y comprueba que el
+resultado vectorizado es idéntico. --synthetic N puntúa N registros generados en
+memoria en lugar de leer la base de datos (medición de rendimiento); --mock usa
+mongomock para la configuración.
+
+Uso:
+    python scripts/rescore_triage_records.py --from 2026-07-01 --to 2026-10-01 --set gcs.base_multiplier=5 --verify 2000
+    python scripts/rescore_triage_records.py --synthetic 1000000 --set spo2.immuno_multiplier=4 --mock
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'src'))
+
+from db.models import PTRConfig, VitalSignReference  # noqa: E402
+
+PTR_SCALAR_FIELDS = ("base_multiplier", "geriatric_multiplier", "immuno_multiplier")
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def apply_overrides(current, args):
+    """Construye la configuración propuesta a partir de la actual."""
+    ptr, vital = copy.deepcopy(current[0]), dict(current[1])
+    if args.ptr_config:
+        with open(args.ptr_config, encoding="utf-8") as f:
+            for doc in json.load(f):
+                config = PTRConfig(**doc)
+                ptr[config.metric_key] = config
+    if args.vital_config:
+        with open(args.vital_config, encoding="utf-8") as f:
+            for doc in json.load(f):
+                ref = VitalSignReference(**doc)
+                vital[ref.key] = ref.configs
+    for item in args.set or []:
+        path, _, raw = item.partition("=")
+        metric, _, field = path.partition(".")
+        if metric not in ptr or field not in PTR_SCALAR_FIELDS:
+            raise SystemExit(f"--set no válido: {item} (métricas: {', '.join(ptr)}; campos: {', '.join(PTR_SCALAR_FIELDS)})")
+        setattr(ptr[metric], field, None if raw.lower() == "none" else float(raw))
+    return ptr, vital
+
+
+def synthetic_records(n, seed=42):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {
+            "audit_id": f"SYN-{i}",
+            "vital_signs": {
+                "fc": rng.randint(35, 170), "spo2": rng.randint(78, 100), "temp": round(rng.gauss(37.0, 0.9), 1),
+                "pas": rng.randint(70, 210), "pad": rng.randint(40, 120), "fr": rng.randint(8, 36),
+                "gcs": rng.choice([15] * 12 + list(range(3, 15))), "eva": rng.randint(0, 10),
+                "oxigeno_suplementario": rng.random() < 0.1,
+            },
+            "patient_data": {
+                "edad": rng.randint(0, 100), "dolor": rng.randint(0, 10),
+                "criterio_geriatrico": rng.random() < 0.2, "ctx_is_onco": rng.random() < 0.05,
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="start", type=parse_date)
+    parser.add_argument("--to", dest="end", type=parse_date)
+    parser.add_argument("--set", action="append", metavar="METRICA.CAMPO=VALOR")
+    parser.add_argument("--ptr-config")
+    parser.add_argument("--vital-config")
+    parser.add_argument("--verify", type=int, default=0, metavar="K")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N")
+    parser.add_argument("--output", help="CSV con los registros que cambian de nivel")
+    parser.add_argument("--mock", action="store_true", help="mongomock para la configuración (solo comprobación)")
+    args = parser.parse_args()
+
+    if args.mock:
+        import mongomock
+        import db.connection as connection
+        connection._database = mongomock.MongoClient().tryag
+
+    from services.rescoring_service import (  # noqa: E402
+        TRANSITION_LEVELS, compare, iter_triage_records, load_current_config, rescore, verify
+    )
+
+    current = load_current_config()
+    proposed = apply_overrides(current, args)
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        records = list(synthetic_records(args.synthetic))
+    else:
+        records = list(iter_triage_records(args.start, args.end))
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    current_df, proposed_df = rescore(records, [current, proposed])
+    t_score = time.perf_counter() - t0
+    summary = compare(current_df, proposed_df)
+
+    print(f"Registros: {summary['records']:,} · lectura {t_load:.2f} s · scoring (2 configuraciones) {t_score:.2f} s")
+    for label in TRANSITION_LEVELS.values():
+        level = summary["levels"][label]
+        print(f"\n{label}: {level['changed']:,} registros cambian de nivel")
+        if level["changed"]:
+            print(level["transitions"].to_string())
+    print(f"\nVariación media del PTR: {summary['ptr_score_delta_mean']:+.3f}")
+
+    if args.output:
+        changed = (current_df[list(TRANSITION_LEVELS)] != proposed_df[list(TRANSITION_LEVELS)]).any(axis=1)
+        current_df[changed].join(proposed_df[changed].drop(columns="id"), rsuffix="_propuesta").to_csv(args.output, index=False)
+        print(f"Cambios exportados a {args.output}")
+
+    if args.verify:
+        t0 = time.perf_counter()
+        mismatches = verify(records, current_df, current, sample=args.verify)
+        mismatches += verify(records, proposed_df, proposed, sample=args.verify)
+        print(f"\nVerificación contra el cálculo por paciente ({min(args.verify, len(records)):,} registros x 2, "
+              f"{time.perf_counter() - t0:.2f} s): {'OK' if not mismatches else f'{len(mismatches)} diferencias'}")
+        for m in mismatches[:10]:
+            print(f"  {m['id']}: {m['diff']}")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
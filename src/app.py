@@ -8,6 +8,7 @@ import sys
 import os
 import streamlit as st
 import mimetypes
+import threading
 
 # FIX: Streamlit Custom Components Loading Issues
 mimetypes.add_type('application/javascript', '.js')
@@ -87,11 +88,32 @@ for key, default in [
 # ---------------------------------------------------------------------------
 # Background Services
 # ---------------------------------------------------------------------------
+def _backfill_people_search():
+    """Completa los campos de búsqueda de personas anteriores a la búsqueda indexada."""
+    try:
+        from db.repositories.people import get_people_repository
+        updated = get_people_repository().backfill_search_fields()
+        if updated:
+            print(f"Campos de búsqueda generados para {updated} personas")
+    except Exception as e:
+        print(f"Error generando campos de búsqueda de personas: {e}")
+
 @st.cache_resource
 def init_background_services():
     """Inicializa servicios en segundo plano (scheduler, etc.) una sola vez."""
     from services.scheduled_reports import start_scheduler
     start_scheduler()
+    from services.his_outbox_service import start_his_dispatcher
+    start_his_dispatcher()
+    from services.audit_analytics_service import start_audit_rollups_backfill
+    start_audit_rollups_backfill()
+    from db.query_profiler import start_query_profile_flusher
+    start_query_profile_flusher()
+    from services.clinical_config import start_clinical_config_watcher
+    start_clinical_config_watcher()
+    from services.anomaly_detection_service import start_anomaly_detector
+    start_anomaly_detector()
+    threading.Thread(target=_backfill_people_search, name="people-search-backfill", daemon=True).start()
     return True
 
 # ---------------------------------------------------------------------------
@@ -341,5 +363,7 @@ else:
         st.session_state.splash_shown = True
         st.rerun()
     else:
-        # Show the main app
-        mostrar_app_principal()
\ No newline at end of file
+        # Show the main app (timed per view when rerun profiling is on for this session)
+        from utils.rerun_profiler import profile_rerun
+        with profile_rerun(globals()):
+            mostrar_app_principal()
\ No newline at end of file
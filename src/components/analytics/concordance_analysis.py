@@ -1,80 +1,50 @@
+# path: src/components/analytics/concordance_analysis.py
+# Actualizado: 2026-10-17 - Concordancia calculada desde audit_rollups
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-# from sklearn.metrics import confusion_matrix, accuracy_score # Removed to avoid dependency
+from services.audit_analytics_service import concordance_metrics
 
-def render_concordance_analysis(df_audit, key_prefix="concordance"):
+def render_concordance_analysis(summary, key_prefix="concordance"):
     """
     Renderiza el análisis de concordancia entre la IA y el triaje humano.
-    Calcula métricas de precisión, sobre-triaje y sub-triaje.
+    Calcula métricas de precisión, sobre-triaje y sub-triaje sobre los
+    agregados del período (AuditSummary), con los niveles normalizados a 1-5.
     """
     st.markdown("### ⚖️ Auditoría de Concordancia (Validación Científica)")
     
-    if df_audit.empty:
+    if summary.empty:
         st.info("No hay datos disponibles para el análisis.")
         return
 
-    # Filtrar solo registros con decisión humana y sugerencia IA válidas
-    # Asumimos que 'nivel_corregido' es la verdad terreno (Human) y 'sugerencia_ia' es la predicción
-    # Asegurarnos de tener columnas numéricas
-    
-    # Pre-procesamiento
-    valid_data = df_audit.dropna(subset=['nivel_corregido', 'sugerencia_ia']).copy()
-    
-    # Convertir a enteros si es posible
-    try:
-        valid_data['human_level'] = pd.to_numeric(valid_data['nivel_corregido'], errors='coerce')
-        valid_data['ai_level'] = pd.to_numeric(valid_data['sugerencia_ia'], errors='coerce')
-        valid_data = valid_data.dropna(subset=['human_level', 'ai_level'])
-        valid_data['human_level'] = valid_data['human_level'].astype(int)
-        valid_data['ai_level'] = valid_data['ai_level'].astype(int)
-    except Exception as e:
-        st.error(f"Error procesando datos numéricos: {e}")
-        return
+    # 'nivel_corregido' es la verdad terreno (Humano) y 'sugerencia_ia' la predicción
+    metrics = concordance_metrics(summary.cells)
 
-    if valid_data.empty:
+    if metrics["n"] == 0:
         st.warning("No hay suficientes datos validados (con nivel IA y Humano) para el análisis.")
         return
 
     # --- MÉTRICAS CLAVE ---
-    y_true = valid_data['human_level']
-    y_pred = valid_data['ai_level']
-    
-    # accuracy = accuracy_score(y_true, y_pred)
-    accuracy = (y_true == y_pred).mean()
-    
     # Sobre-triaje: IA dice más grave (menor número) que Humano
-    # Ej: IA=2 (Naranja), Humano=4 (Verde) -> IA < Humano
-    over_triage = len(valid_data[valid_data['ai_level'] < valid_data['human_level']]) / len(valid_data)
-    
     # Sub-triaje: IA dice menos grave (mayor número) que Humano
-    # Ej: IA=4 (Verde), Humano=2 (Naranja) -> IA > Humano
-    under_triage = len(valid_data[valid_data['ai_level'] > valid_data['human_level']]) / len(valid_data)
-
     col1, col2, col3 = st.columns(3)
-    col1.metric("Precisión Global (Accuracy)", f"{accuracy:.1%}", help="Porcentaje de casos donde IA y Humano coinciden exactamente.")
-    col2.metric("Sobre-triaje (Falsos Positivos)", f"{over_triage:.1%}", help="IA asignó mayor gravedad que el humano (Seguro pero consume recursos).")
-    col3.metric("Sub-triaje (Falsos Negativos)", f"{under_triage:.1%}", help="IA asignó menor gravedad que el humano (Riesgo clínico).", delta_color="inverse")
+    col1.metric("Precisión Global (Accuracy)", f"{metrics['accuracy']:.1%}", help="Porcentaje de casos donde IA y Humano coinciden exactamente.")
+    col2.metric("Sobre-triaje (Falsos Positivos)", f"{metrics['over_triage']:.1%}", help="IA asignó mayor gravedad que el humano (Seguro pero consume recursos).")
+    col3.metric("Sub-triaje (Falsos Negativos)", f"{metrics['under_triage']:.1%}", help="IA asignó menor gravedad que el humano (Riesgo clínico).", delta_color="inverse")
+    st.caption(f"Casos validados en el período: {metrics['n']:,}")
 
     st.divider()
 
     # --- VISUALIZACIONES ---
     tab_matrix, tab_scatter, tab_dist = st.tabs(["Matriz de Confusión", "Dispersión", "Distribución de Errores"])
 
+    cm_df = metrics["confusion"]
+    labels = list(cm_df.index)
+
     with tab_matrix:
         st.markdown("#### Matriz de Confusión")
         st.caption("Eje X: Nivel IA (Predicción) | Eje Y: Nivel Humano (Real)")
         
-        labels = sorted(list(set(y_true.unique()) | set(y_pred.unique())))
-        
-        # cm = confusion_matrix(y_true, y_pred, labels=labels)
-        # Implementación con Pandas
-        cm_df = pd.crosstab(y_true, y_pred, rownames=['Real'], colnames=['Predicción'])
-        cm_df = cm_df.reindex(index=labels, columns=labels, fill_value=0)
-        cm = cm_df.values
-        
-        fig_cm = px.imshow(cm,
+        fig_cm = px.imshow(cm_df.values,
                            labels=dict(x="Nivel IA", y="Nivel Humano", color="Cantidad"),
                            x=labels,
                            y=labels,
@@ -85,28 +55,25 @@ def render_concordance_analysis(df_audit, key_prefix="concordance"):
 
     with tab_scatter:
         st.markdown("#### Correlación Visual")
-        # Jitter para ver mejor los puntos superpuestos
-        valid_data['jitter_ai'] = valid_data['ai_level'] + (pd.Series([0.1]*len(valid_data)).sample(len(valid_data), replace=True).values * (pd.Series([-1, 1]).sample(len(valid_data), replace=True).values))
-        valid_data['jitter_human'] = valid_data['human_level'] + (pd.Series([0.1]*len(valid_data)).sample(len(valid_data), replace=True).values * (pd.Series([-1, 1]).sample(len(valid_data), replace=True).values))
+        # Un punto por par (IA, Humano) con tamaño proporcional al número de casos
+        pairs = cm_df.stack().rename("cases").reset_index()
+        pairs.columns = ["human_level", "ai_level", "cases"]
+        pairs = pairs[pairs["cases"] > 0]
         
-        fig_sc = px.scatter(valid_data, x="ai_level", y="human_level", color="human_level",
-                            title="Nivel IA vs Nivel Humano (con Jitter)",
-                            labels={"ai_level": "Nivel IA", "human_level": "Nivel Humano"},
-                            trendline="ols")
+        fig_sc = px.scatter(pairs, x="ai_level", y="human_level", size="cases", color="human_level",
+                            title="Nivel IA vs Nivel Humano (tamaño = nº de casos)",
+                            labels={"ai_level": "Nivel IA", "human_level": "Nivel Humano", "cases": "Casos"})
         # Línea de identidad perfecta
         fig_sc.add_shape(type="line", x0=1, y0=1, x1=5, y1=5, line=dict(color="Red", width=2, dash="dash"))
         st.plotly_chart(fig_sc, use_container_width=True)
 
     with tab_dist:
         st.markdown("#### Análisis de Desviación")
-        # Calcular diferencia: Humano - IA
+        # Diferencia: Humano - IA
         # 0 = Perfecto
         # Positivo (ej: 4 - 2 = +2) -> IA dijo 2 (Grave), Humano 4 (Leve) -> Sobre-triaje (IA exageró)
         # Negativo (ej: 2 - 4 = -2) -> IA dijo 4 (Leve), Humano 2 (Grave) -> Sub-triaje (IA subestimó)
-        
-        valid_data['diff'] = valid_data['human_level'] - valid_data['ai_level']
-        
-        diff_counts = valid_data['diff'].value_counts().sort_index()
+        diff_counts = metrics["diff_counts"]
         
         fig_bar = px.bar(x=diff_counts.index, y=diff_counts.values,
                          labels={'x': 'Diferencia (Nivel Humano - Nivel IA)', 'y': 'Cantidad de Casos'},
@@ -2,8 +2,9 @@ import streamlit as st
 from datetime import date, timedelta
 from ui.audit_panel.components import render_date_selector, render_action_bar
 from components.analytics import render_evolution as render_evolution_content
+from services.audit_analytics_service import get_audit_summary, refresh_audit_rollups
 
-def render_evolution_module(df_audit_base, df_files, key_prefix="mod_evol"):
+def render_evolution_module(key_prefix="mod_evol"):
     """
     Módulo independiente de Evolución Temporal.
     """
@@ -19,23 +20,23 @@ def render_evolution_module(df_audit_base, df_files, key_prefix="mod_evol"):
         key_prefix=key_prefix
     )
     
-    # Filtrar
-    df_filtered = df_audit_base.copy()
-    if not df_filtered.empty and start_date and end_date:
-        mask = (df_filtered['timestamp'].dt.date >= start_date) & (df_filtered['timestamp'].dt.date <= end_date)
-        df_filtered = df_filtered.loc[mask]
+    summary = get_audit_summary(start_date, end_date)
         
     # 2. Barra de Acciones
+    def _refresh():
+        refresh_audit_rollups(force=True)
+        st.rerun()
+
     render_action_bar(
         key_prefix=f"{key_prefix}_actions",
-        df=df_filtered,
-        on_refresh=lambda: st.rerun(),
+        df=summary.daily,
+        on_refresh=_refresh,
         excel_filename=f"evolution_{date.today()}.xlsx"
     )
     
     st.divider()
     
-    if df_filtered.empty:
+    if summary.daily.empty:
         st.info("No hay datos.")
     else:
-        render_evolution_content(df_filtered, df_files, key_prefix=f"{key_prefix}_content")
+        render_evolution_content(summary, key_prefix=f"{key_prefix}_content")
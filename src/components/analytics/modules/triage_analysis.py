@@ -2,8 +2,12 @@ import streamlit as st
 from datetime import date, timedelta
 from ui.audit_panel.components import render_date_selector, render_action_bar
 from components.analytics import render_triage_analysis as render_triage_content
+from services.audit_analytics_service import get_audit_summary, refresh_audit_rollups, load_audit_detail
 
-def render_triage_analysis_module(df_audit_base, key_prefix="mod_triage"):
+# Registros recientes del rango para las tablas de detalle (las métricas usan agregados)
+DETAIL_LIMIT = 200
+
+def render_triage_analysis_module(key_prefix="mod_triage"):
     """
     Módulo independiente de Análisis de Triaje.
     Incluye tabla con selección y tarjeta de detalles.
@@ -20,30 +24,33 @@ def render_triage_analysis_module(df_audit_base, key_prefix="mod_triage"):
         key_prefix=key_prefix
     )
     
-    # Filtrar
-    df_filtered = df_audit_base.copy()
-    if not df_filtered.empty and start_date and end_date:
-        mask = (df_filtered['timestamp'].dt.date >= start_date) & (df_filtered['timestamp'].dt.date <= end_date)
-        df_filtered = df_filtered.loc[mask]
+    summary = get_audit_summary(start_date, end_date)
+    df_filtered = load_audit_detail(start_date, end_date, limit=DETAIL_LIMIT)
         
     # 2. Barra de Acciones
+    def _refresh():
+        refresh_audit_rollups(force=True)
+        st.rerun()
+
     render_action_bar(
         key_prefix=f"{key_prefix}_actions",
         df=df_filtered,
-        on_refresh=lambda: st.rerun(),
+        on_refresh=_refresh,
         excel_filename=f"triage_{date.today()}.xlsx"
     )
     
     st.divider()
     
-    if df_filtered.empty:
+    if summary.empty:
         st.info("No hay datos.")
     else:
         # Renderizar contenido gráfico existente
-        render_triage_content(df_filtered, key_prefix=f"{key_prefix}_content")
+        render_triage_content(summary, df_filtered, key_prefix=f"{key_prefix}_content")
         
         st.divider()
         st.markdown("#### 📋 Detalle de Registros")
+        if summary.triage_total > len(df_filtered):
+            st.caption(f"Mostrando los {len(df_filtered)} registros más recientes de {summary.triage_total:,} en el rango.")
         
         # Tabla interactiva con selección
         selection = st.dataframe(
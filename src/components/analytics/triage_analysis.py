@@ -1,4 +1,5 @@
 # path: src/components/analytics/triage_analysis.py
+# Actualizado: 2026-10-17 - Gráficos desde audit_rollups; registros solo para tablas de detalle
 """
 Componente de análisis de triaje con 5 subpestañas.
 """
@@ -7,21 +8,29 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from utils.icon_utils import get_icon_html
 
-def render_triage_analysis(df_audit, key_prefix="triage"):
+def _counts(cells, column):
+    return cells.dropna(subset=[column]).groupby(column)['n'].sum().sort_values(ascending=False)
+
+def render_triage_analysis(summary, df_detail=None, key_prefix="triage"):
     """
     Renderiza análisis completo de triaje en subpestañas.
+
+    Los gráficos se calculan sobre los agregados del período (AuditSummary);
+    df_detail (registros recientes del rango) solo alimenta las tablas de detalle.
     """
     st.markdown(f"### {get_icon_html('medical', 24)}Análisis de Triaje", unsafe_allow_html=True)
     
-    if df_audit.empty:
+    if summary.empty:
         st.info("No hay datos de triaje disponibles.")
         return
+    if df_detail is None:
+        df_detail = pd.DataFrame()
 
     # --- Filtros Locales ---
     col_f1, col_f2 = st.columns(2)
     
     with col_f1:
-        niveles_disponibles = df_audit['nivel_corregido'].unique().tolist()
+        niveles_disponibles = _counts(summary.cells, 'human').index.tolist()
         selected_niveles = st.multiselect(
             "Filtrar por Nivel de Triaje",
             options=niveles_disponibles,
@@ -30,24 +39,22 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
         )
         
     with col_f2:
-        if 'decision_humana' in df_audit.columns:
-            decisiones_disponibles = df_audit['decision_humana'].dropna().unique().tolist()
-            selected_decisiones = st.multiselect(
-                "Filtrar por Decisión Humana",
-                options=decisiones_disponibles,
-                default=decisiones_disponibles,
-                key=f"{key_prefix}_filter_decision"
-            )
-        else:
-            selected_decisiones = []
+        decisiones_disponibles = _counts(summary.cells, 'decision').index.tolist()
+        selected_decisiones = st.multiselect(
+            "Filtrar por Decisión Humana",
+            options=decisiones_disponibles,
+            default=decisiones_disponibles,
+            key=f"{key_prefix}_filter_decision"
+        )
 
-    if selected_niveles:
-        df_audit = df_audit[df_audit['nivel_corregido'].isin(selected_niveles)]
-        
-    if 'decision_humana' in df_audit.columns and selected_decisiones:
-        df_audit = df_audit[df_audit['decision_humana'].isin(selected_decisiones)]
+    cells = summary.filter_triage(selected_niveles, selected_decisiones)
+    if not df_detail.empty:
+        if selected_niveles and 'nivel_corregido' in df_detail.columns:
+            df_detail = df_detail[df_detail['nivel_corregido'].isin(selected_niveles)]
+        if selected_decisiones and 'decision_humana' in df_detail.columns:
+            df_detail = df_detail[df_detail['decision_humana'].isin(selected_decisiones)]
     
-    if df_audit.empty:
+    if cells['n'].sum() == 0:
         st.warning("No hay datos para los niveles seleccionados.")
         return
 
@@ -65,7 +72,7 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
         st.markdown("#### Distribución de Niveles de Triaje")
         chart_type = st.radio("Tipo de Gráfico", ["Barras", "Donut"], key=f"{key_prefix}_chart_niveles", horizontal=True)
         
-        nivel_counts = df_audit['nivel_corregido'].value_counts()
+        nivel_counts = _counts(cells, 'human')
         
         if chart_type == "Barras":
             st.bar_chart(nivel_counts, use_container_width=True, color="#28a745")
@@ -83,8 +90,8 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
         chart_type_comp = st.radio("Tipo de Gráfico", ["Barras Agrupadas", "Barras Apiladas", "Área"], 
                                    key=f"{key_prefix}_chart_comparativa", horizontal=True)
         
-        ia_counts = df_audit['sugerencia_ia'].value_counts().rename('Sugerencia IA')
-        humano_counts = df_audit['nivel_corregido'].value_counts().rename('Decisión Humana')
+        ia_counts = _counts(cells, 'ai').rename('Sugerencia IA')
+        humano_counts = _counts(cells, 'human').rename('Decisión Humana')
         comparison_df = pd.concat([ia_counts, humano_counts], axis=1).fillna(0).astype(int)
         
         if chart_type_comp == "Barras Agrupadas":
@@ -98,17 +105,21 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
     with tab3:
         st.markdown("#### Relación Dolor - Nivel de Triaje")
         
-        if 'dolor' not in df_audit.columns or df_audit['dolor'].isnull().all():
+        dolor_cells = cells[cells['pain_n'] > 0]
+        if dolor_cells.empty:
             st.warning("No hay datos de dolor registrados para generar estos gráficos.")
         else:
-            chart_type_dolor = st.radio("Tipo de Gráfico", ["Barras (Promedio)", "Scatter (Dispersión)"], 
+            chart_type_dolor = st.radio("Tipo de Gráfico", ["Barras (Promedio)", "Burbujas (Frecuencia)"], 
                                         key=f"{key_prefix}_chart_dolor", horizontal=True)
             
+            # Histogramas por nivel (el filtro de decisión no aplica a estas distribuciones)
+            pain = summary.pain[summary.pain['human'].isin(selected_niveles)] if selected_niveles else summary.pain
             if chart_type_dolor == "Barras (Promedio)":
-                dolor_por_nivel = df_audit.groupby('nivel_corregido')['dolor'].mean().sort_values(ascending=False)
+                sums = dolor_cells.groupby('human')[['pain_sum', 'pain_n']].sum()
+                dolor_por_nivel = (sums['pain_sum'] / sums['pain_n']).sort_values(ascending=False)
                 st.bar_chart(dolor_por_nivel, use_container_width=True)
-            else:  # Scatter
-                st.scatter_chart(df_audit, x='nivel_corregido', y='dolor', color='nivel_corregido', 
+            else:  # Burbujas
+                st.scatter_chart(pain, x='human', y='pain', size='n', color='human', 
                                use_container_width=True)
             
             st.divider()
@@ -116,13 +127,14 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
             c1, c2 = st.columns(2)
             with c1:
                 st.markdown("**Distribución de Edad**")
-                if 'edad' in df_audit.columns and not df_audit['edad'].isnull().all():
-                    st.bar_chart(df_audit['edad'].value_counts().sort_index(), use_container_width=True)
+                ages = summary.ages[summary.ages['human'].isin(selected_niveles)] if selected_niveles else summary.ages
+                if not ages.empty:
+                    st.bar_chart(ages.groupby('age')['n'].sum().sort_index(), use_container_width=True)
                 else:
                     st.info("Datos de edad no disponibles.")
             with c2:
                 st.markdown("**Distribución de Dolor (EVA)**")
-                st.bar_chart(df_audit['dolor'].value_counts().sort_index(), use_container_width=True)
+                st.bar_chart(pain.groupby('pain')['n'].sum().sort_index(), use_container_width=True)
     
     # Tab 4: Calidad de Sugerencias
     with tab4:
@@ -130,7 +142,8 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
         chart_type_cal = st.radio("Tipo de Gráfico", ["Barras Apiladas", "Barras Agrupadas"], 
                                   key=f"{key_prefix}_chart_calidad", horizontal=True)
         
-        calidad_vs_decision_df = pd.crosstab(df_audit['decision_humana'], df_audit['calificacion_humana'])
+        calidad_vs_decision_df = (cells.dropna(subset=['decision', 'rating'])
+                                  .pivot_table(index='decision', columns='rating', values='n', aggfunc='sum', fill_value=0))
         
         if chart_type_cal == "Barras Apiladas":
             st.bar_chart(calidad_vs_decision_df, use_container_width=True, stack=True)
@@ -140,10 +153,11 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
     # Tab 5: Análisis de Discrepancias
     with tab5:
         st.markdown("#### Análisis de Discrepancias")
-        discrepancias_df = df_audit[df_audit['sugerencia_ia'] != df_audit['nivel_corregido']]
+        discrepancias = cells[cells['ai'] != cells['human']]
+        total_discrepancias = int(discrepancias['n'].sum())
         
-        if not discrepancias_df.empty:
-            st.warning(f"Se han encontrado {len(discrepancias_df)} casos con discrepancia entre la IA y la decisión humana.")
+        if total_discrepancias > 0:
+            st.warning(f"Se han encontrado {total_discrepancias} casos con discrepancia entre la IA y la decisión humana.")
             
             col_chart, col_table = st.columns([1, 1])
             with col_chart:
@@ -151,8 +165,8 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
                 chart_type_disc = st.radio("Tipo de Gráfico", ["Barras Agrupadas", "Barras Apiladas", "Área"], 
                                           key=f"{key_prefix}_chart_discrepancias", horizontal=True)
                 
-                ia_errors = discrepancias_df['sugerencia_ia'].value_counts().rename("Sugerencia IA (Incorrecta)")
-                human_corrections = discrepancias_df['nivel_corregido'].value_counts().rename("Corrección Humana")
+                ia_errors = _counts(discrepancias, 'ai').rename("Sugerencia IA (Incorrecta)")
+                human_corrections = _counts(discrepancias, 'human').rename("Corrección Humana")
                 error_comparison_df = pd.concat([ia_errors, human_corrections], axis=1).fillna(0).astype(int)
                 
                 if chart_type_disc == "Barras Agrupadas":
@@ -163,9 +177,13 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
                     st.area_chart(error_comparison_df, use_container_width=True)
             
             with col_table:
-                st.markdown("##### Detalle de Casos")
-                st.dataframe(discrepancias_df[['timestamp', 'sugerencia_ia', 'nivel_corregido', 'justificacion_humana']], 
-                           use_container_width=True, hide_index=True)
+                st.markdown("##### Detalle de Casos (más recientes)")
+                detail_cols = ['timestamp', 'sugerencia_ia', 'nivel_corregido', 'justificacion_humana']
+                if not df_detail.empty and set(detail_cols) <= set(df_detail.columns):
+                    discrepancias_df = df_detail[df_detail['sugerencia_ia'] != df_detail['nivel_corregido']]
+                    st.dataframe(discrepancias_df[detail_cols], use_container_width=True, hide_index=True)
+                else:
+                    st.info("No hay registros recientes con discrepancia en el rango.")
         else:
             st.success("✅ No se han encontrado discrepancias entre la IA y las decisiones humanas.")
 
@@ -174,7 +192,7 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
         st.markdown("#### Auditoría de Respuestas IA (Versionado)")
         
         # Verificar si existe la columna ai_responses
-        if 'ai_responses' not in df_audit.columns:
+        if 'ai_responses' not in df_detail.columns:
             st.info("No hay datos de historial de respuestas IA disponibles (columna 'ai_responses' no encontrada).")
         else:
             # Filtrar registros que tienen historial (más de 1 respuesta o lista no vacía)
@@ -185,6 +203,7 @@ def render_triage_analysis(df_audit, key_prefix="triage"):
                     return len(x)
                 return 0
                 
+            df_audit = df_detail.copy()
             df_audit['regen_count'] = df_audit['ai_responses'].apply(get_regen_count)
             regenerated_df = df_audit[df_audit['regen_count'] > 1]
             
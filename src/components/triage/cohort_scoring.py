@@ -0,0 +1,374 @@
+# path: src/components/triage/cohort_scoring.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Selección de banda de edad compartida con el snapshot de configuración clínica
+"""
+Scoring vectorizado por cohortes (PTR, NEWS2 y Worst Case).
+
+Aplica las mismas reglas que calculate_ptr_score, calculate_news_score y
+calculate_worst_case a una cohorte completa en una sola pasada con NumPy:
+- build_cohort() convierte los registros de triaje en columnas float64 por
+  métrica (con máscara de presencia) y vectores de edad y flags de contexto.
+- compile_ptr() / compile_vital_signs() convierten PTRConfig y las bandas por
+  edad de VitalSignReference en tuplas de umbrales.
+- score_cohort() evalúa la cohorte y devuelve un DataFrame con una fila por registro.
+
+Los resultados son idénticos bit a bit a los de las funciones por paciente: se
+respeta el orden de las reglas y de las métricas (incluido el orden de suma del
+PTR y el desempate del Worst Case por orden de aparición en vital_signs).
+score_single() calcula la misma fila con las funciones por paciente y sirve de
+referencia para verificarlo.
+
+Diferencias deliberadas (casos en los que la función por paciente falla):
+un registro sin edad numérica no tiene banda de edad, así que no puntúa en el
+Worst Case; los valores no convertibles a float se tratan como ausentes.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db.models import PTRConfig, VitalSignAgeConfig
+from components.triage.ptr_logic import _rule_condition, _rule_points, calculate_ptr_score
+from components.triage.triage_logic import PRIORITY_LEVELS, calculate_news_score, calculate_worst_case
+from services.clinical_config import VITAL_SIGN_METRICS, select_age_band
+
+DEFAULT_AGE = 40
+# Mismo orden que calculate_ptr_score ('dolor' se puntúa con la configuración 'eva')
+PTR_METRICS = ("gcs", "spo2", "pas", "fr", "fc", "temp", "dolor", "eva")
+COHORT_METRICS = tuple(dict.fromkeys(VITAL_SIGN_METRICS + PTR_METRICS))
+
+RESULT_COLUMNS = [
+    "id", "wc_priority", "wc_color", "wc_label",
+    "news_score", "news_color", "ptr_score", "ptr_priority", "ptr_color",
+]
+
+
+# ---------------------------------------------------------------------------
+# Cohorte
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Cohort:
+    """Columnas de una cohorte de registros de triaje (una posición por registro)."""
+    ids: List[Any]
+    values: Dict[str, np.ndarray]    # métrica -> float64
+    present: Dict[str, np.ndarray]   # métrica -> bool (valor no nulo y convertible a float)
+    order: Dict[str, np.ndarray]     # métrica -> posición en vital_signs (desempate del Worst Case)
+    ages: np.ndarray
+    age_known: np.ndarray
+    geriatric: np.ndarray
+    immuno: np.ndarray
+    oxygen: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_inputs(record: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Extrae (vital_signs, patient_data) de un documento de 'triage_records'
+    (o de un dict con esas mismas claves).
+    """
+    patient_data = record.get("patient_data") or {}
+    vital_signs = record.get("vital_signs") or patient_data.get("vital_signs") or {}
+    return vital_signs, patient_data
+
+
+def ptr_inputs(vital_signs: Dict[str, Any], patient_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Signos vitales con el dolor del paciente, como en el cálculo del formulario de triaje."""
+    vs = dict(vital_signs)
+    vs["dolor"] = patient_data.get("dolor", 0)
+    return vs
+
+
+def build_cohort(records: Iterable[Dict[str, Any]], id_field: str = "audit_id") -> Cohort:
+    """Convierte registros de triaje en las columnas de la cohorte."""
+    ids, ages, age_known, geriatric, immuno, oxygen = [], [], [], [], [], []
+    columns = {m: [] for m in COHORT_METRICS}
+    orders = {m: [] for m in VITAL_SIGN_METRICS}
+
+    for record in records:
+        vital_signs, patient_data = record_inputs(record)
+        vs = ptr_inputs(vital_signs, patient_data)
+        ids.append(record.get(id_field, record.get("_id")))
+
+        age = patient_data.get("edad", DEFAULT_AGE)
+        known = isinstance(age, (int, float)) and not isinstance(age, bool)
+        ages.append(float(age) if known else np.nan)
+        age_known.append(known)
+
+        geriatric.append(bool(patient_data.get("criterio_geriatrico", False)))
+        immuno.append(bool(patient_data.get("criterio_inmunodeprimido", False)
+                           or patient_data.get("ctx_is_immuno", False)
+                           or patient_data.get("ctx_is_onco", False)))
+        oxygen.append(bool(vital_signs.get("oxigeno_suplementario", False)))
+
+        for metric in COHORT_METRICS:
+            columns[metric].append(_to_float(vs.get(metric)))
+        positions = {key: i for i, key in enumerate(vital_signs)}
+        for metric in VITAL_SIGN_METRICS:
+            orders[metric].append(positions.get(metric, -1))
+
+    values, present = {}, {}
+    for metric, column in columns.items():
+        mask = np.array([v is not None for v in column], dtype=bool)
+        values[metric] = np.array([v if v is not None else np.nan for v in column], dtype=np.float64)
+        present[metric] = mask
+
+    return Cohort(
+        ids=ids,
+        values=values,
+        present=present,
+        order={m: np.array(o, dtype=np.int64) for m, o in orders.items()},
+        ages=np.array(ages, dtype=np.float64),
+        age_known=np.array(age_known, dtype=bool),
+        geriatric=np.array(geriatric, dtype=bool),
+        immuno=np.array(immuno, dtype=bool),
+        oxygen=np.array(oxygen, dtype=bool),
+    )
+
+
+# ---------------------------------------------------------------------------
+# PTR
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class CompiledPTRMetric:
+    key: str
+    operators: Tuple[Optional[str], ...]
+    refs: np.ndarray
+    ref_maxs: np.ndarray      # NaN si la regla no tiene value_max
+    points: np.ndarray
+    base_multiplier: float
+    geriatric_multiplier: Optional[float]
+    immuno_multiplier: Optional[float]
+
+
+def compile_ptr(configs: Dict[str, PTRConfig]) -> Tuple[CompiledPTRMetric, ...]:
+    """Compila las configuraciones PTR (metric_key -> PTRConfig) en umbrales por métrica."""
+    compiled = []
+    for key in PTR_METRICS:
+        config = configs.get("eva" if key == "dolor" else key)
+        if not config:
+            continue
+        conditions = [_rule_condition(rule) for rule in config.rules]
+        compiled.append(CompiledPTRMetric(
+            key=key,
+            operators=tuple(op if ref is not None else None for op, ref, _ in conditions),
+            refs=np.array([ref if ref is not None else np.nan for _, ref, _ in conditions], dtype=np.float64),
+            ref_maxs=np.array([m if m is not None else np.nan for _, _, m in conditions], dtype=np.float64),
+            points=np.array([_rule_points(rule) for rule in config.rules], dtype=np.float64),
+            base_multiplier=config.base_multiplier,
+            geriatric_multiplier=config.geriatric_multiplier,
+            immuno_multiplier=config.immuno_multiplier,
+        ))
+    return tuple(compiled)
+
+
+def _match(operator: Optional[str], ref: float, ref_max: float, v: np.ndarray) -> np.ndarray:
+    """Versión vectorizada de ptr_logic._evaluate_rule."""
+    if operator == "<": return v < ref
+    if operator == "<=": return v <= ref
+    if operator == ">": return v > ref
+    if operator == ">=": return v >= ref
+    if operator == "==": return v == ref
+    if operator == "between" and not np.isnan(ref_max):
+        return (ref <= v) & (v <= ref_max)
+    return np.zeros(v.shape, dtype=bool)
+
+
+def _score_ptr(cohort: Cohort, compiled: Sequence[CompiledPTRMetric]) -> np.ndarray:
+    score = np.zeros(cohort.size, dtype=np.float64)
+    for metric in compiled:
+        v = cohort.values[metric.key]
+        # Regla ganadora: la de más puntos; en empate, la última (r_points >= base_points)
+        base = np.zeros(cohort.size, dtype=np.float64)
+        matched = np.zeros(cohort.size, dtype=bool)
+        for i, operator in enumerate(metric.operators):
+            hit = _match(operator, metric.refs[i], metric.ref_maxs[i], v) & (metric.points[i] >= base)
+            base = np.where(hit, metric.points[i], base)
+            matched |= hit
+
+        multiplier = np.full(cohort.size, metric.base_multiplier, dtype=np.float64)
+        if metric.geriatric_multiplier:
+            multiplier = np.where(cohort.geriatric, metric.geriatric_multiplier, multiplier)
+        if metric.immuno_multiplier:
+            multiplier = np.where(cohort.immuno, metric.immuno_multiplier, multiplier)
+
+        scored = cohort.present[metric.key] & ~((base == 0) & ~matched)
+        score = score + np.where(scored, base * multiplier, 0.0)
+    return score
+
+
+# ---------------------------------------------------------------------------
+# Worst Case (rangos por edad)
+# ---------------------------------------------------------------------------
+
+def compile_vital_signs(references: Dict[str, Sequence[VitalSignAgeConfig]]) -> Dict[str, Tuple[VitalSignAgeConfig, ...]]:
+    """Bandas de edad por métrica (key -> VitalSignReference.configs), en orden de búsqueda."""
+    return {m: tuple(references.get(m) or ()) for m in VITAL_SIGN_METRICS}
+
+
+def configs_for_age(compiled: Dict[str, Sequence[VitalSignAgeConfig]], age: Any) -> Dict[str, Optional[VitalSignAgeConfig]]:
+    """Equivalente a get_all_configs(age) sobre bandas ya cargadas (primera banda que contiene la edad)."""
+    return {metric: select_age_band(bands, age) for metric, bands in compiled.items()}
+
+
+def _evaluate_band(config: VitalSignAgeConfig, v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Versión vectorizada de evaluate_vital_sign: (prioridad, color)."""
+    normal = (config.normal_min <= v) & (v <= config.normal_max)
+    priority = np.where(normal, 0, 2).astype(np.int64)
+    color = np.where(normal, "green", "orange").astype(object)
+
+    # Primer rango con la prioridad más alta
+    found = np.zeros(v.shape, dtype=bool)
+    best = np.zeros(v.shape, dtype=np.int64)
+    for r in config.ranges:
+        hit = (r.min_val <= v) & (v <= r.max_val) & (~found | (r.priority > best))
+        best = np.where(hit, r.priority, best)
+        color = np.where(hit, r.color, color)
+        found |= hit
+    priority = np.where(found, best, priority)
+
+    error = (v < config.val_min) | (v > config.val_max)
+    priority = np.where(error, 3, priority)
+    color = np.where(error, "red", color)
+    return priority, color
+
+
+def _score_worst_case(cohort: Cohort, compiled: Dict[str, Sequence[VitalSignAgeConfig]]):
+    n = cohort.size
+    metrics = list(VITAL_SIGN_METRICS)
+    priorities = np.full((n, len(metrics)), -1, dtype=np.int64)
+    colors = np.full((n, len(metrics)), "gray", dtype=object)
+    orders = np.zeros((n, len(metrics)), dtype=np.int64)
+
+    for j, metric in enumerate(metrics):
+        orders[:, j] = cohort.order[metric]
+        # Banda de edad: la primera que contiene la edad del paciente
+        band = np.full(n, -1, dtype=np.int64)
+        for b in range(len(compiled.get(metric, ())) - 1, -1, -1):
+            cfg = compiled[metric][b]
+            band = np.where(cohort.age_known & (cfg.min_age <= cohort.ages) & (cohort.ages <= cfg.max_age), b, band)
+        for b, cfg in enumerate(compiled.get(metric, ())):
+            rows = np.flatnonzero((band == b) & cohort.present[metric])
+            if rows.size:
+                priorities[rows, j], colors[rows, j] = _evaluate_band(cfg, cohort.values[metric][rows])
+
+    # Gana la prioridad más alta (> -1); en empate, la métrica que aparece antes en vital_signs
+    stride = int(orders.max(initial=0)) + 1
+    candidate = priorities > -1
+    key = np.where(candidate, priorities * stride - orders, np.iinfo(np.int64).min)
+    winner = key.argmax(axis=1)
+    rows = np.arange(n)
+    any_metric = candidate.any(axis=1)
+
+    final_priority = np.where(any_metric, priorities[rows, winner], 0)
+    final_color = np.where(any_metric, colors[rows, winner], "gray")
+    labels = {p: PRIORITY_LEVELS.get(p, {}).get("label", "Desconocido") for p in np.unique(final_priority).tolist()}
+    final_label = np.array([labels[p] if ok else "Pendiente" for p, ok in zip(final_priority.tolist(), any_metric)], dtype=object)
+    return final_priority, final_color, final_label
+
+
+# ---------------------------------------------------------------------------
+# NEWS2
+# ---------------------------------------------------------------------------
+
+def _news_points(cohort: Cohort, metric: str, conditions, points) -> np.ndarray:
+    v = cohort.values[metric]
+    s = np.select([c(v) for c in conditions], points, 0)
+    return np.where(cohort.present[metric], s, 0)
+
+
+def _score_news(cohort: Cohort) -> Tuple[np.ndarray, np.ndarray]:
+    # Mismos tramos y orden que calculate_news_score (los huecos entre tramos puntúan 0)
+    score = _news_points(cohort, "fr", [
+        lambda v: v <= 8, lambda v: (9 <= v) & (v <= 11), lambda v: (12 <= v) & (v <= 20),
+        lambda v: (21 <= v) & (v <= 24), lambda v: v >= 25], [3, 1, 0, 2, 3])
+    score = score + _news_points(cohort, "spo2", [
+        lambda v: v <= 91, lambda v: (92 <= v) & (v <= 93), lambda v: (94 <= v) & (v <= 95),
+        lambda v: v >= 96], [3, 2, 1, 0])
+    score = score + np.where(cohort.oxygen, 2, 0)
+    score = score + _news_points(cohort, "pas", [
+        lambda v: v <= 90, lambda v: (91 <= v) & (v <= 100), lambda v: (101 <= v) & (v <= 110),
+        lambda v: (111 <= v) & (v <= 219), lambda v: v >= 220], [3, 2, 1, 0, 3])
+    score = score + _news_points(cohort, "fc", [
+        lambda v: v <= 40, lambda v: (41 <= v) & (v <= 50), lambda v: (51 <= v) & (v <= 90),
+        lambda v: (91 <= v) & (v <= 110), lambda v: (111 <= v) & (v <= 130), lambda v: v >= 131],
+        [3, 1, 0, 1, 2, 3])
+    score = score + _news_points(cohort, "gcs", [lambda v: v < 15], [3])
+    score = score + _news_points(cohort, "temp", [
+        lambda v: v <= 35.0, lambda v: (35.1 <= v) & (v <= 36.0), lambda v: (36.1 <= v) & (v <= 38.0),
+        lambda v: (38.1 <= v) & (v <= 39.0), lambda v: v >= 39.1], [3, 1, 0, 1, 2])
+
+    color = np.select([(5 <= score) & (score <= 6), score >= 7], ["orange", "red"], "green").astype(object)
+    return score.astype(np.int64), color
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def score_cohort(
+    cohort: Cohort,
+    ptr: Sequence[CompiledPTRMetric],
+    vital_signs: Dict[str, Sequence[VitalSignAgeConfig]],
+) -> pd.DataFrame:
+    """Puntúa la cohorte completa. Devuelve una fila por registro con RESULT_COLUMNS."""
+    wc_priority, wc_color, wc_label = _score_worst_case(cohort, vital_signs)
+    news_score, news_color = _score_news(cohort)
+    ptr_score = _score_ptr(cohort, ptr)
+    ptr_priority = np.select([ptr_score > 15, ptr_score >= 8, ptr_score >= 3], [1, 2, 3], 4)
+    ptr_color = np.select([ptr_score > 15, ptr_score >= 8, ptr_score >= 3], ["red", "orange", "yellow"], "green")
+
+    return pd.DataFrame({
+        "id": cohort.ids,
+        "wc_priority": wc_priority,
+        "wc_color": wc_color,
+        "wc_label": wc_label,
+        "news_score": news_score,
+        "news_color": news_color,
+        "ptr_score": ptr_score,
+        "ptr_priority": ptr_priority,
+        "ptr_color": ptr_color,
+    }, columns=RESULT_COLUMNS)
+
+
+def score_single(
+    record: Dict[str, Any],
+    ptr_configs: Dict[str, PTRConfig],
+    vital_signs: Dict[str, Sequence[VitalSignAgeConfig]],
+    id_field: str = "audit_id",
+) -> Dict[str, Any]:
+    """Fila de resultados de un registro calculada con las funciones por paciente (referencia)."""
+    vs, patient_data = record_inputs(record)
+    age = patient_data.get("edad", DEFAULT_AGE)
+    if isinstance(age, (int, float)) and not isinstance(age, bool):
+        configs = configs_for_age(vital_signs, age)
+    else:
+        configs = {}
+    wc = calculate_worst_case(vs, configs)
+    news = calculate_news_score(vs)
+    ptr = calculate_ptr_score(ptr_inputs(vs, patient_data), patient_data, configs=ptr_configs)
+    return {
+        "id": record.get(id_field, record.get("_id")),
+        "wc_priority": wc["final_priority"],
+        "wc_color": wc["final_color"],
+        "wc_label": wc["label"],
+        "news_score": news["score"],
+        "news_color": news["color"],
+        "ptr_score": ptr["score"],
+        "ptr_priority": ptr["priority_code"],
+        "ptr_color": ptr["color"],
+    }
@@ -1,10 +1,18 @@
 
+# path: src/components/triage/native_voice_input.py
+# Actualizado: 2026-10-17 - Dictados largos transcritos por tramos con texto parcial en vivo
+# Actualizado: 2026-10-17 - El dictado por tramos no se presenta como traducción
 import streamlit as st
 import hashlib
-from services.transcription_service import transcribir_audio
+from services.transcription_service import transcribir_audio, transcribir_audio_streaming
+from utils.audio_utils import wav_duration_s
 from services.conversational_service import ConversationalService
 from services.contingency_service import is_contingency_active
 
+# Duración (s) a partir de la cual el dictado se transcribe por tramos
+STREAMING_MIN_S = 30
+
+
 def render_native_voice_input(reset_count, target_widget_key=None):
     """
     Renderiza el componente de entrada de voz nativa (st.audio_input) 
@@ -72,8 +80,13 @@ def render_native_voice_input(reset_count, target_widget_key=None):
                 
                 if last_processed != audio_hash:
                     with st.spinner("Transcribiendo y Analizando (Dictado Clínico)..."):
-                        # Use dedicated clinical dictation prompt
-                        full_response, trans_text = transcribir_audio(audio_val, prompt_type="clinical_dictation")
+                        duracion = wav_duration_s(audio_val.getvalue())
+                        if duracion and duracion > STREAMING_MIN_S:
+                            # Dictado largo: transcripción por tramos con texto parcial en vivo
+                            full_response, trans_text = _transcribir_por_tramos(audio_val)
+                        else:
+                            # Use dedicated clinical dictation prompt
+                            full_response, trans_text = transcribir_audio(audio_val, prompt_type="clinical_dictation")
                         
                         if trans_text:
                             native_voice_text = trans_text
@@ -201,6 +214,41 @@ def render_native_voice_input(reset_count, target_widget_key=None):
     st.markdown('<div class="debug-footer">src/components/triage/native_voice_input.py</div>', unsafe_allow_html=True)
 
 
+def _transcribir_por_tramos(audio_val):
+    """
+    Transcribe un dictado largo por tramos mostrando el texto parcial según llega.
+
+    Returns:
+        tuple: (respuesta compatible con save_transcription, texto completo)
+    """
+    progress = st.progress(0.0, text="Transcribiendo dictado por tramos...")
+    preview = st.empty()
+    full_text = ""
+    errores = 0
+    for evento in transcribir_audio_streaming(audio_val, prompt_type="clinical_dictation"):
+        if evento.get("status") == "ERROR" and "total" not in evento:
+            st.error(evento.get("msg", "Error en la transcripción"))
+            break
+        if evento.get("status") == "ERROR":
+            errores += 1
+        full_text = evento.get("partial_text", "")
+        total = evento.get("total", 1) or 1
+        progress.progress((evento["index"] + 1) / total, text=f"Tramo {evento['index'] + 1}/{total}")
+        preview.info(full_text or "...")
+    progress.empty()
+    preview.empty()
+    if errores:
+        st.warning(f"{errores} tramo(s) no se pudieron transcribir. Use 'Reprocesar Audio' para reintentarlos.")
+
+    # Transcripción literal: sin traducción ni idioma detectado (los tramos no lo devuelven)
+    full_response = {
+        "original_text": full_text,
+        "translated_ia_text": "",
+        "transcription": full_text
+    }
+    return full_response, full_text
+
+
 def _append_text_to_patient_data(new_text, widget_key=None):
     """
     Helper para añadir texto al campo médico de forma segura,
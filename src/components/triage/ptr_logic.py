@@ -1,26 +1,25 @@
+# path: src/components/triage/ptr_logic.py
+# Actualizado: 2026-10-17 - Condición de regla compartida con el scoring por cohortes; configs opcionales
+# Actualizado: 2026-10-17 - Configuración desde el snapshot versionado (sustituye a _CONFIG_CACHE, que no se invalidaba)
+# Actualizado: 2026-10-17 - Las reglas PTRRule (operator/value) se evalúan (antes solo rangos min/max)
 """
 Lógica de Puntuación Total de Riesgo (PTR).
 Implementa un sistema de triaje ponderado basado en multiplicadores clínicos configurables.
 """
-from typing import Dict, Any, List, Optional
-from db.repositories.ptr_config import get_ptr_config_repository, PTRConfig
-
-# Cache simple en memoria para evitar consultas constantes a DB durante la misma sesión
-_CONFIG_CACHE: Dict[str, PTRConfig] = {}
+from typing import Dict, Any, List, Optional, Tuple
+from db.models import PTRConfig
+from services.clinical_config import get_clinical_config
 
 def _get_config(metric_key: str) -> Optional[PTRConfig]:
-    """Obtiene la configuración, usando caché si está disponible."""
-    if metric_key in _CONFIG_CACHE:
-        return _CONFIG_CACHE[metric_key]
-    
-    repo = get_ptr_config_repository()
-    config = repo.get_config(metric_key)
-    if config:
-        _CONFIG_CACHE[metric_key] = config
-    return config
+    """Obtiene la configuración del snapshot de configuración clínica (sin consultar la BD)."""
+    return get_clinical_config().ptr_config(metric_key)
 
-def _evaluate_rule(value: float, rule) -> bool:
-    """Evalúa una regla individual basada en rangos min/max."""
+def _rule_condition(rule) -> Tuple[Optional[str], Optional[float], Optional[float]]:
+    """
+    Normaliza la condición de una regla a (operador, valor, valor_max).
+    Admite PTRRule (operator/value/value_max) y, por compatibilidad, rangos
+    min/max (objeto o dict), que se tratan como 'between'.
+    """
     # Soporte para objeto Pydantic o dict (por si acaso)
     r_min = getattr(rule, 'min', None)
     r_max = getattr(rule, 'max', None)
@@ -30,15 +29,43 @@ def _evaluate_rule(value: float, rule) -> bool:
         r_min = rule.get('min')
         r_max = rule.get('max')
         
-    if r_min is None or r_max is None:
+    if r_min is not None and r_max is not None:
+        return "between", r_min, r_max
+
+    if isinstance(rule, dict):
+        return rule.get('operator'), rule.get('value'), rule.get('value_max')
+    return getattr(rule, 'operator', None), getattr(rule, 'value', None), getattr(rule, 'value_max', None)
+
+def _rule_points(rule) -> float:
+    if isinstance(rule, dict):
+        return rule.get('points', 0)
+    return getattr(rule, 'points', 0)
+
+def _evaluate_rule(value: float, rule) -> bool:
+    """Evalúa una regla individual (ver _rule_condition)."""
+    operator, ref, ref_max = _rule_condition(rule)
+    if operator is None or ref is None:
         return False
-        
-    return r_min <= value <= r_max
 
-def calculate_ptr_score(vital_signs: Dict[str, Any], context_flags: Dict[str, bool]) -> Dict[str, Any]:
+    if operator == "<": return value < ref
+    if operator == "<=": return value <= ref
+    if operator == ">": return value > ref
+    if operator == ">=": return value >= ref
+    if operator == "==": return value == ref
+    if operator == "between": return ref_max is not None and ref <= value <= ref_max
+    return False
+
+def calculate_ptr_score(
+    vital_signs: Dict[str, Any],
+    context_flags: Dict[str, bool],
+    configs: Optional[Dict[str, PTRConfig]] = None
+) -> Dict[str, Any]:
     """
     Calcula el PTR (Puntuación Total de Riesgo) basado en signos vitales y configuración dinámica.
+    'configs' (metric_key -> PTRConfig) sustituye a la configuración guardada, p. ej.
+    para simular una propuesta antes de guardarla.
     """
+    get_config = configs.get if configs is not None else _get_config
     score = 0
     details = []
     
@@ -71,10 +98,10 @@ def calculate_ptr_score(vital_signs: Dict[str, Any], context_flags: Dict[str, bo
         except:
             continue
 
-        config = _get_config(lookup_key)
+        config = get_config(lookup_key)
         if not config:
             # Si buscamos 'dolor' y no hay config, intentamos 'eva'
-            if key == 'dolor': config = _get_config('eva')
+            if key == 'dolor': config = get_config('eva')
             if not config: continue
 
         # 1. Determinar puntos base según reglas
@@ -86,8 +113,7 @@ def calculate_ptr_score(vital_signs: Dict[str, Any], context_flags: Dict[str, bo
         for rule in config.rules:
             if _evaluate_rule(val, rule):
                 # Asumimos que si hay múltiples matches, queremos el de mayor puntos
-                r_points = getattr(rule, 'points', 0)
-                if isinstance(rule, dict): r_points = rule.get('points', 0)
+                r_points = _rule_points(rule)
                 
                 if r_points >= base_points:
                     base_points = r_points
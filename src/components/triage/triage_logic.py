@@ -1,4 +1,5 @@
 # path: src/components/triage/triage_logic.py
+# Actualizado: 2026-10-17 - calculate_worst_case ignora métricas sin configuración para la edad
 from typing import Dict, Any, Tuple, Optional, List
 from db.models import VitalSignAgeConfig, VitalSignSeverityRange
 from components.triage.ptr_logic import calculate_ptr_score
@@ -58,7 +59,7 @@ def calculate_worst_case(
     
     # Evaluar cada signo vital presente
     for key, value in vital_signs.items():
-        if key in configs and value is not None:
+        if configs.get(key) is not None and value is not None:
             # Casos especiales no numéricos o booleanos
             if key == "pupilas":
                 # Lógica hardcoded para pupilas si no está en BD como rango numérico
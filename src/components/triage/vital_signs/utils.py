@@ -1,11 +1,8 @@
 # path: src/components/triage/vital_signs/utils.py
+# Actualizado: 2026-10-17 - Configuración desde el snapshot de configuración clínica (sin consultas por render)
 from typing import Dict, Any
-from db.repositories.vital_signs_repo import VitalSignsRepository
+from services.clinical_config import get_clinical_config
 
 def get_all_configs(age: int) -> Dict[str, Any]:
     """Carga todas las configuraciones de signos vitales para la edad dada."""
-    repo = VitalSignsRepository()
-    configs = {}
-    for metric in ["fc", "spo2", "temp", "pas", "pad", "fr", "gcs"]:
-        configs[metric] = repo.get_config(metric, age)
-    return configs
+    return get_clinical_config().vital_configs_for_age(age)
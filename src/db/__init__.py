@@ -13,7 +13,8 @@ from .connection import (
     health_check,
     close_connection,
     MongoDBSession,
-    retry_on_connection_error
+    retry_on_connection_error,
+    run_in_transaction
 )
 
 __all__ = [
@@ -22,5 +23,6 @@ __all__ = [
     "health_check",
     "close_connection",
     "MongoDBSession",
-    "retry_on_connection_error"
+    "retry_on_connection_error",
+    "run_in_transaction"
 ]
@@ -1,3 +1,5 @@
+# path: src/db/connection.py
+# Actualizado: 2026-10-17 - Registro del perfilador de consultas (command monitoring) en el cliente
 """
 Módulo de gestión de conexión a MongoDB Atlas.
 
@@ -5,18 +7,19 @@ Este módulo proporciona una interfaz centralizada para conectarse a MongoDB,
 con manejo de errores, retry logic y connection pooling.
 """
 import os
-from typing import Optional
+from typing import Optional, Callable, Any
 from functools import wraps
 import time
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from pymongo.database import Database
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
 
 import certifi
 import streamlit as st
 from core.logger_config import logger
+from db.query_profiler import PROFILER_ENABLED, get_query_profiler
 
 # Cargar variables de entorno
 load_dotenv()
@@ -97,6 +100,9 @@ def get_client() -> MongoClient:
     masked_uri = mongodb_uri.replace(mongodb_uri.split("@")[0].split("//")[1].split(":")[1], "****") if "@" in mongodb_uri else "URI_SIN_CREDENCIALES"
     logger.info(f"🔌 Intentando conectar a MongoDB con URI: {masked_uri}")
     
+    # Perfilado de consultas (latencias, COLLSCAN): ver db/query_profiler.py
+    listeners = [get_query_profiler()] if PROFILER_ENABLED else []
+
     # Crear cliente con configuración optimizada
     _client = MongoClient(
         mongodb_uri,
@@ -109,7 +115,10 @@ def get_client() -> MongoClient:
         socketTimeoutMS=30000,  # Timeout para operaciones de socket (30s)
         tlsCAFile=certifi.where(), # Explicitly use certifi CA bundle
         tlsDisableOCSPEndpointCheck=True, # Disable OCSP check which might fail on mobile networks
+        event_listeners=listeners,
     )
+    if PROFILER_ENABLED:
+        get_query_profiler().attach(_client)
     
     # Verificar conexión
     _client.admin.command('ping')
@@ -224,6 +233,41 @@ class MongoDBSession:
         return False
 
 
+# Código de error de MongoDB cuando el servidor no admite transacciones (standalone)
+_ILLEGAL_OPERATION = 20
+
+
+def run_in_transaction(callback: Callable[[Any], Any], database: Optional[Database] = None) -> Any:
+    """
+    Ejecuta *callback(session)* dentro de una transacción multi-documento.
+
+    Usa ``with_transaction`` (reintenta errores transitorios y de commit).
+    Si el despliegue no admite transacciones (servidor standalone o cliente
+    de pruebas) ejecuta el callback sin sesión, es decir ``callback(None)``.
+
+    Args:
+        callback: Función que recibe la sesión (o None) y realiza las operaciones
+        database: Base de datos a usar (por defecto la configurada)
+
+    Returns:
+        Any: Lo que devuelva el callback
+    """
+    db = database if database is not None else get_database()
+
+    try:
+        session = db.client.start_session()
+    except NotImplementedError:
+        return callback(None)
+
+    with session:
+        try:
+            return session.with_transaction(callback)
+        except OperationFailure as e:
+            if e.code == _ILLEGAL_OPERATION:
+                return callback(None)
+            raise
+
+
 if __name__ == "__main__":
     # Prueba de conexión
     print("🔄 Probando conexión a MongoDB...")
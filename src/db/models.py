@@ -82,6 +82,7 @@ class AIAuditLog(BaseModel):
     # Resultado
     status: Literal["success", "error"] = Field(..., description="Estado de la llamada")
     error_msg: Optional[str] = None
+    cache_hit: bool = Field(default=False, description="Respuesta servida desde la caché de IA (sin llamar al modelo)")
     
     # Metadata extra
     metadata: Dict[str, Any] = Field(default_factory=dict)
@@ -443,6 +444,18 @@ class PatientFlow(BaseModel):
     """Modelo de flujo de paciente (un documento por cada paso/movimiento)."""
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     flow_id: str = Field(..., description="ID único del flujo completo (compartido por todos los pasos)")
+    patient_code: str = Field(..., description="Código del paciente")
+    secuencia: int = Field(default=1, description="Orden del paso dentro del flujo")
+
+    sala_code: str = Field(..., description="Código de la sala del paso")
+    sala_tipo: Optional[str] = Field(default=None)
+    sala_subtipo: Optional[str] = Field(default=None)
+
+    estado: str = Field(default="EN_ADMISION", description="Estado del paciente en este paso")
+    activo: bool = Field(default=True, description="Solo un paso activo por paciente")
+
+    entrada: datetime = Field(default_factory=datetime.now)
+    salida: Optional[datetime] = Field(default=None)
     duracion_minutos: Optional[int] = Field(default=None, description="Duración en minutos")
     
     notas: Optional[str] = Field(default=None)
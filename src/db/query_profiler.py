@@ -0,0 +1,394 @@
+# path: src/db/query_profiler.py
+# Creado: 2026-10-17
+"""
+Perfilado de consultas a MongoDB mediante command monitoring de pymongo.
+
+QueryProfiler es un CommandListener registrado en el MongoClient (ver
+connection.get_client) que mide cada comando y acumula:
+- Histogramas de latencia por colección, por operación y por punto de llamada
+  (primer fichero de src/ en la pila: repositorio, servicio o vista).
+- Documentos devueltos, errores y un registro acotado de consultas lentas
+  (también emitido al log como JSON estructurado).
+- Formas de consulta (filtro sin valores). Cada forma nueva se analiza una vez con
+  explain(queryPlanner) en segundo plano para detectar COLLSCAN (falta de índice).
+
+Nunca se guardan valores de los filtros (datos clínicos), solo su forma. El
+resumen se exporta como JSON y se persiste periódicamente en 'query_profiles'
+(un documento por proceso) para revisarlo desde el panel "Debug MongoDB".
+Se desactiva con MONGO_PROFILER=0.
+"""
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from core.logger_config import logger
+
+PROFILER_ENABLED = os.getenv("MONGO_PROFILER", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+SLOW_LOG_SIZE = 200
+MAX_SHAPES = 500
+PROFILE_COLLECTION = "query_profiles"
+PROFILE_FLUSH_S = 60
+PROFILE_RETENTION_DAYS = 7
+
+# Límites superiores (ms) de los buckets del histograma; el último bucket es abierto
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Comandos de handshake, sesión o del propio perfilador que no se miden
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "buildinfo", "saslStart", "saslContinue",
+    "endSessions", "killCursors", "explain", "getLastError", "listCollections", "listIndexes",
+    "serverStatus", "dbStats", "collStats", "abortTransaction", "commitTransaction",
+}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Claves de sesión/transporte que no forman parte de la consulta a analizar
+_TRANSPORT_KEYS = {"lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime",
+                   "$readPreference", "readConcern", "writeConcern", "apiVersion", "apiStrict",
+                   "apiDeprecationErrors", "cursor", "batchSize", "singleBatch", "ordered", "bypassDocumentValidation"}
+
+_SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Helpers genéricos de acceso: se atribuye la llamada a quien los invoca
+_GENERIC_FILES = {os.path.abspath(__file__),
+                  os.path.join(_SRC_ROOT, "db", "connection.py"),
+                  os.path.join(_SRC_ROOT, "db", "repositories", "base.py")}
+
+
+class _Stats:
+    """Contador con histograma de latencias."""
+    __slots__ = ("count", "errors", "total_ms", "max_ms", "docs", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.docs = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms: float, docs: int, failed: bool):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.docs += docs
+        if failed:
+            self.errors += 1
+        for i, limit in enumerate(BUCKETS_MS):
+            if ms <= limit:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, q: float) -> float:
+        """Estimación por histograma: límite superior del bucket que alcanza el cuantil."""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= threshold:
+                return float(min(BUCKETS_MS[i], self.max_ms)) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "docs": self.docs,
+            "histogram": dict(zip([f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], self.buckets)),
+        }
+
+
+def query_shape(value: Any) -> Any:
+    """Forma de un filtro/pipeline: conserva claves y operadores y sustituye los valores por '?'."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [query_shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+def _command_shape(name: str, command: Dict[str, Any]) -> Any:
+    if name == "find":
+        return {"filter": query_shape(command.get("filter", {})), "sort": query_shape(command.get("sort") or {})}
+    if name == "aggregate":
+        return [{stage: query_shape(body) if stage in ("$match", "$sort", "$lookup") else "?"}
+                for stage_doc in command.get("pipeline", []) for stage, body in stage_doc.items()]
+    if name in ("count", "distinct", "findAndModify"):
+        return query_shape(command.get("query") or {})
+    if name in ("update", "delete"):
+        ops = command.get("updates" if name == "update" else "deletes") or [{}]
+        return query_shape(ops[0].get("q", {}))
+    return None
+
+
+def _docs_returned(name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if name == "distinct":
+        return len(reply.get("values") or [])
+    if name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    n = reply.get("n")
+    return int(n) if isinstance(n, (int, float)) else 0
+
+
+def _call_site() -> str:
+    """Primer marco de la pila dentro de src/ (fuera de pymongo y de los helpers genéricos)."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _GENERIC_FILES and f"{os.sep}pymongo{os.sep}" not in filename and f"{os.sep}mongomock{os.sep}" not in filename:
+            if filename.startswith(_SRC_ROOT + os.sep):
+                rel = os.path.relpath(filename, _SRC_ROOT).replace(os.sep, "/")
+                return f"{rel}:{frame.f_lineno} {frame.f_code.co_name}"
+            if fallback is None and "threading.py" not in filename:
+                fallback = f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback or "?"
+
+
+def find_collscan(plan: Any) -> bool:
+    """True si algún nodo del plan de explain() es un COLLSCAN."""
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(find_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(find_collscan(v) for v in plan)
+    return False
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Listener de comandos que acumula latencias, formas de consulta y consultas lentas."""
+
+    def __init__(self, capture_call_sites: bool = True, auto_explain: bool = True):
+        self.capture_call_sites = capture_call_sites
+        self.auto_explain = auto_explain
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, str, Any, Optional[Dict[str, Any]]]] = {}
+        self._client = None
+        self._explain_queue: "queue.Queue" = queue.Queue()
+        self._explain_thread: Optional[threading.Thread] = None
+        self._observers: List[Any] = []
+        self.reset()
+
+    # --- Configuración -----------------------------------------------------
+
+    def attach(self, client):
+        """Cliente usado para ejecutar explain() sobre las formas nuevas."""
+        self._client = client
+
+    def add_observer(self, callback):
+        """
+        callback(collection, command_name, ms) tras cada comando medido, en el hilo
+        que lo ejecutó (p. ej. para atribuir llamadas a BD a la vista que las hace).
+        """
+        if callback not in self._observers:
+            self._observers.append(callback)
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.utcnow()
+            self.totals = _Stats()
+            self.collections: Dict[str, _Stats] = {}
+            self.operations: Dict[Tuple[str, str], _Stats] = {}
+            self.call_sites: Dict[Tuple[str, str, str], _Stats] = {}
+            self.shapes: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+            self.slow_queries: deque = deque(maxlen=SLOW_LOG_SIZE)
+
+    # --- CommandListener ---------------------------------------------------
+
+    def started(self, event):
+        name = event.command_name
+        if name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get("collection") if name == "getMore" else command.get(name)
+        if not isinstance(collection, str) or collection == PROFILE_COLLECTION:
+            return
+        shape = _command_shape(name, command)
+        explain_cmd = None
+        if name in EXPLAINABLE_COMMANDS:
+            explain_cmd = {k: v for k, v in command.items() if k not in _TRANSPORT_KEYS}
+        site = _call_site() if self.capture_call_sites else "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.database_name, site, shape, explain_cmd)
+
+    def succeeded(self, event):
+        self._finish(event, _docs_returned(event.command_name, event.reply or {}), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _finish(self, event, docs: int, failed: bool):
+        key = (event.connection_id, event.request_id)
+        with self._lock:
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                return
+            collection, database, site, shape, explain_cmd = pending
+            name = event.command_name
+            ms = event.duration_micros / 1000.0
+            self.totals.add(ms, docs, failed)
+            self.collections.setdefault(collection, _Stats()).add(ms, docs, failed)
+            self.operations.setdefault((collection, name), _Stats()).add(ms, docs, failed)
+            self.call_sites.setdefault((site, collection, name), _Stats()).add(ms, docs, failed)
+
+            shape_json = json.dumps(shape, default=str) if shape is not None else None
+            new_shape = None
+            if shape_json is not None:
+                shape_key = (collection, name, shape_json)
+                entry = self.shapes.get(shape_key)
+                if entry is None and len(self.shapes) < MAX_SHAPES:
+                    entry = self.shapes[shape_key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                      "call_site": site, "plan": None}
+                    if explain_cmd is not None:
+                        new_shape = (shape_key, database, explain_cmd)
+                if entry is not None:
+                    entry["count"] += 1
+                    entry["total_ms"] += ms
+                    entry["max_ms"] = max(entry["max_ms"], ms)
+
+            slow = None
+            if ms >= SLOW_QUERY_MS:
+                slow = {"at": datetime.utcnow().isoformat(timespec="milliseconds"), "collection": collection,
+                        "command": name, "ms": round(ms, 3), "docs": docs, "failed": failed,
+                        "call_site": site, "shape": shape_json}
+                self.slow_queries.append(slow)
+
+        for callback in self._observers:
+            callback(collection, name, ms)
+        if slow is not None:
+            logger.warning("mongo_slow_query " + json.dumps(slow, ensure_ascii=False))
+        if new_shape is not None and self.auto_explain and self._client is not None:
+            self._enqueue_explain(*new_shape)
+
+    # --- Análisis de planes (COLLSCAN) -------------------------------------
+
+    def _enqueue_explain(self, shape_key, database, command):
+        self._explain_queue.put((shape_key, database, command))
+        if self._explain_thread is None or not self._explain_thread.is_alive():
+            self._explain_thread = threading.Thread(target=self._explain_loop, name="mongo-explain", daemon=True)
+            self._explain_thread.start()
+
+    def _explain_loop(self):
+        while True:
+            try:
+                item = self._explain_queue.get(timeout=30)
+            except queue.Empty:
+                return
+            self.explain_shape(*item)
+
+    def explain_shape(self, shape_key, database: str, command: Dict[str, Any]) -> Optional[str]:
+        """Ejecuta explain(queryPlanner) de una consulta de ejemplo y anota el plan de su forma."""
+        try:
+            result = self._client[database].command("explain", command, verbosity="queryPlanner")
+            plan = "COLLSCAN" if find_collscan(result) else "INDEX"
+        except Exception as e:
+            logger.debug(f"explain no disponible para {shape_key[:2]}: {e}")
+            plan = "n/d"
+        with self._lock:
+            if shape_key in self.shapes:
+                self.shapes[shape_key]["plan"] = plan
+        return plan
+
+    # --- Resumen / exportación ---------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Resumen serializable (sin valores de consulta) del perfil de este proceso."""
+        with self._lock:
+            collections = [{"collection": c, **s.to_dict()} for c, s in self.collections.items()]
+            operations = [{"collection": c, "command": n, **s.to_dict()} for (c, n), s in self.operations.items()]
+            call_sites = [{"call_site": site, "collection": c, "command": n, **s.to_dict()}
+                          for (site, c, n), s in self.call_sites.items()]
+            shapes = [{"collection": c, "command": n, "shape": shape, "count": e["count"],
+                       "total_ms": round(e["total_ms"], 3), "avg_ms": round(e["total_ms"] / e["count"], 3) if e["count"] else 0.0,
+                       "max_ms": round(e["max_ms"], 3), "plan": e["plan"], "call_site": e["call_site"]}
+                      for (c, n, shape), e in self.shapes.items()]
+            totals = self.totals.to_dict()
+            slow = list(self.slow_queries)
+        by_total = lambda row: -row["total_ms"]
+        return {
+            "process": self.process,
+            "started_at": self.started_at,
+            "generated_at": datetime.utcnow(),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "totals": totals,
+            "collections": sorted(collections, key=by_total),
+            "operations": sorted(operations, key=by_total),
+            "call_sites": sorted(call_sites, key=by_total),
+            "shapes": sorted(shapes, key=by_total),
+            "slow_queries": slow[::-1],
+        }
+
+    def export_json(self) -> str:
+        return json.dumps(self.snapshot(), default=str, ensure_ascii=False, indent=2)
+
+    def flush(self, database) -> None:
+        """Persiste el resumen de este proceso en 'query_profiles' (un documento por proceso)."""
+        doc = self.snapshot()
+        database[PROFILE_COLLECTION].replace_one({"_id": self.process}, doc, upsert=True)
+
+
+_profiler: Optional[QueryProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_query_profiler() -> QueryProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = QueryProfiler()
+    return _profiler
+
+
+def get_persisted_profiles(database) -> List[Dict[str, Any]]:
+    """Resúmenes persistidos por todos los procesos (más recientes primero)."""
+    return list(database[PROFILE_COLLECTION].find().sort("generated_at", -1))
+
+
+def start_query_profile_flusher(interval_s: int = PROFILE_FLUSH_S) -> Optional[threading.Thread]:
+    """Hilo que persiste periódicamente el perfil del proceso."""
+    if not PROFILER_ENABLED:
+        return None
+    from db.connection import get_database
+
+    def _run():
+        try:
+            db = get_database()
+            db[PROFILE_COLLECTION].create_index("generated_at", expireAfterSeconds=int(timedelta(days=PROFILE_RETENTION_DAYS).total_seconds()))
+        except Exception as e:
+            logger.error(f"Perfil de consultas: no se pudo preparar '{PROFILE_COLLECTION}': {e}")
+            return
+        while True:
+            time.sleep(interval_s)
+            try:
+                get_query_profiler().flush(db)
+            except Exception as e:
+                logger.error(f"Perfil de consultas: error al persistir: {e}")
+
+    thread = threading.Thread(target=_run, name="mongo-profile-flush", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,55 @@
+# path: src/db/repositories/ai_response_cache.py
+# Creado: 2026-10-17
+"""
+Repositorio de la caché compartida de respuestas de IA.
+Maneja la colección 'ai_response_cache' (_id = clave de contenido) para que
+varios workers compartan las respuestas de llamadas deterministas.
+La caducidad la aplica MongoDB mediante un índice TTL sobre 'expires_at'.
+"""
+from typing import Optional, Dict, Any
+from datetime import datetime
+from db import get_database
+
+
+class AIResponseCacheRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.ai_response_cache
+        self.ensure_indexes()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la entrada vigente para la clave (None si no existe o ha caducado)."""
+        return self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now()}})
+
+    def put(self, key: str, entry: Dict[str, Any], expires_at: datetime) -> bool:
+        """Guarda (o reemplaza) una entrada con su fecha de caducidad."""
+        try:
+            result = self.collection.replace_one(
+                {"_id": key},
+                {**entry, "_id": key, "expires_at": expires_at, "updated_at": datetime.now()},
+                upsert=True
+            )
+            return result.acknowledged
+        except Exception as e:
+            print(f"Error guardando entrada de caché IA: {e}")
+            return False
+
+    def delete_all(self) -> int:
+        """Vacía la caché compartida."""
+        return self.collection.delete_many({}).deleted_count
+
+    def ensure_indexes(self):
+        """Índice TTL: MongoDB elimina las entradas al alcanzar 'expires_at'."""
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0, name="idx_expires_at_ttl")
+        except Exception as e:
+            print(f"Error creando índice TTL de caché IA: {e}")
+
+
+_ai_response_cache_repo = None
+
+def get_ai_response_cache_repository() -> AIResponseCacheRepository:
+    global _ai_response_cache_repo
+    if _ai_response_cache_repo is None:
+        _ai_response_cache_repo = AIResponseCacheRepository()
+    return _ai_response_cache_repo
@@ -46,6 +46,24 @@ class AuditRepository(BaseRepository):
             limit=limit
         )
     
+    def get_range(self, start: datetime, end: datetime, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Obtiene los registros más recientes con timestamp en [start, end).
+        
+        Args:
+            start: Inicio del rango (incluido)
+            end: Fin del rango (excluido)
+            limit: Número máximo de registros
+            
+        Returns:
+            List[Dict]: Lista de registros ordenados por fecha descendente
+        """
+        return self.find_all(
+            filters={"timestamp": {"$gte": start, "$lt": end}},
+            sort=[("timestamp", pymongo.DESCENDING)],
+            limit=limit
+        )
+    
     def registrar_accion(self, accion: str, usuario: str, detalles: Dict[str, Any], patient_code: Optional[str] = None) -> str:
         """
         Registra una nueva acción en la auditoría.
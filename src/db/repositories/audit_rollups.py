@@ -0,0 +1,123 @@
+# path: src/db/repositories/audit_rollups.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - clear_section para los días que se quedan sin registros
+"""
+Repositorio de agregados diarios del panel de auditoría (colección 'audit_rollups').
+
+Un documento por día (_id 'YYYY-MM-DD') con una sección por colección origen
+(triage, files, transcriptions). Cada sección guarda contadores escalares y
+"cubos": listas de celdas {dimensiones..., n, medidas...} que se suman con
+$unwind/$group para cualquier rango de fechas, de modo que el coste de una
+consulta depende del rango y no del volumen de registros.
+
+Los documentos 'watermark:<origen>' guardan hasta dónde se han procesado las
+altas de cada colección origen (por tiempo de generación del ObjectId).
+"""
+from typing import List, Dict, Any, Optional, Iterator, Iterable
+from datetime import datetime, date, timedelta
+from bson import ObjectId
+from db import get_database
+
+WATERMARK_PREFIX = "watermark:"
+
+
+def day_key(day: date) -> str:
+    return day.strftime("%Y-%m-%d")
+
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+class AuditRollupsRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.audit_rollups
+        self.ensure_indexes()
+
+    # --- Lectura de colecciones origen ---
+
+    def scan_new_timestamps(self, source: str, since: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        """
+        Registros dados de alta en 'source' desde 'since' (tiempo de generación del
+        _id, UTC). Solo proyecta _id y timestamp.
+        """
+        query = {"_id": {"$gte": ObjectId.from_datetime(since)}} if since else {}
+        return self.db[source].find(query, {"timestamp": 1})
+
+    def stream_range(self, source: str, start: datetime, end: datetime,
+                     projection: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Registros de 'source' con timestamp en [start, end), en orden cronológico."""
+        return self.db[source].find(
+            {"timestamp": {"$gte": start, "$lt": end}}, projection
+        ).sort("timestamp", 1)
+
+    # --- Escritura de agregados ---
+
+    def save_section(self, day: date, section: str, data: Dict[str, Any]):
+        """Sustituye la sección de un día (recalcular un día es idempotente)."""
+        self.collection.update_one(
+            {"_id": day_key(day)},
+            {"$set": {"day": day_start(day), section: data, "updated_at": datetime.now()}},
+            upsert=True,
+        )
+
+    def clear_section(self, days: Iterable[date], section: str, sections: List[str]):
+        """
+        Quita la sección de los días indicados y elimina los documentos que se
+        quedan sin ninguna de las 'sections'.
+        """
+        keys = [day_key(day) for day in days]
+        if not keys:
+            return
+        self.collection.update_many({"_id": {"$in": keys}}, {"$unset": {section: ""}})
+        self.collection.delete_many({"_id": {"$in": keys}, **{s: {"$exists": False} for s in sections}})
+
+    def get_watermark(self, source: str) -> Optional[datetime]:
+        doc = self.collection.find_one({"_id": WATERMARK_PREFIX + source})
+        return doc.get("seen_until") if doc else None
+
+    def set_watermark(self, source: str, seen_until: datetime):
+        self.collection.update_one(
+            {"_id": WATERMARK_PREFIX + source},
+            {"$set": {"seen_until": seen_until, "updated_at": datetime.now()}},
+            upsert=True,
+        )
+
+    # --- Consultas por rango ---
+
+    @staticmethod
+    def _range_match(start: date, end: date) -> Dict[str, Any]:
+        return {"$match": {"day": {"$gte": day_start(start), "$lt": day_start(end) + timedelta(days=1)}}}
+
+    def aggregate_cube(self, start: date, end: date, path: str, dims: List[str],
+                       measures: List[str]) -> List[Dict[str, Any]]:
+        """
+        Suma las celdas del cubo 'path' (p.ej. 'triage.cells') en el rango [start, end],
+        agrupando por 'dims'. Devuelve una fila plana por combinación de dimensiones.
+        """
+        group = {"_id": {d: f"${path}.{d}" for d in dims}}
+        for m in measures:
+            group[m] = {"$sum": f"${path}.{m}"}
+        rows = self.collection.aggregate([self._range_match(start, end), {"$unwind": f"${path}"}, {"$group": group}])
+        return [{**row["_id"], **{m: row[m] for m in measures}} for row in rows]
+
+    def daily_totals(self, start: date, end: date, paths: List[str]) -> List[Dict[str, Any]]:
+        """Contadores escalares ('triage.total', ...) por día del rango, en orden."""
+        projection = {"day": 1, **{p: 1 for p in paths}}
+        return list(self.collection.find(self._range_match(start, end)["$match"], projection).sort("day", 1))
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([("day", 1)], name="idx_day")
+        except Exception as e:
+            print(f"Error creando índices de audit_rollups: {e}")
+
+
+_audit_rollups_repo = None
+
+def get_audit_rollups_repository() -> AuditRollupsRepository:
+    global _audit_rollups_repo
+    if _audit_rollups_repo is None:
+        _audit_rollups_repo = AuditRollupsRepository()
+    return _audit_rollups_repo
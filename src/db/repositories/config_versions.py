@@ -0,0 +1,67 @@
+# path: src/db/repositories/config_versions.py
+# Creado: 2026-10-17
+"""
+Contadores de versión de configuración ('config_versions').
+
+Un documento por ámbito (_id = nombre, p. ej. 'clinical') con un contador que los
+repositorios incrementan tras cada escritura. Los lectores con caché comparan la
+versión con un solo find_one por _id (o escuchan el change stream de la colección)
+para saber si deben recargar. Además se mantiene un contador en proceso, de modo que
+los cambios hechos por el propio proceso se ven sin esperar a la comprobación.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from db import get_database
+
+CLINICAL_CONFIG = "clinical"
+
+_local_versions: Dict[str, int] = {}
+_local_lock = threading.Lock()
+
+
+def get_local_config_version(name: str) -> int:
+    """Versión en proceso (número de cambios hechos desde este proceso)."""
+    return _local_versions.get(name, 0)
+
+
+def bump_config_version(name: str):
+    """Marca la configuración 'name' como modificada (en proceso y en BD)."""
+    with _local_lock:
+        _local_versions[name] = _local_versions.get(name, 0) + 1
+    try:
+        get_config_versions_repository().bump(name)
+    except Exception as e:
+        print(f"Error actualizando versión de configuración '{name}': {e}")
+
+
+class ConfigVersionsRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.config_versions
+
+    def get_version(self, name: str) -> Optional[int]:
+        doc = self.collection.find_one({"_id": name}, {"version": 1})
+        return doc.get("version") if doc else None
+
+    def bump(self, name: str) -> int:
+        doc = self.collection.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now()}},
+            upsert=True,
+            return_document=True,
+        )
+        return doc["version"]
+
+    def watch(self, name: str):
+        """Change stream de las actualizaciones del contador (requiere replica set)."""
+        return self.collection.watch([{"$match": {"documentKey._id": name}}])
+
+
+_config_versions_repo: Optional[ConfigVersionsRepository] = None
+
+def get_config_versions_repository() -> ConfigVersionsRepository:
+    global _config_versions_repo
+    if _config_versions_repo is None:
+        _config_versions_repo = ConfigVersionsRepository()
+    return _config_versions_repo
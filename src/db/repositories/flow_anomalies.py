@@ -0,0 +1,93 @@
+# path: src/db/repositories/flow_anomalies.py
+# Creado: 2026-10-17
+"""
+Repositorio de la detección de anomalías de flujo.
+
+- 'flow_anomalies': una alerta por (sala, métrica, hora) con el valor observado,
+  el esperado (mediana de la franja) y la puntuación robusta.
+- 'flow_baselines': línea base por (sala, métrica, franja semanal día+hora) con
+  los últimos valores observados en esa franja. El documento '_state' guarda
+  hasta qué hora se ha procesado.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from db import get_database
+
+STATE_ID = "_state"
+
+
+class FlowAnomaliesRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.anomalies = self.db.flow_anomalies
+        self.baselines = self.db.flow_baselines
+        try:
+            self.anomalies.create_index(
+                [("sala_code", ASCENDING), ("metric", ASCENDING), ("hour", ASCENDING)], unique=True
+            )
+            self.anomalies.create_index([("hour", DESCENDING)])
+        except Exception as e:
+            print(f"Error creando índices de flow_anomalies: {e}")
+
+    # --- Líneas base ---
+
+    def get_processed_until(self) -> Optional[datetime]:
+        doc = self.baselines.find_one({"_id": STATE_ID})
+        return doc.get("processed_until") if doc else None
+
+    def load_baselines(self) -> Dict[tuple, List[float]]:
+        """{(sala, métrica, franja): valores} de todas las franjas."""
+        return {
+            (doc["sala_code"], doc["metric"], doc["slot"]): doc.get("values", [])
+            for doc in self.baselines.find({"_id": {"$ne": STATE_ID}})
+        }
+
+    def save_baselines(self, baselines: Dict[tuple, List[float]], processed_until: datetime):
+        """Guarda las franjas modificadas y la marca de procesado."""
+        ops = [
+            UpdateOne(
+                {"_id": f"{sala}|{metric}|{slot}"},
+                {"$set": {"sala_code": sala, "metric": metric, "slot": slot, "values": values}},
+                upsert=True,
+            )
+            for (sala, metric, slot), values in baselines.items()
+        ]
+        ops.append(UpdateOne(
+            {"_id": STATE_ID},
+            {"$set": {"processed_until": processed_until, "updated_at": datetime.now()}},
+            upsert=True,
+        ))
+        self.baselines.bulk_write(ops, ordered=False)
+
+    # --- Alertas ---
+
+    def save_anomalies(self, anomalies: List[Dict[str, Any]]):
+        if not anomalies:
+            return
+        self.anomalies.bulk_write([
+            UpdateOne(
+                {"sala_code": a["sala_code"], "metric": a["metric"], "hour": a["hour"]},
+                {"$set": a},
+                upsert=True,
+            )
+            for a in anomalies
+        ], ordered=False)
+
+    def get_anomalies(self, sala_code: Optional[str] = None, since: Optional[datetime] = None,
+                      limit: int = 100) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if sala_code:
+            query["sala_code"] = sala_code
+        if since:
+            query["hour"] = {"$gte": since}
+        return list(self.anomalies.find(query, {"_id": 0}).sort("hour", DESCENDING).limit(limit))
+
+
+_flow_anomalies_repo: Optional[FlowAnomaliesRepository] = None
+
+def get_flow_anomalies_repository() -> FlowAnomaliesRepository:
+    global _flow_anomalies_repo
+    if _flow_anomalies_repo is None:
+        _flow_anomalies_repo = FlowAnomaliesRepository()
+    return _flow_anomalies_repo
@@ -0,0 +1,157 @@
+# path: src/db/repositories/his_outbox.py
+# Creado: 2026-10-17
+"""
+Repositorio del outbox de envíos clínicos al HIS (colección 'his_outbox').
+
+Cada mensaje usa su clave de idempotencia como _id, de modo que encolar dos
+veces el mismo triaje no duplica el envío. Ciclo de vida:
+    pending -> sending (reclamado por el dispatcher con lease) -> delivered
+                                                              -> pending (reintento)
+                                                              -> dead (dead-letter)
+Un lease caducado (worker caído a mitad de envío) vuelve a ser reclamable.
+"""
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from db import get_database
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_DELIVERED = "delivered"
+STATUS_DEAD = "dead"
+
+DELIVERED_RETENTION_DAYS = 30
+
+
+class HISOutboxRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.his_outbox
+        self.ensure_indexes()
+
+    def enqueue(self, idempotency_key: str, endpoint: str, payload: Dict[str, Any],
+                metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Encola un mensaje con una única inserción.
+
+        Returns:
+            True si se ha encolado, False si la clave ya existía (envío duplicado).
+        """
+        now = datetime.now()
+        try:
+            self.collection.insert_one({
+                "_id": idempotency_key,
+                "endpoint": endpoint,
+                "payload": payload,
+                "metadata": metadata or {},
+                "status": STATUS_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    @staticmethod
+    def _claimable(now: datetime, endpoints: List[str]) -> Dict[str, Any]:
+        return {
+            "endpoint": {"$in": endpoints},
+            "$or": [
+                {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+                {"status": STATUS_SENDING, "lease_until": {"$lt": now}},
+            ],
+        }
+
+    def claim_batch(self, endpoints: List[str], limit: int, lease_s: float) -> List[Dict[str, Any]]:
+        """
+        Reclama hasta 'limit' mensajes vencidos para los endpoints indicados.
+        El reclamo es atómico por mensaje (filtro de estado en el update_many),
+        así que varios dispatchers no envían el mismo mensaje a la vez.
+        """
+        now = datetime.now()
+        query = self._claimable(now, endpoints)
+        ids = [d["_id"] for d in self.collection.find(query, {"_id": 1}).sort("next_attempt_at", 1).limit(limit)]
+        if not ids:
+            return []
+        claim_id = uuid.uuid4().hex
+        self.collection.update_many(
+            {"_id": {"$in": ids}, **query},
+            {"$set": {"status": STATUS_SENDING, "claim_id": claim_id,
+                      "lease_until": now + timedelta(seconds=lease_s)},
+             "$inc": {"attempts": 1}}
+        )
+        return list(self.collection.find({"claim_id": claim_id, "status": STATUS_SENDING}))
+
+    def mark_delivered(self, keys: List[str], response: Optional[Dict[str, Any]] = None) -> int:
+        if not keys:
+            return 0
+        now = datetime.now()
+        result = self.collection.update_many(
+            {"_id": {"$in": keys}},
+            {"$set": {"status": STATUS_DELIVERED, "delivered_at": now, "response": response or {},
+                      "purge_at": now + timedelta(days=DELIVERED_RETENTION_DAYS)},
+             "$unset": {"claim_id": "", "lease_until": "", "last_error": ""}}
+        )
+        return result.modified_count
+
+    def reschedule(self, retries: List[Tuple[str, datetime, str]]) -> int:
+        """Devuelve mensajes a 'pending' con su próximo intento: [(clave, next_attempt_at, error)]."""
+        if not retries:
+            return 0
+        ops = [
+            UpdateOne({"_id": key}, {"$set": {"status": STATUS_PENDING, "next_attempt_at": next_at, "last_error": error},
+                                     "$unset": {"claim_id": "", "lease_until": ""}})
+            for key, next_at, error in retries
+        ]
+        return self.collection.bulk_write(ops, ordered=False).modified_count
+
+    def dead_letter(self, failures: List[Tuple[str, str]]) -> int:
+        """Mueve mensajes a dead-letter: [(clave, error)]."""
+        if not failures:
+            return 0
+        now = datetime.now()
+        ops = [
+            UpdateOne({"_id": key}, {"$set": {"status": STATUS_DEAD, "dead_at": now, "last_error": error},
+                                     "$unset": {"claim_id": "", "lease_until": ""}})
+            for key, error in failures
+        ]
+        return self.collection.bulk_write(ops, ordered=False).modified_count
+
+    def requeue_dead(self, keys: Optional[List[str]] = None) -> int:
+        """Reencola mensajes en dead-letter (todos o los indicados) con los intentos a cero."""
+        query: Dict[str, Any] = {"status": STATUS_DEAD}
+        if keys:
+            query["_id"] = {"$in": keys}
+        result = self.collection.update_many(
+            query,
+            {"$set": {"status": STATUS_PENDING, "attempts": 0, "next_attempt_at": datetime.now()},
+             "$unset": {"dead_at": ""}}
+        )
+        return result.modified_count
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = {STATUS_PENDING: 0, STATUS_SENDING: 0, STATUS_DELIVERED: 0, STATUS_DEAD: 0}
+        for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([("status", 1), ("next_attempt_at", 1)], name="idx_status_next_attempt")
+            self.collection.create_index("claim_id", sparse=True, name="idx_claim_id")
+            # Los entregados se purgan solos tras el periodo de retención
+            self.collection.create_index("purge_at", expireAfterSeconds=0, name="idx_purge_at_ttl")
+        except Exception as e:
+            print(f"Error creando índices de his_outbox: {e}")
+
+
+_his_outbox_repo = None
+
+def get_his_outbox_repository() -> HISOutboxRepository:
+    global _his_outbox_repo
+    if _his_outbox_repo is None:
+        _his_outbox_repo = HISOutboxRepository()
+    return _his_outbox_repo
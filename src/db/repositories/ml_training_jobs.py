@@ -0,0 +1,95 @@
+# path: src/db/repositories/ml_training_jobs.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Latido periódico independiente del progreso (heartbeat)
+"""
+Repositorio de trabajos de entrenamiento ML ('ml_training_jobs').
+
+Un documento por trabajo con su estado (queued, running, success, error),
+progreso (0-1), etapa actual, latido y resultado. El proceso que entrena
+actualiza el documento; la interfaz solo lo lee.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import DESCENDING
+from db import get_database
+
+# Un trabajo sin latido durante este tiempo se considera muerto
+STALE_AFTER = timedelta(minutes=10)
+# El proceso que entrena renueva el latido con esta frecuencia (también durante un ajuste largo)
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+ACTIVE_STATES = ("queued", "running")
+
+
+class MLTrainingJobsRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.ml_training_jobs
+        try:
+            self.collection.create_index([("created_at", DESCENDING)])
+            self.collection.create_index([("status", 1), ("heartbeat_at", DESCENDING)])
+        except Exception as e:
+            print(f"Error creando índices de ml_training_jobs: {e}")
+
+    def create_job(self, requested_by: str, params: Dict[str, Any]) -> str:
+        now = datetime.now()
+        result = self.collection.insert_one({
+            "status": "queued",
+            "progress": 0.0,
+            "stage": "En cola",
+            "requested_by": requested_by,
+            "params": params,
+            "created_at": now,
+            "heartbeat_at": now,
+            "log": [],
+        })
+        return str(result.inserted_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.collection.find_one({"_id": ObjectId(job_id)})
+
+    def get_active_job(self) -> Optional[Dict[str, Any]]:
+        """Trabajo en cola o en curso con latido reciente, si lo hay."""
+        return self.collection.find_one(
+            {"status": {"$in": list(ACTIVE_STATES)}, "heartbeat_at": {"$gte": datetime.now() - STALE_AFTER}},
+            sort=[("created_at", DESCENDING)],
+        )
+
+    def get_recent_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(self.collection.find({}, {"log": 0}).sort("created_at", DESCENDING).limit(limit))
+
+    def update_progress(self, job_id: str, progress: float, stage: str):
+        now = datetime.now()
+        self.collection.update_one(
+            {"_id": ObjectId(job_id)},
+            {
+                "$set": {"status": "running", "progress": round(progress, 3), "stage": stage, "heartbeat_at": now},
+                "$push": {"log": {"$each": [{"at": now, "progress": round(progress, 3), "stage": stage}], "$slice": -100}},
+            },
+        )
+
+    def heartbeat(self, job_id: str):
+        """Renueva el latido de un trabajo activo sin tocar su progreso."""
+        self.collection.update_one(
+            {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATES)}},
+            {"$set": {"heartbeat_at": datetime.now()}},
+        )
+
+    def set_pid(self, job_id: str, pid: int):
+        self.collection.update_one({"_id": ObjectId(job_id)}, {"$set": {"pid": pid}})
+
+    def finish(self, job_id: str, status: str, result: Dict[str, Any]):
+        now = datetime.now()
+        fields = {"status": status, "result": result, "finished_at": now, "heartbeat_at": now}
+        if status == "success":
+            fields.update(progress=1.0, stage="Completado")
+        self.collection.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+
+_ml_training_jobs_repo: Optional[MLTrainingJobsRepository] = None
+
+def get_ml_training_jobs_repository() -> MLTrainingJobsRepository:
+    global _ml_training_jobs_repo
+    if _ml_training_jobs_repo is None:
+        _ml_training_jobs_repo = MLTrainingJobsRepository()
+    return _ml_training_jobs_repo
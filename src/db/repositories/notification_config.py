@@ -1,5 +1,7 @@
 # path: src/db/repositories/notification_config.py
 # Creado: 2025-11-25
+# Actualizado: 2026-10-17 - Configuración del endpoint HIS (outbox FHIR)
+# Actualizado: 2026-10-17 - HIS sin fallback al webhook genérico (requiere URL y token)
 """
 Repositorio para gestión de configuración de notificaciones (SMTP, Webhooks).
 """
@@ -301,3 +303,63 @@ def get_vapid_config() -> Dict[str, Any]:
     except Exception as e:
         print(f"Error obteniendo config VAPID: {e}")
         return {}
+
+
+def save_his_config(config: Dict[str, Any]) -> bool:
+    """
+    Guarda configuración del envío de datos clínicos al HIS (FHIR) en MongoDB.
+    
+    Args:
+        config: Dict con configuración HIS
+            - enabled: bool
+            - url: str (endpoint FHIR base que acepta Bundles 'batch')
+            - auth_token: str (opcional, Bearer)
+            - batch_size: int (bundles por petición)
+    """
+    db = get_database()
+    collection = db["system_config"]
+    
+    try:
+        config['updated_at'] = datetime.now()
+        
+        result = collection.update_one(
+            {"type": "his_config"},
+            {"$set": {
+                "type": "his_config",
+                "config": config,
+                "updated_at": config['updated_at']
+            }},
+            upsert=True
+        )
+        return result.acknowledged
+    except Exception as e:
+        print(f"Error guardando config HIS: {e}")
+        return False
+
+
+def get_his_config() -> Dict[str, Any]:
+    """
+    Obtiene configuración del envío al HIS desde MongoDB.
+    
+    Los Bundles FHIR contienen datos del paciente: solo se envían a un destino
+    HIS configurado explícitamente con URL y token de autenticación. Nunca se
+    reutiliza el webhook genérico; sin configuración válida los mensajes
+    permanecen pendientes en el outbox.
+    
+    Returns:
+        Dict con configuración, o deshabilitada si no hay destino autenticado
+    """
+    db = get_database()
+    collection = db["system_config"]
+    
+    try:
+        doc = collection.find_one({"type": "his_config"})
+        config = doc.get('config') if doc else None
+        
+        if config and config.get('url') and config.get('auth_token'):
+            return config
+        
+        return {'enabled': False, 'url': '', 'auth_token': '', 'batch_size': 20}
+    except Exception as e:
+        print(f"Error obteniendo config HIS: {e}")
+        return {'enabled': False}
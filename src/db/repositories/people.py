@@ -1,23 +1,60 @@
 # path: src/db/repositories/people.py
 # Creado: 2025-11-25
+# Actualizado: 2026-10-17 - Lectura y poda masiva de suscripciones push
+# Actualizado: 2026-10-17 - Búsqueda indexada (tokens, prefijos e identificadores normalizados)
+# Actualizado: 2026-10-17 - Prefijo de código sin dígitos y lecturas sin 'search.prefixes'
+# Actualizado: 2026-10-17 - update_person refresca la proyección de ocupación
 """
 Repositorio para la gestión de personas (anteriormente pacientes).
 Maneja la colección 'people'.
 """
 from typing import Optional, List, Dict, Any
 from bson import ObjectId
+from pymongo import UpdateOne
 from db import get_database
 from datetime import datetime
+from utils.search_utils import (
+    build_person_search_fields, fold_text, tokenize, looks_like_identifier,
+    identifier_prefix, SEARCH_SOURCE_FIELDS, PREFIX_MIN, PREFIX_MAX, PERSON_PROJECTION,
+)
+
+# Campos de la persona copiados en la proyección de ocupación (room_occupancy)
+OCCUPANCY_FIELDS = ("nombre", "apellido1", "apellido2", "edad", "motivo_consulta", "nivel_triaje", "nivel_asignado")
+
+SEARCH_CANDIDATES = 50  # Candidatos leídos por fase antes de ordenar por relevancia
+
+
+def _rank_key(doc: Dict[str, Any], ident: str, words: List[str]):
+    """Clave de ordenación (menor = más relevante) de un candidato de búsqueda."""
+    search = doc.get("search") or {}
+    ids = search.get("ids") or []
+    tokens = search.get("tokens") or []
+    score = 0
+    if ident:
+        if ident in ids:
+            score += 1000
+        elif any(i.startswith(ident) for i in ids):
+            score += 500
+    for position, word in enumerate(words):
+        if word in tokens:
+            score += 10
+            # Mismo orden que el nombre completo (nombre, apellido1, apellido2)
+            if tokens.index(word) == position:
+                score += 2
+        elif any(t.startswith(word) for t in tokens):
+            score += 5
+    return (-score, fold_text(doc.get("apellido1")), fold_text(doc.get("apellido2")), fold_text(doc.get("nombre")))
 
 class PeopleRepository:
     def __init__(self):
         self.db = get_database()
         self.collection = self.db.people
+        self.ensure_indexes()
 
     def get_by_id(self, person_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene una persona por su ID."""
         try:
-            return self.collection.find_one({"_id": ObjectId(person_id)})
+            return self.collection.find_one({"_id": ObjectId(person_id)}, PERSON_PROJECTION)
         except:
             return None
 
@@ -29,49 +66,111 @@ class PeopleRepository:
                 {"identification_number": identifier},
                 {"identificaciones.value": identifier}
             ]
-        })
+        }, PERSON_PROJECTION)
 
     def get_by_patient_code(self, patient_code: str) -> Optional[Dict[str, Any]]:
         """Busca por código de paciente interno (ej. CIP)."""
-        return self.collection.find_one({"patient_code": patient_code})
+        return self.collection.find_one({"patient_code": patient_code}, PERSON_PROJECTION)
 
     def search_by_name(self, query: str, limit: int = 10, active_only: bool = True) -> List[Dict[str, Any]]:
-        """Busca personas por nombre o apellido."""
-        regex = {"$regex": query, "$options": "i"}
-        
-        filter_q = {
-            "$or": [
-                {"nombre": regex},
-                {"apellido1": regex},
-                {"apellido2": regex},
-                {"identification_number": regex},
-                {"identificaciones.value": regex},
-                {"num_ss": regex},
-                {"patient_code": regex}
-            ]
-        }
-        
-        if active_only:
-            filter_q["activo"] = True
-            
-        return list(self.collection.find(filter_q).limit(limit))
+        """
+        Busca personas por nombre, apellidos o identificador (DNI/NIE, SS, código de paciente).
+
+        Usa los campos indexados de 'search' (ver utils.search_utils):
+        1. Identificadores: coincidencia exacta (consultas con dígitos) y por prefijo
+           en search.ids para cualquier consulta de una palabra ('PAC' -> 'PAC001').
+        2. Nombre: palabras completas en search.tokens y, si faltan resultados,
+           prefijos en search.prefixes (búsqueda mientras se escribe).
+        Los candidatos se ordenan por relevancia (identificador exacto > palabra
+        exacta > prefijo) y después por apellidos y nombre.
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        base = {"activo": True} if active_only else {}
+        cap = max(limit, SEARCH_CANDIDATES)
+        found: Dict[Any, Dict[str, Any]] = {}
+
+        def collect(filters: Dict[str, Any], max_docs: int):
+            if len(found) >= max_docs:
+                return
+            for doc in self.collection.find({**base, **filters}, PERSON_PROJECTION).limit(max_docs):
+                found.setdefault(doc["_id"], doc)
+
+        ident = identifier_prefix(query)
+        if ident:
+            if looks_like_identifier(query):
+                collect({"search.ids": ident}, limit)
+            collect({"search.ids": {"$gte": ident, "$lt": ident + "\uffff"}}, cap)
+
+        words = tokenize(query)
+        if words:
+            collect({"search.tokens": {"$all": words}}, cap)
+            prefixes = [w[:PREFIX_MAX] for w in words if len(w) >= PREFIX_MIN]
+            if prefixes:
+                # El término más largo primero: es el más selectivo para el índice
+                collect({"search.prefixes": {"$all": sorted(prefixes, key=len, reverse=True)}}, cap)
+
+        ranked = sorted(found.values(), key=lambda doc: _rank_key(doc, ident, words))
+        for doc in ranked:
+            doc.pop("search", None)
+        return ranked[:limit]
 
     def create_person(self, person_data: Dict[str, Any]) -> str:
         """Crea un nuevo registro de persona."""
         person_data["created_at"] = datetime.now()
         person_data["updated_at"] = datetime.now()
+        person_data["search"] = build_person_search_fields(person_data)
         result = self.collection.insert_one(person_data)
         return str(result.inserted_id)
 
     def update_person(self, person_id: str, updates: Dict[str, Any]) -> bool:
-        """Actualiza los datos de una persona."""
+        """Actualiza los datos de una persona (y sus campos de búsqueda si cambian nombre o identificadores)."""
         updates["updated_at"] = datetime.now()
+        if any(field in updates for field in SEARCH_SOURCE_FIELDS):
+            current = self.collection.find_one(
+                {"_id": ObjectId(person_id)}, {field: 1 for field in SEARCH_SOURCE_FIELDS}
+            ) or {}
+            updates["search"] = build_person_search_fields({**current, **updates})
         result = self.collection.update_one(
             {"_id": ObjectId(person_id)},
             {"$set": updates}
         )
+        if result.modified_count and any(field in updates for field in OCCUPANCY_FIELDS):
+            self._refresh_occupancy(person_id)
         return result.modified_count > 0
 
+    def _refresh_occupancy(self, person_id: str):
+        """Vuelve a proyectar los datos personales si el paciente ocupa alguna sala."""
+        person = self.collection.find_one({"_id": ObjectId(person_id)}, {"patient_code": 1, **{f: 1 for f in OCCUPANCY_FIELDS}})
+        if not person or not person.get("patient_code"):
+            return
+        # Import diferido: la proyección vive en la capa de servicios
+        from services.occupancy_service import refrescar_persona
+        refrescar_persona(person["patient_code"], person)
+
+    def backfill_search_fields(self, batch_size: int = 1000) -> int:
+        """Calcula 'search' para las personas que aún no lo tienen (datos previos). Devuelve cuántas."""
+        fields = {field: 1 for field in SEARCH_SOURCE_FIELDS}
+        updated, ops = 0, []
+        for doc in self.collection.find({"search": {"$exists": False}}, fields):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search": build_person_search_fields(doc)}}))
+            if len(ops) >= batch_size:
+                updated += self.collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += self.collection.bulk_write(ops, ordered=False).modified_count
+        return updated
+
+    def ensure_indexes(self):
+        try:
+            # Un solo campo array por índice compuesto (restricción multikey)
+            self.collection.create_index([("search.tokens", 1), ("activo", 1)], name="idx_search_tokens")
+            self.collection.create_index([("search.prefixes", 1), ("activo", 1)], name="idx_search_prefixes")
+            self.collection.create_index([("search.ids", 1), ("activo", 1)], name="idx_search_ids")
+        except Exception as e:
+            print(f"Error creando índices de people: {e}")
+
     def add_push_subscription(self, person_id: str, subscription: Dict[str, Any]) -> bool:
         """Añade una suscripción push a la persona."""
         result = self.collection.update_one(
@@ -88,6 +187,24 @@ class PeopleRepository:
         )
         return result.modified_count > 0
 
+    def get_push_subscriptions(self, person_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Suscripciones push de varias personas en una sola consulta ($in)."""
+        oids = [ObjectId(pid) for pid in person_ids if ObjectId.is_valid(pid)]
+        if not oids:
+            return {}
+        cursor = self.collection.find({"_id": {"$in": oids}}, {"push_subscriptions": 1})
+        return {str(doc["_id"]): doc.get("push_subscriptions", []) for doc in cursor}
+
+    def remove_push_subscriptions_bulk(self, expired: Dict[str, List[Dict[str, Any]]]) -> int:
+        """Poda suscripciones caducadas de varias personas en una escritura masiva."""
+        ops = [
+            UpdateOne({"_id": ObjectId(pid)}, {"$pull": {"push_subscriptions": {"$in": subs}}})
+            for pid, subs in expired.items() if subs and ObjectId.is_valid(pid)
+        ]
+        if not ops:
+            return 0
+        return self.collection.bulk_write(ops, ordered=False).modified_count
+
 _people_repo = None
 
 def get_people_repository() -> PeopleRepository:
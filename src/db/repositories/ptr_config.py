@@ -1,9 +1,12 @@
+# path: src/db/repositories/ptr_config.py
+# Actualizado: 2026-10-17 - Cada guardado incrementa la versión de configuración clínica
 """
 Repositorio para la configuración de Puntuación Total de Riesgo (PTR).
 """
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from db.repositories.base import BaseRepository
+from db.repositories.config_versions import bump_config_version, CLINICAL_CONFIG
 from db.models import PTRConfig, PTRRule
 
 class PTRConfigRepository(BaseRepository[PTRConfig]):
@@ -35,11 +38,13 @@ class PTRConfigRepository(BaseRepository[PTRConfig]):
     def save_config(self, config: PTRConfig) -> bool:
         """Guarda o actualiza una configuración."""
         config.updated_at = datetime.now()
-        return self.collection.replace_one(
+        acknowledged = self.collection.replace_one(
             {"metric_key": config.metric_key},
             config.model_dump(by_alias=True, exclude={"id"}),
             upsert=True
         ).acknowledged
+        bump_config_version(CLINICAL_CONFIG)
+        return acknowledged
 
     def initialize_defaults(self):
         """Inicializa la configuración por defecto si la colección está vacía."""
@@ -0,0 +1,99 @@
+# path: src/db/repositories/rerun_profiles.py
+# Creado: 2026-10-17
+"""
+Repositorio del perfilado de reruns de Streamlit.
+
+- 'rerun_profiles': un documento por rerun perfilado con sus marcos aplanados
+  (ruta 'rerun;vista;subvista', tiempo total y propio, llamadas a BD). Caduca
+  por TTL a los RERUN_RETENTION_DAYS días.
+- 'rerun_view_stats': un documento por vista/cargador (_id = etiqueta) con
+  contadores acumulados y las últimas VIEW_SAMPLES duraciones, de las que se
+  calculan los percentiles.
+"""
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+import numpy as np
+from pymongo import UpdateOne, DESCENDING
+from db import get_database
+
+RERUN_RETENTION_DAYS = 7
+VIEW_SAMPLES = 500
+
+
+class RerunProfilesRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.reruns = self.db.rerun_profiles
+        self.view_stats = self.db.rerun_view_stats
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        try:
+            self.reruns.create_index("started_at", expireAfterSeconds=RERUN_RETENTION_DAYS * 86400)
+            self.reruns.create_index([("session_id", 1), ("started_at", DESCENDING)])
+        except Exception as e:
+            print(f"Error creando índices de rerun_profiles: {e}")
+
+    def save_rerun(self, rerun: Dict[str, Any]):
+        """Guarda un rerun y acumula la duración de cada vista en su documento de estadísticas."""
+        self.reruns.insert_one(rerun)
+        per_view: Dict[str, Dict[str, Any]] = {}
+        for frame in rerun["frames"]:
+            stats = per_view.setdefault(frame["label"], {"kind": frame["kind"], "ms": 0.0, "db_calls": 0, "calls": 0})
+            stats["ms"] += frame["ms"]
+            stats["db_calls"] += frame["db_calls"]
+            stats["calls"] += frame["calls"]
+        ops = [
+            UpdateOne(
+                {"_id": label},
+                {
+                    "$inc": {"reruns": 1, "calls": s["calls"], "total_ms": s["ms"], "db_calls": s["db_calls"]},
+                    "$push": {"samples": {"$each": [round(s["ms"], 3)], "$slice": -VIEW_SAMPLES}},
+                    "$set": {"kind": s["kind"], "last_at": rerun["started_at"]},
+                },
+                upsert=True,
+            )
+            for label, s in per_view.items()
+        ]
+        if ops:
+            self.view_stats.bulk_write(ops, ordered=False)
+
+    def get_view_percentiles(self) -> List[Dict[str, Any]]:
+        """Percentiles por vista (ms por rerun) sobre las últimas muestras, de mayor a menor p95."""
+        rows = []
+        for doc in self.view_stats.find():
+            samples = np.asarray(doc.get("samples") or [], dtype=float)
+            if not samples.size:
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            reruns = doc.get("reruns", 0) or 1
+            rows.append({
+                "view": doc["_id"],
+                "kind": doc.get("kind"),
+                "reruns": doc.get("reruns", 0),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "avg_ms": round(doc.get("total_ms", 0.0) / reruns, 2),
+                "calls_per_rerun": round(doc.get("calls", 0) / reruns, 2),
+                "db_calls_per_rerun": round(doc.get("db_calls", 0) / reruns, 2),
+                "last_at": doc.get("last_at"),
+            })
+        return sorted(rows, key=lambda r: -r["p95_ms"])
+
+    def get_recent_reruns(self, limit: int = 50, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = {"session_id": session_id} if session_id else {}
+        return list(self.reruns.find(query).sort("started_at", DESCENDING).limit(limit))
+
+    def clear(self):
+        self.reruns.delete_many({})
+        self.view_stats.delete_many({})
+
+
+_rerun_profiles_repo = None
+
+def get_rerun_profiles_repository() -> RerunProfilesRepository:
+    global _rerun_profiles_repo
+    if _rerun_profiles_repo is None:
+        _rerun_profiles_repo = RerunProfilesRepository()
+    return _rerun_profiles_repo
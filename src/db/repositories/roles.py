@@ -1,6 +1,7 @@
 # path: src/db/repositories/roles.py
 # Creado: 2025-11-25
 # Modificado: 2025-11-27 (Persistencia DB)
+# Actualizado: 2026-10-17 - Contador de versión para invalidar la matriz de permisos compilada
 """
 Repositorio de Roles del sistema.
 Maneja la colección 'roles' en MongoDB, con fallback a roles por defecto.
@@ -9,6 +10,20 @@ from typing import List, Dict, Optional
 from db.connection import get_database
 from datetime import datetime
 
+# Versión de los roles en este proceso: se incrementa en cada alta/modificación/baja
+_roles_version = 0
+
+
+def _bump_roles_version():
+    global _roles_version
+    _roles_version += 1
+
+
+def get_roles_version() -> int:
+    """Versión actual de los roles (invalida cachés derivadas, p. ej. permisos compilados)."""
+    return _roles_version
+
+
 # Definición de Roles por Defecto (Seeding)
 DEFAULT_ROLES = [
     {
@@ -139,6 +154,8 @@ class RolesRepository:
             {"code": code},
             {"$set": updates}
         )
+        if result.modified_count > 0:
+            _bump_roles_version()
         return result.modified_count > 0
 
     def create_role(self, role_data: Dict) -> bool:
@@ -149,6 +166,7 @@ class RolesRepository:
         role_data["created_at"] = datetime.now()
         role_data["updated_at"] = datetime.now()
         self.collection.insert_one(role_data)
+        _bump_roles_version()
         return True
 
     def delete_role(self, code: str) -> bool:
@@ -159,6 +177,8 @@ class RolesRepository:
             return False
             
         result = self.collection.delete_one({"code": code})
+        if result.deleted_count > 0:
+            _bump_roles_version()
         return result.deleted_count > 0
 
 _roles_repo = None
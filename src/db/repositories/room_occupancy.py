@@ -0,0 +1,172 @@
+# path: src/db/repositories/room_occupancy.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - update_patient_fields para refrescar datos personales proyectados
+"""
+Repositorio de la proyección materializada de ocupación de salas.
+Maneja la colección 'room_occupancy':
+- Un documento por sala (_id = código de sala) con la lista de pacientes activos.
+- Un documento meta (_id = '__meta__') con el contador de versión global.
+
+Cada cambio se aplica con un único bulk_write que incrementa también la versión,
+de modo que los lectores pueden saber si algo ha cambiado con un solo find_one.
+"""
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime
+from pymongo import UpdateOne, UpdateMany
+from db import get_database
+
+META_ID = "__meta__"
+
+
+class RoomOccupancyRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.room_occupancy
+
+    def get_version(self) -> Optional[int]:
+        """Devuelve la versión global de la proyección (None si nunca se ha construido)."""
+        meta = self.collection.find_one({"_id": META_ID}, {"version": 1})
+        return meta.get("version") if meta else None
+
+    def get_snapshot(self) -> Tuple[Optional[int], Dict[str, Dict[str, Any]]]:
+        """
+        Lee todas las salas y la versión en un único round-trip.
+
+        Returns:
+            tuple: (versión global, {sala_code: documento de sala})
+        """
+        version = None
+        salas = {}
+        for doc in self.collection.find({}):
+            if doc["_id"] == META_ID:
+                version = doc.get("version")
+            else:
+                salas[doc["_id"]] = doc
+        return version, salas
+
+    def get_patient_item(self, patient_code: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la entrada proyectada de un paciente (si está en alguna sala)."""
+        doc = self.collection.find_one(
+            {"pacientes.patient_code": patient_code},
+            {"pacientes": {"$elemMatch": {"patient_code": patient_code}}}
+        )
+        if doc and doc.get("pacientes"):
+            return doc["pacientes"][0]
+        return None
+
+    def apply_event(
+        self,
+        patient_code: str,
+        sala_code: Optional[str] = None,
+        item: Optional[Dict[str, Any]] = None,
+        sala_nombre: Optional[str] = None
+    ) -> bool:
+        """
+        Aplica un evento de flujo sobre la proyección en un único bulk_write:
+        1. Retira al paciente de cualquier sala en la que figure.
+        2. Si se indica sala destino, lo añade a ella.
+        3. Incrementa la versión global.
+
+        Args:
+            patient_code: Código del paciente afectado
+            sala_code: Sala destino (None si el paciente sale del sistema)
+            item: Entrada proyectada del paciente para la sala destino
+            sala_nombre: Nombre visible de la sala destino
+        """
+        now = datetime.now()
+        ops = [
+            UpdateMany(
+                {"_id": {"$ne": META_ID}, "pacientes.patient_code": patient_code},
+                {
+                    "$pull": {"pacientes": {"patient_code": patient_code}},
+                    "$inc": {"version": 1},
+                    "$set": {"updated_at": now}
+                }
+            )
+        ]
+        if sala_code and item is not None:
+            set_fields = {"updated_at": now}
+            if sala_nombre:
+                set_fields["sala_nombre"] = sala_nombre
+            ops.append(UpdateOne(
+                {"_id": sala_code},
+                {
+                    "$push": {"pacientes": item},
+                    "$inc": {"version": 1},
+                    "$set": set_fields
+                },
+                upsert=True
+            ))
+        ops.append(UpdateOne(
+            {"_id": META_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+            upsert=True
+        ))
+        result = self.collection.bulk_write(ops, ordered=True)
+        return result.acknowledged
+
+    def update_patient_fields(self, patient_code: str, fields: Dict[str, Any]) -> bool:
+        """
+        Actualiza campos de la entrada proyectada de un paciente (p.ej. su nombre
+        tras editar la persona) sin moverlo de sala. Devuelve True si figuraba.
+        """
+        now = datetime.now()
+        result = self.collection.update_many(
+            {"_id": {"$ne": META_ID}, "pacientes.patient_code": patient_code},
+            {
+                "$set": {**{f"pacientes.$.{k}": v for k, v in fields.items()}, "updated_at": now},
+                "$inc": {"version": 1}
+            }
+        )
+        if not result.matched_count:
+            return False
+        self.collection.update_one(
+            {"_id": META_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        return True
+
+    def replace_all(self, salas: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Reconstruye la proyección completa (recuperación o primer arranque).
+
+        Args:
+            salas: {sala_code: {"sala_nombre": str, "pacientes": [items]}}
+
+        Returns:
+            int: Nueva versión global
+        """
+        now = datetime.now()
+        self.collection.delete_many({"_id": {"$ne": META_ID}})
+        if salas:
+            self.collection.insert_many([
+                {
+                    "_id": code,
+                    "sala_nombre": data.get("sala_nombre", code),
+                    "pacientes": data.get("pacientes", []),
+                    "version": 1,
+                    "updated_at": now
+                }
+                for code, data in salas.items()
+            ])
+        meta = self.collection.find_one_and_update(
+            {"_id": META_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now, "rebuilt_at": now}},
+            upsert=True,
+            return_document=True
+        )
+        return meta.get("version", 1) if meta else 1
+
+    def ensure_indexes(self):
+        """Índice para localizar la sala de un paciente en los eventos de movimiento."""
+        self.collection.create_index([("pacientes.patient_code", 1)], name="idx_pacientes_patient_code")
+
+
+_room_occupancy_repo = None
+
+def get_room_occupancy_repository() -> RoomOccupancyRepository:
+    global _room_occupancy_repo
+    if _room_occupancy_repo is None:
+        _room_occupancy_repo = RoomOccupancyRepository()
+    return _room_occupancy_repo
@@ -5,6 +5,7 @@ Repositorio para gestión de salas (CRUD) y consultas auxiliares.
 Mantiene la filosofía DRY y archivos pequeños.
 """
 from typing import List, Dict, Any, Optional
+from pymongo import UpdateOne
 from db.connection import get_database
 from datetime import datetime
 
@@ -106,3 +107,27 @@ def update_sala_plazas(codigo: str, delta: int) -> bool:
         print(f"Error actualizando plazas sala {codigo}: {e}")
         return False
 
+
+def update_salas_plazas_bulk(deltas: Dict[str, int], session=None) -> bool:
+    """
+    Aplica varios cambios de plazas en un único bulk_write (un round-trip).
+
+    Args:
+        deltas: {codigo_sala: delta} (negativo para ocupar, positivo para liberar)
+        session: Sesión de MongoDB para participar en una transacción (opcional)
+
+    Returns:
+        bool: True si se reconoció la escritura
+    """
+    now = datetime.now()
+    ops = [
+        UpdateOne(
+            {"codigo": codigo},
+            {"$inc": {"plazas_disponibles": delta}, "$set": {"updated_at": now}}
+        )
+        for codigo, delta in deltas.items() if delta
+    ]
+    if not ops:
+        return True
+    result = get_collection().bulk_write(ops, ordered=False, session=session)
+    return result.acknowledged
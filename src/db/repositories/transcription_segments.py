@@ -0,0 +1,68 @@
+# path: src/db/repositories/transcription_segments.py
+# Creado: 2026-10-17
+"""
+Repositorio de la caché de tramos de la transcripción por streaming.
+Maneja la colección 'transcription_segments', separada de
+'transcriptions_records' para que los tramos no cuenten como transcripciones
+auditadas (solo se audita el dictado completo).
+
+La clave (_id) combina el MD5 del tramo con el tipo y la versión del prompt:
+el mismo audio transcrito con otro prompt no reutiliza el texto.
+La caducidad la aplica MongoDB mediante un índice TTL sobre 'updated_at'.
+"""
+from typing import Optional
+from datetime import datetime
+from db import get_database
+
+SEGMENT_TTL_S = 30 * 24 * 3600   # 30 días
+
+
+def segment_key(md5: str, prompt_type: str, prompt_version_id: Optional[str]) -> str:
+    return f"{md5}|{prompt_type}|{prompt_version_id or ''}"
+
+
+class TranscriptionSegmentsRepository:
+    def __init__(self):
+        self.db = get_database()
+        self.collection = self.db.transcription_segments
+        self.ensure_indexes()
+
+    def get_text(self, md5: str, prompt_type: str, prompt_version_id: Optional[str]) -> Optional[str]:
+        """Texto ya transcrito del tramo con ese prompt (None si no existe)."""
+        doc = self.collection.find_one({"_id": segment_key(md5, prompt_type, prompt_version_id)})
+        return doc.get("text") if doc else None
+
+    def save_text(self, md5: str, prompt_type: str, prompt_version_id: Optional[str], text: str) -> bool:
+        """Guarda (o reemplaza) el texto de un tramo transcrito correctamente."""
+        try:
+            result = self.collection.replace_one(
+                {"_id": segment_key(md5, prompt_type, prompt_version_id)},
+                {
+                    "file_md5": md5,
+                    "prompt_type": prompt_type,
+                    "prompt_version_id": prompt_version_id,
+                    "text": text,
+                    "updated_at": datetime.now(),
+                },
+                upsert=True
+            )
+            return result.acknowledged
+        except Exception as e:
+            print(f"Error guardando tramo de transcripción: {e}")
+            return False
+
+    def ensure_indexes(self):
+        """Índice TTL: MongoDB elimina los tramos no reutilizados en SEGMENT_TTL_S."""
+        try:
+            self.collection.create_index("updated_at", expireAfterSeconds=SEGMENT_TTL_S, name="idx_updated_at_ttl")
+        except Exception as e:
+            print(f"Error creando índice TTL de tramos de transcripción: {e}")
+
+
+_transcription_segments_repo = None
+
+def get_transcription_segments_repository() -> TranscriptionSegmentsRepository:
+    global _transcription_segments_repo
+    if _transcription_segments_repo is None:
+        _transcription_segments_repo = TranscriptionSegmentsRepository()
+    return _transcription_segments_repo
@@ -37,6 +37,8 @@ class TriageRepository(BaseRepository[TriageRecord]):
         self.create_index([("patient_id", 1)])
         self.create_index([("evaluator_id", 1)])
         self.create_index([("is_reevaluation", 1)])
+        # Historial por paciente ordenado (segunda opinión, último triaje)
+        self.create_index([("patient_id", 1), ("timestamp", pymongo.DESCENDING)])
     
     def get_by_audit_id(self, audit_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -1,9 +1,11 @@
 # path: src/db/repositories/triage_config.py
+# Actualizado: 2026-10-17 - Cada guardado incrementa la versión de configuración clínica
 """
 Repositorio para la configuración de rangos de triaje.
 """
 from typing import Optional, List, Dict, Any
 from db.repositories.base import BaseRepository
+from db.repositories.config_versions import bump_config_version, CLINICAL_CONFIG
 from db.models import TriageRangeConfig
 
 class TriageConfigRepository(BaseRepository[TriageRangeConfig]):
@@ -40,11 +42,13 @@ class TriageConfigRepository(BaseRepository[TriageRangeConfig]):
         if not metric:
             return False
             
-        return self.collection.replace_one(
+        acknowledged = self.collection.replace_one(
             {"metric": metric},
             config,
             upsert=True
         ).acknowledged
+        bump_config_version(CLINICAL_CONFIG)
+        return acknowledged
 
 # Instancia singleton
 _triage_config_repo: Optional[TriageConfigRepository] = None
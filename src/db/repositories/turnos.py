@@ -8,10 +8,13 @@ class TurnosRepository:
     def __init__(self):
         self.db = get_database()
         self.collection = self.db["turnos"]
+        # Contador de cambios en este proceso (invalida el índice de cuadrante en memoria)
+        self.version = 0
 
     def create(self, turno: Turno) -> Turno:
         result = self.collection.insert_one(turno.model_dump(by_alias=True, exclude={"id"}))
         turno.id = result.inserted_id
+        self.version += 1
         return turno
 
     def get_by_user(self, user_id: str) -> List[Turno]:
@@ -55,7 +58,10 @@ class TurnosRepository:
         }
         return [Turno(**doc) for doc in self.collection.find(query)]
 
-_turnos_repo = TurnosRepository()
+_turnos_repo = None
 
 def get_turnos_repository() -> TurnosRepository:
+    global _turnos_repo
+    if _turnos_repo is None:
+        _turnos_repo = TurnosRepository()
     return _turnos_repo
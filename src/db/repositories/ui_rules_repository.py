@@ -1,9 +1,25 @@
+# path: src/db/repositories/ui_rules_repository.py
+# Actualizado: 2026-10-17 - Contador de versión para invalidar las reglas compiladas
 from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..connection import get_database
 from ..models_rules import UIRule, RuleStatus
 
+# Versión de las reglas en este proceso: se incrementa en cada alta/modificación
+_rules_version = 0
+
+
+def _bump_rules_version():
+    global _rules_version
+    _rules_version += 1
+
+
+def get_rules_version() -> int:
+    """Versión actual de las reglas (invalida las reglas compiladas del motor Liquid UI)."""
+    return _rules_version
+
+
 class UIRulesRepository:
     def __init__(self):
         self.db = get_database()
@@ -37,6 +53,7 @@ class UIRulesRepository:
         rule_dict["created_at"] = datetime.utcnow()
         rule_dict["updated_at"] = datetime.utcnow()
         result = self.collection.insert_one(rule_dict)
+        _bump_rules_version()
         return str(result.inserted_id)
 
     def update_rule(self, rule_id: str, updates: Dict) -> bool:
@@ -51,6 +68,8 @@ class UIRulesRepository:
             {"_id": oid},
             {"$set": updates}
         )
+        if result.modified_count > 0:
+            _bump_rules_version()
         return result.modified_count > 0
 
     def publish_version(self, rule_id: str) -> bool:
@@ -1,5 +1,6 @@
 # path: src/db/repositories/users.py
 # Creado: 2025-11-25
+# Actualizado: 2026-10-17 - Contador de versión para invalidar el índice de cuadrante
 """
 Repositorio para la gestión de usuarios del sistema.
 Maneja la colección 'users' y su relación con 'people'.
@@ -13,6 +14,8 @@ class UsersRepository:
     def __init__(self):
         self.db = get_database()
         self.collection = self.db.users
+        # Contador de cambios en este proceso (invalida el índice de cuadrante en memoria)
+        self.version = 0
 
     def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene un usuario por su ID."""
@@ -42,6 +45,7 @@ class UsersRepository:
             user_data["activo"] = True
             
         result = self.collection.insert_one(user_data)
+        self.version += 1
         return str(result.inserted_id)
 
     def update_user(self, user_id: str, updates: Dict[str, Any]) -> bool:
@@ -51,6 +55,8 @@ class UsersRepository:
             {"_id": ObjectId(user_id)},
             {"$set": updates}
         )
+        if result.modified_count > 0:
+            self.version += 1
         return result.modified_count > 0
 
     def delete_user(self, user_id: str) -> bool:
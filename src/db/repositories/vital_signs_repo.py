@@ -1,6 +1,8 @@
 # path: src/db/repositories/vital_signs_repo.py
-from typing import List, Optional, Any
+# Actualizado: 2026-10-17 - Las escrituras incrementan la versión de configuración clínica
+from typing import List, Optional, Any, Dict
 from db.repositories.base import BaseRepository
+from db.repositories.config_versions import bump_config_version, CLINICAL_CONFIG
 from db.models import VitalSignReference
 
 class VitalSignsRepository(BaseRepository[VitalSignReference]):
@@ -9,6 +11,21 @@ class VitalSignsRepository(BaseRepository[VitalSignReference]):
     def __init__(self):
         super().__init__(collection_name="vital_signs_references")
     
+    def create(self, document: Dict[str, Any]) -> str:
+        doc_id = super().create(document)
+        bump_config_version(CLINICAL_CONFIG)
+        return doc_id
+
+    def update(self, doc_id: str, update_data: Dict[str, Any]) -> bool:
+        updated = super().update(doc_id, update_data)
+        bump_config_version(CLINICAL_CONFIG)
+        return updated
+
+    def delete(self, doc_id: str) -> bool:
+        deleted = super().delete(doc_id)
+        bump_config_version(CLINICAL_CONFIG)
+        return deleted
+
     def get_by_key(self, key: str) -> Optional[VitalSignReference]:
         """Obtiene la configuración de un signo vital por su clave interna."""
         data = self.find_one({"key": key})
@@ -0,0 +1,498 @@
+# path: src/services/ai_gateway.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Caché de respuestas deterministas con auditoría de aciertos
+"""
+Pasarela asíncrona para las llamadas a Gemini.
+
+Corre un event loop asyncio propio en un hilo de fondo, de modo que el hilo de
+Streamlit solo espera por el resultado (o lo recoge más tarde con submit()).
+Funcionalidades:
+- Semáforo de concurrencia acotada por modelo.
+- Coalescencia: prompts idénticos en vuelo comparten una única llamada.
+- Reutilización de objetos de modelo (por modelo + configuración).
+- Timeout por intento y reintentos con backoff exponencial con jitter.
+- Auditoría (AIAuditLog) en segundo plano, sin bloquear al llamante.
+- Caché opcional de respuestas deterministas (services.ai_response_cache); los
+  aciertos también se auditan (cache_hit=True).
+
+La factoría de modelos es inyectable para poder probar contra un modelo falso local.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, Union, Tuple, List, Callable
+
+try:
+    from ..db.models import AIAuditLog
+    from .ai_response_cache import cache_key, get_ai_response_cache
+except ImportError:
+    from db.models import AIAuditLog
+    from services.ai_response_cache import cache_key, get_ai_response_cache
+
+# Configuración por defecto de la pasarela
+DEFAULT_MAX_CONCURRENCY = 4      # Llamadas simultáneas por modelo
+DEFAULT_TIMEOUT_S = 90.0         # Timeout por intento
+DEFAULT_MAX_RETRIES = 3          # Intentos totales
+DEFAULT_BACKOFF_BASE_S = 1.0     # 1s, 2s, 4s... (con jitter completo)
+DEFAULT_BACKOFF_MAX_S = 10.0
+
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "response_mime_type": "application/json"
+}
+
+# Default permisivo para contexto médico
+DEFAULT_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+def _default_model_factory(model_name: str, generation_config: Dict[str, Any], safety_settings: List[Dict[str, Any]]):
+    """Crea un modelo real de Gemini (import perezoso para no exigir el SDK en tests)."""
+    import google.generativeai as genai
+    return genai.GenerativeModel(
+        model_name=model_name,
+        generation_config=generation_config,
+        safety_settings=safety_settings
+    )
+
+
+def _retryable_exceptions() -> tuple:
+    """Errores transitorios que justifican un reintento."""
+    errors = [asyncio.TimeoutError, ConnectionError]
+    try:
+        from google.api_core import exceptions as google_exceptions
+        errors += [
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.Aborted,
+            google_exceptions.InternalServerError,
+        ]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def _stable_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _hash_prompt(prompt_content: Union[str, list]) -> str:
+    """Huella del prompt (incluye binarios por contenido, no por identidad)."""
+    h = hashlib.sha256()
+    parts = prompt_content if isinstance(prompt_content, list) else [prompt_content]
+    for part in parts:
+        if isinstance(part, dict) and "data" in part:
+            h.update(str(part.get("mime_type", "")).encode())
+            data = part["data"]
+            h.update(data if isinstance(data, (bytes, bytearray)) else str(data).encode())
+        elif isinstance(part, str):
+            h.update(part.encode("utf-8"))
+        else:
+            # Objetos no serializables (imágenes PIL, ficheros): identidad del objeto
+            h.update(f"{type(part).__name__}:{id(part)}".encode())
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def request_key(
+    model_name: str,
+    prompt_content: Union[str, list],
+    generation_config: Dict[str, Any],
+    safety_settings: List[Dict[str, Any]]
+) -> str:
+    """Clave de coalescencia: modelo + configuración + contenido del prompt."""
+    h = hashlib.sha256()
+    h.update(model_name.encode())
+    h.update(_stable_json(generation_config).encode())
+    h.update(_stable_json(safety_settings).encode())
+    h.update(_hash_prompt(prompt_content).encode())
+    return h.hexdigest()
+
+
+def sanitize_prompt_for_log(prompt_content: Union[str, list]) -> str:
+    """Prepara raw_prompt para log (sanitiza binarios)."""
+    if isinstance(prompt_content, str):
+        return prompt_content
+    if isinstance(prompt_content, list):
+        log_parts = []
+        for part in prompt_content:
+            if isinstance(part, dict) and "data" in part:
+                # Es un blob de datos (imagen/audio)
+                mime = part.get("mime_type", "unknown")
+                size = len(part["data"]) if hasattr(part["data"], "__len__") else "unknown"
+                log_parts.append(f"[{mime} DATA, size={size}]")
+            elif hasattr(part, "read"):
+                log_parts.append("[FILE OBJECT]")
+            else:
+                log_parts.append(str(part))
+        return str(log_parts)
+    return str(prompt_content)
+
+
+def parse_model_response(response, generation_config: Dict[str, Any]) -> Tuple[Dict[str, Any], str, str, Optional[str]]:
+    """
+    Convierte la respuesta del modelo al formato de la aplicación.
+
+    Returns:
+        tuple: (response_data, raw_response_log, status, error_msg)
+    """
+    if not response.parts:
+        # Intentar obtener más detalles del error
+        finish_reason = "UNKNOWN"
+        if response.candidates:
+            finish_reason = response.candidates[0].finish_reason.name
+
+        if response.prompt_feedback:
+            error_msg = f"Blocked: {response.prompt_feedback.block_reason.name}"
+        else:
+            error_msg = f"Empty response parts. Finish Reason: {finish_reason}"
+        return {"status": "ERROR", "msg": error_msg}, "", "error", error_msg
+
+    raw_response_log = response.text
+    cleaned_text = response.text.strip()
+
+    # Limpiar markdown code blocks
+    if cleaned_text.startswith("```"):
+        lines = cleaned_text.split("\n")
+        if len(lines) >= 2:
+            cleaned_text = "\n".join(lines[1:-1])
+
+    if generation_config and generation_config.get("response_mime_type") == "application/json":
+        try:
+            return json.loads(cleaned_text), raw_response_log, "success", None
+        except json.JSONDecodeError:
+            error_msg = "Invalid JSON response"
+            return {"status": "ERROR", "msg": error_msg, "raw": cleaned_text}, raw_response_log, "error", error_msg
+
+    # Si no esperamos JSON, devolvemos texto plano
+    return {"text": cleaned_text}, raw_response_log, "success", None
+
+
+def _error_response(error: Exception) -> Dict[str, Any]:
+    """Traduce una excepción al dict de error (sugiriendo contingencia si es de conexión)."""
+    error_msg = str(error) or type(error).__name__
+    lowered = error_msg.lower()
+    if (
+        isinstance(error, (asyncio.TimeoutError, ConnectionError))
+        or "503" in error_msg or "deadline" in lowered or "connection" in lowered
+    ):
+        return {
+            "status": "ERROR",
+            "msg": f"Error de Conexión con IA: {error_msg}",
+            "suggest_contingency": True
+        }
+    return {"status": "ERROR", "msg": f"Exception: {error_msg}"}
+
+
+class AIGateway:
+    """
+    Pasarela asíncrona y compartida para todas las llamadas a Gemini del proceso.
+    """
+
+    def __init__(
+        self,
+        model_factory: Optional[Callable[..., Any]] = None,
+        audit_sink: Optional[Callable[[AIAuditLog], Any]] = None,
+        cache=None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout_s: float = DEFAULT_TIMEOUT_S,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base_s: float = DEFAULT_BACKOFF_BASE_S,
+        backoff_max_s: float = DEFAULT_BACKOFF_MAX_S
+    ):
+        self.model_factory = model_factory or _default_model_factory
+        self.audit_sink = audit_sink
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.max_retries = max(1, max_retries)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+
+        self._models: Dict[str, Any] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._retryable = _retryable_exceptions()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-gateway-bg")
+
+    # ------------------------------------------------------------------
+    # Event loop de fondo
+    # ------------------------------------------------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="ai-gateway", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def close(self):
+        """Detiene el event loop de fondo y espera a las auditorías pendientes."""
+        with self._loop_lock:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+            # Los semáforos y tareas en vuelo pertenecen al loop anterior
+            self._semaphores.clear()
+            self._inflight.clear()
+        self._background_pool.shutdown(wait=True)
+        self._background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-gateway-bg")
+
+    def flush_audit(self):
+        """Espera a que terminen las escrituras en segundo plano (auditoría, caché compartida)."""
+        self._background_pool.submit(lambda: None).result()
+
+    # ------------------------------------------------------------------
+    # Recursos por modelo
+    # ------------------------------------------------------------------
+    def _get_model(self, model_name: str, generation_config: Dict[str, Any], safety_settings: List[Dict[str, Any]]):
+        key = f"{model_name}|{_stable_json(generation_config)}|{_stable_json(safety_settings)}"
+        model = self._models.get(key)
+        if model is None:
+            model = self.model_factory(model_name, generation_config, safety_settings)
+            self._models[key] = model
+        return model
+
+    def _get_semaphore(self, model_name: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model_name)
+        if sem is None:
+            sem = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[model_name] = sem
+        return sem
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Backoff exponencial con jitter completo."""
+        cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    # ------------------------------------------------------------------
+    # Llamada al modelo
+    # ------------------------------------------------------------------
+    async def _invoke(self, model, prompt_content):
+        native_async = getattr(model, "generate_content_async", None)
+        if native_async is not None:
+            return await native_async(prompt_content)
+        return await asyncio.to_thread(model.generate_content, prompt_content)
+
+    async def _call_model(
+        self,
+        model_name: str,
+        prompt_content: Union[str, list],
+        generation_config: Dict[str, Any],
+        safety_settings: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], str, str, Optional[str], int]:
+        """
+        Ejecuta la llamada con semáforo, timeout y reintentos.
+
+        Returns:
+            tuple: (response_data, raw_response_log, status, error_msg, intentos)
+        """
+        attempt = 0
+        try:
+            model = self._get_model(model_name, generation_config, safety_settings)
+            async with self._get_semaphore(model_name):
+                while True:
+                    attempt += 1
+                    try:
+                        response = await asyncio.wait_for(
+                            self._invoke(model, prompt_content), timeout=self.timeout_s
+                        )
+                        break
+                    except self._retryable as e:
+                        if attempt >= self.max_retries:
+                            raise
+                        delay = self._backoff_delay(attempt - 1)
+                        print(f"⚠️ Gemini API Error ({type(e).__name__}: {e}). Retrying in {delay:.1f}s...")
+                        await asyncio.sleep(delay)
+            return (*parse_model_response(response, generation_config), attempt)
+        except Exception as e:
+            data = _error_response(e)
+            return data, "", "error", str(e) or type(e).__name__, attempt
+
+    async def generate(
+        self,
+        model_name: str,
+        prompt_content: Union[str, list],
+        generation_config: Optional[Dict[str, Any]] = None,
+        safety_settings: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Dict[str, Any], str, str, Optional[str], Dict[str, Any]]:
+        """
+        Corrutina de bajo nivel (sin auditoría). Coalesce prompts idénticos en vuelo.
+
+        Returns:
+            tuple: (response_data, raw_response_log, status, error_msg, info)
+        """
+        generation_config = generation_config if generation_config is not None else dict(DEFAULT_GENERATION_CONFIG)
+        safety_settings = safety_settings if safety_settings is not None else DEFAULT_SAFETY_SETTINGS
+
+        key = request_key(model_name, prompt_content, generation_config, safety_settings)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(
+                self._call_model(model_name, prompt_content, generation_config, safety_settings)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+
+        response_data, raw_response, status, error_msg, attempts = await asyncio.shield(task)
+        info = {"coalesced": coalesced, "attempts": attempts, "request_key": key}
+        # Cada llamante recibe su propia copia (los post-procesados mutan el dict)
+        return copy.deepcopy(response_data), raw_response, status, error_msg, info
+
+    # ------------------------------------------------------------------
+    # API para los servicios (hilo de Streamlit / FastAPI)
+    # ------------------------------------------------------------------
+    async def generate_content_async(
+        self,
+        caller_id: str,
+        user_id: str,
+        call_type: str,
+        prompt_type: str,
+        prompt_version_id: str,
+        model_name: str,
+        prompt_content: Union[str, list],
+        generation_config: Optional[Dict[str, Any]] = None,
+        safety_settings: Optional[List[Dict[str, Any]]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        cache: bool = False
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Igual que generate_content() pero como corrutina del loop de la pasarela.
+        Con cache=True se consulta/alimenta la caché de respuestas deterministas.
+        """
+        start_time = datetime.now()
+        raw_prompt_log = sanitize_prompt_for_log(prompt_content)
+        audit_fields = dict(
+            caller_id=caller_id,
+            user_id=user_id,
+            call_type=call_type,
+            prompt_type=prompt_type,
+            prompt_version_id=prompt_version_id,
+            model_name=model_name,
+            raw_prompt=raw_prompt_log,
+        )
+
+        key = None
+        if cache and self.cache is not None:
+            key = cache_key(
+                model_name, prompt_version_id, prompt_content,
+                generation_config if generation_config is not None else DEFAULT_GENERATION_CONFIG,
+                safety_settings if safety_settings is not None else DEFAULT_SAFETY_SETTINGS
+            )
+        if key:
+            # Puede consultar MongoDB: fuera del loop
+            hit = await asyncio.to_thread(self.cache.get, key)
+            if hit is not None:
+                self._audit(
+                    start_time=start_time,
+                    end_time=datetime.now(),
+                    raw_response=hit.get("raw_response") or str(hit.get("response")),
+                    status="success",
+                    cache_hit=True,
+                    metadata={**(metadata or {}), "cache_key": key},
+                    **audit_fields
+                )
+                return hit["response"], raw_prompt_log
+
+        response_data, raw_response, status, error_msg, info = await self.generate(
+            model_name, prompt_content, generation_config, safety_settings
+        )
+
+        if key and status == "success":
+            entry = {"response": response_data, "raw_response": raw_response, "model_name": model_name}
+            self.cache.put(key, entry, share=False)
+            self._background_pool.submit(self.cache.share, key, entry)
+
+        end_time = datetime.now()
+        self._audit(
+            start_time=start_time,
+            end_time=end_time,
+            raw_response=raw_response or str(response_data),
+            status=status,
+            error_msg=error_msg,
+            metadata={**(metadata or {}), "coalesced": info["coalesced"], "attempts": info["attempts"]},
+            **audit_fields
+        )
+        return response_data, raw_prompt_log
+
+    def submit(self, **kwargs) -> Future:
+        """
+        Lanza la llamada en la pasarela sin bloquear y devuelve un Future.
+        Acepta los mismos argumentos que generate_content().
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.generate_content_async(**kwargs), loop)
+
+    def generate_content(self, **kwargs) -> Tuple[Dict[str, Any], str]:
+        """
+        Llamada bloqueante: el hilo llamante solo espera al resultado; la ejecución,
+        los reintentos y la auditoría ocurren en la pasarela.
+        """
+        # Margen para todos los intentos y sus backoffs
+        budget = self.max_retries * (self.timeout_s + self.backoff_max_s) + 5
+        future = self.submit(**kwargs)
+        try:
+            return future.result(timeout=budget)
+        except Exception as e:
+            future.cancel()
+            return _error_response(e), sanitize_prompt_for_log(kwargs.get("prompt_content", ""))
+
+    # ------------------------------------------------------------------
+    # Auditoría en segundo plano
+    # ------------------------------------------------------------------
+    def _audit(self, start_time: datetime, end_time: datetime, prompt_version_id: Optional[str], **fields):
+        if self.audit_sink is None:
+            return
+        try:
+            log_entry = AIAuditLog(
+                timestamp_start=start_time,
+                timestamp_end=end_time,
+                duration_ms=(end_time - start_time).total_seconds() * 1000,
+                prompt_version_id=prompt_version_id or "unknown",
+                **fields
+            )
+        except Exception as e:
+            print(f"CRITICAL: Failed to build AI audit entry: {e}")
+            return
+        self._background_pool.submit(self._write_audit, log_entry)
+
+    def _write_audit(self, log_entry: AIAuditLog):
+        try:
+            self.audit_sink(log_entry)
+        except Exception as log_err:
+            print(f"CRITICAL: Failed to log AI audit: {log_err}")
+
+
+# Singleton instance
+_ai_gateway = None
+_ai_gateway_lock = threading.Lock()
+
+def get_ai_gateway() -> AIGateway:
+    """Pasarela compartida del proceso, auditando en ai_audit_logs y con caché de respuestas."""
+    global _ai_gateway
+    with _ai_gateway_lock:
+        if _ai_gateway is None:
+            try:
+                from ..db.repositories.ai_audit import get_ai_audit_repository
+            except ImportError:
+                from db.repositories.ai_audit import get_ai_audit_repository
+            _ai_gateway = AIGateway(
+                audit_sink=get_ai_audit_repository().log_call,
+                cache=get_ai_response_cache()
+            )
+        return _ai_gateway
@@ -0,0 +1,172 @@
+# path: src/services/ai_response_cache.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - La clave incluye safety_settings (configuración completa de la petición)
+"""
+Caché direccionada por contenido para llamadas deterministas a la IA.
+
+La clave es un hash de (modelo, versión del prompt, contenido normalizado del
+prompt, configuración completa de la petición: generation_config y
+safety_settings). Niveles:
+- Memoria del proceso: LRU acotada con TTL.
+- Opcional: colección MongoDB 'ai_response_cache' compartida entre workers.
+
+Solo se cachean respuestas correctas. Los prompts con partes no serializables
+(p.ej. imágenes PIL) no se cachean.
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Union
+
+DEFAULT_TTL_S = 900          # 15 minutos
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _normalize_text(text: str) -> str:
+    """Normaliza un texto para que diferencias irrelevantes no cambien la clave."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def cache_key(
+    model_name: str,
+    prompt_version_id: Optional[str],
+    prompt_content: Union[str, list],
+    generation_config: Optional[Dict[str, Any]],
+    safety_settings: Optional[List[Dict[str, Any]]] = None
+) -> Optional[str]:
+    """
+    Calcula la clave de caché. Todo parámetro que cambie la salida del modelo
+    (generation_config, safety_settings) forma parte de la clave.
+
+    Returns:
+        str: Hash SHA-256 hexadecimal, o None si el prompt no es cacheable.
+    """
+    h = hashlib.sha256()
+    h.update(f"{model_name}\x1f{prompt_version_id or ''}\x1f".encode("utf-8"))
+    request_config = {"generation_config": generation_config or {}, "safety_settings": safety_settings or []}
+    h.update(json.dumps(request_config, sort_keys=True, default=str).encode("utf-8"))
+
+    parts = prompt_content if isinstance(prompt_content, list) else [prompt_content]
+    for part in parts:
+        h.update(b"\x1e")
+        if isinstance(part, str):
+            h.update(_normalize_text(part).encode("utf-8"))
+        elif isinstance(part, dict) and isinstance(part.get("data"), (bytes, bytearray)):
+            h.update(str(part.get("mime_type", "")).encode("utf-8"))
+            h.update(hashlib.sha256(part["data"]).digest())
+        else:
+            return None
+    return h.hexdigest()
+
+
+class AIResponseCache:
+    """
+    Caché LRU + TTL en memoria, con respaldo opcional en MongoDB.
+    """
+
+    def __init__(self, ttl_s: float = DEFAULT_TTL_S, max_entries: int = DEFAULT_MAX_ENTRIES, shared_repo=None):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.shared_repo = shared_repo
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expira_monotonic, entry)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Busca en memoria y, si falla, en la colección compartida."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires, entry = item
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(entry)
+                del self._entries[key]
+
+        if self.shared_repo is not None:
+            try:
+                doc = self.shared_repo.get(key)
+            except Exception as e:
+                print(f"Error leyendo caché IA compartida: {e}")
+                doc = None
+            if doc:
+                entry = {k: v for k, v in doc.items() if k not in ("_id", "expires_at", "updated_at")}
+                remaining = (doc["expires_at"] - datetime.now()).total_seconds()
+                self._store(key, entry, min(self.ttl_s, max(remaining, 0)))
+                with self._lock:
+                    self.hits += 1
+                return copy.deepcopy(entry)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, entry: Dict[str, Any], share: bool = True):
+        """Guarda una respuesta en memoria (y en la colección compartida si share=True)."""
+        self._store(key, copy.deepcopy(entry), self.ttl_s)
+        if share:
+            self.share(key, entry)
+
+    def share(self, key: str, entry: Dict[str, Any]):
+        """Publica la entrada en la colección compartida (pensado para segundo plano)."""
+        if self.shared_repo is None:
+            return
+        try:
+            self.shared_repo.put(key, entry, datetime.now() + timedelta(seconds=self.ttl_s))
+        except Exception as e:
+            print(f"Error escribiendo caché IA compartida: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared_repo is not None:
+            try:
+                self.shared_repo.delete_all()
+            except Exception as e:
+                print(f"Error vaciando caché IA compartida: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, entry: Dict[str, Any], ttl_s: float):
+        if ttl_s <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_s, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_ai_response_cache = None
+
+def get_ai_response_cache() -> AIResponseCache:
+    """
+    Caché del proceso. Configurable por entorno:
+    AI_CACHE_TTL_S, AI_CACHE_MAX_ENTRIES y AI_CACHE_SHARED (1/0, respaldo MongoDB).
+    """
+    global _ai_response_cache
+    if _ai_response_cache is None:
+        shared_repo = None
+        if os.getenv("AI_CACHE_SHARED", "1") == "1":
+            try:
+                from db.repositories.ai_response_cache import get_ai_response_cache_repository
+                shared_repo = get_ai_response_cache_repository()
+            except Exception as e:
+                print(f"WARNING: caché IA compartida no disponible, solo memoria: {e}")
+        _ai_response_cache = AIResponseCache(
+            ttl_s=float(os.getenv("AI_CACHE_TTL_S", DEFAULT_TTL_S)),
+            max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            shared_repo=shared_repo
+        )
+    return _ai_response_cache
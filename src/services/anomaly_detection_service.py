@@ -0,0 +1,181 @@
+# path: src/services/anomaly_detection_service.py
+# Creado: 2026-10-17
+"""
+Detección de anomalías en las series horarias de flujo por sala.
+
+- Series: llegadas (entrada) y salidas (salida) por sala y hora, leídas de
+  'patient_flow' con una única agregación ($facet) sobre las horas pendientes.
+- Línea base estacional: para cada (sala, métrica, franja semanal día+hora) se
+  guardan los últimos BASELINE_WEEKS valores de esa franja; cada ejecución solo
+  procesa las horas completas desde la última y añade sus valores.
+- Detección robusta: puntuación z modificada respecto a la mediana y la MAD de
+  la franja (con un mínimo tipo Poisson para franjas casi constantes).
+
+Las alertas se guardan en 'flow_anomalies' (db.repositories.flow_anomalies) y
+el panel solo las lee. El detector corre en segundo plano cada DETECTION_INTERVAL_S.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from db import get_database
+from db.repositories.flow_anomalies import get_flow_anomalies_repository
+
+METRICS = ("llegadas", "salidas")
+BASELINE_WEEKS = 8
+MIN_BASELINE = 4
+THRESHOLD = 3.5
+HIGH_SEVERITY = 6.0
+MIN_DEVIATION = 3
+BACKFILL_DAYS = 7 * BASELINE_WEEKS
+DETECTION_INTERVAL_S = 15 * 60
+
+Series = Dict[Tuple[str, datetime], Dict[str, int]]
+
+_run_lock = threading.Lock()
+_detector: Optional[threading.Thread] = None
+_detector_lock = threading.Lock()
+
+
+def hour_floor(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def slot_of(hour: datetime) -> int:
+    """Franja semanal: 0 = lunes 00h ... 167 = domingo 23h."""
+    return hour.weekday() * 24 + hour.hour
+
+
+def _hour_group(field: str) -> Dict[str, Any]:
+    return {
+        "sala": "$sala_code",
+        "y": {"$year": f"${field}"}, "m": {"$month": f"${field}"},
+        "d": {"$dayOfMonth": f"${field}"}, "h": {"$hour": f"${field}"},
+    }
+
+
+def hourly_flow_series(start: datetime, end: datetime, db=None) -> Series:
+    """
+    Llegadas y salidas por (sala, hora) en [start, end) con una sola agregación.
+    Solo aparecen las horas con algún movimiento.
+    """
+    db = db if db is not None else get_database()
+    window = {"$gte": start, "$lt": end}
+    facets = {
+        metric: [{"$match": {field: window}}, {"$group": {"_id": _hour_group(field), "n": {"$sum": 1}}}]
+        for metric, field in (("llegadas", "entrada"), ("salidas", "salida"))
+    }
+    result = list(db["patient_flow"].aggregate([
+        {"$match": {"$or": [{"entrada": window}, {"salida": window}]}},
+        {"$facet": facets},
+    ]))
+    series: Series = {}
+    for metric, rows in (result[0] if result else {}).items():
+        for row in rows:
+            key = row["_id"]
+            if not key.get("sala"):
+                continue
+            hour = datetime(key["y"], key["m"], key["d"], key["h"])
+            series.setdefault((key["sala"], hour), {})[metric] = row["n"]
+    return series
+
+
+def robust_score(value: float, history: Iterable[float]) -> Tuple[float, float, float]:
+    """(esperado, escala, puntuación) con mediana y MAD de la franja."""
+    values = np.asarray(list(history), dtype=float)
+    expected = float(np.median(values))
+    mad = float(np.median(np.abs(values - expected)))
+    scale = max(1.4826 * mad, np.sqrt(max(expected, 1.0)))
+    return expected, scale, (value - expected) / scale
+
+
+def detect(series: Series, baselines: Dict[tuple, List[float]], start: datetime, end: datetime,
+           detected_at: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], set]:
+    """
+    Recorre las horas de [start, end) en orden: compara cada valor con su franja
+    y después lo incorpora a ella. Modifica 'baselines' y devuelve
+    (alertas, claves de franja modificadas).
+    """
+    detected_at = detected_at or datetime.now()
+    rooms = {sala for sala, _ in series} | {key[0] for key in baselines}
+    anomalies, touched = [], set()
+    hour = start
+    while hour < end:
+        slot = slot_of(hour)
+        for sala in rooms:
+            counts = series.get((sala, hour), {})
+            for metric in METRICS:
+                value = counts.get(metric, 0)
+                key = (sala, metric, slot)
+                history = baselines.get(key, [])
+                if len(history) >= MIN_BASELINE:
+                    expected, scale, score = robust_score(value, history)
+                    if abs(score) >= THRESHOLD and abs(value - expected) >= MIN_DEVIATION:
+                        anomalies.append({
+                            "sala_code": sala,
+                            "metric": metric,
+                            "hour": hour,
+                            "value": value,
+                            "expected": expected,
+                            "scale": round(scale, 2),
+                            "score": round(score, 2),
+                            "tipo": "pico_inusual" if score > 0 else "baja_inusual",
+                            "severidad": "alta" if abs(score) >= HIGH_SEVERITY else "media",
+                            "detected_at": detected_at,
+                        })
+                baselines[key] = (history + [value])[-BASELINE_WEEKS:]
+                touched.add(key)
+        hour += timedelta(hours=1)
+    return anomalies, touched
+
+
+def run_anomaly_detection(now: Optional[datetime] = None, db=None) -> Dict[str, Any]:
+    """
+    Procesa las horas completas pendientes (la primera vez, BACKFILL_DAYS para
+    calentar las líneas base) y guarda alertas y líneas base.
+    """
+    with _run_lock:
+        repo = get_flow_anomalies_repository()
+        end = hour_floor(now or datetime.now())
+        start = repo.get_processed_until() or end - timedelta(days=BACKFILL_DAYS)
+        if start >= end:
+            return {"hours": 0, "anomalies": 0}
+
+        series = hourly_flow_series(start, end, db=db)
+        baselines = repo.load_baselines()
+        anomalies, touched = detect(series, baselines, start, end)
+        repo.save_anomalies(anomalies)
+        repo.save_baselines({key: baselines[key] for key in touched}, end)
+        return {"hours": int((end - start).total_seconds() // 3600), "anomalies": len(anomalies)}
+
+
+def get_recent_anomalies(sala_code: Optional[str] = None, days: int = 30) -> List[Dict[str, Any]]:
+    """Alertas ya calculadas de los últimos 'days' días (más recientes primero)."""
+    since = datetime.now() - timedelta(days=days)
+    return get_flow_anomalies_repository().get_anomalies(sala_code, since=since)
+
+
+def get_last_processed_hour() -> Optional[datetime]:
+    return get_flow_anomalies_repository().get_processed_until()
+
+
+def _detector_loop():
+    while True:
+        try:
+            run_anomaly_detection()
+        except Exception as e:
+            print(f"Error en la detección de anomalías de flujo: {e}")
+        time.sleep(DETECTION_INTERVAL_S)
+
+
+def start_anomaly_detector() -> threading.Thread:
+    """Arranca (una vez por proceso) la detección periódica de anomalías."""
+    global _detector
+    with _detector_lock:
+        if _detector is None or not _detector.is_alive():
+            _detector = threading.Thread(target=_detector_loop, name="flow-anomaly-detector", daemon=True)
+            _detector.start()
+        return _detector
@@ -0,0 +1,446 @@
+# path: src/services/audit_analytics_service.py
+# Creado: 2026-10-17
+"""
+Analítica pre-agregada del panel de auditoría.
+
+Mantiene de forma incremental los agregados diarios/horarios de 'audit_rollups'
+a partir de audit_log, file_imports_records y transcriptions_records:
+- refresh_audit_rollups() detecta las altas nuevas de cada colección (marca de
+  agua por ObjectId con un solape de seguridad) y recalcula completos solo los
+  días afectados, así que repetir un refresco no duplica contadores.
+- get_audit_summary(start, end) consulta únicamente los agregados del rango y
+  devuelve un AuditSummary con tablas pequeñas listas para los gráficos.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+import pandas as pd
+
+from db.repositories.audit_rollups import get_audit_rollups_repository
+
+ROLLUP_REFRESH_S = 30
+# Solape al releer altas: los ObjectId de distintos procesos no son estrictamente
+# monótonos dentro del mismo segundo; recalcular un día es idempotente
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+AUDIO_TYPES = {"wav", "mp3", "ogg"}
+MODIFIED_DECISIONS = {"Modificar Nivel", "Modificado"}
+POSITIVE_RATING = "Correcto"
+
+TRIAGE_DIMS = ["ai", "human", "decision", "rating"]
+TRIAGE_MEASURES = ["n", "pain_sum", "pain_n"]
+
+_ROMAN_LEVELS = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5}
+_LEVEL_RE = re.compile(r"^\s*(?:nivel\s+)?([1-5]|IV|V|I{1,3})\b", re.IGNORECASE)
+
+
+def parse_level(value: Any) -> Optional[int]:
+    """Nivel de triaje numérico (1-5) desde 3, '3', 'Nivel III' o 'Nivel III (Urgencia)'."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if 1 <= value <= 5 else None
+    match = _LEVEL_RE.match(str(value))
+    if not match:
+        return None
+    token = match.group(1).upper()
+    return int(token) if token.isdigit() else _ROMAN_LEVELS[token]
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number  # NaN
+
+
+def _dim(value: Any) -> Optional[str]:
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+# ---------------------------------------------------------------------------
+# Construcción de secciones diarias (funciones puras)
+# ---------------------------------------------------------------------------
+
+def _hours_cube(hours: List[int]) -> List[Dict[str, int]]:
+    return [{"hour": h, "n": n} for h, n in enumerate(hours) if n]
+
+
+def build_triage_section(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agregado de un día de audit_log (campos clínicos dentro de 'detalles')."""
+    cells: Dict[Tuple, List[float]] = {}
+    pain = Counter()
+    ages = Counter()
+    hours = [0] * 24
+    total = 0
+    for record in records:
+        ts = _as_datetime(record.get("timestamp"))
+        if ts is None:
+            continue
+        total += 1
+        hours[ts.hour] += 1
+        det = record.get("detalles") or {}
+        key = tuple(_dim(det.get(f)) for f in ("sugerencia_ia", "nivel_corregido", "decision_humana", "calificacion_humana"))
+        cell = cells.setdefault(key, [0, 0.0, 0])
+        cell[0] += 1
+        dolor = _as_number(det.get("dolor"))
+        if dolor is not None:
+            cell[1] += dolor
+            cell[2] += 1
+            pain[(key[1], dolor)] += 1
+        edad = _as_number(det.get("edad"))
+        if edad is not None:
+            ages[(key[1], edad)] += 1
+    return {
+        "total": total,
+        "cells": [
+            {**dict(zip(TRIAGE_DIMS, key)), "n": n, "pain_sum": pain_sum, "pain_n": pain_n}
+            for key, (n, pain_sum, pain_n) in cells.items()
+        ],
+        "pain": [{"human": h, "pain": p, "n": n} for (h, p), n in pain.items()],
+        "ages": [{"human": h, "age": a, "n": n} for (h, a), n in ages.items()],
+        "hours": _hours_cube(hours),
+    }
+
+
+def build_files_section(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agregado de un día de file_imports_records."""
+    types = Counter()
+    audits = set()
+    hours = [0] * 24
+    total = 0
+    for record in records:
+        ts = _as_datetime(record.get("timestamp"))
+        if ts is None:
+            continue
+        total += 1
+        hours[ts.hour] += 1
+        types[_dim(record.get("file_type"))] += 1
+        if record.get("audit_id"):
+            audits.add(record["audit_id"])
+    return {
+        "total": total,
+        "audits": len(audits),
+        "audio": sum(n for t, n in types.items() if t in AUDIO_TYPES),
+        "types": [{"type": t, "n": n} for t, n in types.items()],
+        "hours": _hours_cube(hours),
+    }
+
+
+def build_transcriptions_section(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agregado de un día de transcriptions_records."""
+    languages = Counter()
+    hours = [0] * 24
+    total = 0
+    for record in records:
+        ts = _as_datetime(record.get("timestamp"))
+        if ts is None:
+            continue
+        total += 1
+        hours[ts.hour] += 1
+        languages[_dim(record.get("language_name"))] += 1
+    return {
+        "total": total,
+        "languages": [{"language": lang, "n": n} for lang, n in languages.items()],
+        "hours": _hours_cube(hours),
+    }
+
+
+# sección -> (colección origen, proyección, constructor)
+ROLLUP_SOURCES = {
+    "triage": ("audit_log", {"timestamp": 1, "detalles.sugerencia_ia": 1, "detalles.nivel_corregido": 1,
+                             "detalles.decision_humana": 1, "detalles.calificacion_humana": 1,
+                             "detalles.dolor": 1, "detalles.edad": 1}, build_triage_section),
+    "files": ("file_imports_records", {"timestamp": 1, "file_type": 1, "audit_id": 1}, build_files_section),
+    "transcriptions": ("transcriptions_records", {"timestamp": 1, "language_name": 1}, build_transcriptions_section),
+}
+
+
+# ---------------------------------------------------------------------------
+# Refresco incremental
+# ---------------------------------------------------------------------------
+
+def _day_spans(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """Agrupa días en tramos consecutivos [inicio, fin]."""
+    spans: List[Tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if spans and day == spans[-1][1] + timedelta(days=1):
+            spans[-1] = (spans[-1][0], day)
+        else:
+            spans.append((day, day))
+    return spans
+
+
+def _rebuild_days(repo, section: str, days: Iterable[date]) -> int:
+    """
+    Recalcula completos los días indicados de una sección. Los días que ya no
+    tienen registros en el origen pierden la sección (y el documento si se
+    queda vacío). Devuelve días escritos.
+    """
+    source, projection, builder = ROLLUP_SOURCES[section]
+    days = set(days)
+    written_days = set()
+    for first, last in _day_spans(days):
+        start = datetime(first.year, first.month, first.day)
+        end = datetime(last.year, last.month, last.day) + timedelta(days=1)
+        # Recorrido cronológico: solo se mantiene un día en memoria
+        current_day, bucket = None, []
+        for record in repo.stream_range(source, start, end, projection):
+            record_day = record["timestamp"].date()
+            if record_day != current_day and bucket:
+                repo.save_section(current_day, section, builder(bucket))
+                written_days.add(current_day)
+                bucket = []
+            current_day = record_day
+            bucket.append(record)
+        if bucket:
+            repo.save_section(current_day, section, builder(bucket))
+            written_days.add(current_day)
+    if days - written_days:
+        repo.clear_section(days - written_days, section, list(ROLLUP_SOURCES))
+    return len(written_days)
+
+
+def rebuild_audit_rollups(start: date, end: date) -> Dict[str, int]:
+    """Recalcula todas las secciones en [start, end] (p.ej. tras una corrección de datos)."""
+    repo = get_audit_rollups_repository()
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return {section: _rebuild_days(repo, section, days) for section in ROLLUP_SOURCES}
+
+
+_refresh_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def refresh_audit_rollups(force: bool = False) -> Dict[str, int]:
+    """
+    Incorpora a los agregados las altas producidas desde el último refresco.
+
+    Sin 'force' no hace nada si el proceso ya refrescó hace menos de
+    ROLLUP_REFRESH_S. La primera ejecución sobre una base existente hace el
+    backfill completo (un único recorrido cronológico por colección).
+
+    Returns:
+        Días recalculados por sección.
+    """
+    global _last_refresh
+    if not force and time.monotonic() - _last_refresh < ROLLUP_REFRESH_S:
+        return {}
+    with _refresh_lock:
+        if not force and time.monotonic() - _last_refresh < ROLLUP_REFRESH_S:
+            return {}
+        repo = get_audit_rollups_repository()
+        written = {}
+        for section, (source, _, _) in ROLLUP_SOURCES.items():
+            watermark = repo.get_watermark(section)
+            since = watermark - WATERMARK_OVERLAP if watermark else None
+            days, seen_until = set(), watermark
+            for record in repo.scan_new_timestamps(source, since):
+                ts = _as_datetime(record.get("timestamp"))
+                if ts is not None:
+                    days.add(ts.date())
+                generated = getattr(record.get("_id"), "generation_time", None)
+                if generated is not None:
+                    generated = generated.replace(tzinfo=None)
+                    if seen_until is None or generated > seen_until:
+                        seen_until = generated
+            written[section] = _rebuild_days(repo, section, days) if days else 0
+            if seen_until is not None and seen_until != watermark:
+                repo.set_watermark(section, seen_until)
+        _last_refresh = time.monotonic()
+        return written
+
+
+def start_audit_rollups_backfill() -> threading.Thread:
+    """Lanza en segundo plano el primer refresco (backfill) para no hacerlo esperar al panel."""
+    def _run():
+        try:
+            refresh_audit_rollups(force=True)
+        except Exception as e:
+            print(f"Error actualizando audit_rollups: {e}")
+    thread = threading.Thread(target=_run, name="audit-rollups", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------------------------------
+# Consulta por rango
+# ---------------------------------------------------------------------------
+
+def _frame(rows: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=columns)
+
+
+@dataclass
+class AuditSummary:
+    """Agregados de un rango de fechas, como tablas pequeñas para los gráficos."""
+    start: date
+    end: date
+    triage_total: int = 0
+    files_total: int = 0
+    files_audits: int = 0
+    files_audio: int = 0
+    transcriptions_total: int = 0
+    cells: pd.DataFrame = field(default_factory=lambda: _frame([], TRIAGE_DIMS + TRIAGE_MEASURES))
+    pain: pd.DataFrame = field(default_factory=lambda: _frame([], ["human", "pain", "n"]))
+    ages: pd.DataFrame = field(default_factory=lambda: _frame([], ["human", "age", "n"]))
+    file_types: pd.DataFrame = field(default_factory=lambda: _frame([], ["type", "n"]))
+    languages: pd.DataFrame = field(default_factory=lambda: _frame([], ["language", "n"]))
+    daily: pd.DataFrame = field(default_factory=lambda: _frame([], ["day", "triage", "files", "transcriptions"]))
+    hourly: pd.DataFrame = field(default_factory=lambda: _frame([], ["hour", "triage", "files", "transcriptions"]))
+
+    @property
+    def empty(self) -> bool:
+        return self.triage_total == 0
+
+    def filter_triage(self, levels: Optional[List[str]] = None, decisions: Optional[List[str]] = None) -> pd.DataFrame:
+        """Celdas de triaje restringidas a niveles humanos y/o decisiones."""
+        cells = self.cells
+        if levels:
+            cells = cells[cells["human"].isin(levels)]
+        if decisions:
+            cells = cells[cells["decision"].isin(decisions)]
+        return cells
+
+    def concordant(self) -> int:
+        """Casos donde la sugerencia IA coincide literalmente con el nivel final."""
+        both = self.cells.dropna(subset=["ai", "human"])
+        return int(both.loc[both["ai"] == both["human"], "n"].sum())
+
+    def count_where(self, column: str, values) -> int:
+        return int(self.cells.loc[self.cells[column].isin(values), "n"].sum())
+
+
+def concordance_metrics(cells: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Métricas de concordancia IA vs humano sobre celdas de triaje, con los niveles
+    normalizados a 1-5 (el humano es la verdad terreno).
+
+    Returns:
+        dict con n, accuracy, over_triage, under_triage, confusion (DataFrame
+        Real x Predicción) y diff_counts (Serie humano - IA).
+    """
+    levels = pd.DataFrame({
+        "ai_level": cells["ai"].map(parse_level),
+        "human_level": cells["human"].map(parse_level),
+        "n": cells["n"],
+    }).dropna(subset=["ai_level", "human_level"])
+    n = int(levels["n"].sum())
+    if n == 0:
+        return {"n": 0}
+    levels = levels.astype({"ai_level": int, "human_level": int})
+    hit = levels["ai_level"] == levels["human_level"]
+    over = levels["ai_level"] < levels["human_level"]
+    under = levels["ai_level"] > levels["human_level"]
+    labels = sorted(set(levels["ai_level"]) | set(levels["human_level"]))
+    confusion = (levels.pivot_table(index="human_level", columns="ai_level", values="n", aggfunc="sum", fill_value=0)
+                 .reindex(index=labels, columns=labels, fill_value=0))
+    confusion.index.name, confusion.columns.name = "Real", "Predicción"
+    diff_counts = levels.assign(diff=levels["human_level"] - levels["ai_level"]).groupby("diff")["n"].sum().sort_index()
+    return {
+        "n": n,
+        "accuracy": levels.loc[hit, "n"].sum() / n,
+        "over_triage": levels.loc[over, "n"].sum() / n,
+        "under_triage": levels.loc[under, "n"].sum() / n,
+        "confusion": confusion,
+        "diff_counts": diff_counts,
+    }
+
+
+def _section_totals(rows: List[Dict[str, Any]], section: str, key: str = "total") -> int:
+    return int(sum((row.get(section) or {}).get(key, 0) for row in rows))
+
+
+def _hourly(repo, start: date, end: date) -> pd.DataFrame:
+    hourly = pd.DataFrame({"hour": range(24)})
+    for section in ROLLUP_SOURCES:
+        rows = repo.aggregate_cube(start, end, f"{section}.hours", ["hour"], ["n"])
+        counts = {row["hour"]: row["n"] for row in rows}
+        hourly[section] = hourly["hour"].map(counts).fillna(0).astype(int)
+    return hourly
+
+
+def get_audit_summary(start: date, end: date, refresh: bool = True) -> AuditSummary:
+    """
+    Agregados del rango [start, end] leídos solo de 'audit_rollups'.
+
+    Args:
+        refresh: Incorporar antes las altas recientes (con el límite de frecuencia
+                 de refresh_audit_rollups).
+    """
+    if refresh:
+        refresh_audit_rollups()
+    repo = get_audit_rollups_repository()
+    days = repo.daily_totals(start, end, ["triage.total", "files.total", "files.audits",
+                                          "files.audio", "transcriptions.total"])
+    daily = _frame([
+        {"day": row["day"].date(),
+         "triage": (row.get("triage") or {}).get("total", 0),
+         "files": (row.get("files") or {}).get("total", 0),
+         "transcriptions": (row.get("transcriptions") or {}).get("total", 0)}
+        for row in days
+    ], ["day", "triage", "files", "transcriptions"])
+    return AuditSummary(
+        start=start,
+        end=end,
+        triage_total=_section_totals(days, "triage"),
+        files_total=_section_totals(days, "files"),
+        files_audits=_section_totals(days, "files", "audits"),
+        files_audio=_section_totals(days, "files", "audio"),
+        transcriptions_total=_section_totals(days, "transcriptions"),
+        cells=_frame(repo.aggregate_cube(start, end, "triage.cells", TRIAGE_DIMS, TRIAGE_MEASURES),
+                     TRIAGE_DIMS + TRIAGE_MEASURES),
+        pain=_frame(repo.aggregate_cube(start, end, "triage.pain", ["human", "pain"], ["n"]), ["human", "pain", "n"]),
+        ages=_frame(repo.aggregate_cube(start, end, "triage.ages", ["human", "age"], ["n"]), ["human", "age", "n"]),
+        file_types=_frame(repo.aggregate_cube(start, end, "files.types", ["type"], ["n"]), ["type", "n"]),
+        languages=_frame(repo.aggregate_cube(start, end, "transcriptions.languages", ["language"], ["n"]),
+                         ["language", "n"]),
+        daily=daily,
+        hourly=_hourly(repo, start, end),
+    )
+
+
+def load_audit_detail(start: date, end: date, limit: int = 200) -> pd.DataFrame:
+    """
+    Registros de audit_log del rango (los 'limit' más recientes) con 'detalles'
+    expandido, para las tablas de detalle. Las métricas salen de los agregados.
+    """
+    from db.repositories.audit import get_audit_repository
+    records = get_audit_repository().get_range(
+        datetime(start.year, start.month, start.day),
+        datetime(end.year, end.month, end.day) + timedelta(days=1),
+        limit=limit,
+    )
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+    if "detalles" in df.columns:
+        detalles_df = pd.json_normalize(df["detalles"].apply(lambda d: d if isinstance(d, dict) else {}))
+        detalles_df.index = df.index
+        for col in detalles_df.columns:
+            if col not in df.columns:
+                df[col] = detalles_df[col]
+    if "audit_id" not in df.columns and "_id" in df.columns:
+        df["audit_id"] = df["_id"].astype(str)
+    return df
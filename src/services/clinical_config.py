@@ -0,0 +1,187 @@
+# path: src/services/clinical_config.py
+# Creado: 2026-10-17
+"""
+Snapshot versionado de la configuración clínica.
+
+Reúne en un objeto inmutable, cargado de una vez, la configuración PTR
+('ptr_config'), las referencias de signos vitales ('vital_signs_references')
+con una tabla precalculada edad -> banda por métrica, y los umbrales de
+'triage_config'. Los formularios de signos vitales y el scoring leen de aquí
+sin consultar la BD en el camino caliente.
+
+Invalidación:
+- Los repositorios incrementan la versión 'clinical' de 'config_versions' tras
+  cada escritura (y un contador en proceso, visible al instante).
+- Si el servidor admite change streams, un hilo escucha el contador y fuerza la
+  comprobación en cuanto cambia; si no, se comprueba la versión (un find_one por
+  _id) como mucho cada VERSION_CHECK_S segundos.
+- La recarga construye un snapshot nuevo y lo publica sustituyendo la referencia,
+  así que los lectores ven siempre una configuración completa y coherente.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from db.models import PTRConfig, VitalSignAgeConfig, VitalSignReference
+from db.repositories.config_versions import (
+    CLINICAL_CONFIG, get_config_versions_repository, get_local_config_version
+)
+from db.repositories.ptr_config import get_ptr_config_repository
+from db.repositories.triage_config import get_triage_config_repository
+from db.repositories.vital_signs_repo import VitalSignsRepository
+
+# Métricas con rangos por edad en 'vital_signs_references' (evaluadas por el Worst Case)
+VITAL_SIGN_METRICS = ("fc", "spo2", "temp", "pas", "pad", "fr", "gcs")
+# Edades enteras con banda precalculada; el resto se resuelve recorriendo las bandas
+MAX_TABLE_AGE = 130
+
+VERSION_CHECK_S = 5.0
+# Con change stream activo la comprobación periódica es solo una red de seguridad
+WATCHED_CHECK_S = 300.0
+WATCH_RETRY_S = 30.0
+
+
+def select_age_band(bands: Sequence[VitalSignAgeConfig], age: Any) -> Optional[VitalSignAgeConfig]:
+    """Primera banda que contiene la edad (mismo criterio que VitalSignsRepository.get_config)."""
+    for band in bands:
+        if band.min_age <= age <= band.max_age:
+            return band
+    return None
+
+
+@dataclass(frozen=True)
+class ClinicalConfigSnapshot:
+    """Configuración clínica en memoria. Compartida entre sesiones: no modificar los modelos."""
+    db_version: Optional[int]
+    local_version: int
+    loaded_at: datetime
+    ptr: Mapping[str, PTRConfig]
+    vital_signs: Mapping[str, VitalSignReference]
+    triage_ranges: Mapping[str, Mapping[str, Any]]
+    age_table: Tuple[Mapping[str, Optional[VitalSignAgeConfig]], ...]
+
+    def ptr_config(self, metric_key: str) -> Optional[PTRConfig]:
+        return self.ptr.get(metric_key)
+
+    def vital_configs_for_age(self, age: Any) -> Dict[str, Optional[VitalSignAgeConfig]]:
+        """Configuración de cada signo vital para la edad (equivale a get_config por métrica)."""
+        if isinstance(age, int) and 0 <= age <= MAX_TABLE_AGE:
+            return dict(self.age_table[age])
+        return {m: select_age_band(self.vital_bands(m), age) for m in VITAL_SIGN_METRICS}
+
+    def vital_bands(self, metric: str) -> Tuple[VitalSignAgeConfig, ...]:
+        ref = self.vital_signs.get(metric)
+        return tuple(ref.configs) if ref else ()
+
+
+def build_snapshot(
+    ptr_configs: Iterable[PTRConfig],
+    references: Iterable[VitalSignReference],
+    triage_ranges: Iterable[Dict[str, Any]],
+    db_version: Optional[int] = None,
+    local_version: int = 0,
+) -> ClinicalConfigSnapshot:
+    refs: Dict[str, VitalSignReference] = {}
+    for ref in references:
+        refs.setdefault(ref.key, ref)
+    bands = {m: tuple(refs[m].configs) if m in refs else () for m in VITAL_SIGN_METRICS}
+    age_table = tuple(
+        MappingProxyType({m: select_age_band(bands[m], age) for m in VITAL_SIGN_METRICS})
+        for age in range(MAX_TABLE_AGE + 1)
+    )
+    return ClinicalConfigSnapshot(
+        db_version=db_version,
+        local_version=local_version,
+        loaded_at=datetime.now(),
+        ptr=MappingProxyType({c.metric_key: c for c in ptr_configs}),
+        vital_signs=MappingProxyType(refs),
+        triage_ranges=MappingProxyType({d["metric"]: MappingProxyType(d) for d in triage_ranges if d.get("metric")}),
+        age_table=age_table,
+    )
+
+
+def _load(db_version: Optional[int], local_version: int) -> ClinicalConfigSnapshot:
+    return build_snapshot(
+        get_ptr_config_repository().get_all_configs(),
+        VitalSignsRepository().get_all_references(),
+        get_triage_config_repository().get_all_configs(),
+        db_version=db_version,
+        local_version=local_version,
+    )
+
+
+_snapshot: Optional[ClinicalConfigSnapshot] = None
+_next_check = 0.0
+_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+_watching = False
+
+
+def get_clinical_config() -> ClinicalConfigSnapshot:
+    """Snapshot vigente; recarga si la versión ha cambiado (en proceso o en BD)."""
+    global _snapshot, _next_check
+    snapshot = _snapshot
+    if (snapshot is not None and time.monotonic() < _next_check
+            and snapshot.local_version == get_local_config_version(CLINICAL_CONFIG)):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        local_version = get_local_config_version(CLINICAL_CONFIG)
+        if snapshot is not None and time.monotonic() < _next_check and snapshot.local_version == local_version:
+            return snapshot
+
+        try:
+            # Versión antes que datos: un cambio concurrente dispara otra recarga
+            db_version = get_config_versions_repository().get_version(CLINICAL_CONFIG)
+            if snapshot is None or snapshot.local_version != local_version or snapshot.db_version != db_version:
+                snapshot = _load(db_version, local_version)
+                _snapshot = snapshot
+        except Exception as e:
+            if snapshot is None:
+                raise
+            print(f"Error recargando la configuración clínica (se mantiene la anterior): {e}")
+        _next_check = time.monotonic() + (WATCHED_CHECK_S if _watching else VERSION_CHECK_S)
+        return snapshot
+
+
+def invalidate_clinical_config():
+    """Fuerza la comprobación de versión en la próxima lectura."""
+    global _next_check
+    _next_check = 0.0
+
+
+def _watch_loop():
+    global _watching
+    from pymongo.errors import OperationFailure
+    repo = get_config_versions_repository()
+    while True:
+        try:
+            with repo.watch(CLINICAL_CONFIG) as stream:
+                _watching = True
+                invalidate_clinical_config()
+                for _change in stream:
+                    invalidate_clinical_config()
+        except OperationFailure as e:
+            # Servidor sin change streams (standalone): queda la comprobación periódica
+            _watching = False
+            print(f"Change streams no disponibles para la configuración clínica: {e}")
+            return
+        except Exception as e:
+            _watching = False
+            print(f"Error en el change stream de configuración clínica: {e}")
+        invalidate_clinical_config()
+        time.sleep(WATCH_RETRY_S)
+
+
+def start_clinical_config_watcher() -> threading.Thread:
+    """Arranca (una vez por proceso) la escucha de cambios de la configuración clínica."""
+    global _watcher
+    with _lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(target=_watch_loop, name="clinical-config-watch", daemon=True)
+            _watcher.start()
+        return _watcher
@@ -1,8 +1,158 @@
+# path: src/services/dynamic_ui_rules_engine.py
+# Actualizado: 2026-10-17 - Reglas compiladas a closures con caché por versión y evaluación por lotes
 import re
-from typing import Dict, List, Any
-from db.repositories.ui_rules_repository import get_ui_rules_repository, UIRulesRepository
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
+from db.repositories.ui_rules_repository import get_ui_rules_repository, get_rules_version, UIRulesRepository
 from db.models_rules import UIRule, RuleCondition, RuleAction, LogicOperator, ConditionOperator, ActionType, RuleStatus
 
+# --- Compilation -------------------------------------------------------------
+# Each rule is compiled into a closure tree: dotted paths are pre-split, numeric
+# targets pre-coerced, 'contains' targets pre-lowered and the operator resolved to a
+# single function. Field values are read once per evaluation and shared by every
+# condition (and every rule) that references the same path.
+
+RULES_TTL_S = 60  # Safety net for rules edited from another process
+
+_MISSING = object()
+_compiled_cache: Tuple[Optional[int], float, Tuple["CompiledRule", ...]] = (None, 0.0, ())
+_compiled_lock = threading.Lock()
+
+Predicate = Callable[[Dict[str, Any], Dict[str, Any]], bool]
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    name: str
+    matches: Predicate
+    alerts: Tuple[Tuple[Optional[str], Optional[str]], ...]
+    highlights: Tuple[str, ...]
+    suggestions: Tuple[str, ...]
+
+
+def _extract(data: Dict[str, Any], parts: Tuple[str, ...]) -> Any:
+    """Reads a dotted path ('vital_signs.temperature'); None if any step is missing."""
+    current_val = data
+    try:
+        for part in parts:
+            if current_val is None:
+                break
+            current_val = current_val.get(part)
+    except Exception:
+        current_val = None
+    return current_val
+
+
+def _compare(op: ConditionOperator) -> Optional[Callable[[Any, Any], bool]]:
+    if op == ConditionOperator.EQUALS: return lambda v, t: v == t
+    if op == ConditionOperator.NOT_EQUALS: return lambda v, t: v != t
+    if op == ConditionOperator.GREATER_THAN: return lambda v, t: v > t
+    if op == ConditionOperator.LESS_THAN: return lambda v, t: v < t
+    if op == ConditionOperator.GREATER_EQUAL: return lambda v, t: v >= t
+    if op == ConditionOperator.LESS_EQUAL: return lambda v, t: v <= t
+    if op == ConditionOperator.CONTAINS: return lambda v, t: t in str(v).lower()
+    if op == ConditionOperator.NOT_CONTAINS: return lambda v, t: t not in str(v).lower()
+    if op == ConditionOperator.IN: return lambda v, t: v in t  # Target should be list
+    if op == ConditionOperator.NOT_IN: return lambda v, t: v not in t
+    return None
+
+
+def _compile_leaf(condition: RuleCondition) -> Predicate:
+    """Single field comparison, with the same type normalization as the interpreter it replaces."""
+    path = condition.field
+    parts = tuple(path.split('.'))
+    compare = _compare(condition.operator)
+    if compare is None:
+        return lambda data, values: False
+
+    target = condition.value
+    text_op = condition.operator in (ConditionOperator.CONTAINS, ConditionOperator.NOT_CONTAINS)
+    if text_op:
+        target = str(target).lower()
+    numeric_target = isinstance(target, (int, float))
+    # A string target is compared as a number against numeric values (if it parses)
+    target_as_number = target
+    if isinstance(target, str) and not text_op:
+        try:
+            target_as_number = float(target)
+        except ValueError:
+            pass
+
+    def leaf(data: Dict[str, Any], values: Dict[str, Any]) -> bool:
+        current_val = values.get(path, _MISSING)
+        if current_val is _MISSING:
+            current_val = values[path] = _extract(data, parts)
+        if current_val is None:
+            return False
+
+        t = target
+        if numeric_target and isinstance(current_val, str):
+            try:
+                current_val = float(current_val)
+            except ValueError:
+                pass
+        if isinstance(current_val, (int, float)):
+            t = target_as_number
+        try:
+            return compare(current_val, t)
+        except Exception:
+            return False
+
+    return leaf
+
+
+def compile_condition(condition: RuleCondition) -> Predicate:
+    """Compiles a (possibly nested) condition into a short-circuiting predicate."""
+    if condition.field:
+        return _compile_leaf(condition)
+
+    if condition.logic and condition.rules:
+        children = tuple(compile_condition(sub) for sub in condition.rules)
+        if condition.logic == LogicOperator.AND:
+            return lambda data, values: all(child(data, values) for child in children)
+        if condition.logic == LogicOperator.OR:
+            return lambda data, values: any(child(data, values) for child in children)
+
+    return lambda data, values: False
+
+
+def compile_rule(rule: UIRule) -> CompiledRule:
+    alerts, highlights, suggestions = [], [], []
+    for action in rule.actions:
+        if action.type == ActionType.ALERT:
+            alerts.append((action.level, action.message))
+        elif action.type == ActionType.HIGHLIGHT:
+            if action.fields:
+                highlights.extend(action.fields)
+        elif action.type == ActionType.SUGGEST:
+            if action.protocol:
+                suggestions.append(action.protocol)
+    return CompiledRule(
+        name=rule.name,
+        matches=compile_condition(rule.conditions),
+        alerts=tuple(alerts),
+        highlights=tuple(highlights),
+        suggestions=tuple(suggestions),
+    )
+
+
+def _run_rules(rules: Tuple[CompiledRule, ...], patient_data: Dict[str, Any]) -> Dict[str, List[Any]]:
+    results = {
+        "alerts": [],
+        "highlights": [],
+        "suggestions": []
+    }
+    values: Dict[str, Any] = {}  # Field values shared across all rules for this patient
+    for rule in rules:
+        if rule.matches(patient_data, values):
+            results["alerts"].extend({"type": level, "message": message} for level, message in rule.alerts)
+            results["highlights"].extend(rule.highlights)
+            results["suggestions"].extend(rule.suggestions)
+    return results
+
+
 class DynamicRulesEngine:
     _instance = None
     
@@ -31,6 +181,7 @@ class DynamicRulesEngine:
         
         # Hack: Update all to ACTIVE directly after insertion for the migration
         self.repo.collection.update_many({}, {"$set": {"status": RuleStatus.ACTIVE.value}})
+        self.invalidate_cache()
         print("✅ Migration Complete.")
 
         # 2. Seed Fields
@@ -44,98 +195,41 @@ class DynamicRulesEngine:
             print(f"✅ Seeding Complete. {count} fields found.")
 
 
+    def invalidate_cache(self):
+        """Drops the compiled rule set; the next evaluation recompiles it."""
+        global _compiled_cache
+        with _compiled_lock:
+            _compiled_cache = (None, 0.0, ())
+
+    def _get_compiled_rules(self) -> Tuple["CompiledRule", ...]:
+        """Active rules compiled once per rules version (or every RULES_TTL_S)."""
+        global _compiled_cache
+        version = get_rules_version()
+        cache_version, expires_at, compiled = _compiled_cache
+        if cache_version == version and time.monotonic() < expires_at:
+            return compiled
+
+        with _compiled_lock:
+            cache_version, expires_at, compiled = _compiled_cache
+            if cache_version != version or time.monotonic() >= expires_at:
+                compiled = tuple(compile_rule(rule) for rule in self.repo.get_active_rules())
+                _compiled_cache = (version, time.monotonic() + RULES_TTL_S, compiled)
+        return compiled
+
     def evaluate(self, patient_data: Dict[str, Any]) -> Dict[str, List[Any]]:
         """
         Evaluates active rules against patient data.
         """
-        results = {
-            "alerts": [],
-            "highlights": [],
-            "suggestions": []
-        }
-
-        active_rules = self.repo.get_active_rules()
-        
-        for rule in active_rules:
-            if self._evaluate_condition(rule.conditions, patient_data):
-                self._apply_actions(rule.actions, results)
-                
-        return results
-
-    def _evaluate_condition(self, condition: RuleCondition, data: Dict[str, Any]) -> bool:
-        """Recursive evaluation of conditions."""
-        
-        # 1. Base Case: Direct Rule (Field + Operator + Value)
-        if condition.field:
-            return self._check_rule(condition, data)
-        
-        # 2. Logic Group (AND/OR with nested rules)
-        if condition.logic and condition.rules:
-            results = [self._evaluate_condition(sub, data) for sub in condition.rules]
-            
-            if condition.logic == LogicOperator.AND:
-                return all(results)
-            elif condition.logic == LogicOperator.OR:
-                return any(results)
-                
-        return False
-
-    def _check_rule(self, condition: RuleCondition, data: Dict[str, Any]) -> bool:
-        """Evaluates a single field comparison."""
-        # 1. Extract value from data (supports dot notation e.g. 'vital_signs.temperature')
-        current_val = data
-        try:
-            for part in condition.field.split('.'):
-                if current_val is None: break
-                current_val = current_val.get(part)
-        except Exception:
-            current_val = None
+        return _run_rules(self._get_compiled_rules(), patient_data)
 
-        if current_val is None:
-            return False
-
-        # 2. Compare using operator
-        op = condition.operator
-        target = condition.value
-        
-        # Normalize types for comparison (basic)
-        try:
-            if isinstance(target, (int, float)) and isinstance(current_val, (str)):
-                current_val = float(current_val)
-            if isinstance(current_val, (int, float)) and isinstance(target, (str)):
-                target = float(target)
-        except:
-            pass # Keep original if conversion fails
+    def evaluate_many(self, patients: Iterable[Dict[str, Any]]) -> List[Dict[str, List[Any]]]:
+        """
+        Evaluates active rules for a batch of patients (e.g. every waiting patient on a
+        dashboard). The compiled rule set is fetched once; results keep the input order.
+        """
+        rules = self._get_compiled_rules()
+        return [_run_rules(rules, patient_data) for patient_data in patients]
 
-        try:
-            if op == ConditionOperator.EQUALS: return current_val == target
-            if op == ConditionOperator.NOT_EQUALS: return current_val != target
-            if op == ConditionOperator.GREATER_THAN: return current_val > target
-            if op == ConditionOperator.LESS_THAN: return current_val < target
-            if op == ConditionOperator.GREATER_EQUAL: return current_val >= target
-            if op == ConditionOperator.LESS_EQUAL: return current_val <= target
-            if op == ConditionOperator.CONTAINS: return str(target).lower() in str(current_val).lower()
-            if op == ConditionOperator.NOT_CONTAINS: return str(target).lower() not in str(current_val).lower()
-            if op == ConditionOperator.IN: return current_val in target # Target should be list
-            if op == ConditionOperator.NOT_IN: return current_val not in target
-        except Exception:
-            return False
-            
-        return False
-
-    def _apply_actions(self, actions: List[RuleAction], results: Dict):
-        for action in actions:
-            if action.type == ActionType.ALERT:
-                results["alerts"].append({
-                    "type": action.level,
-                    "message": action.message
-                })
-            elif action.type == ActionType.HIGHLIGHT:
-                if action.fields:
-                    results["highlights"].extend(action.fields)
-            elif action.type == ActionType.SUGGEST:
-                if action.protocol:
-                    results["suggestions"].append(action.protocol)
 
     def _get_default_rules(self) -> List[UIRule]:
         """Definitions for the initial migration."""
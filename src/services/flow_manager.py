@@ -1,12 +1,15 @@
 # path: src/services/flow_manager.py
 # Creado: 2025-11-24
+# Actualizado: 2026-10-17 - Sincronización con la proyección de ocupación
 """
 Gestor del nuevo sistema de flujo de pacientes.
 Implementa el modelo de registro por sala con flow_id único.
+Cada alta, movimiento o cierre actualiza también la proyección 'room_occupancy'.
 """
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
 from db import get_database, MongoDBSession
+from services.occupancy_service import registrar_entrada, registrar_salida
 
 
 def generar_flow_id() -> str:
@@ -87,6 +90,7 @@ def crear_nuevo_flujo(
     }
     
     db.patient_flow.insert_one(registro)
+    registrar_entrada(registro)
     return flow_id
 
 
@@ -242,6 +246,7 @@ def mover_paciente_a_sala(
     }
     
     db.patient_flow.insert_one(nuevo_registro)
+    registrar_entrada(nuevo_registro)
     
     return True, f"Paciente movido a {sala_destino_code}"
 
@@ -345,6 +350,7 @@ def rechazar_paciente(
         }
     )
     
+    registrar_salida(patient_code)
     return True, "Paciente rechazado correctamente"
 
 
@@ -391,6 +397,7 @@ def finalizar_flujo(
         }
     )
     
+    registrar_salida(patient_code)
     return True, f"Flujo finalizado: {tipo_finalizacion}"
 
 
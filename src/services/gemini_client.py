@@ -1,16 +1,16 @@
 # path: src/services/gemini_client.py
+# Actualizado: 2026-10-17 - Delegación en la pasarela asíncrona (AIGateway) y caché de respuestas
 import google.generativeai as genai
-import json
 import os
-from datetime import datetime
+from concurrent.futures import Future
 from typing import Optional, Dict, Any, Union, Tuple, List
 import streamlit as st
 try:
-    from ..db.models import AIAuditLog
     from ..db.repositories.ai_audit import get_ai_audit_repository
+    from .ai_gateway import get_ai_gateway
 except ImportError:
-    from db.models import AIAuditLog
     from db.repositories.ai_audit import get_ai_audit_repository
+    from services.ai_gateway import get_ai_gateway
 
 class GeminiService:
     """
@@ -41,6 +41,7 @@ class GeminiService:
             print("WARNING: GOOGLE_API_KEY not found in secrets or env vars.")
             
         self.audit_repo = get_ai_audit_repository()
+        self.gateway = get_ai_gateway()
 
     def generate_content(
         self,
@@ -53,7 +54,8 @@ class GeminiService:
         prompt_content: Union[str, list],
         generation_config: Optional[Dict[str, Any]] = None,
         safety_settings: Optional[List[Dict[str, Any]]] = None, # New argument
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        cache: bool = False
     ) -> Tuple[Dict[str, Any], str]:
         """
         Realiza una llamada a Gemini y registra la auditoría.
@@ -69,164 +71,34 @@ class GeminiService:
             generation_config: Configuración específica (temp, tokens).
             safety_settings: Configuración de seguridad opcional.
             metadata: Datos extra para el log.
+            cache: Usar la caché de respuestas (solo para llamadas deterministas).
 
         Returns:
             Tuple[Dict, str]: (Respuesta parseada JSON o Error, Raw Prompt String)
-        """
-        start_time = datetime.now()
-        
-        # Configuración por defecto
-        if generation_config is None:
-            generation_config = {
-                "temperature": 0.2,
-                "response_mime_type": "application/json"
-            }
-            
-        # Preparar raw_prompt para log (sanitizar binarios)
-        if isinstance(prompt_content, str):
-            raw_prompt_log = prompt_content
-        elif isinstance(prompt_content, list):
-            log_parts = []
-            for part in prompt_content:
-                if isinstance(part, dict) and "data" in part:
-                    # Es un blob de datos (imagen/audio)
-                    mime = part.get("mime_type", "unknown")
-                    size = len(part["data"]) if hasattr(part["data"], "__len__") else "unknown"
-                    log_parts.append(f"[{mime} DATA, size={size}]")
-                elif hasattr(part, "read"):
-                     log_parts.append("[FILE OBJECT]")
-                else:
-                    log_parts.append(str(part))
-            raw_prompt_log = str(log_parts)
-        else:
-            raw_prompt_log = str(prompt_content)
-        
-        response_data = {"status": "ERROR", "msg": "Unknown error"}
-        raw_response_log = ""
-        status = "error"
-        error_msg = None
-
-        try:
-            # Configuración de seguridad
-            if safety_settings is None:
-                # Default permisivo para contexto médico
-                safety_settings = [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                ]
-            
-            model = genai.GenerativeModel(
-                model_name=model_name, 
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-            
-            # Retry logic for transient errors
-            import time
-            from google.api_core import exceptions as google_exceptions
-            
-            max_retries = 3
-            last_error = None
-            
-            for attempt in range(max_retries):
-                try:
-                    # Llamada a la API
-                    response = model.generate_content(prompt_content)
-                    break # Success
-                except (google_exceptions.ServiceUnavailable, 
-                        google_exceptions.DeadlineExceeded, 
-                        google_exceptions.ResourceExhausted,
-                        google_exceptions.Aborted,
-                        google_exceptions.InternalServerError) as e:
-                    last_error = e
-                    if attempt < max_retries - 1:
-                        wait_time = 2 ** attempt # 1s, 2s, 4s
-                        print(f"⚠️ Gemini API Error ({e}). Retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        raise last_error
-            
-            # Procesar respuesta
-            if not response.parts:
-                # Intentar obtener más detalles del error
-                finish_reason = "UNKNOWN"
-                if response.candidates:
-                    finish_reason = response.candidates[0].finish_reason.name
-                
-                if response.prompt_feedback:
-                    block_reason = response.prompt_feedback.block_reason.name
-                    error_msg = f"Blocked: {block_reason}"
-                    response_data = {"status": "ERROR", "msg": error_msg}
-                else:
-                    error_msg = f"Empty response parts. Finish Reason: {finish_reason}"
-                    response_data = {"status": "ERROR", "msg": error_msg}
-            else:
-                raw_response_log = response.text
-                cleaned_text = response.text.strip()
-                
-                # Limpiar markdown code blocks
-                if cleaned_text.startswith("```"):
-                    lines = cleaned_text.split("\n")
-                    if len(lines) >= 2:
-                        cleaned_text = "\n".join(lines[1:-1])
-                
-                # Determinar si esperamos JSON
-                expected_json = False
-                if generation_config and generation_config.get("response_mime_type") == "application/json":
-                    expected_json = True
-
-                if expected_json:
-                    try:
-                        response_data = json.loads(cleaned_text)
-                        status = "success"
-                    except json.JSONDecodeError:
-                        error_msg = "Invalid JSON response"
-                        response_data = {"status": "ERROR", "msg": error_msg, "raw": cleaned_text}
-                else:
-                    # Si no esperamos JSON, devolvemos texto plano
-                    response_data = {"text": cleaned_text}
-                    status = "success"
-                    
-        except Exception as e:
-            error_msg = str(e)
-            # Detectar si es error de conexión para sugerir contingencia
-            if "503" in error_msg or "deadline" in error_msg.lower() or "connection" in error_msg.lower():
-                response_data = {
-                    "status": "ERROR", 
-                    "msg": f"Error de Conexión con IA: {error_msg}", 
-                    "suggest_contingency": True
-                }
-            else:
-                response_data = {"status": "ERROR", "msg": f"Exception: {error_msg}"}
-            
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds() * 1000
 
-        # Registrar Auditoría
-        try:
-            log_entry = AIAuditLog(
-                timestamp_start=start_time,
-                timestamp_end=end_time,
-                duration_ms=duration,
-                caller_id=caller_id,
-                user_id=user_id,
-                call_type=call_type,
-                prompt_type=prompt_type,
-                prompt_version_id=prompt_version_id or "unknown",
-                model_name=model_name,
-                raw_prompt=raw_prompt_log,
-                raw_response=raw_response_log or str(response_data),
-                status=status,
-                error_msg=error_msg,
-                metadata=metadata or {}
-            )
-            self.audit_repo.log_call(log_entry)
-        except Exception as log_err:
-            print(f"CRITICAL: Failed to log AI audit: {log_err}")
+        La llamada se ejecuta en la pasarela asíncrona (services.ai_gateway):
+        concurrencia acotada, coalescencia, reintentos y auditoría en segundo plano.
+        """
+        return self.gateway.generate_content(
+            caller_id=caller_id,
+            user_id=user_id,
+            call_type=call_type,
+            prompt_type=prompt_type,
+            prompt_version_id=prompt_version_id,
+            model_name=model_name,
+            prompt_content=prompt_content,
+            generation_config=generation_config,
+            safety_settings=safety_settings,
+            metadata=metadata,
+            cache=cache
+        )
 
-        return response_data, raw_prompt_log
+    def submit_content(self, **kwargs) -> Future:
+        """
+        Variante no bloqueante de generate_content(): devuelve un Future con la
+        tupla (respuesta, raw_prompt). Permite lanzar varias llamadas en paralelo.
+        """
+        return self.gateway.submit(**kwargs)
 
 # Singleton instance
 _gemini_service = None
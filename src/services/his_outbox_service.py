@@ -0,0 +1,318 @@
+# path: src/services/his_outbox_service.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Solo endpoints HIS autenticados
+"""
+Envío asíncrono de datos clínicos (FHIR) al HIS mediante un outbox persistente.
+
+Guardar un triaje solo encola el Bundle en 'his_outbox' (una inserción). Un
+dispatcher en segundo plano:
+- Reclama mensajes vencidos con lease (reanudable si el proceso cae).
+- Agrupa los Bundles por endpoint en Bundles FHIR de tipo 'batch'.
+- Reutiliza conexiones HTTP (requests.Session con pool) y envía lotes en paralelo.
+- Reintenta con backoff exponencial con jitter y, agotados los intentos o ante
+  un rechazo permanente (4xx), mueve el mensaje a dead-letter.
+- Propaga la clave de idempotencia: identificador del Bundle, 'ifNoneExist'
+  (create condicional FHIR) y cabecera Idempotency-Key del lote.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from core.logger_config import logger
+from db.repositories.his_outbox import get_his_outbox_repository
+
+HIS_ENDPOINT = "his"
+IDEMPOTENCY_SYSTEM = "urn:tryag:his-outbox"
+
+DEFAULT_BATCH_SIZE = 20
+POLL_INTERVAL_S = 2.0
+LEASE_S = 120
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 900.0
+HTTP_TIMEOUT_S = 15
+MAX_WORKERS = 4
+CONFIG_TTL_S = 30
+
+# Respuestas HTTP que merecen reintento; el resto de 4xx se consideran permanentes
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+def idempotency_key_for(record: Dict[str, Any]) -> str:
+    """Clave estable derivada del contenido del registro (si no hay un identificador propio)."""
+    canonical = json.dumps(record, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def enqueue_clinical_data(bundle: Dict[str, Any], idempotency_key: str,
+                          metadata: Optional[Dict[str, Any]] = None,
+                          endpoint: str = HIS_ENDPOINT) -> bool:
+    """
+    Encola un Bundle FHIR para el HIS (una inserción, sin E/S de red).
+
+    Returns:
+        True si se encoló, False si esa clave ya estaba en el outbox.
+    """
+    queued = get_his_outbox_repository().enqueue(idempotency_key, endpoint, bundle, metadata)
+    if _dispatcher is not None:
+        _dispatcher.wake()
+    return queued
+
+
+def backoff_delay(attempts: int, base_s: float = BACKOFF_BASE_S, max_s: float = BACKOFF_MAX_S) -> float:
+    """Backoff exponencial con jitter ("equal jitter") para el intento n (1-based)."""
+    delay = min(max_s, base_s * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def build_batch_bundle(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Bundle FHIR 'batch' con un create condicional por mensaje del outbox."""
+    entries = []
+    for msg in messages:
+        resource = dict(msg["payload"])
+        resource["identifier"] = {"system": IDEMPOTENCY_SYSTEM, "value": msg["_id"]}
+        entries.append({
+            "resource": resource,
+            "request": {
+                "method": "POST",
+                "url": resource.get("resourceType", "Bundle"),
+                "ifNoneExist": f"identifier={IDEMPOTENCY_SYSTEM}|{msg['_id']}",
+            },
+        })
+    return {"resourceType": "Bundle", "type": "batch", "entry": entries}
+
+
+def _entry_status(entry: Dict[str, Any]) -> Optional[int]:
+    status = str((entry.get("response") or {}).get("status", "")).strip()
+    try:
+        return int(status.split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class HISOutboxDispatcher:
+    """
+    Worker que vacía el outbox hacia los endpoints HIS configurados.
+    """
+
+    def __init__(
+        self,
+        repo=None,
+        session=None,
+        config_loader: Optional[Callable[[], Dict[str, Any]]] = None,
+        poll_interval_s: float = POLL_INTERVAL_S,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_base_s: float = BACKOFF_BASE_S,
+        backoff_max_s: float = BACKOFF_MAX_S,
+        lease_s: float = LEASE_S,
+        max_workers: int = MAX_WORKERS,
+        timeout_s: float = HTTP_TIMEOUT_S,
+    ):
+        self.repo = repo or get_his_outbox_repository()
+        self.session = session or self._build_session(max_workers)
+        if config_loader is None:
+            from db.repositories.notification_config import get_his_config
+            config_loader = get_his_config
+        self.config_loader = config_loader
+        self.poll_interval_s = poll_interval_s
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.lease_s = lease_s
+        self.timeout_s = timeout_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="his-outbox")
+        self._max_workers = max_workers
+        self._config: Tuple[float, Dict[str, Any]] = (0.0, {})
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"batches": 0, "delivered": 0, "retried": 0, "dead": 0}
+
+    @staticmethod
+    def _build_session(pool_size: int):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # ------------------------------------------------------------------
+    # Configuración de endpoints
+    # ------------------------------------------------------------------
+    def endpoints(self) -> Dict[str, Dict[str, Any]]:
+        """Endpoints habilitados con URL y token (nombre -> configuración), cacheados CONFIG_TTL_S."""
+        loaded_at, endpoints = self._config
+        if time.monotonic() - loaded_at >= CONFIG_TTL_S:
+            config = self.config_loader() or {}
+            usable = config.get("enabled") and config.get("url") and config.get("auth_token")
+            endpoints = {HIS_ENDPOINT: config} if usable else {}
+            self._config = (time.monotonic(), endpoints)
+        return endpoints
+
+    # ------------------------------------------------------------------
+    # Envío
+    # ------------------------------------------------------------------
+    def _post(self, config: Dict[str, Any], messages: List[Dict[str, Any]]):
+        """POST de un lote. Devuelve (status_code, cuerpo_json | None)."""
+        keys = sorted(m["_id"] for m in messages)
+        headers = {
+            "Content-Type": "application/fhir+json",
+            "Idempotency-Key": hashlib.sha256("|".join(keys).encode("utf-8")).hexdigest(),
+        }
+        if config.get("auth_token"):
+            headers["Authorization"] = f"Bearer {config['auth_token']}"
+        response = self.session.post(
+            config["url"],
+            data=json.dumps(build_batch_bundle(messages), default=str),
+            headers=headers,
+            timeout=self.timeout_s,
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def _deliver(self, config: Dict[str, Any], messages: List[Dict[str, Any]]) -> Dict[str, Tuple[str, str]]:
+        """
+        Envía un lote y clasifica cada mensaje: 'ok', 'retry' o 'dead'.
+
+        Returns:
+            Dict[clave] -> (resultado, detalle)
+        """
+        try:
+            status, body = self._post(config, messages)
+        except Exception as e:
+            return {m["_id"]: ("retry", f"{type(e).__name__}: {e}") for m in messages}
+
+        if 200 <= status < 300:
+            entries = (body or {}).get("entry") if isinstance(body, dict) else None
+            if not entries or len(entries) != len(messages):
+                return {m["_id"]: ("ok", f"HTTP {status}") for m in messages}
+            outcome = {}
+            for msg, entry in zip(messages, entries):
+                entry_status = _entry_status(entry)
+                if entry_status is None or 200 <= entry_status < 300:
+                    outcome[msg["_id"]] = ("ok", f"HTTP {entry_status or status}")
+                elif 400 <= entry_status < 500 and entry_status not in RETRYABLE_STATUS:
+                    outcome[msg["_id"]] = ("dead", f"Rechazado por el HIS: HTTP {entry_status}")
+                else:
+                    outcome[msg["_id"]] = ("retry", f"HTTP {entry_status}")
+            return outcome
+
+        if 400 <= status < 500 and status not in RETRYABLE_STATUS:
+            # Rechazo de todo el lote: se aísla el mensaje culpable reenviando uno a uno
+            if len(messages) > 1:
+                outcome = {}
+                for msg in messages:
+                    outcome.update(self._deliver(config, [msg]))
+                return outcome
+            return {messages[0]["_id"]: ("dead", f"Rechazado por el HIS: HTTP {status}")}
+
+        return {m["_id"]: ("retry", f"HTTP {status}") for m in messages}
+
+    def run_once(self) -> int:
+        """
+        Un ciclo del dispatcher: reclama, envía por lotes y registra resultados.
+
+        Returns:
+            Número de mensajes procesados.
+        """
+        endpoints = self.endpoints()
+        if not endpoints:
+            return 0
+
+        batch_size = max(1, min(int(cfg.get("batch_size") or DEFAULT_BATCH_SIZE) for cfg in endpoints.values()))
+        messages = self.repo.claim_batch(list(endpoints), batch_size * self._max_workers, self.lease_s)
+        if not messages:
+            return 0
+
+        # Lotes por endpoint
+        by_endpoint: Dict[str, List[Dict[str, Any]]] = {}
+        for msg in messages:
+            by_endpoint.setdefault(msg["endpoint"], []).append(msg)
+        futures = []
+        for name, msgs in by_endpoint.items():
+            size = max(1, int(endpoints[name].get("batch_size") or DEFAULT_BATCH_SIZE))
+            for i in range(0, len(msgs), size):
+                futures.append(self._executor.submit(self._deliver, endpoints[name], msgs[i:i + size]))
+        self.stats["batches"] += len(futures)
+
+        outcome: Dict[str, Tuple[str, str]] = {}
+        for future in futures:
+            outcome.update(future.result())
+
+        attempts = {m["_id"]: m.get("attempts", 1) for m in messages}
+        delivered = [k for k, (result, _) in outcome.items() if result == "ok"]
+        dead, retries = [], []
+        now = datetime.now()
+        for key, (result, detail) in outcome.items():
+            if result == "dead" or (result == "retry" and attempts[key] >= self.max_attempts):
+                dead.append((key, detail))
+            elif result == "retry":
+                delay = backoff_delay(attempts[key], self.backoff_base_s, self.backoff_max_s)
+                retries.append((key, now + timedelta(seconds=delay), detail))
+
+        self.repo.mark_delivered(delivered)
+        self.repo.reschedule(retries)
+        self.repo.dead_letter(dead)
+        for key, detail in dead:
+            logger.error(f"HIS outbox: mensaje {key} movido a dead-letter ({detail})")
+
+        self.stats["delivered"] += len(delivered)
+        self.stats["retried"] += len(retries)
+        self.stats["dead"] += len(dead)
+        return len(messages)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida del hilo
+    # ------------------------------------------------------------------
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"HIS outbox: error en el dispatcher: {e}")
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval_s)
+                self._wake.clear()
+
+    def wake(self):
+        """Despierta el dispatcher (p. ej. tras encolar) sin esperar al siguiente sondeo."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="his-outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+
+_dispatcher: Optional[HISOutboxDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_his_dispatcher() -> HISOutboxDispatcher:
+    """Arranca (una vez por proceso) el dispatcher del outbox HIS."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = HISOutboxDispatcher()
+        _dispatcher.start()
+        return _dispatcher
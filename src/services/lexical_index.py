@@ -0,0 +1,179 @@
+# path: src/services/lexical_index.py
+# Creado: 2026-10-17
+"""
+Índice léxico BM25 (índice invertido) de la Base de Conocimiento.
+
+Se construye junto a la colección de ChromaDB durante la ingesta y se persiste
+en disco con un fichero JSON por documento fuente (data/rag_lexical/), de modo
+que reindexar un documento solo reescribe su propio fichero. Al cargar se
+reconstruyen en memoria las listas de postings.
+
+Pensado para lo que el embedding denso resuelve mal: nombres de fármacos,
+escalas (Glasgow, NEWS2) y abreviaturas, y para responder consultas cortas de
+palabras clave sin calcular ningún embedding.
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Stopwords mínimas (castellano clínico); el resto de términos cuenta
+STOPWORDS = frozenset("""
+a al algo ante como con contra de del desde donde durante e el ella ellos en entre
+era es esta este esto estos fue ha hay la las le les lo los mas me mi muy no nos o
+otra otro para pero por que se segun si sin sobre su sus tambien te tiene u un una
+uno unos y ya
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokeniza para BM25: minúsculas, sin tildes, alfanumérico.
+    Conserva tokens como 'news2', 'ev', 'sat02' y números (dosis, escalas).
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 con persistencia por documento fuente.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)   # término -> {chunk_id: tf}
+        self.doc_len: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}                       # chunk_id -> términos
+        self.docs: Dict[str, Dict[str, Any]] = {}                       # chunk_id -> {content, metadata}
+        self.by_source: Dict[str, List[str]] = {}
+        self.total_len = 0
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def _source_path(self, source: str) -> str:
+        name = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self):
+        """Carga todos los documentos fuente del directorio y reconstruye los postings."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index_source(data["source"], data["chunks"])
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"Índice léxico: fichero ignorado {name}: {e}")
+
+    def _write_source(self, source: str, chunks: List[Dict[str, Any]]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._source_path(source)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "chunks": chunks}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+    def _index_source(self, source: str, chunks: List[Dict[str, Any]]):
+        with self._lock:
+            self._unindex_source(source)
+            ids = []
+            for chunk in chunks:
+                cid = chunk["id"]
+                tf = chunk.get("tf") or Counter(tokenize(chunk["content"]))
+                for term, count in tf.items():
+                    self.postings[term][cid] = count
+                length = chunk.get("length") or sum(tf.values())
+                self.doc_len[cid] = length
+                self.doc_terms[cid] = list(tf)
+                self.total_len += length
+                self.docs[cid] = {"content": chunk["content"], "metadata": chunk.get("metadata", {})}
+                ids.append(cid)
+            self.by_source[source] = ids
+
+    def _unindex_source(self, source: str):
+        ids = self.by_source.pop(source, [])
+        if not ids:
+            return
+        for cid in ids:
+            for term in self.doc_terms.pop(cid, []):
+                plist = self.postings.get(term)
+                if plist is not None:
+                    plist.pop(cid, None)
+                    if not plist:
+                        del self.postings[term]
+            self.total_len -= self.doc_len.pop(cid, 0)
+            self.docs.pop(cid, None)
+
+    def replace_source(self, source: str, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Sustituye todos los chunks de un documento fuente (memoria + disco)."""
+        chunks = []
+        for cid, text, meta in zip(ids, texts, metadatas):
+            tf = Counter(tokenize(text))
+            chunks.append({"id": cid, "content": text, "metadata": meta, "tf": dict(tf), "length": sum(tf.values())})
+        self._index_source(source, chunks)
+        self._write_source(source, chunks)
+
+    def remove_source(self, source: str):
+        with self._lock:
+            self._unindex_source(source)
+        path = self._source_path(source)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def has_source(self, source: str) -> bool:
+        return source in self.by_source
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Puntúa con BM25 los chunks que contienen algún término de la consulta.
+
+        Returns:
+            List[(chunk_id, score)] ordenada de mayor a menor.
+        """
+        terms = tokenize(query)
+        if not terms or not self.doc_len:
+            return []
+        with self._lock:
+            n_docs = len(self.doc_len)
+            avgdl = self.total_len / n_docs if n_docs else 0.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(terms):
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+                for cid, tf in plist.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[cid] / avgdl) if avgdl else BM25_K1
+                    scores[cid] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda kv: kv[1])
+
+    def get(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        return self.docs.get(chunk_id)
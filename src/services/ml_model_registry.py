@@ -0,0 +1,168 @@
+# path: src/services/ml_model_registry.py
+# Creado: 2026-10-17
+"""
+Registro versionado de modelos ML en disco (data/models/registry).
+
+Estructura por modelo ('demand', 'wait_time'):
+    registry/<modelo>/<versión>/model.joblib   modelo entrenado
+    registry/<modelo>/<versión>/meta.json      métricas de holdout, parámetros, datos
+    registry/<modelo>/ACTIVE                   versión activa
+    registry/<modelo>/history.json             promociones anteriores (para rollback)
+
+Las versiones se escriben en un directorio temporal y se publican con un rename;
+la promoción reescribe ACTIVE con os.replace, así que un lector (de este proceso o
+de otro) ve siempre una versión completa: la anterior o la nueva. Sin versión
+activa se usa el fichero plano anterior (data/models/<modelo>_model.joblib).
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'models')
+REGISTRY_DIR = os.path.join(MODELS_DIR, 'registry')
+MODEL_NAMES = ('demand', 'wait_time')
+HISTORY_SIZE = 20
+
+
+def legacy_model_path(name: str) -> str:
+    return os.path.join(MODELS_DIR, f'{name}_model.joblib')
+
+
+def _write_atomic(path: str, content: str):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def register(self, name: str, model: Any, metrics: Dict[str, Any], params: Dict[str, Any],
+                 training: Dict[str, Any]) -> str:
+        """Guarda una nueva versión (no la activa). Devuelve el identificador de versión."""
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        tmp_dir = tempfile.mkdtemp(dir=model_dir, prefix='.tmp-')
+        try:
+            joblib.dump(model, os.path.join(tmp_dir, 'model.joblib'))
+            meta = {
+                "name": name,
+                "version": version,
+                "created_at": datetime.now().isoformat(timespec='seconds'),
+                "metrics": metrics,
+                "params": params,
+                "training": training,
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp_dir, os.path.join(model_dir, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return version
+
+    def list_versions(self, name: str) -> List[Dict[str, Any]]:
+        """Metadatos de todas las versiones, de la más reciente a la más antigua."""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        active = self.get_active_version(name)
+        versions = []
+        for entry in sorted(os.listdir(model_dir), reverse=True):
+            meta_path = os.path.join(model_dir, entry, 'meta.json')
+            if entry.startswith('.') or not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            meta["active"] = entry == active
+            versions.append(meta)
+        return versions
+
+    def get_meta(self, name: str, version: str) -> Optional[Dict[str, Any]]:
+        meta_path = os.path.join(self._model_dir(name), version, 'meta.json')
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_active_version(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._model_dir(name), 'ACTIVE'), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def active_token(self, name: str) -> Optional[Tuple[str, Any]]:
+        """
+        Identificador barato de la versión servida (un stat): ('registry', versión)
+        o ('legacy', mtime) si solo existe el fichero plano. None si no hay modelo.
+        """
+        version = self.get_active_version(name)
+        if version:
+            return ('registry', version)
+        try:
+            return ('legacy', os.path.getmtime(legacy_model_path(name)))
+        except OSError:
+            return None
+
+    def load(self, name: str, token: Optional[Tuple[str, Any]] = None) -> Tuple[Optional[Tuple[str, Any]], Any]:
+        """Carga el modelo servido (o el de 'token'). Devuelve (token, modelo)."""
+        token = token or self.active_token(name)
+        if token is None:
+            return None, None
+        kind, value = token
+        path = os.path.join(self._model_dir(name), value, 'model.joblib') if kind == 'registry' else legacy_model_path(name)
+        return token, joblib.load(path)
+
+    def _read_history(self, name: str) -> List[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._model_dir(name), 'history.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def promote(self, name: str, version: str, by: str = 'system') -> Optional[str]:
+        """Activa una versión registrada. Devuelve la versión que estaba activa."""
+        if self.get_meta(name, version) is None:
+            raise ValueError(f"Versión desconocida de '{name}': {version}")
+        with self._lock:
+            previous = self.get_active_version(name)
+            if previous == version:
+                return previous
+            model_dir = self._model_dir(name)
+            history = self._read_history(name)
+            history.append({"version": version, "previous": previous, "by": by,
+                            "at": datetime.now().isoformat(timespec='seconds')})
+            _write_atomic(os.path.join(model_dir, 'history.json'), json.dumps(history[-HISTORY_SIZE:], indent=2))
+            _write_atomic(os.path.join(model_dir, 'ACTIVE'), version)
+            return previous
+
+    def rollback(self, name: str, by: str = 'system') -> Optional[str]:
+        """Vuelve a la versión activa antes de la última promoción. Devuelve la versión restaurada."""
+        for entry in reversed(self._read_history(name)):
+            if entry["version"] == self.get_active_version(name) and entry.get("previous"):
+                self.promote(name, entry["previous"], by=by)
+                return entry["previous"]
+        return None
+
+
+_registry: Optional[ModelRegistry] = None
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
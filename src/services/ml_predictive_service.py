@@ -1,19 +1,29 @@
 # path: src/services/ml_predictive_service.py
 # Creado: 2025-11-26
 # Actualizado: 2025-12-02 (Real ML Integration)
+# Actualizado: 2026-10-17 - Predicción vectorizada por rejilla (sala, fecha, hora) con memoización
+# Actualizado: 2026-10-17 - Modelos desde el registro de versiones con recarga en segundo plano
+# Actualizado: 2026-10-17 - predict_wait_time con el simulador de cola
+# Actualizado: 2026-10-17 - detect_anomalies lee las alertas de flujo precalculadas
+# Actualizado: 2026-10-17 - predict_wait_time usa la cola real de la sala y las atenciones en curso
 """
 Servicio de Machine Learning para predicciones y optimizaciones.
 Integra modelos reales (RandomForest) entrenados con Scikit-learn.
 """
 import streamlit as st
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Iterable, Optional
 import pandas as pd
 import numpy as np
-import joblib
-import os
+from services.ml_model_registry import get_model_registry, MODEL_NAMES
 
-MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'models')
+DEMAND_FEATURES = ['hour', 'day_of_week']
+GRID_CACHE_SIZE = 64
+# Cada cuánto se comprueba (un stat por modelo) si ha cambiado la versión activa
+MODEL_CHECK_S = 10.0
 
 class MLPredictiveService:
     """
@@ -23,43 +33,100 @@ class MLPredictiveService:
     
     def __init__(self):
         self.models = {}
+        self.model_versions = {}
+        self._grid_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._grid_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._next_model_check = 0.0
+        self.grid_stats = {"hits": 0, "misses": 0, "predict_calls": 0}
         self.load_models()
     
-    def load_models(self):
-        """Carga los modelos entrenados desde disco."""
-        try:
-            demand_path = os.path.join(MODELS_DIR, 'demand_model.joblib')
-            wait_path = os.path.join(MODELS_DIR, 'wait_time_model.joblib')
-            
-            if os.path.exists(demand_path):
-                self.models['demand'] = joblib.load(demand_path)
-            
-            if os.path.exists(wait_path):
-                self.models['wait_time'] = joblib.load(wait_path)
-                
-            self.models_loaded = bool(self.models)
-        except Exception as e:
-            print(f"Error cargando modelos ML: {e}")
-            self.models_loaded = False
+    def load_models(self, tokens: Optional[Dict[str, Any]] = None):
+        """
+        Carga las versiones activas del registro (o los ficheros planos anteriores).
+        Los modelos nuevos se cargan aparte y se publican de una vez, sustituyendo
+        el diccionario: las predicciones en curso siguen con los anteriores.
+        """
+        registry = get_model_registry()
+        models = dict(self.models)
+        versions = dict(self.model_versions)
+        for name in MODEL_NAMES:
+            token = tokens.get(name) if tokens is not None else registry.active_token(name)
+            if token == versions.get(name) and name in models:
+                continue
+            try:
+                token, model = registry.load(name, token)
+            except Exception as e:
+                print(f"Error cargando modelo ML '{name}': {e}")
+                continue
+            if model is None:
+                models.pop(name, None)
+                versions.pop(name, None)
+            else:
+                models[name] = model
+                versions[name] = token
+        self.models, self.model_versions = models, versions
+        self.models_loaded = bool(models)
+        self._next_model_check = time.monotonic() + MODEL_CHECK_S
 
-    def predict_demand(self, sala_code: str, fecha: date, hora: int) -> Dict[str, Any]:
+    def refresh_models(self, wait: bool = False) -> bool:
         """
-        Predice la demanda esperada para una sala en una fecha/hora específica.
+        Si ha cambiado la versión activa de algún modelo, la carga en un hilo aparte
+        (o en este, con wait=True). Devuelve True si se ha iniciado una recarga.
         """
-        # Preparar features
-        day_of_week = fecha.weekday()
-        
-        # Predicción
-        if 'demand' in self.models:
-            # Input: [[hour, day_of_week]]
-            X = pd.DataFrame([[hora, day_of_week]], columns=['hour', 'day_of_week'])
-            demanda_predicha = self.models['demand'].predict(X)[0]
-            confidence = 0.9 # RandomForest es robusto
+        self._next_model_check = time.monotonic() + MODEL_CHECK_S
+        registry = get_model_registry()
+        tokens = {name: registry.active_token(name) for name in MODEL_NAMES}
+        if all(tokens[n] == self.model_versions.get(n) for n in MODEL_NAMES):
+            return False
+        if not self._reload_lock.acquire(blocking=wait):
+            return False  # ya hay una recarga en curso
+
+        def reload():
+            try:
+                self.load_models(tokens)
+            finally:
+                self._reload_lock.release()
+
+        if wait:
+            reload()
         else:
-            # Fallback a heurística si no hay modelo
-            demanda_predicha = 15 * (1.5 if 10 <= hora <= 14 else 1.0)
-            confidence = 0.5
-            
+            threading.Thread(target=reload, name="ml-model-reload", daemon=True).start()
+        return True
+
+    def _maybe_refresh_models(self):
+        if time.monotonic() >= self._next_model_check:
+            try:
+                self.refresh_models()
+            except Exception as e:
+                print(f"Error comprobando versiones de modelos ML: {e}")
+
+    def _demand_model_version(self) -> Optional[Any]:
+        """
+        Versión servida del modelo de demanda (versión del registro o mtime del
+        fichero plano). Comprueba periódicamente si hay una versión nueva.
+        """
+        self._maybe_refresh_models()
+        return self.model_versions.get('demand')
+
+    def _predict_demand_matrix(self, horas: np.ndarray, dias_semana: np.ndarray) -> np.ndarray:
+        """
+        Demanda (sin redondear) para vectores paralelos de hora y día de la semana,
+        con una única llamada a predict del modelo.
+        """
+        model = self.models.get('demand')
+        if model is not None:
+            X = np.column_stack([horas, dias_semana])
+            self.grid_stats["predict_calls"] += 1
+            return np.asarray(model.predict(pd.DataFrame(X, columns=DEMAND_FEATURES)), dtype=float)
+        # Fallback a heurística si no hay modelo
+        return 15 * np.where((horas >= 10) & (horas <= 14), 1.5, 1.0)
+
+    def _demand_summary(self, demanda_predicha: float, hora: int, day_of_week: int) -> Dict[str, Any]:
+        """Estructura de respuesta de predict_demand a partir de la demanda prevista."""
+        demanda_predicha = float(demanda_predicha)
+        confidence = 0.9 if 'demand' in self.models else 0.5  # RandomForest es robusto
+
         # Calcular intervalo de confianza simple
         margen_error = demanda_predicha * 0.2
         
@@ -74,11 +141,112 @@ class MLPredictiveService:
                 'modelo_usado': 'RandomForest' if 'demand' in self.models else 'Heurístico'
             }
         }
+
+    def predict_demand(self, sala_code: str, fecha: date, hora: int) -> Dict[str, Any]:
+        """
+        Predice la demanda esperada para una sala en una fecha/hora específica.
+        """
+        day_of_week = fecha.weekday()
+        demanda = self._predict_demand_matrix(np.array([hora]), np.array([day_of_week]))
+        return self._demand_summary(demanda[0], hora, day_of_week)
+
+    def predict_demand_day(self, sala_code: str, fecha: date) -> List[Dict[str, Any]]:
+        """
+        Predicción de las 24 horas de un día (misma estructura que predict_demand por hora)
+        con una única inferencia.
+        """
+        day_of_week = fecha.weekday()
+        demandas = self.predict_demand_grid([sala_code], fecha, fecha, range(24))[0, 0]
+        return [self._demand_summary(demanda, hora, day_of_week) for hora, demanda in enumerate(demandas)]
+
+    def predict_demand_grid(
+        self,
+        salas: Iterable[str],
+        fecha_inicio: date,
+        fecha_fin: Optional[date] = None,
+        horas: Iterable[int] = range(24)
+    ) -> np.ndarray:
+        """
+        Predice la demanda para toda una rejilla (sala × fecha × hora) con una sola
+        inferencia vectorizada.
+
+        El modelo solo depende de (hora, día de la semana), así que se predicen las
+        combinaciones únicas (como mucho 7 × 24 filas) y se expanden a la rejilla.
+        El resultado se memoiza por (mtime del modelo, rejilla).
+
+        Args:
+            salas: Códigos de sala (primer eje).
+            fecha_inicio: Primera fecha (incluida).
+            fecha_fin: Última fecha (incluida); por defecto igual a fecha_inicio.
+            horas: Horas del día (último eje).
+
+        Returns:
+            np.ndarray de solo lectura con forma (len(salas), n_fechas, len(horas)),
+            demanda sin redondear.
+        """
+        salas = tuple(salas)
+        horas = tuple(int(h) for h in horas)
+        fecha_fin = fecha_fin or fecha_inicio
+        n_dias = (fecha_fin - fecha_inicio).days + 1
+        if n_dias <= 0:
+            raise ValueError("fecha_fin debe ser igual o posterior a fecha_inicio")
+
+        key = (self._demand_model_version(), salas, fecha_inicio, n_dias, horas)
+        with self._grid_lock:
+            cached = self._grid_cache.get(key)
+            if cached is not None:
+                self._grid_cache.move_to_end(key)
+                self.grid_stats["hits"] += 1
+                return cached
+        self.grid_stats["misses"] += 1
+
+        # Días de la semana de cada fecha y combinaciones únicas (hora, día)
+        dias_semana = (fecha_inicio.weekday() + np.arange(n_dias)) % 7
+        horas_arr = np.asarray(horas, dtype=int)
+        dias_unicos, dia_idx = np.unique(dias_semana, return_inverse=True)
+        hh, dd = np.meshgrid(horas_arr, dias_unicos)
+        por_dia = self._predict_demand_matrix(hh.ravel(), dd.ravel()).reshape(len(dias_unicos), len(horas))
+
+        # Las salas comparten patrón (el modelo no distingue sala): se difunde sin copiar
+        grid = np.broadcast_to(por_dia[dia_idx], (len(salas), n_dias, len(horas)))
+        grid.setflags(write=False)
+
+        with self._grid_lock:
+            self._grid_cache[key] = grid
+            while len(self._grid_cache) > GRID_CACHE_SIZE:
+                self._grid_cache.popitem(last=False)
+        return grid
     
-    def predict_wait_time(self, sala_code: str, pacientes_actuales: int) -> Dict[str, Any]:
+    def predict_wait_time(self, sala_code: str, pacientes_actuales: int, vista: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
-        Predice el tiempo de espera basado en pacientes actuales.
+        Predice la espera de un paciente que llega ahora a 'sala_code' con
+        'pacientes_actuales' por delante, con el simulador de cola: se usan los
+        pacientes reales de la sala (completados con pacientes de nivel III si
+        el escenario pide más), las atenciones en curso de los boxes, los médicos
+        del cuadrante y las duraciones reales de atención.
+        'vista' permite reutilizar la vista de ocupación entre varias llamadas.
+        Si la simulación falla se usa el modelo de espera.
         """
+        try:
+            from services.wait_time_service import estimate_room_waits
+            _, estimacion = estimate_room_waits(sala_code, pacientes_actuales, vista=vista)
+            tiempo_predicho = estimacion.new_patient['p50']
+            return {
+                'tiempo_predicho_min': round(tiempo_predicho),
+                'tiempo_p10_min': round(estimacion.new_patient['p10']),
+                'tiempo_p90_min': round(estimacion.new_patient['p90']),
+                'pacientes_en_espera': pacientes_actuales,
+                'tiempo_por_paciente': round(tiempo_predicho / max(1, pacientes_actuales), 1),
+                'nivel_carga': self._get_load_level(pacientes_actuales),
+                'medicos': estimacion.servers,
+                'modelo_usado': 'Simulación'
+            }
+        except Exception as e:
+            print(f"Error en la simulación de espera: {e}")
+            return self._predict_wait_time_model(pacientes_actuales)
+
+    def _predict_wait_time_model(self, pacientes_actuales: int) -> Dict[str, Any]:
+        """Estimación de respaldo: modelo de espera (o heurística) escalado por la cola."""
         # Estimamos la hora actual y día para el contexto
         now = datetime.now()
         hour = now.hour
@@ -87,13 +255,15 @@ class MLPredictiveService:
         # Asumimos un nivel de triaje promedio (3) para la predicción general
         avg_triage = 3
         
-        if 'wait_time' in self.models:
+        self._maybe_refresh_models()
+        wait_model = self.models.get('wait_time')
+        if wait_model is not None:
             # Input: [[hour, day_of_week, triage_level]]
             # Nota: El modelo fue entrenado prediciendo el tiempo INDIVIDUAL.
             # Para la cola, sumamos o promediamos? 
             # Simplificación: El modelo predice tiempo de espera para un paciente nuevo llegando AHORA.
             X = pd.DataFrame([[hour, day_of_week, avg_triage]], columns=['hour', 'day_of_week', 'triage_level'])
-            tiempo_base = self.models['wait_time'].predict(X)[0]
+            tiempo_base = wait_model.predict(X)[0]
             
             # Ajuste por cola actual (Factor de corrección lineal)
             factor_cola = 1 + (pacientes_actuales * 0.1)
@@ -107,19 +277,41 @@ class MLPredictiveService:
             'pacientes_en_espera': pacientes_actuales,
             'tiempo_por_paciente': round(tiempo_predicho / max(1, pacientes_actuales), 1),
             'nivel_carga': self._get_load_level(pacientes_actuales),
-            'modelo_usado': 'RandomForest' if 'wait_time' in self.models else 'Heurístico'
+            'modelo_usado': 'RandomForest' if wait_model is not None else 'Heurístico'
         }
     
     def recommend_staffing(self, sala_code: str, fecha: date) -> Dict[str, Any]:
         """
         Recomienda el staffing óptimo para una sala en una fecha.
         """
-        # Predecir demanda para diferentes horas del día
-        demandas_dia = []
-        for hora in range(24):
-            pred = self.predict_demand(sala_code, fecha, hora)
-            demandas_dia.append(pred['demanda_predicha'])
-        
+        return self.recommend_staffing_range([sala_code], fecha, fecha)[(sala_code, fecha)]
+
+    def recommend_staffing_range(
+        self,
+        salas: Iterable[str],
+        fecha_inicio: date,
+        fecha_fin: Optional[date] = None
+    ) -> Dict[Tuple[str, date], Dict[str, Any]]:
+        """
+        Recomendaciones de staffing para varias salas y días a partir de una única
+        predicción de rejilla.
+
+        Returns:
+            Dict[(sala, fecha)] -> recomendación (misma estructura que recommend_staffing).
+        """
+        salas = list(salas)
+        fecha_fin = fecha_fin or fecha_inicio
+        grid = np.rint(self.predict_demand_grid(salas, fecha_inicio, fecha_fin, range(24)))
+
+        recomendaciones = {}
+        for i, sala in enumerate(salas):
+            for d in range(grid.shape[1]):
+                fecha = fecha_inicio + timedelta(days=d)
+                recomendaciones[(sala, fecha)] = self._staffing_from_demand([int(v) for v in grid[i, d]])
+        return recomendaciones
+
+    def _staffing_from_demand(self, demandas_dia: List[int]) -> Dict[str, Any]:
+        """Recomendación de staffing a partir de la demanda horaria (24 valores) de un día."""
         # Calcular picos de demanda
         demanda_max = max(demandas_dia)
         demanda_promedio = np.mean(demandas_dia)
@@ -144,33 +336,23 @@ class MLPredictiveService:
     
     def detect_anomalies(self, sala_code: str, dias_historico: int = 30) -> List[Dict[str, Any]]:
         """
-        Detecta anomalías comparando histórico real vs predicción del modelo.
+        Anomalías de flujo (llegadas/salidas por hora) ya detectadas para la sala
+        por services.anomaly_detection_service. No calcula nada: lee las alertas.
         """
-        anomalies = []
-        # Nota: Esto requeriría leer datos reales de DB para comparar.
-        # Por ahora mantenemos la simulación para esta función específica 
-        # hasta tener un pipeline de detección de anomalías real.
-        
-        for i in range(dias_historico):
-            fecha = date.today() - timedelta(days=i)
-            # Usamos el modelo para obtener la "esperada"
-            pred = self.predict_demand(sala_code, fecha, 12) # Mediodía como referencia
-            demanda_esperada = pred['demanda_predicha']
-            
-            # Simulamos un dato "real" para el ejemplo (en prod leeríamos de DB)
-            demanda_real = np.random.normal(demanda_esperada, 3)
-            
-            if abs(demanda_real - demanda_esperada) > 10:
-                anomalies.append({
-                    'fecha': fecha,
-                    'tipo': 'pico_inusual' if demanda_real > demanda_esperada else 'baja_inusual',
-                    'demanda_esperada': round(demanda_esperada),
-                    'demanda_real': round(demanda_real),
-                    'desviacion': round(abs(demanda_real - demanda_esperada)),
-                    'severidad': 'alta' if abs(demanda_real - demanda_esperada) > 15 else 'media'
-                })
-        
-        return sorted(anomalies, key=lambda x: x['fecha'], reverse=True)[:10]
+        from services.anomaly_detection_service import get_recent_anomalies
+        return [
+            {
+                'fecha': a['hour'],
+                'metrica': a['metric'],
+                'tipo': a['tipo'],
+                'demanda_esperada': round(a['expected']),
+                'demanda_real': a['value'],
+                'desviacion': round(abs(a['value'] - a['expected'])),
+                'puntuacion': a['score'],
+                'severidad': a['severidad']
+            }
+            for a in get_recent_anomalies(sala_code, dias_historico)
+        ]
     
     def optimize_room_assignment(self, pacientes: List[Dict], salas: List[Dict]) -> Dict[str, List[str]]:
         """
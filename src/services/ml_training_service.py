@@ -1,118 +1,279 @@
+# path: src/services/ml_training_service.py
+# Actualizado: 2026-10-17 - Entrenamiento fuera de proceso, lectura por bloques, n_jobs y registro de versiones
+# Actualizado: 2026-10-17 - Latido en segundo plano mientras dura el trabajo
+# Actualizado: 2026-10-17 - El proceso de entrenamiento se lanza desde la raíz del proyecto
+"""
+Entrenamiento de los modelos predictivos (demanda y tiempo de espera).
+
+- start_training_job() lanza el entrenamiento en un proceso aparte
+  (python -m services.ml_training_service --job <id>) y devuelve el id del trabajo.
+  El proceso arranca en la raíz del proyecto (src en PYTHONPATH) para que
+  encuentre .streamlit/secrets.toml y .env igual que la aplicación;
+  el progreso queda en 'ml_training_jobs' para que la interfaz lo consulte.
+  Un hilo renueva el latido del trabajo cada HEARTBEAT_INTERVAL, así que un
+  ajuste largo sin progreso no se toma por un trabajo muerto.
+- Los registros se leen con un cursor proyectado, por bloques, y se reducen a
+  columnas numéricas (sin materializar los documentos completos).
+- Los bosques se ajustan en paralelo (n_jobs) y se evalúan sobre un holdout.
+- Cada modelo se guarda como nueva versión en el registro (ml_model_registry) y
+  se promociona si no empeora el MAE de holdout de la versión activa.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
-import joblib
-import os
-from datetime import datetime
+from sklearn.metrics import mean_absolute_error, r2_score
+
 from db.connection import get_database
+from services.ml_model_registry import get_model_registry, REGISTRY_DIR
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(SRC_DIR)
+
+TRAINING_PROJECTION = {
+    "timestamp": 1,
+    "arrival_time": 1,
+    "triage_level": 1,
+    "triage_result.final_priority": 1,
+    "wait_time_minutes": 1,
+    "_id": 0
+}
+CHUNK_SIZE = 20_000
+N_ESTIMATORS = 100
+HOLDOUT_FRACTION = 0.2
+MIN_HOLDOUT_ROWS = 20
+DEMAND_FEATURES = ['hour', 'day_of_week']
+WAIT_FEATURES = ['hour', 'day_of_week', 'triage_level']
+
+ProgressCallback = Callable[[float, str], None]
+
+
+def _print_progress(progress: float, stage: str):
+    print(f"[{progress:5.0%}] {stage}")
 
-MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'models')
 
 class MLTrainingService:
-    def __init__(self):
+    def __init__(self, n_jobs: int = -1, n_estimators: int = N_ESTIMATORS, chunk_size: int = CHUNK_SIZE):
         self.db = get_database()
-        if not os.path.exists(MODELS_DIR):
-            os.makedirs(MODELS_DIR)
-            
-    def fetch_training_data(self):
-        """Obtiene datos de entrenamiento de MongoDB."""
-        # Obtener todos los registros completados (sintéticos y reales)
-        # Se busca tanto 'timestamp' como 'arrival_time' para compatibilidad
-        cursor = self.db.triage_records.find(
-            {"status": "completed"},
-            {
-                "timestamp": 1, 
-                "arrival_time": 1, 
-                "triage_level": 1, 
-                "triage_result.final_priority": 1,
-                "wait_time_minutes": 1, 
-                "_id": 0
-            }
-        )
-        data = list(cursor)
-        df = pd.DataFrame(data)
-        
-        if not df.empty:
-            # Normalizar columnas
-            # 1. Fecha: Usar timestamp si existe, sino arrival_time
-            if 'timestamp' in df.columns:
-                df['arrival_time'] = df['timestamp'].fillna(df.get('arrival_time'))
-            
-            # 2. Nivel: Usar triage_result.final_priority si existe, sino triage_level
-            if 'triage_result' in df.columns:
-                # Extraer final_priority de triage_result (puede ser dict o NaN)
-                def extract_priority(x):
-                    if isinstance(x, dict):
-                        return x.get('final_priority')
-                    return x
-                
-                df['real_priority'] = df['triage_result'].apply(extract_priority)
-                df['triage_level'] = df['real_priority'].fillna(df.get('triage_level'))
-                
-        return df
-        
-    def train_demand_model(self, df):
-        """Entrena modelo de predicción de demanda."""
-        print("Entrenando modelo de demanda...")
-        
+        self.n_jobs = n_jobs
+        self.n_estimators = n_estimators
+        self.chunk_size = chunk_size
+        self.registry = get_model_registry()
+
+    @staticmethod
+    def _normalize(docs: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Reduce un bloque de documentos a las columnas de entrenamiento:
+        fecha (timestamp o, si falta, arrival_time), nivel (triage_result.final_priority
+        o, si falta, triage_level) y minutos de espera.
+        """
+        arrival, level, wait = [], [], []
+        for doc in docs:
+            ts = doc.get('timestamp')
+            arrival.append(ts if ts is not None else doc.get('arrival_time'))
+            result = doc.get('triage_result')
+            priority = result.get('final_priority') if isinstance(result, dict) else None
+            level.append(priority if priority is not None else doc.get('triage_level'))
+            wait.append(doc.get('wait_time_minutes'))
+        return pd.DataFrame({
+            'arrival_time': pd.to_datetime(pd.Series(arrival, dtype=object), errors='coerce'),
+            'triage_level': pd.to_numeric(pd.Series(level, dtype=object), errors='coerce'),
+            'wait_time_minutes': pd.to_numeric(pd.Series(wait, dtype=object), errors='coerce'),
+        })
+
+    def iter_training_chunks(self) -> Iterator[pd.DataFrame]:
+        """Registros completados (sintéticos y reales), por bloques de chunk_size."""
+        cursor = self.db.triage_records.find({"status": "completed"}, TRAINING_PROJECTION).batch_size(self.chunk_size)
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.chunk_size:
+                yield self._normalize(batch)
+                batch = []
+        if batch:
+            yield self._normalize(batch)
+
+    def fetch_training_data(self, progress: ProgressCallback = _print_progress) -> pd.DataFrame:
+        """Obtiene los datos de entrenamiento de MongoDB (columnas normalizadas)."""
+        total = self.db.triage_records.count_documents({"status": "completed"})
+        chunks, read = [], 0
+        for chunk in self.iter_training_chunks():
+            chunks.append(chunk)
+            read += len(chunk)
+            progress(0.4 * read / max(total, 1), f"Leyendo registros ({read:,}/{total:,})")
+        if not chunks:
+            return pd.DataFrame(columns=['arrival_time', 'triage_level', 'wait_time_minutes'])
+        return pd.concat(chunks, ignore_index=True)
+
+    def _fit(self, X: pd.DataFrame, y: pd.Series):
+        """Ajusta el bosque (n_jobs en paralelo) y lo evalúa sobre un holdout."""
+        params = {"n_estimators": self.n_estimators, "random_state": 42, "n_jobs": self.n_jobs}
+        metrics: Dict[str, Any] = {"rows": int(len(X))}
+        if len(X) >= MIN_HOLDOUT_ROWS:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=HOLDOUT_FRACTION, random_state=42)
+        else:
+            X_train, X_test, y_train, y_test = X, None, y, None
+
+        model = RandomForestRegressor(**params)
+        model.fit(X_train, y_train)
+
+        if X_test is not None:
+            predicted = model.predict(X_test)
+            metrics.update(
+                holdout_rows=int(len(X_test)),
+                mae=float(mean_absolute_error(y_test, predicted)),
+                r2=float(r2_score(y_test, predicted)),
+                # Referencia: predecir siempre la media de entrenamiento
+                baseline_mae=float(mean_absolute_error(y_test, np.full(len(y_test), y_train.mean()))),
+            )
+        return model, metrics, params
+
+    def train_demand_model(self, df: pd.DataFrame):
+        """Entrena modelo de predicción de demanda. Devuelve (modelo, métricas, parámetros)."""
+        df = df.dropna(subset=['arrival_time'])
         # Feature Engineering: Agrupar por hora y día
-        df['hour'] = pd.to_datetime(df['arrival_time']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['arrival_time']).dt.dayofweek
-        df['date'] = pd.to_datetime(df['arrival_time']).dt.date
-        
-        # Contar pacientes por hora
-        demand_df = df.groupby(['date', 'hour', 'day_of_week']).size().reset_index(name='patient_count')
-        
-        X = demand_df[['hour', 'day_of_week']]
+        arrival = df['arrival_time'].dt
+        demand_df = pd.DataFrame({
+            'date': arrival.date, 'hour': arrival.hour, 'day_of_week': arrival.dayofweek
+        }).groupby(['date', 'hour', 'day_of_week']).size().reset_index(name='patient_count')
+
+        X = demand_df[DEMAND_FEATURES]
         y = demand_df['patient_count']
-        
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X, y)
-        
-        # Guardar modelo
-        joblib.dump(model, os.path.join(MODELS_DIR, 'demand_model.joblib'))
-        print("Modelo de demanda guardado.")
-        return model
-        
-    def train_wait_time_model(self, df):
-        """Entrena modelo de predicción de tiempo de espera."""
-        print("Entrenando modelo de tiempo de espera...")
-        
-        # Feature Engineering
-        df['hour'] = pd.to_datetime(df['arrival_time']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['arrival_time']).dt.dayofweek
-        
+        return self._fit(X, y)
+
+    def train_wait_time_model(self, df: pd.DataFrame):
+        """Entrena modelo de predicción de tiempo de espera. Devuelve (modelo, métricas, parámetros)."""
         # Variables predictoras: Hora, Día, Nivel de Triaje
-        X = df[['hour', 'day_of_week', 'triage_level']]
+        arrival = df['arrival_time'].dt
+        X = pd.DataFrame({
+            'hour': arrival.hour, 'day_of_week': arrival.dayofweek, 'triage_level': df['triage_level']
+        })[WAIT_FEATURES]
         y = df['wait_time_minutes']
-        
+
         # Limpiar datos faltantes si los hay
-        X = X.fillna(0)
-        y = y.fillna(0)
-        
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X, y)
-        
-        # Guardar modelo
-        joblib.dump(model, os.path.join(MODELS_DIR, 'wait_time_model.joblib'))
-        print("Modelo de tiempo de espera guardado.")
-        return model
-
-    def train_all(self):
-        """Ejecuta el pipeline completo de entrenamiento."""
-        df = self.fetch_training_data()
-        
+        return self._fit(X.fillna(0), y.fillna(0))
+
+    def _should_promote(self, name: str, metrics: Dict[str, Any]) -> bool:
+        """Promociona si no hay versión activa o si el MAE de holdout no empeora."""
+        active = self.registry.get_active_version(name)
+        if not active:
+            return True
+        active_mae = ((self.registry.get_meta(name, active) or {}).get("metrics") or {}).get("mae")
+        new_mae = metrics.get("mae")
+        if active_mae is None or new_mae is None:
+            return new_mae is not None or active_mae is None
+        return new_mae <= active_mae
+
+    def train_all(self, progress: ProgressCallback = _print_progress, promote: str = "auto",
+                  job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecuta el pipeline completo de entrenamiento.
+        promote: 'auto' (si no empeora el holdout), 'always' o 'never'.
+        """
+        df = self.fetch_training_data(progress)
+
         if df.empty:
             return {"status": "error", "msg": "No hay datos suficientes para entrenar."}
-            
-        self.train_demand_model(df)
-        self.train_wait_time_model(df)
-        
-        return {"status": "success", "msg": f"Modelos entrenados con {len(df)} registros."}
+
+        training = {
+            "records": int(len(df)),
+            "from": df['arrival_time'].min(),
+            "to": df['arrival_time'].max(),
+            "job_id": job_id,
+        }
+        trainers = [("demand", "Entrenando modelo de demanda...", self.train_demand_model),
+                    ("wait_time", "Entrenando modelo de tiempo de espera...", self.train_wait_time_model)]
+        versions = {}
+        for i, (name, stage, train) in enumerate(trainers):
+            progress(0.4 + 0.55 * i / len(trainers), stage)
+            model, metrics, params = train(df)
+            version = self.registry.register(name, model, metrics, params, training)
+            promoted = promote == "always" or (promote == "auto" and self._should_promote(name, metrics))
+            if promoted:
+                self.registry.promote(name, version, by=f"job:{job_id}" if job_id else "system")
+            versions[name] = {"version": version, "promoted": promoted, "metrics": metrics}
+        progress(1.0, "Modelos registrados")
+
+        promoted = [name for name, v in versions.items() if v["promoted"]]
+        msg = f"Modelos entrenados con {len(df)} registros."
+        if len(promoted) < len(versions):
+            msg += " Versiones no promocionadas (peor holdout): " + ", ".join(n for n in versions if n not in promoted) + "."
+        return {"status": "success", "msg": msg, "versions": versions}
+
+
+def run_training_job(job_id: str, n_jobs: int = -1) -> Dict[str, Any]:
+    """Ejecuta un trabajo registrado en 'ml_training_jobs' informando del progreso."""
+    from db.repositories.ml_training_jobs import get_ml_training_jobs_repository, HEARTBEAT_INTERVAL
+    jobs = get_ml_training_jobs_repository()
+    jobs.update_progress(job_id, 0.0, "Iniciando")
+
+    stop = threading.Event()
+
+    def _heartbeat():
+        while not stop.wait(HEARTBEAT_INTERVAL.total_seconds()):
+            try:
+                jobs.heartbeat(job_id)
+            except Exception as e:
+                print(f"Error renovando el latido del trabajo {job_id}: {e}")
+
+    beat = threading.Thread(target=_heartbeat, name=f"ml-job-heartbeat-{job_id}", daemon=True)
+    beat.start()
+    try:
+        result = MLTrainingService(n_jobs=n_jobs).train_all(
+            progress=lambda p, stage: jobs.update_progress(job_id, p, stage), job_id=job_id
+        )
+    except Exception as e:
+        jobs.finish(job_id, "error", {"status": "error", "msg": str(e)})
+        raise
+    finally:
+        stop.set()
+        beat.join()
+    jobs.finish(job_id, "success" if result.get("status") == "success" else "error", result)
+    return result
+
+
+def start_training_job(requested_by: str = "system", n_jobs: int = -1) -> str:
+    """
+    Lanza el entrenamiento en un proceso aparte y devuelve el id del trabajo.
+    Si ya hay un trabajo en curso se devuelve ese en lugar de lanzar otro.
+    """
+    from db.repositories.ml_training_jobs import get_ml_training_jobs_repository
+    jobs = get_ml_training_jobs_repository()
+    active = jobs.get_active_job()
+    if active:
+        return str(active["_id"])
+
+    job_id = jobs.create_job(requested_by, {"n_jobs": n_jobs})
+    log_dir = os.path.join(REGISTRY_DIR, 'jobs')
+    os.makedirs(log_dir, exist_ok=True)
+    # Misma raíz que la aplicación (secrets.toml/.env); los módulos se importan desde src
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (SRC_DIR, env.get("PYTHONPATH")) if p)
+    with open(os.path.join(log_dir, f'{job_id}.log'), 'ab') as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "services.ml_training_service", "--job", job_id, "--n-jobs", str(n_jobs)],
+            cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    jobs.set_pid(job_id, process.pid)
+    return job_id
+
 
 if __name__ == "__main__":
-    service = MLTrainingService()
-    result = service.train_all()
-    print(result)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--job", help="Id del trabajo en ml_training_jobs")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if args.job:
+        result = run_training_job(args.job, n_jobs=args.n_jobs)
+    else:
+        result = MLTrainingService(n_jobs=args.n_jobs).train_all()
+    print({k: v for k, v in result.items() if k != "versions"})
@@ -1,10 +1,13 @@
 # path: src/services/notification_service.py
 # Creado: 2025-11-25
+# Actualizado: 2026-10-17 - send_clinical_data encola en el outbox HIS en lugar de enviar en línea
+# Actualizado: 2026-10-17 - Envío paralelo por canal, push concurrente y escritura única de estados
 """
 Servicio de notificaciones flexible y modular.
 Soporta múltiples canales: in-app, email, webhook, etc.
 Principios: DRY, Modularidad, Extensibilidad
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Callable
 from enum import Enum
@@ -103,9 +106,8 @@ def create_notification(
         result = collection.insert_one(notification_doc)
         notification_id = str(result.inserted_id)
         
-        # Procesar envío por cada canal
-        for channel in channels:
-            _send_via_channel(channel, notification_doc, notification_id)
+        # Envío por todos los canales en paralelo y una única escritura de resultados
+        _deliver_channels(channels, notification_doc, result.inserted_id)
         
         return notification_id
     except Exception as e:
@@ -113,49 +115,76 @@ def create_notification(
         return None
 
 
+# Canales con envío externo y el campo de sent_status que actualizan
+_EXTERNAL_CHANNELS = {
+    NotificationChannel.EMAIL: "email",
+    NotificationChannel.WEBHOOK: "webhook",
+    NotificationChannel.PUSH: "push",
+}
+_channel_pool = ThreadPoolExecutor(max_workers=len(_EXTERNAL_CHANNELS), thread_name_prefix="notif-channel")
+
+
 def _send_via_channel(
     channel: NotificationChannel,
-    notification: Dict[str, Any],
-    notification_id: str
-):
+    notification: Dict[str, Any]
+) -> Dict[str, Any]:
     """
     Envía notificación por un canal específico.
     
     Args:
         channel: Canal de envío
         notification: Documento de notificación
-        notification_id: ID de la notificación
-    """
-    db = get_database()
-    collection = db["notifications"]
     
+    Returns:
+        Dict con 'success' y, si aplica, detalle de la entrega
+    """
     try:
         if channel == NotificationChannel.EMAIL:
-            success = _send_email(notification)
-            collection.update_one(
-                {"_id": notification_id},
-                {"$set": {"sent_status.email": success}}
-            )
+            return {"success": _send_email(notification)}
         
         elif channel == NotificationChannel.WEBHOOK:
-            success = _send_webhook(notification)
-            collection.update_one(
-                {"_id": notification_id},
-                {"$set": {"sent_status.webhook": success}}
-            )
+            return {"success": _send_webhook(notification)}
 
         elif channel == NotificationChannel.PUSH:
-            success = _send_push(notification)
-            collection.update_one(
-                {"_id": notification_id},
-                {"$set": {"sent_status.push": success}}
-            )
+            stats = _send_push_detailed(notification)
+            return {"success": stats.get("sent", 0) > 0, "detail": stats}
         
         # IN_APP y LOG no requieren envío externo
+        return {"success": True}
         
     except Exception as e:
         # Log error pero no fallar
         logger.error(f"Error sending via {channel.value}: {e}")
+        return {"success": False}
+
+
+def _deliver_channels(
+    channels: List[NotificationChannel],
+    notification: Dict[str, Any],
+    notification_id: Any
+) -> Dict[str, Any]:
+    """
+    Envía por todos los canales externos en paralelo y escribe los resultados
+    de todos ellos en un único update.
+    
+    Returns:
+        Dict canal -> resultado
+    """
+    pending = {
+        _EXTERNAL_CHANNELS[channel]: _channel_pool.submit(_send_via_channel, channel, notification)
+        for channel in channels if channel in _EXTERNAL_CHANNELS
+    }
+    if not pending:
+        return {}
+    
+    results = {name: future.result() for name, future in pending.items()}
+    updates = {f"sent_status.{name}": r["success"] for name, r in results.items()}
+    updates.update({f"delivery.{name}": r["detail"] for name, r in results.items() if "detail" in r})
+    try:
+        get_database()["notifications"].update_one({"_id": notification_id}, {"$set": updates})
+    except Exception as e:
+        logger.error(f"Error guardando estado de envío de la notificación: {e}")
+    return results
 
 
 def _send_email(notification: Dict[str, Any]) -> bool:
@@ -431,71 +460,58 @@ def _send_push(notification: Dict[str, Any]) -> bool:
     Returns:
         bool: True si al menos un envío fue exitoso
     """
-    import json
-    from pywebpush import webpush, WebPushException
+    return _send_push_detailed(notification).get("sent", 0) > 0
+
+
+def _send_push_detailed(notification: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Envío Web Push a todos los destinatarios:
+    1. Suscripciones de todos los destinatarios en una consulta ($in).
+    2. Envíos concurrentes en el pool acotado del motor de push.
+    3. Poda masiva de las suscripciones caducadas (404/410).
+    
+    Returns:
+        Dict con contadores: sent, failed, expired
+    """
     from db.repositories.people import get_people_repository
     from db.repositories.notification_config import get_vapid_config
+    from services.push_delivery import get_push_engine
     
     # Obtener claves VAPID de configuración centralizada
     vapid_config = get_vapid_config()
     private_key = vapid_config.get("private_key")
-    # public_key = vapid_config.get("public_key") # Not strictly needed for sending
     subject = vapid_config.get("subject")
     
     if not private_key:
         logger.error("❌ VAPID keys not configured in _send_push")
-        return False
+        return {"sent": 0, "failed": 0, "expired": 0}
 
     repo = get_people_repository()
-    success_count = 0
+    recipients = notification.get('recipients', [])
+    subscriptions = repo.get_push_subscriptions(recipients)
+    
+    targets = [(user_id, sub) for user_id in recipients for sub in subscriptions.get(user_id, [])]
+    missing = [user_id for user_id in recipients if not subscriptions.get(user_id)]
+    if missing:
+        logger.warning(f"⚠️ {len(missing)} destinatario(s) sin suscripciones push")
+    
+    payload = {
+        "title": notification['title'],
+        "body": notification['message'],
+        "icon": "/static/icons/icon-192x192.png",
+        "badge": "/static/icons/badge.png",
+        "url": notification.get('action_url') or '/'
+    }
     
-    print(f"🚀 Iniciando envío push a {len(notification.get('recipients', []))} destinatarios")
+    result = get_push_engine().deliver(targets, payload, private_key, {"sub": subject})
     
-    for user_id in notification.get('recipients', []):
-        # Buscar usuario y sus suscripciones
-        user = repo.get_by_id(user_id)
-        if not user:
-            logger.warning(f"⚠️ Usuario {user_id} no encontrado")
-            continue
-            
-        subs = user.get('push_subscriptions', [])
-        if not subs:
-            print(f"⚠️ Usuario {user_id} no tiene suscripciones push")
-            continue
-            
-        print(f"Found {len(subs)} subscriptions for user {user_id}")
-            
-        payload = {
-            "title": notification['title'],
-            "body": notification['message'],
-            "icon": "/static/icons/icon-192x192.png",
-            "badge": "/static/icons/badge.png",
-            "url": notification.get('action_url', '/')
-        }
-        
-        # Iterar sobre suscripciones del usuario (puede tener varios dispositivos)
-        # Copia para iterar y poder borrar si fallan (410 Gone)
-        for i, sub in enumerate(subs[:]):
-            try:
-                print(f"Sending to sub {i+1}/{len(subs)}...")
-                webpush(
-                    subscription_info=sub,
-                    data=json.dumps(payload),
-                    vapid_private_key=private_key,
-                    vapid_claims={"sub": subject}
-                )
-                print(f"✅ Push sent successfully to sub {i+1}")
-                success_count += 1
-            except WebPushException as ex:
-                print(f"❌ WebPush Error: {ex}")
-                # Si el endpoint ya no es válido, eliminar suscripción
-                if ex.response and ex.response.status_code == 410:
-                    print(f"🗑️ Removing stale subscription for user {user_id}")
-                    repo.remove_push_subscription(user_id, sub)
-            except Exception as e:
-                print(f"❌ Error enviando push a {user_id}: {e}")
-
-    return success_count > 0
+    # Si el endpoint ya no es válido (404/410), eliminar suscripciones en bloque
+    if result.expired:
+        repo.remove_push_subscriptions_bulk(result.expired)
+        logger.info(f"🗑️ {result.pruned} suscripción(es) push caducadas eliminadas")
+    
+    logger.info(f"Push: {result.sent} enviados, {result.failed} fallidos de {len(targets)} suscripciones")
+    return result.as_dict()
 
 
 # ---------------------------------------------------------------------------
@@ -617,44 +633,44 @@ def get_unread_count(user_id: str = "admin") -> int:
 # Notificaciones Específicas del Dominio (Helpers)
 # ---------------------------------------------------------------------------
 
-def send_clinical_data(triage_record: Dict[str, Any]) -> str:
+def send_clinical_data(triage_record: Dict[str, Any], idempotency_key: Optional[str] = None) -> str:
     """
-    Envía datos clínicos a un sistema externo (HIS) mediante Webhook FHIR.
+    Envía datos clínicos a un sistema externo (HIS) como Bundle FHIR.
     Phase 12.4 Integration.
     
+    El envío es asíncrono: el Bundle se encola en el outbox 'his_outbox' (una
+    inserción) y el dispatcher en segundo plano lo entrega con lotes, reintentos
+    y dead-letter (ver services/his_outbox_service.py). La lentitud del HIS no
+    añade latencia al guardado del triaje.
+    
     Args:
         triage_record: Diccionario con datos del triaje
+        idempotency_key: Clave de idempotencia (p. ej. audit_id del registro);
+            por defecto se deriva del contenido del registro
         
     Returns:
-        str: ID de la notificación/log creada
+        str: Clave del mensaje en el outbox
     """
     from services.fhir_service import FHIRService
+    from services.his_outbox_service import enqueue_clinical_data, idempotency_key_for
+    
+    key = idempotency_key or idempotency_key_for(triage_record)
     
     # 1. Convertir a FHIR Bundle
     fhir_bundle = FHIRService.create_triage_bundle(triage_record)
     
-    # 2. Preparar el payload
-    payload = fhir_bundle # El bundle ya es un dict
-    
-    # 3. Datos para el log interno
+    # 2. Encolar para el dispatcher (sin E/S de red)
     patient = triage_record.get('datos_paciente', {})
-    title = f"🏥 Envío HIS - {patient.get('nombre', 'Desconocido')}"
-    message = "Envío de datos clínicos FHIR a sistema de terceros."
-    
-    # 4. Crear notificación tipo WEBHOOK
-    # Usamos una categoría nueva o repurposeamos GENERAL con metadata específica
-    return create_notification(
-        title=title,
-        message=message,
-        category=NotificationCategory.system_alert, # O una nueva Clinical_Integration
-        priority=NotificationPriority.LOW,
-        channels=[NotificationChannel.WEBHOOK],
+    enqueue_clinical_data(
+        fhir_bundle,
+        idempotency_key=key,
         metadata={
             "type": "clinical_integration",
-            "fhir_bundle": fhir_bundle,
-            "patient_id": triage_record.get('patient_id')
+            "patient_id": triage_record.get('patient_id'),
+            "patient_name": patient.get('nombre', 'Desconocido')
         }
     )
+    return key
 
 def notify_room_error_detected(
     patient_code: str,
@@ -0,0 +1,222 @@
+# path: src/services/occupancy_service.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Datos personales frescos en movimientos y al editar la persona
+"""
+Servicio de Ocupación en Vivo (Proyección Materializada).
+
+Mantiene la colección 'room_occupancy' sincronizada de forma incremental con los
+eventos de flujo (alta, movimiento y fin de flujo), de modo que la vista global de
+salas se lee en O(salas) sin recorrer 'patient_flow' ni cruzar con 'people'.
+Los datos personales copiados se refrescan al editar la persona (refrescar_persona).
+
+La lectura está memoizada por versión: mientras el contador global no cambie se
+devuelve la vista en memoria con un solo find_one de comprobación.
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from db import get_database
+from db.repositories.room_occupancy import get_room_occupancy_repository
+
+# Memo de proceso: última vista leída y su versión
+_VISTA_CACHE: Dict[str, Any] = {"version": None, "vista": {}}
+
+# Campos de 'people' necesarios para la proyección
+_PERSON_FIELDS = {
+    "patient_code": 1, "nombre": 1, "apellido1": 1, "apellido2": 1,
+    "edad": 1, "motivo_consulta": 1, "nivel_triaje": 1, "nivel_asignado": 1
+}
+
+
+def _nombre_sala(sala_code: str) -> str:
+    """Resuelve el nombre visible de una sala desde la configuración (cacheada)."""
+    try:
+        from ui.config.config_loader import load_centro_config
+        config = load_centro_config()
+        for s in config.get('salas', []):
+            if s.get('codigo') == sala_code:
+                return s.get('nombre', sala_code)
+    except Exception:
+        pass
+    return sala_code
+
+
+def campos_persona(persona: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Campos de la entrada proyectada que proceden de 'people'."""
+    p_info = persona or {}
+    nombre = p_info.get('nombre') or ''
+    apellido1 = p_info.get('apellido1') or ''
+    apellido2 = p_info.get('apellido2') or ''
+    return {
+        "nombre_completo": f"{nombre} {apellido1} {apellido2}".strip(),
+        "nombre": nombre,
+        "apellido1": apellido1,
+        "apellido2": apellido2,
+        "edad": p_info.get("edad"),
+        "motivo_consulta": p_info.get("motivo_consulta", ""),
+        "nivel_triaje": p_info.get("nivel_triaje", p_info.get("nivel_asignado", ""))
+    }
+
+
+def construir_item(flujo: Dict[str, Any], persona: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Construye la entrada proyectada de un paciente a partir de su paso activo
+    y sus datos personales (mismo formato que la vista global de salas).
+    """
+    return {
+        "flow_id": flujo.get("flow_id"),
+        "patient_code": flujo["patient_code"],
+        **campos_persona(persona),
+        "estado_flujo": flujo.get("estado"),
+        "sala_code": flujo.get("sala_code"),
+        "sala_tipo": flujo.get("sala_tipo"),
+        "sala_subtipo": flujo.get("sala_subtipo"),
+        "created_at": flujo.get("created_at"),
+        "entrada": flujo.get("entrada"),
+        "wait_start": flujo.get("entrada"),
+    }
+
+
+def _leer_persona(patient_code: str) -> Optional[Dict[str, Any]]:
+    """Datos personales actuales (la versión activa si hay varias)."""
+    people = get_database()["people"]
+    return (people.find_one({"patient_code": patient_code, "activo": True}, _PERSON_FIELDS)
+            or people.find_one({"patient_code": patient_code}, _PERSON_FIELDS))
+
+
+def _persona_de_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Reconstruye los datos personales mínimos a partir de una entrada proyectada."""
+    return {k: item.get(k) for k in ("nombre", "apellido1", "apellido2", "edad", "motivo_consulta", "nivel_triaje")}
+
+
+# ---------------------------------------------------------------------------
+# Eventos de flujo (escritura incremental)
+# ---------------------------------------------------------------------------
+
+def registrar_entrada(
+    flujo: Dict[str, Any],
+    persona: Optional[Dict[str, Any]] = None,
+    sala_nombre: Optional[str] = None
+) -> bool:
+    """
+    Registra que un paciente ocupa una sala (alta de flujo o movimiento).
+    Si no se aportan los datos personales se leen de 'people' (así un
+    movimiento recoge las ediciones) y, si no está, se reutilizan los ya proyectados.
+
+    Args:
+        flujo: Documento del nuevo paso activo (patient_flow)
+        persona: Datos del paciente (opcional)
+        sala_nombre: Nombre visible de la sala destino (opcional)
+    """
+    try:
+        repo = get_room_occupancy_repository()
+        patient_code = flujo["patient_code"]
+
+        if persona is None:
+            persona = _leer_persona(patient_code)
+        if persona is None:
+            previo = repo.get_patient_item(patient_code)
+            if previo:
+                persona = _persona_de_item(previo)
+
+        sala_code = flujo.get("sala_code")
+        item = construir_item(flujo, persona)
+        return repo.apply_event(patient_code, sala_code, item, sala_nombre or _nombre_sala(sala_code))
+    except Exception as e:
+        print(f"Error actualizando proyección de ocupación (entrada): {e}")
+        return False
+
+
+def refrescar_persona(patient_code: str, persona: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Vuelve a copiar los datos personales en la entrada proyectada del paciente
+    (tras editar la persona). No hace nada si el paciente no ocupa ninguna sala.
+
+    Args:
+        patient_code: Código con el que figura en la proyección
+        persona: Datos nuevos (por defecto, se leen de 'people')
+    """
+    try:
+        persona = persona if persona is not None else _leer_persona(patient_code)
+        if persona is None:
+            return False
+        return get_room_occupancy_repository().update_patient_fields(patient_code, campos_persona(persona))
+    except Exception as e:
+        print(f"Error actualizando proyección de ocupación (persona): {e}")
+        return False
+
+
+def registrar_salida(patient_code: str) -> bool:
+    """Registra que un paciente abandona el sistema (fin de flujo o rechazo)."""
+    try:
+        return get_room_occupancy_repository().apply_event(patient_code)
+    except Exception as e:
+        print(f"Error actualizando proyección de ocupación (salida): {e}")
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Lectura
+# ---------------------------------------------------------------------------
+
+def reconstruir_ocupacion() -> int:
+    """
+    Reconstruye la proyección desde 'patient_flow' (ruta lenta, solo para
+    recuperación o primer arranque).
+
+    Returns:
+        int: Nueva versión global
+    """
+    db = get_database()
+    flujos = list(db["patient_flow"].find({"activo": True}))
+
+    patient_codes = [f["patient_code"] for f in flujos]
+    pacientes_db = db["people"].find({"patient_code": {"$in": patient_codes}}, _PERSON_FIELDS)
+    pacientes_map = {p["patient_code"]: p for p in pacientes_db}
+
+    salas: Dict[str, Dict[str, Any]] = {}
+    for flujo in flujos:
+        sala_code = flujo.get("sala_code")
+        if not sala_code:
+            continue
+        if sala_code not in salas:
+            salas[sala_code] = {"sala_nombre": _nombre_sala(sala_code), "pacientes": []}
+        salas[sala_code]["pacientes"].append(construir_item(flujo, pacientes_map.get(flujo["patient_code"])))
+
+    repo = get_room_occupancy_repository()
+    repo.ensure_indexes()
+    return repo.replace_all(salas)
+
+
+def obtener_version_ocupacion() -> int:
+    """Devuelve la versión actual de la ocupación (0 si aún no existe proyección)."""
+    return get_room_occupancy_repository().get_version() or 0
+
+
+def obtener_ocupacion() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Devuelve la ocupación activa por sala: {sala_code: [pacientes]}.
+    Si la versión no ha cambiado desde la última lectura se devuelve la copia en memoria.
+    """
+    repo = get_room_occupancy_repository()
+    version = repo.get_version()
+
+    if version is None:
+        reconstruir_ocupacion()
+
+    if version is None or version != _VISTA_CACHE["version"]:
+        version, salas = repo.get_snapshot()
+        vista = {}
+        for sala_code, doc in salas.items():
+            pacientes = doc.get("pacientes") or []
+            if not pacientes:
+                continue
+            sala_nombre = doc.get("sala_nombre", sala_code)
+            items = [{**p, "sala_nombre": sala_nombre} for p in pacientes]
+            items.sort(key=lambda p: p.get("entrada") or datetime.min)
+            vista[sala_code] = items
+        _VISTA_CACHE["version"] = version
+        _VISTA_CACHE["vista"] = vista
+
+    # Copia superficial: las vistas añaden campos calculados a cada paciente
+    return {sala: [dict(p) for p in items] for sala, items in _VISTA_CACHE["vista"].items()}
@@ -1,21 +1,33 @@
 # path: src/services/patient_flow_service.py
 # Creado: 2025-11-24
 # Actualizado: 2025-11-25 - Reescribiendo para modelo Log-based (Histórico de Pasos)
+# Actualizado: 2026-10-17 - Vista global servida desde la proyección materializada de ocupación
+# Actualizado: 2026-10-17 - Movimiento transaccional con concurrencia optimista sobre 'secuencia'
+# Actualizado: 2026-10-17 - Envío al HIS a través del outbox asíncrono
+# Actualizado: 2026-10-17 - Lecturas de 'people' sin 'search.prefixes'
+# Actualizado: 2026-10-17 - clear_all_data vacía también la proyección de ocupación
 """
 Servicio para gestión del flujo de pacientes a través del sistema.
 Implementa un modelo de Histórico de Pasos (Log-based):
 - Cada movimiento es un nuevo documento en 'patient_flow'.
 - Se mantiene la trazabilidad completa con 'secuencia', 'entrada', 'salida'.
 - Solo un paso está 'activo=True' por paciente.
+- Cada evento (alta, movimiento, fin) actualiza la proyección 'room_occupancy'
+  (ver services/occupancy_service.py), que es la fuente de las vistas de salas.
 """
 from datetime import datetime
+from collections import defaultdict
 from typing import Optional, Dict, Any, List
+from pymongo import UpdateOne, InsertOne
+from pymongo.errors import BulkWriteError
 
 # Imports internos
-from db import get_database
+from db import get_database, run_in_transaction
 from db.models import PatientFlow
-from db.repositories.salas import update_sala_plazas # IMPORT FIX
+from db.repositories.salas import update_sala_plazas, update_salas_plazas_bulk # IMPORT FIX
 from ui.config.config_loader import load_centro_config, save_centro_config
+from services.occupancy_service import registrar_entrada, registrar_salida, obtener_ocupacion, reconstruir_ocupacion
+from utils.search_utils import PERSON_PROJECTION
 
 
 def get_db():
@@ -35,12 +47,16 @@ def get_db():
 # ---------------------------------------------------------------------------
 
 def _get_sala_info(sala_code: str) -> Dict[str, str]:
-    """Obtiene tipo y subtipo de una sala por su código."""
+    """Obtiene tipo, subtipo y nombre de una sala por su código."""
     config = load_centro_config()
     for s in config.get('salas', []):
         if s['codigo'] == sala_code:
-            return {"tipo": s.get('tipo', 'desconocido'), "subtipo": s.get('subtipo', '')}
-    return {"tipo": "desconocido", "subtipo": ""}
+            return {
+                "tipo": s.get('tipo', 'desconocido'),
+                "subtipo": s.get('subtipo', ''),
+                "nombre": s.get('nombre', sala_code)
+            }
+    return {"tipo": "desconocido", "subtipo": "", "nombre": sala_code}
 
 
 def crear_flujo_paciente(
@@ -83,21 +99,48 @@ def crear_flujo_paciente(
         notas="Inicio de flujo"
     )
     
-    collection.insert_one(nuevo_paso.dict(by_alias=True, exclude={"id"}))
+    paso_doc = nuevo_paso.dict(by_alias=True, exclude={"id"})
+    collection.insert_one(paso_doc)
     
     if not motivo_rechazo:
         update_sala_plazas(sala_admision_code, -1) # Ocupar plaza
+        registrar_entrada(paso_doc, sala_nombre=sala_info["nombre"])
+    elif active:
+        registrar_salida(patient_code)
         
     return nuevo_paso
 
 
+class MovimientoConcurrenteError(Exception):
+    """El paso activo cambió entre la lectura y la escritura (movimiento doble)."""
+
+
 def mover_paciente(
     patient_code: str,
     nueva_sala_code: str,
     nuevo_estado: str,
-    notas: str = ""
+    notas: str = "",
+    secuencia_esperada: Optional[int] = None
 ) -> bool:
-    """Mueve un paciente de su sala actual a una nueva (Cierra paso N, Crea paso N+1)."""
+    """
+    Mueve un paciente de su sala actual a una nueva (Cierra paso N, Crea paso N+1).
+
+    El cierre del paso, la apertura del nuevo y los dos contadores de plazas se
+    escriben en una única transacción con dos bulk_write (patient_flow y salas).
+    El cierre está condicionado a que el paso siga activo con la misma 'secuencia'
+    (concurrencia optimista): si otro usuario movió al paciente entretanto, el
+    movimiento se rechaza y no se tocan las plazas.
+
+    Args:
+        patient_code: Código del paciente
+        nueva_sala_code: Sala destino
+        nuevo_estado: Estado del nuevo paso
+        notas: Notas del movimiento
+        secuencia_esperada: Secuencia del paso que el usuario estaba viendo (opcional)
+
+    Returns:
+        bool: True si el movimiento se aplicó, False si no hay paso activo o hubo conflicto
+    """
     db = get_db()
     collection = db["patient_flow"]
     
@@ -105,28 +148,14 @@ def mover_paciente(
     paso_actual = collection.find_one({"patient_code": patient_code, "activo": True})
     if not paso_actual:
         return False
+    if secuencia_esperada is not None and paso_actual.get("secuencia") != secuencia_esperada:
+        return False
         
-    # 2. Cerrar paso actual
+    # 2. Preparar cierre del paso actual y apertura del nuevo
     salida = datetime.now()
     entrada_anterior = paso_actual.get("entrada")
     duracion = int((salida - entrada_anterior).total_seconds() / 60) if entrada_anterior else 0
     
-    collection.update_one(
-        {"_id": paso_actual["_id"]},
-        {
-            "$set": {
-                "activo": False,
-                "salida": salida,
-                "duracion_minutos": duracion,
-                "updated_at": datetime.now()
-            }
-        }
-    )
-    
-    # Liberar plaza de sala anterior
-    update_sala_plazas(paso_actual["sala_code"], 1)
-    
-    # 3. Crear nuevo paso
     sala_info = _get_sala_info(nueva_sala_code)
     
     nuevo_paso = PatientFlow(
@@ -141,11 +170,46 @@ def mover_paciente(
         entrada=salida, # La entrada es la salida del anterior
         notas=notas
     )
+    paso_doc = nuevo_paso.dict(by_alias=True, exclude={"id"})
+    
+    flow_ops = [
+        UpdateOne(
+            {"_id": paso_actual["_id"], "activo": True, "secuencia": paso_actual["secuencia"]},
+            {
+                "$set": {
+                    "activo": False,
+                    "salida": salida,
+                    "duracion_minutos": duracion,
+                    "updated_at": salida
+                }
+            }
+        ),
+        InsertOne(paso_doc)
+    ]
+    
+    # Liberar plaza anterior y ocupar la nueva (se compensan si es la misma sala)
+    deltas = defaultdict(int)
+    deltas[paso_actual["sala_code"]] += 1
+    deltas[nueva_sala_code] -= 1
+    
+    def _aplicar(session):
+        result = collection.bulk_write(flow_ops, ordered=True, session=session)
+        if result.matched_count != 1:
+            if session is None:
+                # Sin transacción no hay rollback: compensar el paso insertado
+                collection.delete_one({"_id": paso_doc["_id"]})
+            raise MovimientoConcurrenteError(patient_code)
+        update_salas_plazas_bulk(deltas, session=session)
     
-    collection.insert_one(nuevo_paso.dict(by_alias=True, exclude={"id"}))
+    # 3. Escritura atómica
+    try:
+        run_in_transaction(_aplicar, db)
+    except (MovimientoConcurrenteError, BulkWriteError) as e:
+        print(f"Movimiento rechazado por conflicto concurrente ({patient_code}): {e}")
+        return False
     
-    # Ocupar plaza de nueva sala
-    update_sala_plazas(nueva_sala_code, -1)
+    # 4. Actualizar proyección de ocupación (reutiliza los datos personales ya proyectados)
+    registrar_entrada(paso_doc, sala_nombre=sala_info["nombre"])
     
     return True
 
@@ -163,8 +227,9 @@ def finalizar_flujo(patient_code: str, motivo: str, notas: str = "") -> bool:
     entrada_anterior = paso_actual.get("entrada")
     duracion = int((salida - entrada_anterior).total_seconds() / 60) if entrada_anterior else 0
     
-    collection.update_one(
-        {"_id": paso_actual["_id"]},
+    # Solo se libera la plaza si este cierre es el que desactiva el paso (evita dobles cierres)
+    result = collection.update_one(
+        {"_id": paso_actual["_id"], "activo": True},
         {
             "$set": {
                 "activo": False,
@@ -177,8 +242,11 @@ def finalizar_flujo(patient_code: str, motivo: str, notas: str = "") -> bool:
             }
         }
     )
+    if result.matched_count == 0:
+        return False
     
     update_sala_plazas(paso_actual["sala_code"], 1)
+    registrar_salida(patient_code)
     return True
 
 
@@ -317,13 +385,13 @@ def save_triage_data(patient_code: str, triage_data: Dict[str, Any]) -> bool:
         
         collection.insert_one(record)
         
-        # --- PHASE 12.4: HIS INTEGRATION (WEBHOOK) ---
-        # Enviar datos clínicos a sistema externo (Fire-and-forget logic ideally)
+        # --- PHASE 12.4: HIS INTEGRATION (OUTBOX) ---
+        # Se encola en 'his_outbox' (una inserción); el envío lo hace el dispatcher en segundo plano
         try:
             from services.notification_service import send_clinical_data
-            send_clinical_data(triage_data) # triage_data tiene la misma estructura que record (o similar)
+            send_clinical_data(triage_data, idempotency_key=audit_id) # triage_data tiene la misma estructura que record (o similar)
         except Exception as webhook_e:
-            print(f"Non-blocking error sending HIS webhook: {webhook_e}")
+            print(f"Non-blocking error queuing HIS delivery: {webhook_e}")
             # No fallamos el guardado principal solo porque falle el webhook
             
         return True
@@ -357,89 +425,42 @@ def save_triage_data(patient_code: str, triage_data: Dict[str, Any]) -> bool:
 # ---------------------------------------------------------------------------
 
 def obtener_vista_global_salas() -> Dict[str, List[Dict[str, Any]]]:
-    """Obtiene vista jerárquica de pacientes activos."""
-    db = get_db()
-    cursor = db["patient_flow"].find({"activo": True})
-    
-    flujos = list(cursor)
-    vista_salas = {}
-
-    patient_codes = [f["patient_code"] for f in flujos]
-    pacientes_db = list(db["people"].find({"patient_code": {"$in": patient_codes}}))
-    pacientes_map = {p["patient_code"]: p for p in pacientes_db}
-
-    # Mapa de nombres de salas
-    config = load_centro_config()
-    salas_map = {s['codigo']: s.get('nombre', s['codigo']) for s in config.get('salas', [])}
-
-    for flujo in flujos:
-        sala_actual = flujo.get("sala_code")
-        if not sala_actual: continue
-            
-        p_info = pacientes_map.get(flujo["patient_code"], {})
-        
-        # Nombre completo
-        nombre = p_info.get('nombre', '')
-        apellido1 = p_info.get('apellido1', '')
-        apellido2 = p_info.get('apellido2', '')
-        nombre_completo = f"{nombre} {apellido1} {apellido2}".strip()
-        
-        item = {
-            "flow_id": flujo.get("flow_id"),
-            "patient_code": flujo["patient_code"],
-            "nombre_completo": nombre_completo,
-            "nombre": nombre,
-            "apellido1": apellido1,
-            "apellido2": apellido2,
-            "edad": p_info.get("edad"),
-            "estado_flujo": flujo.get("estado"),
-            "sala_code": sala_actual,
-            "sala_nombre": salas_map.get(sala_actual, sala_actual),
-            "sala_tipo": flujo.get("sala_tipo"),
-            "sala_subtipo": flujo.get("sala_subtipo"),
-            "created_at": flujo.get("created_at"),
-            "entrada": flujo.get("entrada"),
-            "wait_start": flujo.get("entrada"),
-            "motivo_consulta": p_info.get("motivo_consulta", ""),
-            "nivel_triaje": p_info.get("nivel_triaje", p_info.get("nivel_asignado", ""))
-        }
-        
-        if sala_actual not in vista_salas:
-            vista_salas[sala_actual] = []
-        vista_salas[sala_actual].append(item)
-        
-    return vista_salas
+    """
+    Obtiene vista jerárquica de pacientes activos: {sala_code: [pacientes]}.
+    Se sirve desde la proyección materializada (O(salas), memoizada por versión).
+    """
+    return obtener_ocupacion()
 
 
 def obtener_pacientes_en_espera(sala_code: str) -> List[Dict[str, Any]]:
-    """Obtiene pacientes activos en una sala."""
-    db = get_db()
-    flujos = list(db["patient_flow"].find({"sala_code": sala_code, "activo": True}).sort("entrada", 1))
+    """
+    Obtiene pacientes activos en una sala (ordenados por entrada).
+    Los pasos activos salen de la proyección y los datos personales completos
+    se recuperan con una única consulta $in sobre 'people'.
+    """
+    items = obtener_ocupacion().get(sala_code, [])
+    if not items:
+        return []
     
-    # Obtener nombre de la sala
-    config = load_centro_config()
-    sala_nombre = next((s.get('nombre') for s in config.get('salas', []) if s['codigo'] == sala_code), sala_code)
+    db = get_db()
+    codes = [i["patient_code"] for i in items]
+    personas = {p["patient_code"]: p for p in db["people"].find({"patient_code": {"$in": codes}}, PERSON_PROJECTION)}
     
     pacientes = []
-    for flujo in flujos:
-        p = db["people"].find_one({"patient_code": flujo["patient_code"]})
+    for item in items:
+        p = personas.get(item["patient_code"])
         if p:
-            nombre = p.get('nombre', '')
-            apellido1 = p.get('apellido1', '')
-            apellido2 = p.get('apellido2', '')
-            nombre_completo = f"{nombre} {apellido1} {apellido2}".strip()
-            
             p_completo = {
                 **p,
-                "flow_id": flujo.get("flow_id"),
-                "nombre_completo": nombre_completo,
-                "estado_flujo": flujo.get("estado"),
+                "flow_id": item.get("flow_id"),
+                "nombre_completo": item.get("nombre_completo"),
+                "estado_flujo": item.get("estado_flujo"),
                 "sala_code": sala_code,
-                "sala_nombre": sala_nombre,
-                "sala_tipo": flujo.get("sala_tipo"),
-                "sala_subtipo": flujo.get("sala_subtipo"),
-                "entrada": flujo.get("entrada"),
-                "created_at_flow": flujo.get("created_at"),
+                "sala_nombre": item.get("sala_nombre", sala_code),
+                "sala_tipo": item.get("sala_tipo"),
+                "sala_subtipo": item.get("sala_subtipo"),
+                "entrada": item.get("entrada"),
+                "created_at_flow": item.get("created_at"),
             }
             pacientes.append(p_completo)
     return pacientes
@@ -452,9 +473,10 @@ def obtener_flujo_activo(patient_code: str) -> Optional[Dict[str, Any]]:
 
 
 def clear_all_data():
-    """Limpia la colección para reiniciar pruebas."""
+    """Limpia la colección para reiniciar pruebas (y la proyección de ocupación que deriva de ella)."""
     db = get_db()
     db["patient_flow"].delete_many({})
+    reconstruir_ocupacion()
     return True
 
 
@@ -473,7 +495,7 @@ def detectar_errores_salas() -> List[Dict[str, Any]]:
     
     errores = []
     patient_codes = [f["patient_code"] for f in flujos_activos]
-    pacientes_db = list(db["people"].find({"patient_code": {"$in": patient_codes}}))
+    pacientes_db = list(db["people"].find({"patient_code": {"$in": patient_codes}}, PERSON_PROJECTION))
     pacientes_map = {p["patient_code"]: p for p in pacientes_db}
 
     for flujo in flujos_activos:
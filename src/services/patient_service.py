@@ -1,6 +1,9 @@
 # path: src/services/patient_service.py
 # Creado: 2025-11-24
 # Refactorizado: 2025-11-26 (Migración a Person/people y validaciones avanzadas)
+# Actualizado: 2026-10-17 - Las altas incluyen los campos de búsqueda indexada ('search')
+# Actualizado: 2026-10-17 - Lecturas sin 'search.prefixes' (PERSON_PROJECTION)
+# Actualizado: 2026-10-17 - La edición con auditoría refresca la proyección de ocupación
 """
 Servicio para gestión de pacientes en el sistema de admisión.
 Utiliza la colección unificada 'people' y el modelo 'Person'.
@@ -9,12 +12,20 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 from db import get_database
 from db.models import Person, Identificacion
+from utils.search_utils import build_person_search_fields, PERSON_PROJECTION
+from services.occupancy_service import refrescar_persona
 import re
 
 def get_db():
     """Alias para mantener compatibilidad."""
     return get_database()
 
+def _person_document(person: Person) -> Dict[str, Any]:
+    """Documento a insertar en 'people', con los campos de búsqueda indexada."""
+    doc = person.model_dump(by_alias=True, exclude={"id"})
+    doc["search"] = build_person_search_fields(doc)
+    return doc
+
 def validar_dni(dni: str) -> bool:
     """Valida un DNI español."""
     if not dni or len(dni) != 9:
@@ -110,7 +121,7 @@ def buscar_paciente_existente(
         return None
     
     # Buscar en people
-    return db.people.find_one(query)
+    return db.people.find_one(query, PERSON_PROJECTION)
 
 def _check_duplicate_identifications(
     db, 
@@ -214,7 +225,7 @@ def crear_paciente(
     }
     
     person = Person(**person_data)
-    result = db.people.insert_one(person.model_dump(by_alias=True, exclude={"id"}))
+    result = db.people.insert_one(_person_document(person))
     
     person_data["_id"] = result.inserted_id
     return person_data, warning
@@ -222,7 +233,7 @@ def crear_paciente(
 def obtener_paciente_por_codigo(patient_code: str) -> Optional[Dict[str, Any]]:
     """Obtiene un paciente por su código."""
     db = get_db()
-    return db.people.find_one({"patient_code": patient_code.upper()})
+    return db.people.find_one({"patient_code": patient_code.upper()}, PERSON_PROJECTION)
 
 def calcular_edad(fecha_nacimiento: datetime) -> int:
     """Calcula la edad en años."""
@@ -341,9 +352,12 @@ def actualizar_paciente_con_auditoria(
     }
     
     person = Person(**person_data)
-    result = db.people.insert_one(person.model_dump(by_alias=True, exclude={"id"}))
+    result = db.people.insert_one(_person_document(person))
     
     person_data["_id"] = result.inserted_id
+
+    # Si está en alguna sala, su entrada sigue el código del flujo (el anterior)
+    refrescar_persona(patient_code_anterior.upper(), person_data)
     return person_data, warning
 
 def listar_pacientes(limite: int = 100, skip: int = 0, solo_activos: bool = True) -> list[Dict[str, Any]]:
@@ -354,4 +368,4 @@ def listar_pacientes(limite: int = 100, skip: int = 0, solo_activos: bool = True
     if solo_activos:
         query["activo"] = True
     
-    return list(db.people.find(query).sort("created_at", -1).limit(limite).skip(skip))
+    return list(db.people.find(query, PERSON_PROJECTION).sort("created_at", -1).limit(limite).skip(skip))
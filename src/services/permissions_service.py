@@ -1,11 +1,115 @@
 # path: src/services/permissions_service.py
 # Creado: 2025-11-25
+# Actualizado: 2026-10-17 - Matriz de permisos compilada por rol con caché e invalidación por versión
 """
 Servicio de gestión de permisos y control de acceso (RBAC).
+
+Cada rol se compila una sola vez en una tabla inmutable de permisos
+(CompiledRole) que se guarda en una caché de proceso. La caché se invalida
+cuando cambia la versión de los roles (alta/modificación/baja en
+RolesRepository) o tras PERMISSIONS_TTL_S, de modo que has_permission() es
+una consulta en memoria sin acceso a MongoDB.
 """
+import threading
+import time
 import streamlit as st
-from typing import List, Dict, Optional
-from db.repositories.roles import get_role_by_code
+from dataclasses import dataclass
+from typing import List, Dict, Optional, FrozenSet, Tuple
+from db.repositories.roles import get_role_by_code, get_roles_version
+
+SUPERADMIN_ROLE = "superadministrador"
+PERMISSIONS_TTL_S = 60  # Red de seguridad ante cambios de roles desde otros procesos
+
+
+@dataclass(frozen=True)
+class CompiledRole:
+    """
+    Permisos de un rol compilados a conjuntos inmutables.
+
+    - grants: pares (módulo, acción) concedidos. Para la acción 'general' se
+      precalcula "alguna acción del módulo está concedida".
+    - full_modules: módulos definidos con un booleano True (todas las acciones).
+    """
+    code: str
+    superadmin: bool
+    grants: FrozenSet[Tuple[str, str]]
+    full_modules: FrozenSet[str]
+
+    def allows(self, module: str, action: str = "view") -> bool:
+        if self.superadmin or module in self.full_modules:
+            return True
+        return (module, action) in self.grants
+
+
+def compile_role(role_def: Dict) -> CompiledRole:
+    """Compila la definición de un rol (documento de 'roles') a CompiledRole."""
+    code = role_def.get("code")
+    grants = set()
+    full_modules = set()
+    for module, module_perms in (role_def.get("permissions") or {}).items():
+        # Módulo no definido o vacío: denegar por defecto
+        if not module_perms:
+            continue
+        # Booleano directo (caso simple): todas las acciones
+        if isinstance(module_perms, bool):
+            full_modules.add(module)
+            continue
+        if isinstance(module_perms, dict):
+            for action, allowed in module_perms.items():
+                if action != "general" and allowed:
+                    grants.add((module, action))
+            # 'general' (acceso a tab): alguna acción concedida
+            if any(module_perms.values()):
+                grants.add((module, "general"))
+        else:
+            grants.add((module, "general"))
+    return CompiledRole(
+        code=code,
+        superadmin=code == SUPERADMIN_ROLE,
+        grants=frozenset(grants),
+        full_modules=frozenset(full_modules),
+    )
+
+
+# (versión de roles, instante de caducidad, {rol: CompiledRole | None}); se sustituye
+# entera al invalidar, así que la lectura del camino rápido no necesita bloqueo
+_compiled_cache: Tuple[Optional[int], float, Dict[str, Optional[CompiledRole]]] = (None, 0.0, {})
+_compiled_lock = threading.Lock()
+_MISSING = object()
+
+
+def clear_permissions_cache():
+    """Descarta todos los roles compilados."""
+    global _compiled_cache
+    with _compiled_lock:
+        _compiled_cache = (None, 0.0, {})
+
+
+def get_compiled_role(role_code: Optional[str]) -> Optional[CompiledRole]:
+    """
+    Rol compilado desde la caché de proceso (solo consulta MongoDB la primera vez
+    o tras un cambio de versión/TTL). None si el rol no existe.
+    """
+    global _compiled_cache
+    if not role_code:
+        return None
+    version = get_roles_version()
+    cache_version, expires_at, roles = _compiled_cache
+    if cache_version == version and time.monotonic() < expires_at:
+        compiled = roles.get(role_code, _MISSING)
+        if compiled is not _MISSING:
+            return compiled
+
+    role_def = get_role_by_code(role_code)
+    compiled = compile_role(role_def) if role_def else None
+    with _compiled_lock:
+        cache_version, expires_at, roles = _compiled_cache
+        if cache_version != version or time.monotonic() >= expires_at:
+            roles = {}
+            _compiled_cache = (version, time.monotonic() + PERMISSIONS_TTL_S, roles)
+        roles[role_code] = compiled
+    return compiled
+
 
 def get_current_user() -> Optional[Dict]:
     """Retorna el usuario actual de la sesión o None."""
@@ -23,35 +127,10 @@ def has_permission(module: str, action: str = "view") -> bool:
     if not user:
         return False
         
-    role_code = user.get("rol")
-    role_def = get_role_by_code(role_code)
-    
-    if not role_def:
-        return False
-        
-    # Superadmin tiene acceso total
-    if role_code == "superadministrador":
-        return True
-        
-    permissions = role_def.get("permissions", {})
-    module_perms = permissions.get(module, {})
-    
-    # Si el módulo no está definido en permisos, denegar por defecto
-    if not module_perms:
+    compiled = get_compiled_role(user.get("rol"))
+    if not compiled:
         return False
-    
-    # Si el permiso es un booleano directo (caso simple)
-    if isinstance(module_perms, bool):
-        return module_perms
-        
-    # Si es diccionario, buscar la acción específica
-    # Si la acción es 'general' (usada para acceso a tab), verificar 'view' o si existe alguna key True
-    if action == "general":
-        if isinstance(module_perms, dict):
-            return any(module_perms.values())
-        return bool(module_perms)
-
-    return module_perms.get(action, False)
+    return compiled.allows(module, action)
 
 def get_available_tabs() -> List[str]:
     """
@@ -116,7 +116,8 @@ def generar_alertas_predictivas(edad, vital_signs, antecedentes=None, alergias=N
         safety_settings=safety_settings,
         metadata={
             "patient_age": edad
-        }
+        },
+        cache=True
     )
 
     return response_data, final_prompt
@@ -1,48 +1,203 @@
-from services.rag_service import get_rag_service
+# path: src/services/proactive_service.py
+# Actualizado: 2026-10-17 - Caché LRU de embeddings/resultados, debounce y atajo por similitud
+# Actualizado: 2026-10-17 - TTL en las cachés e invalidación por versión de la base de conocimiento
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+import numpy as np
 import streamlit as st
 
+from services.rag_service import get_rag_service
+
+MIN_TEXT_CHARS = 10          # Por debajo no se consulta
+MIN_DELTA_CHARS = 8          # Debounce: cambios menores reutilizan la última sugerencia
+SIMILARITY_REUSE = 0.97      # Coseno a partir del cual se reutiliza un resultado previo
+RECENT_RESULTS = 8           # Resultados recientes comparados por similitud
+EMBEDDING_CACHE_SIZE = 256
+EMBEDDING_CACHE_TTL_S = 3600
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE_TTL_S = 600
+
+
+class _LRU:
+    """LRU mínima y thread-safe con caducidad (compartida entre sesiones del proceso)."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # clave -> (expira_monotonic, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    return item[1]
+                del self._data[key]
+        return None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza el texto libre: minúsculas, sin tildes, sin puntuación y espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def text_delta(previous: str, current: str) -> int:
+    """
+    Estimación barata de cuánto ha cambiado el texto: caracteres tras el prefijo común
+    (al teclear al final equivale a los caracteres añadidos o borrados).
+    """
+    limit = min(len(previous), len(current))
+    prefix = 0
+    while prefix < limit and previous[prefix] == current[prefix]:
+        prefix += 1
+    return max(len(previous), len(current)) - prefix
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b) / denom) if denom else 0.0
+
+
 class ProactiveService:
     """
     Servicio de vigilancia proactiva.
     Analiza el texto de entrada en tiempo real y busca coincidencias en la base vectorial (RAG).
     Si encuentra algo muy relevante, devuelve una sugerencia o alerta.
+
+    Para no recalcular embeddings en cada rerun mientras se escribe:
+    1. Debounce: si el texto normalizado apenas cambia, se devuelve la última sugerencia.
+    2. Caché LRU de resultados por (versión de la base de conocimiento, texto
+       normalizado): ingestar o borrar documentos invalida los resultados.
+    3. Caché LRU de embeddings por texto normalizado.
+    4. Atajo por similitud: si el embedding es casi idéntico a uno reciente, se
+       reutiliza su resultado sin consultar Chroma.
     """
-    
-    _last_query = ""
-    _cache_response = []
+
+    _embedding_cache = _LRU(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL_S)
+    _result_cache = _LRU(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S)
+    stats = {"debounced": 0, "result_hits": 0, "embedding_hits": 0, "similar_hits": 0, "searches": 0}
+
+    @staticmethod
+    def _session_state() -> Dict[str, Any]:
+        """Estado del debounce por sesión (el texto de un usuario no afecta a otro)."""
+        try:
+            return st.session_state.setdefault("_proactive_state", {"last_text": None, "last_result": [], "recent": []})
+        except Exception:
+            # Fuera de Streamlit (API / tests sin contexto)
+            return {"last_text": None, "last_result": [], "recent": []}
+
+    @classmethod
+    def clear_cache(cls):
+        cls._embedding_cache.clear()
+        cls._result_cache.clear()
+        for key in cls.stats:
+            cls.stats[key] = 0
+
+    @classmethod
+    def _embedding_for(cls, rag, norm: str) -> np.ndarray:
+        embedding = cls._embedding_cache.get(norm)
+        if embedding is not None:
+            cls.stats["embedding_hits"] += 1
+            return embedding
+        embedding = np.asarray(rag.embed_query(norm), dtype=np.float32)
+        cls._embedding_cache.put(norm, embedding)
+        return embedding
 
     @staticmethod
-    def check_context_and_suggest(text: str) -> list[str]:
+    def _format(results: List[Dict[str, Any]]) -> List[str]:
+        sugerencias = []
+        if results:
+            # Extraer título o fuente del metadato
+            metadata = results[0].get("metadata", {}) or {}
+            source = metadata.get("source", "Protocolo")
+            sugerencias.append(f"📚 Protocolo Relacionado: {source}")
+        return sugerencias
+
+    @classmethod
+    def check_context_and_suggest(cls, text: str, state: Optional[Dict[str, Any]] = None) -> list[str]:
         """
         Calcula sugerencias basadas en el texto.
-        Usa caché simple para no machacar la DB si el texto no cambia mucho.
+
+        Args:
+            text: Texto libre introducido por el usuario.
+            state: Estado del debounce (por defecto, el de la sesión de Streamlit).
         """
-        if not text or len(text) < 10:
+        if not text or len(text) < MIN_TEXT_CHARS:
             return []
-            
-        # Evitar calls si el texto es casi igual (optimización básica)
-        # En una app real usaríamos embeddings ligeros o debounce JS.
-        # Aquí permitimos re-consulta si ha cambiado significativamente
-        
+
+        state = state if state is not None else cls._session_state()
+        norm = normalize_query(text)
+
         try:
             rag = get_rag_service()
-            # Buscamos SOLO 1 documento muy relevante
-            results = rag.search_documents(text, n_results=1)
-            
-            sugerencias = []
-            if results:
-                # Extraer título o fuente del metadato
-                doc = results[0]
-                metadata = doc.get("metadata", {})
-                source = metadata.get("source", "Protocolo")
-                
-                # Heurística simple: Si la distancia es baja (similitud alta)
-                # Chroma devuelve distancias, pero aquí asumimos que search_documents ya filtra.
-                # Simularemos "detección" si hay resultado.
-                
-                sugerencias.append(f"📚 Protocolo Relacionado: {source}")
-                
-            return sugerencias
+            kb_version = rag.kb_version
+        except Exception as e:
+            print(f"Error en ProactiveService: {e}")
+            return []
+
+        # La base de conocimiento ha cambiado: lo recordado en la sesión ya no vale
+        if state.get("kb_version") != kb_version:
+            state.update(kb_version=kb_version, last_text=None, last_result=[], recent=[])
+
+        # 1. Debounce por delta mínimo
+        last_text = state.get("last_text")
+        if last_text is not None and text_delta(last_text, norm) < MIN_DELTA_CHARS:
+            cls.stats["debounced"] += 1
+            return list(state.get("last_result", []))
+
+        try:
+            # 2. Resultado ya calculado para este texto normalizado
+            result_key = f"{kb_version}|{norm}"
+            sugerencias = cls._result_cache.get(result_key)
+            if sugerencias is not None:
+                cls.stats["result_hits"] += 1
+            else:
+                embedding = cls._embedding_for(rag, norm)
+
+                # 3. Atajo por similitud con consultas recientes de la sesión
+                for prev_embedding, prev_result in state.get("recent", []):
+                    if _cosine(embedding, prev_embedding) >= SIMILARITY_REUSE:
+                        cls.stats["similar_hits"] += 1
+                        sugerencias = prev_result
+                        break
+
+                if sugerencias is None:
+                    # Buscamos SOLO 1 documento muy relevante
+                    cls.stats["searches"] += 1
+                    sugerencias = cls._format(rag.search_documents_by_embedding(embedding.tolist(), n_results=1))
+
+                cls._result_cache.put(result_key, sugerencias)
+                recent = state.setdefault("recent", [])
+                recent.append((embedding, sugerencias))
+                del recent[:-RECENT_RESULTS]
+
+            state["last_text"] = norm
+            state["last_result"] = sugerencias
+            return list(sugerencias)
 
         except Exception as e:
             print(f"Error en ProactiveService: {e}")
@@ -0,0 +1,128 @@
+# path: src/services/push_delivery.py
+# Creado: 2026-10-17
+"""
+Motor de entrega Web Push (VAPID) con envío concurrente.
+
+- Los envíos se reparten en un pool de hilos acotado (PUSH_MAX_WORKERS) que
+  comparte una requests.Session con pool de conexiones.
+- Las suscripciones caducadas (HTTP 404/410) se devuelven agrupadas por persona
+  para podarlas en una sola escritura masiva.
+El motor no accede a la base de datos: recibe destinos ya resueltos.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+PUSH_MAX_WORKERS = 16
+PUSH_TIMEOUT_S = 10
+EXPIRED_STATUS = {404, 410}
+
+
+@dataclass
+class PushDeliveryResult:
+    """Resultado agregado de un envío a varias suscripciones."""
+    sent: int = 0
+    failed: int = 0
+    expired: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)  # person_id -> suscripciones
+
+    @property
+    def pruned(self) -> int:
+        return sum(len(subs) for subs in self.expired.values())
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"sent": self.sent, "failed": self.failed, "expired": self.pruned}
+
+
+def _response_status(exc: Exception) -> Optional[int]:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) if response is not None else None
+
+
+class PushDeliveryEngine:
+    """
+    Envía un mismo payload a muchas suscripciones en paralelo.
+
+    Args:
+        send_fn: Función de envío compatible con pywebpush.webpush (inyectable en tests/benchmarks).
+        max_workers: Tamaño del pool de envío (y del pool de conexiones HTTP).
+    """
+
+    def __init__(self, send_fn: Optional[Callable[..., Any]] = None, max_workers: int = PUSH_MAX_WORKERS,
+                 timeout_s: float = PUSH_TIMEOUT_S):
+        if send_fn is None:
+            from pywebpush import webpush
+            send_fn = webpush
+        self.send_fn = send_fn
+        self.timeout_s = timeout_s
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="push")
+        self._session = self._build_session(max_workers)
+
+    @staticmethod
+    def _build_session(pool_size: int):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _send_one(self, subscription: Dict[str, Any], data: str, private_key: str, claims: Dict[str, Any]) -> Tuple[bool, Optional[int], str]:
+        try:
+            response = self.send_fn(
+                subscription_info=subscription,
+                data=data,
+                vapid_private_key=private_key,
+                vapid_claims=dict(claims),  # pywebpush modifica las claims (aud/exp)
+                timeout=self.timeout_s,
+                requests_session=self._session,
+            )
+            status = getattr(response, "status_code", None)
+            if status is not None and status >= 300:
+                return False, status, f"HTTP {status}"
+            return True, status, ""
+        except Exception as e:
+            return False, _response_status(e), str(e)
+
+    def deliver(self, targets: List[Tuple[str, Dict[str, Any]]], payload: Dict[str, Any],
+                private_key: str, claims: Dict[str, Any]) -> PushDeliveryResult:
+        """
+        Envía el payload a cada (person_id, suscripción) y espera a todos los envíos.
+        """
+        result = PushDeliveryResult()
+        if not targets:
+            return result
+        data = json.dumps(payload)
+        futures = [
+            (person_id, sub, self._executor.submit(self._send_one, sub, data, private_key, claims))
+            for person_id, sub in targets
+        ]
+        for person_id, sub, future in futures:
+            ok, status, _ = future.result()
+            if ok:
+                result.sent += 1
+            else:
+                result.failed += 1
+                if status in EXPIRED_STATUS:
+                    result.expired.setdefault(person_id, []).append(sub)
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+_engine: Optional[PushDeliveryEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_push_engine() -> PushDeliveryEngine:
+    """Motor compartido por el proceso (pool de hilos y conexiones reutilizados)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PushDeliveryEngine()
+        return _engine
@@ -1,111 +1,318 @@
 # path: src/services/queue_manager.py
+# Actualizado: 2026-10-17 - Índice de prioridad persistente por sala (PriorityQueueIndex)
+"""
+Gestión de colas de espera priorizadas.
+
+- Funciones sin estado (calculate_priority_score, sort_queue, get_wait_time_alert).
+- PriorityQueueIndex: índice ordenado por sala que se actualiza incrementalmente
+  con los eventos de flujo. La clave de orden (nivel normalizado + llegada) no
+  depende de la hora actual, así que no hay que recalcular puntuaciones en cada
+  rerun: solo se insertan/retiran los pacientes que cambian.
+"""
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+# Mapeo de niveles a base score
+LEVEL_MAP = {
+    "Nivel I": 1000, "Rojo": 1000, "Red": 1000,
+    "Nivel II": 2000, "Naranja": 2000, "Orange": 2000,
+    "Nivel III": 3000, "Amarillo": 3000, "Yellow": 3000,
+    "Nivel IV": 4000, "Verde": 4000, "Green": 4000,
+    "Nivel V": 5000, "Azul": 5000, "Blue": 5000
+}
+
+# Umbrales de alerta por color (en minutos)
+WAIT_THRESHOLDS = {
+    'rojo': {'warn': 5, 'crit': 10},     # Nivel I
+    'naranja': {'warn': 15, 'crit': 30}, # Nivel II
+    'amarillo': {'warn': 45, 'crit': 60},# Nivel III
+    'verde': {'warn': 90, 'crit': 120},  # Nivel IV
+    'azul': {'warn': 120, 'crit': 240}   # Nivel V
+}
+
+_COLOR_MAP = {
+    'rojo': 'rojo', 'nivel i': 'rojo',
+    'naranja': 'naranja', 'nivel ii': 'naranja',
+    'amarillo': 'amarillo', 'nivel iii': 'amarillo',
+    'verde': 'verde', 'nivel iv': 'verde',
+    'azul': 'azul', 'nivel v': 'azul'
+}
+
+# Claves ordenadas por longitud descendente una sola vez (evita falsos positivos como 'Nivel I' en 'Nivel IV')
+_LEVEL_KEYS = sorted(LEVEL_MAP.keys(), key=len, reverse=True)
+_COLOR_KEYS = sorted(_COLOR_MAP.keys(), key=len, reverse=True)
+
+
+@lru_cache(maxsize=256)
+def _base_score(triage_level: str) -> int:
+    """Base score del nivel de triaje (5000 si no se reconoce)."""
+    level = triage_level.lower()
+    for key in _LEVEL_KEYS:
+        if key.lower() in level:
+            return LEVEL_MAP[key]
+    return 5000
+
+
+@lru_cache(maxsize=256)
+def _alert_color(triage_level: str) -> str:
+    """Color de umbrales de espera del nivel de triaje ('azul' si no se reconoce)."""
+    level = triage_level.lower()
+    for key in _COLOR_KEYS:
+        if key in level:
+            return _COLOR_MAP[key]
+    return 'azul'
+
+
+def _parse_wait_start(wait_start: Any) -> Optional[datetime]:
+    """Normaliza wait_start (datetime o ISO string) a datetime; None si no es válido."""
+    if not wait_start:
+        return None
+    if isinstance(wait_start, str):
+        try:
+            return datetime.fromisoformat(wait_start)
+        except ValueError:
+            return None
+    return wait_start
+
 
 def calculate_priority_score(patient: Dict[str, Any]) -> int:
     """
     Calcula un score de prioridad para ordenamiento.
     Menor score = Mayor prioridad.
-    
+
     Lógica:
     - Nivel 1 (Rojo): 1000
     - Nivel 2 (Naranja): 2000
     - Nivel 3 (Amarillo): 3000
     - Nivel 4 (Verde): 4000
     - Nivel 5 (Azul/Blanco): 5000
-    
+
     Se resta el tiempo de espera en minutos para desempatar (FIFO dentro del mismo nivel).
     """
-    # Mapeo de niveles a base score
-    level_map = {
-        "Nivel I": 1000, "Rojo": 1000, "Red": 1000,
-        "Nivel II": 2000, "Naranja": 2000, "Orange": 2000,
-        "Nivel III": 3000, "Amarillo": 3000, "Yellow": 3000,
-        "Nivel IV": 4000, "Verde": 4000, "Green": 4000,
-        "Nivel V": 5000, "Azul": 5000, "Blue": 5000
-    }
-    
-    # Obtener nivel del paciente (normalizar string)
-    triage_level = patient.get('nivel_triaje', 'Nivel V')
-    # Intentar buscar substring clave (ordenar por longitud descendente para evitar falsos positivos como 'Nivel I' en 'Nivel IV')
-    base_score = 5000
-    sorted_keys = sorted(level_map.keys(), key=len, reverse=True)
-    
-    for key in sorted_keys:
-        if key.lower() in str(triage_level).lower():
-            base_score = level_map[key]
-            break
-            
+    base_score = _base_score(str(patient.get('nivel_triaje', 'Nivel V')))
+
     # Calcular tiempo de espera
     wait_start = patient.get('wait_start')
     wait_minutes = 0
     if wait_start:
-        if isinstance(wait_start, str):
-            try:
-                wait_start = datetime.fromisoformat(wait_start)
-            except ValueError:
-                wait_start = datetime.now() # Fallback
-        
+        wait_start = _parse_wait_start(wait_start) or datetime.now() # Fallback
         wait_minutes = int((datetime.now() - wait_start).total_seconds() / 60)
-        
+
     # Score final: Base - Minutos (para que más tiempo de espera reduzca el score y suba prioridad)
     # Ejemplo: Rojo (1000) con 10 min espera = 990. Rojo con 20 min = 980 (Va antes).
     return base_score - wait_minutes
 
+
+def priority_key(patient: Dict[str, Any], arrival: Optional[datetime] = None) -> float:
+    """
+    Clave de orden invariante en el tiempo equivalente a calculate_priority_score.
+
+    score = base - (ahora - llegada)/60  ⇒  ordenar por score es ordenar por
+    base*60 + timestamp(llegada), que no cambia mientras el paciente espera.
+    """
+    if arrival is None:
+        arrival = _parse_wait_start(patient.get('wait_start')) or datetime.now()
+    return _base_score(str(patient.get('nivel_triaje', 'Nivel V'))) * 60 + arrival.timestamp()
+
+
 def sort_queue(patients: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Ordena la lista de pacientes por prioridad."""
-    return sorted(patients, key=calculate_priority_score)
+    return sorted(patients, key=priority_key)
+
 
 def get_wait_time_alert(patient: Dict[str, Any]) -> str:
     """
     Determina el nivel de alerta por tiempo de espera.
     Returns: 'normal', 'warning', 'critical'
     """
-    triage_level = str(patient.get('nivel_triaje', '')).lower()
-    wait_start = patient.get('wait_start')
-    
+    wait_start = _parse_wait_start(patient.get('wait_start'))
     if not wait_start:
         return 'normal'
-        
-    if isinstance(wait_start, str):
-        try:
-            wait_start = datetime.fromisoformat(wait_start)
-        except ValueError:
-            return 'normal'
 
     wait_min = (datetime.now() - wait_start).total_seconds() / 60
-    
-    # Umbrales (en minutos)
-    thresholds = {
-        'rojo': {'warn': 5, 'crit': 10},     # Nivel I
-        'naranja': {'warn': 15, 'crit': 30}, # Nivel II
-        'amarillo': {'warn': 45, 'crit': 60},# Nivel III
-        'verde': {'warn': 90, 'crit': 120},  # Nivel IV
-        'azul': {'warn': 120, 'crit': 240}   # Nivel V
-    }
-    
-    # Detectar color usando mapeo ordenado por longitud de clave
-    color_map = {
-        'rojo': 'rojo', 'nivel i': 'rojo',
-        'naranja': 'naranja', 'nivel ii': 'naranja',
-        'amarillo': 'amarillo', 'nivel iii': 'amarillo',
-        'verde': 'verde', 'nivel iv': 'verde',
-        'azul': 'azul', 'nivel v': 'azul'
-    }
-    
-    color_key = 'azul' # Default
-    sorted_keys = sorted(color_map.keys(), key=len, reverse=True)
-    
-    for key in sorted_keys:
-        if key in triage_level:
-            color_key = color_map[key]
-            break
-            
-    limits = thresholds[color_key]
-    
+    limits = WAIT_THRESHOLDS[_alert_color(str(patient.get('nivel_triaje', '')))]
+
     if wait_min >= limits['crit']:
         return 'critical'
     elif wait_min >= limits['warn']:
         return 'warning'
-    
+
     return 'normal'
+
+
+# ---------------------------------------------------------------------------
+# Índice de prioridad persistente (por sala)
+# ---------------------------------------------------------------------------
+
+class PriorityQueueIndex:
+    """
+    Cola priorizada de una sala mantenida incrementalmente.
+
+    - _keys: lista ordenada de (clave, patient_code) → orden en O(n), inserción/baja O(log n) búsqueda.
+    - _arrivals: por color, timestamps de llegada ordenados → recuento de alertas en O(log n).
+    - _entries: patient_code → (clave, color, llegada_ts, firma, paciente).
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[float, str]] = []
+        self._arrivals: Dict[str, List[Tuple[float, str]]] = {color: [] for color in WAIT_THRESHOLDS}
+        self._entries: Dict[str, Tuple[float, str, float, Tuple[Any, Any], Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, patient_code: str) -> bool:
+        return patient_code in self._entries
+
+    @staticmethod
+    def _signature(patient: Dict[str, Any]) -> Tuple[Any, Any]:
+        """Campos que afectan al orden: si no cambian no se recalcula nada."""
+        return (patient.get('nivel_triaje'), patient.get('wait_start'))
+
+    def push(self, patient: Dict[str, Any]):
+        """Inserta (o reposiciona) un paciente en la cola."""
+        code = patient['patient_code']
+        if code in self._entries:
+            self.remove(code)
+
+        arrival = _parse_wait_start(patient.get('wait_start')) or datetime.now()
+        key = priority_key(patient, arrival)
+        color = _alert_color(str(patient.get('nivel_triaje', '')))
+        arrival_ts = arrival.timestamp()
+
+        insort(self._keys, (key, code))
+        insort(self._arrivals[color], (arrival_ts, code))
+        self._entries[code] = (key, color, arrival_ts, self._signature(patient), patient)
+
+    def remove(self, patient_code: str) -> bool:
+        """Retira un paciente de la cola (p.ej. al ser llamado a box)."""
+        entry = self._entries.pop(patient_code, None)
+        if entry is None:
+            return False
+        key, color, arrival_ts, _, _ = entry
+        keys_pos = bisect_left(self._keys, (key, patient_code))
+        del self._keys[keys_pos]
+        arr = self._arrivals[color]
+        del arr[bisect_left(arr, (arrival_ts, patient_code))]
+        return True
+
+    def sync(self, patients: Iterable[Dict[str, Any]]):
+        """
+        Sincroniza la cola con la lista actual de pacientes de la sala.
+        Solo se insertan/retiran los pacientes nuevos, salientes o cuyo nivel o
+        llegada hayan cambiado; el resto únicamente refresca sus datos de display.
+        """
+        incoming = {p['patient_code']: p for p in patients}
+
+        for code in [c for c in self._entries if c not in incoming]:
+            self.remove(code)
+
+        for code, patient in incoming.items():
+            entry = self._entries.get(code)
+            if entry is None or entry[3] != self._signature(patient):
+                self.push(patient)
+            else:
+                self._entries[code] = entry[:4] + (patient,)
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """Siguiente paciente a atender (O(1))."""
+        if not self._keys:
+            return None
+        return self._entries[self._keys[0][1]][4]
+
+    def ordered(self) -> List[Dict[str, Any]]:
+        """Pacientes en orden de prioridad."""
+        return [self._entries[code][4] for _, code in self._keys]
+
+    def iter_keyed(self) -> Iterable[Tuple[float, str, Dict[str, Any]]]:
+        """Itera (clave, patient_code, paciente) en orden, para fusiones entre salas."""
+        for key, code in self._keys:
+            yield key, code, self._entries[code][4]
+
+    def alert_for(self, patient_code: str, now: Optional[datetime] = None) -> str:
+        """Nivel de alerta de un paciente de la cola (O(1), sin re-parsear fechas)."""
+        entry = self._entries.get(patient_code)
+        if entry is None:
+            return 'normal'
+        now_ts = (now or datetime.now()).timestamp()
+        wait_min = (now_ts - entry[2]) / 60
+        limits = WAIT_THRESHOLDS[entry[1]]
+        if wait_min >= limits['crit']:
+            return 'critical'
+        if wait_min >= limits['warn']:
+            return 'warning'
+        return 'normal'
+
+    def alert_counts(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Número de pacientes en 'warning' y 'critical' (búsqueda binaria por color)."""
+        now_ts = (now or datetime.now()).timestamp()
+        counts = {'normal': 0, 'warning': 0, 'critical': 0}
+        for color, arrivals in self._arrivals.items():
+            limits = WAIT_THRESHOLDS[color]
+            # Llegadas anteriores a (ahora - umbral) superan el umbral
+            crit = bisect_right(arrivals, now_ts - limits['crit'] * 60, key=_first)
+            warn = bisect_right(arrivals, now_ts - limits['warn'] * 60, key=_first)
+            counts['critical'] += crit
+            counts['warning'] += warn - crit
+            counts['normal'] += len(arrivals) - warn
+        return counts
+
+
+def _first(item: Tuple[float, str]) -> float:
+    return item[0]
+
+
+# Registro de colas por sala (vive mientras viva el proceso de Streamlit).
+# Las sesiones de Streamlit corren en hilos distintos: el lock serializa sync/lectura.
+_ROOM_QUEUES: Dict[str, PriorityQueueIndex] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_room_queue(sala_code: str) -> PriorityQueueIndex:
+    """Devuelve (creando si hace falta) la cola priorizada de una sala."""
+    if sala_code not in _ROOM_QUEUES:
+        _ROOM_QUEUES[sala_code] = PriorityQueueIndex()
+    return _ROOM_QUEUES[sala_code]
+
+
+def build_prioritized_queue(
+    vista_salas: Dict[str, List[Dict[str, Any]]],
+    salas_codes: List[str],
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve la cola priorizada conjunta de varias salas de espera.
+
+    Sincroniza incrementalmente el índice de cada sala con la vista de ocupación
+    y fusiona las colas ya ordenadas (k-way merge). Cada paciente se devuelve con
+    'alert_level' calculado por el índice.
+    """
+    now = now or datetime.now()
+    with _QUEUES_LOCK:
+        colas = []
+        cola_de_paciente = {}
+        for sala_code in salas_codes:
+            cola = get_room_queue(sala_code)
+            cola.sync(vista_salas.get(sala_code, []))
+            colas.append(cola)
+            cola_de_paciente.update({code: cola for _, code, _ in cola.iter_keyed()})
+
+        resultado = []
+        for _, code, patient in heapq.merge(*(c.iter_keyed() for c in colas), key=lambda t: (t[0], t[1])):
+            patient['alert_level'] = cola_de_paciente[code].alert_for(code, now)
+            resultado.append(patient)
+    return resultado
+
+
+def count_wait_alerts(salas_codes: List[str], now: Optional[datetime] = None) -> Dict[str, int]:
+    """Suma los recuentos de alertas de espera de varias salas (sin recorrer pacientes)."""
+    totals = {'normal': 0, 'warning': 0, 'critical': 0}
+    with _QUEUES_LOCK:
+        for sala_code in salas_codes:
+            for level, n in get_room_queue(sala_code).alert_counts(now).items():
+                totals[level] += n
+    return totals
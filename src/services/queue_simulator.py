@@ -0,0 +1,171 @@
+# path: src/services/queue_simulator.py
+# Creado: 2026-10-17
+"""
+Simulador de eventos discretos de la cola de atención (sin base de datos).
+
+Modelo: c médicos (servidores) y una cola con prioridad no expropiativa. Cada
+vez que un médico queda libre atiende al paciente disponible con menor clave
+de prioridad, la misma que usa queue_manager.priority_key expresada en minutos
+relativos a ahora:
+
+    clave = base_nivel (1000..5000) - minutos_esperando
+
+Las llegadas futuras (Poisson) solo pueden adelantar a pacientes de menor
+prioridad, así que únicamente se generan las de nivel más urgente que el menos
+urgente de la cola.
+
+Las réplicas avanzan a la vez sobre arrays de numpy (una fila por réplica): el
+bucle en Python es por evento de servicio, no por réplica. La cola actual y las
+llegadas de cada nivel se atienden en orden fijo, así que elegir el siguiente
+paciente es comparar unos pocos punteros por réplica.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+REPLICATIONS = 1000
+PERCENTILES = (10, 50, 90)
+HORIZON_MIN = 12 * 60
+
+
+@dataclass
+class QueueSimulation:
+    """ETA de inicio de atención (minutos desde ahora) por paciente de la cola."""
+    eta: np.ndarray                  # (pacientes, percentiles)
+    mean: np.ndarray                 # (pacientes,)
+    percentiles: Tuple[int, ...]
+    servers: int
+    replications: int
+    samples: Optional[np.ndarray] = field(default=None, repr=False)  # (réplicas, pacientes)
+
+    def percentile(self, p: int) -> np.ndarray:
+        return self.eta[:, self.percentiles.index(p)]
+
+
+def _residual_service(rng: np.random.Generator, service_minutes: np.ndarray, elapsed: np.ndarray,
+                      replications: int) -> np.ndarray:
+    """
+    Tiempo restante de las atenciones en curso: se muestrea entre las duraciones
+    empíricas mayores que lo ya transcurrido (1 minuto si ninguna lo es).
+    """
+    ordered = np.sort(service_minutes)
+    first_longer = np.searchsorted(ordered, elapsed, side='right')
+    longer = len(ordered) - first_longer
+    u = rng.random((replications, len(elapsed)))
+    idx = np.minimum(first_longer + (u * np.maximum(longer, 1)).astype(int), len(ordered) - 1)
+    residual = ordered[idx] - elapsed
+    return np.where(longer > 0, residual, 1.0)
+
+
+def _arrivals(rng: np.random.Generator, rate_per_min: float, mix: Dict[int, float], max_key: float,
+              horizon: float, replications: int) -> List[Tuple[float, np.ndarray]]:
+    """
+    Llegadas que pueden adelantar a algún paciente de la cola, por nivel:
+    [(base_nivel, minutos de llegada ordenados (réplicas, n) rellenados con inf)].
+    """
+    total = sum(p for p in mix.values() if p > 0)
+    streams = []
+    if rate_per_min <= 0 or total <= 0:
+        return streams
+    for base, share in sorted(mix.items()):
+        if share <= 0 or base >= max_key:
+            continue
+        counts = rng.poisson(rate_per_min * horizon * share / total, replications)
+        width = int(counts.max())
+        if width == 0:
+            continue
+        times = rng.random((replications, width)) * horizon
+        times[np.arange(width)[None, :] >= counts[:, None]] = np.inf
+        times.sort(axis=1)
+        streams.append((float(base), np.hstack([times, np.full((replications, 1), np.inf)])))
+    return streams
+
+
+def simulate_queue(
+    queue_keys: Sequence[float],
+    servers: int,
+    service_minutes: Sequence[float],
+    busy_elapsed: Sequence[float] = (),
+    arrival_rate_per_min: float = 0.0,
+    arrival_mix: Optional[Dict[int, float]] = None,
+    replications: int = REPLICATIONS,
+    percentiles: Tuple[int, ...] = PERCENTILES,
+    horizon_min: float = HORIZON_MIN,
+    seed: Optional[int] = None,
+    keep_samples: bool = False,
+) -> QueueSimulation:
+    """
+    Simula 'replications' veces la cola y devuelve los percentiles del minuto en
+    que empieza la atención de cada paciente.
+
+    Args:
+        queue_keys: Clave de prioridad (minutos) de cada paciente en espera.
+        servers: Médicos disponibles.
+        service_minutes: Muestra empírica de duraciones de atención.
+        busy_elapsed: Minutos transcurridos de cada atención en curso.
+        arrival_rate_per_min: Llegadas por minuto (todas las prioridades).
+        arrival_mix: {base_nivel: proporción} de las llegadas.
+    """
+    rng = np.random.default_rng(seed)
+    keys = np.asarray(queue_keys, dtype=float)
+    service = np.asarray(service_minutes, dtype=float)
+    busy = np.asarray(busy_elapsed, dtype=float)
+    n, R = len(keys), replications
+    c = max(int(servers), len(busy), 1)
+
+    if n == 0:
+        empty = np.empty((0, len(percentiles)))
+        return QueueSimulation(empty, np.empty(0), tuple(percentiles), c, R,
+                               np.empty((R, 0)) if keep_samples else None)
+
+    free = np.zeros((R, c))
+    if len(busy):
+        free[:, :len(busy)] = _residual_service(rng, service, busy, R)
+
+    # Dentro de un nivel las llegadas se atienden por orden: basta un puntero por nivel
+    streams = _arrivals(rng, arrival_rate_per_min, arrival_mix or {}, keys.max(), horizon_min, R)
+    stream_next = [np.zeros(R, dtype=int) for _ in streams]
+
+    # La cola actual tiene un orden fijo: su siguiente paciente también es un puntero
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = np.append(keys[order], np.inf)
+    next_in_queue = np.zeros(R, dtype=int)
+
+    start = np.full((R, n), np.nan)
+    rows = np.arange(R)
+    max_events = n + sum(times.shape[1] - 1 for _, times in streams)
+    for _ in range(max_events):
+        active = next_in_queue < n
+        if not active.any():
+            break
+        server = free.argmin(axis=1)
+        t = free[rows, server]
+
+        best_key = sorted_keys[next_in_queue]
+        best_stream = np.full(R, -1)
+        for i, (base, times) in enumerate(streams):
+            arrival = times[rows, stream_next[i]]
+            key = np.where(arrival <= t, base + arrival, np.inf)
+            better = key < best_key
+            best_key = np.where(better, key, best_key)
+            best_stream[better] = i
+        best_stream[~active] = -2
+        for i in range(len(streams)):
+            stream_next[i] += best_stream == i
+
+        from_queue = best_stream == -1
+        start[rows[from_queue], order[next_in_queue[from_queue]]] = t[from_queue]
+        next_in_queue += from_queue
+
+        r, s = rows[active], server[active]
+        free[r, s] = t[active] + service[rng.integers(0, len(service), len(r))]
+
+    return QueueSimulation(
+        eta=np.percentile(start, percentiles, axis=0).T,
+        mean=start.mean(axis=0),
+        percentiles=tuple(percentiles),
+        servers=c,
+        replications=R,
+        samples=start if keep_samples else None,
+    )
@@ -0,0 +1,319 @@
+# path: src/services/rag_ingestion.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Mantenimiento del índice léxico BM25 durante la ingesta
+"""
+Ingesta masiva e incremental de la Base de Conocimiento (RAG).
+
+- Extracción de páginas PDF repartida entre procesos (por rangos de páginas).
+- Troceado por página, con IDs de chunk derivados del contenido (SHA-256):
+  los chunks sin cambios no se vuelven a embeber ni a escribir.
+- Embeddings calculados por lotes.
+- Índice léxico BM25 (services.lexical_index) mantenido en la misma pasada.
+- Manifiesto en disco con el progreso por documento, de modo que una ingesta
+  interrumpida se reanuda donde se quedó y los ficheros sin cambios se saltan.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Callable, Iterable, Tuple, Any
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_EMBED_BATCH = 64
+PAGES_PER_TASK = 20             # Páginas por tarea de extracción
+MIN_PAGES_FOR_PROCESSES = 40    # Por debajo, el coste de arrancar procesos no compensa
+
+MANIFEST_VERSION = 1
+
+
+def _extract_pdf_range(path: str, start: int, end: int) -> List[str]:
+    """Extrae el texto de las páginas [start, end) (se ejecuta en un proceso hijo)."""
+    import pypdf
+    reader = pypdf.PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def _count_pdf_pages(path: str) -> int:
+    import pypdf
+    return len(pypdf.PdfReader(path).pages)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """ID estable de un chunk: documento + hash del contenido (+ nº de repetición)."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    return f"{source}::{digest}" + (f"::{occurrence}" if occurrence else "")
+
+
+class RAGIngestionPipeline:
+    """
+    Pipeline de ingesta incremental sobre una colección de ChromaDB.
+    """
+
+    def __init__(
+        self,
+        collection,
+        manifest_path: str,
+        embedding_function: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        embed_batch_size: int = DEFAULT_EMBED_BATCH,
+        max_workers: Optional[int] = None,
+        lexical_index=None
+    ):
+        """
+        Args:
+            collection: Colección de ChromaDB destino.
+            manifest_path: Fichero JSON con el progreso por documento.
+            embedding_function: Si se indica, se usa para calcular los embeddings
+                por lotes; si no, Chroma los calcula con su función por defecto
+                (también por lotes, en cada upsert).
+            max_workers: Procesos para la extracción de PDFs (0 = en el propio proceso).
+            lexical_index: Índice BM25 (services.lexical_index) a mantener en paralelo.
+        """
+        self.collection = collection
+        self.manifest_path = manifest_path
+        self.embedding_function = embedding_function
+        self.embed_batch_size = embed_batch_size
+        self.lexical_index = lexical_index
+        self.max_workers = min(4, os.cpu_count() or 1) if max_workers is None else max_workers
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+        self.manifest = self._load_manifest()
+
+    # ------------------------------------------------------------------
+    # Manifiesto (progreso reanudable)
+    # ------------------------------------------------------------------
+    def _load_manifest(self) -> Dict[str, Any]:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    return data
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Manifiesto RAG ilegible, se reconstruye: {e}")
+        return {"version": MANIFEST_VERSION, "documents": {}}
+
+    def _save_manifest(self):
+        """Escritura atómica (tmp + replace) para no corromperlo si se interrumpe."""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, self.manifest_path)
+
+    def is_up_to_date(self, filename: str, sha: str) -> bool:
+        entry = self.manifest["documents"].get(filename)
+        if self.lexical_index is not None and not self.lexical_index.has_source(filename):
+            return False
+        return bool(entry) and entry.get("status") == "done" and entry.get("sha256") == sha
+
+    def forget(self, filename: str):
+        """Elimina un documento del manifiesto (p.ej. al borrarlo de la base)."""
+        if self.manifest["documents"].pop(filename, None) is not None:
+            self._save_manifest()
+        if self.lexical_index is not None:
+            self.lexical_index.remove_source(filename)
+
+    # ------------------------------------------------------------------
+    # Extracción
+    # ------------------------------------------------------------------
+    def _extract_pages(self, paths: List[str]) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+        """
+        Extrae las páginas de todos los ficheros. Los PDFs se reparten en tareas
+        de PAGES_PER_TASK páginas entre procesos.
+
+        Returns:
+            tuple: ({ruta: [texto por página]}, {ruta: error})
+        """
+        pages: Dict[str, List[str]] = {}
+        errors: Dict[str, str] = {}
+        pdf_tasks: List[Tuple[str, int, int]] = []
+
+        for path in paths:
+            try:
+                if path.lower().endswith(".pdf"):
+                    n_pages = _count_pdf_pages(path)
+                    pages[path] = [""] * n_pages
+                    for start in range(0, n_pages, PAGES_PER_TASK):
+                        pdf_tasks.append((path, start, min(start + PAGES_PER_TASK, n_pages)))
+                else:
+                    with open(path, "rb") as f:
+                        pages[path] = [f.read().decode("utf-8", errors="replace")]
+            except Exception as e:
+                errors[path] = str(e)
+
+        total_pages = sum(end - start for _, start, end in pdf_tasks)
+        if self.max_workers > 0 and total_pages >= MIN_PAGES_FOR_PROCESSES and len(pdf_tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [(task, pool.submit(_extract_pdf_range, *task)) for task in pdf_tasks]
+                for (path, start, end), future in futures:
+                    try:
+                        pages[path][start:end] = future.result()
+                    except Exception as e:
+                        errors[path] = str(e)
+        else:
+            for path, start, end in pdf_tasks:
+                try:
+                    pages[path][start:end] = _extract_pdf_range(path, start, end)
+                except Exception as e:
+                    errors[path] = str(e)
+        return pages, errors
+
+    def build_chunks(self, filename: str, pages: List[str]) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """
+        Trocea por página (una edición solo afecta a los chunks de su página).
+
+        Returns:
+            tuple: (ids, textos, metadatos)
+        """
+        ids, texts, metas = [], [], []
+        seen: Dict[str, int] = {}
+        chunk_index = 0
+        for page_no, page_text in enumerate(pages, start=1):
+            if not page_text or not page_text.strip():
+                continue
+            for text in self.splitter.split_text(page_text):
+                base = chunk_id(filename, text)
+                occurrence = seen.get(base, 0)
+                seen[base] = occurrence + 1
+                ids.append(chunk_id(filename, text, occurrence))
+                texts.append(text)
+                metas.append({"source": filename, "chunk_index": chunk_index, "page": page_no})
+                chunk_index += 1
+        return ids, texts, metas
+
+    # ------------------------------------------------------------------
+    # Escritura incremental
+    # ------------------------------------------------------------------
+    def _existing_chunks(self, filename: str) -> Dict[str, Dict[str, Any]]:
+        """{id: metadatos} de los chunks ya indexados del documento (sin embeddings)."""
+        result = self.collection.get(where={"source": filename}, include=["metadatas"])
+        return dict(zip(result.get("ids") or [], result.get("metadatas") or []))
+
+    def _sync_document(self, filename: str, pages: List[str]) -> Dict[str, int]:
+        ids, texts, metas = self.build_chunks(filename, pages)
+        if not ids:
+            # Documento vacío o sin texto extraíble (p.ej. PDF escaneado): no se indexa
+            raise ValueError("El documento no contiene texto extraíble")
+        existing = self._existing_chunks(filename)
+        new_set = set(ids)
+
+        stale = [cid for cid in existing if cid not in new_set]
+        if stale:
+            self.collection.delete(ids=stale)
+
+        pending = [i for i, cid in enumerate(ids) if cid not in existing]
+        for b in range(0, len(pending), self.embed_batch_size):
+            batch = pending[b:b + self.embed_batch_size]
+            kwargs = {
+                "ids": [ids[i] for i in batch],
+                "documents": [texts[i] for i in batch],
+                "metadatas": [metas[i] for i in batch],
+            }
+            if self.embedding_function is not None:
+                kwargs["embeddings"] = self.embedding_function(kwargs["documents"])
+            self.collection.upsert(**kwargs)
+
+        # Chunks reutilizados que han cambiado de posición: solo metadatos, sin re-embeber
+        kept = [i for i, cid in enumerate(ids) if cid in existing]
+        moved = [i for i in kept if existing[ids[i]] != metas[i]]
+        if moved:
+            self.collection.update(ids=[ids[i] for i in moved], metadatas=[metas[i] for i in moved])
+
+        # El índice léxico se reconstruye entero para el documento (no requiere embeddings)
+        if self.lexical_index is not None:
+            self.lexical_index.replace_source(filename, ids, texts, metas)
+
+        return {"added": len(pending), "deleted": len(stale), "unchanged": len(kept), "total": len(ids)}
+
+    def ingest(
+        self,
+        paths: Iterable[str],
+        on_progress: Optional[Callable[[int, int, str, Dict[str, Any]], None]] = None,
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Ingesta (o reingesta) un conjunto de ficheros.
+
+        Args:
+            paths: Rutas de los ficheros (PDF/TXT/MD).
+            on_progress: Callback (hechos, total, fichero, stats_del_fichero).
+            force: Reprocesar aunque el fichero no haya cambiado.
+
+        Returns:
+            dict: Totales de la ejecución.
+        """
+        paths = [p for p in paths if p.lower().endswith(SUPPORTED_EXTENSIONS)]
+        totals = {"documents": len(paths), "skipped": 0, "processed": 0, "failed": 0,
+                  "chunks_added": 0, "chunks_deleted": 0, "chunks_unchanged": 0, "errors": {}}
+
+        hashes = {p: file_sha256(p) for p in paths}
+        todo = []
+        for path in paths:
+            filename = os.path.basename(path)
+            if not force and self.is_up_to_date(filename, hashes[path]):
+                totals["skipped"] += 1
+                if on_progress:
+                    on_progress(totals["skipped"], len(paths), filename, {"skipped": True})
+            else:
+                todo.append(path)
+
+        if not todo:
+            return totals
+
+        # Extracción en paralelo de todo lo pendiente
+        pages_by_path, extract_errors = self._extract_pages(todo)
+
+        done = totals["skipped"]
+        for path in todo:
+            filename = os.path.basename(path)
+            entry = {"sha256": hashes[path], "status": "in_progress", "started_at": datetime.now().isoformat()}
+            self.manifest["documents"][filename] = entry
+            try:
+                if path in extract_errors:
+                    raise ValueError(f"Extracción fallida: {extract_errors[path]}")
+                stats = self._sync_document(filename, pages_by_path[path])
+                entry.update(status="done", chunks=stats["total"], updated_at=datetime.now().isoformat())
+                totals["processed"] += 1
+                totals["chunks_added"] += stats["added"]
+                totals["chunks_deleted"] += stats["deleted"]
+                totals["chunks_unchanged"] += stats["unchanged"]
+            except Exception as e:
+                print(f"Error ingesting document {filename}: {e}")
+                entry.update(status="error", error=str(e))
+                totals["failed"] += 1
+                totals["errors"][filename] = str(e)
+                stats = {"error": str(e)}
+            # Progreso persistido tras cada documento: la siguiente ejecución reanuda aquí
+            self._save_manifest()
+            done += 1
+            if on_progress:
+                on_progress(done, len(paths), filename, stats)
+        return totals
+
+    def ingest_directory(self, directory: str, **kwargs) -> Dict[str, Any]:
+        """Ingesta todos los ficheros soportados de un directorio."""
+        if not os.path.isdir(directory):
+            return self.ingest([], **kwargs)
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(SUPPORTED_EXTENSIONS)
+        )
+        return self.ingest(paths, **kwargs)
@@ -1,17 +1,33 @@
+# path: src/services/rag_service.py
+# Actualizado: 2026-10-17 - Ingesta incremental por lotes (RAGIngestionPipeline)
+# Actualizado: 2026-10-17 - Búsqueda por embedding precalculado (embed_query)
+# Actualizado: 2026-10-17 - Búsqueda híbrida BM25 + vectorial (hybrid_search)
+# Actualizado: 2026-10-17 - Versión de la base de conocimiento (kb_version) para invalidar cachés
 import os
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 from typing import List, Dict, Optional
-import pypdf
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import streamlit as st
+from services.rag_ingestion import RAGIngestionPipeline
+from services.lexical_index import LexicalIndex, tokenize
 
 # Configuración de persistencia
 CHROMA_DB_DIR = os.path.join(os.getcwd(), "data", "chroma_db")
 COLLECTION_NAME = "triage_knowledge_base"
+INGEST_MANIFEST_PATH = os.path.join(os.getcwd(), "data", "rag_ingest_manifest.json")
+LEXICAL_INDEX_DIR = os.path.join(os.getcwd(), "data", "rag_lexical")
+
+# Búsqueda híbrida
+KEYWORD_QUERY_MAX_TERMS = 3   # Consultas de hasta N términos: solo léxico (sin embedding)
+HYBRID_CANDIDATES = 20        # Candidatos por cada vía antes de fusionar
+HYBRID_VECTOR_WEIGHT = 0.5    # Peso de la vía vectorial en la fusión (1 - peso para BM25)
+RRF_K = 60                    # Constante de Reciprocal Rank Fusion
 
 class RAGService:
     _instance = None
+    # Se incrementa con cada ingesta o borrado: las cachés de resultados la usan en su clave
+    kb_version = 0
     
     def __new__(cls):
         if cls._instance is None:
@@ -28,7 +44,36 @@ class RAGService:
         
         # Usamos el modelo de embedding por defecto de Chroma (all-MiniLM-L6-v2)
         # Es ligero y corre en local CPU.
-        self.collection = self.client.get_or_create_collection(name=COLLECTION_NAME)
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            embedding_function=self.embedding_function
+        )
+        self.lexical_index = LexicalIndex(LEXICAL_INDEX_DIR)
+        self.ingestion = RAGIngestionPipeline(
+            self.collection,
+            manifest_path=INGEST_MANIFEST_PATH,
+            lexical_index=self.lexical_index
+        )
+        self._backfill_lexical_index()
+
+    def _backfill_lexical_index(self):
+        """Construye el índice léxico a partir de Chroma si aún no existe (instalaciones previas)."""
+        try:
+            if len(self.lexical_index) or not self.collection.count():
+                return
+            data = self.collection.get(include=['documents', 'metadatas'])
+            by_source = {}
+            for cid, doc, meta in zip(data['ids'], data['documents'], data['metadatas']):
+                source = (meta or {}).get('source', 'desconocido')
+                ids, texts, metas = by_source.setdefault(source, ([], [], []))
+                ids.append(cid)
+                texts.append(doc)
+                metas.append(meta or {})
+            for source, (ids, texts, metas) in by_source.items():
+                self.lexical_index.replace_source(source, ids, texts, metas)
+        except Exception as e:
+            print(f"Error construyendo índice léxico: {e}")
         
     def ingest_document(self, file_obj, filename: str) -> bool:
         """
@@ -36,99 +81,155 @@ class RAGService:
         """
         try:
             # 1. Guardar archivo físico en data/rag_docs
-            docs_dir = os.path.join(os.getcwd(), "data", "rag_docs")
-            if not os.path.exists(docs_dir):
-                os.makedirs(docs_dir)
+            file_path = self.save_document(file_obj, filename)
                 
-            file_path = os.path.join(docs_dir, filename)
-            
-            # Guardar el contenido
-            # file_obj viene de st.file_uploader, es un BytesIO-like
-            file_content = file_obj.getvalue()
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-                
-            # 2. Procesar texto
-            text = ""
-            if filename.lower().endswith(".pdf"):
-                # Usar el archivo guardado o el objeto en memoria
-                pdf_reader = pypdf.PdfReader(file_obj)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            else:
-                # Asumimos texto plano o markdown
-                text = file_content.decode("utf-8")
-                
-            if not text.strip():
-                return False
-                
-            # Dividir en chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            chunks = text_splitter.split_text(text)
-            
-            # Preparar datos para Chroma
-            ids = [f"{filename}_chunk_{i}" for i in range(len(chunks))]
-            metadatas = [{"source": filename, "chunk_index": i} for i in range(len(chunks))]
-            
-            # Insertar (upsert)
-            self.collection.upsert(
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
-            )
-            return True
+            # 2. Extraer, trocear e indexar solo los chunks nuevos/cambiados
+            result = self.ingestion.ingest([file_path], force=True)
+            self._knowledge_base_changed()
+            return result["processed"] == 1 and result["failed"] == 0
             
         except Exception as e:
             print(f"Error ingesting document {filename}: {e}")
             return False
 
+    def _knowledge_base_changed(self):
+        self.kb_version += 1
+
+    def save_document(self, file_obj, filename: str) -> str:
+        """Guarda el fichero subido en data/rag_docs y devuelve su ruta."""
+        docs_dir = os.path.join(os.getcwd(), "data", "rag_docs")
+        if not os.path.exists(docs_dir):
+            os.makedirs(docs_dir)
+        file_path = os.path.join(docs_dir, filename)
+        # file_obj viene de st.file_uploader, es un BytesIO-like
+        with open(file_path, "wb") as f:
+            f.write(file_obj.getvalue())
+        return file_path
+
+    def ingest_library(self, directory: Optional[str] = None, on_progress=None, force: bool = False) -> Dict:
+        """
+        Ingesta incremental de toda la biblioteca de protocolos (por defecto data/rag_docs).
+        Solo se procesan los ficheros nuevos o modificados y, dentro de ellos,
+        solo se embeben los chunks cuyo contenido ha cambiado.
+        """
+        directory = directory or os.path.join(os.getcwd(), "data", "rag_docs")
+        result = self.ingestion.ingest_directory(directory, on_progress=on_progress, force=force)
+        if result["processed"] or result["failed"]:
+            self._knowledge_base_changed()
+        return result
+
     def search_context(self, query: str, n_results: int = 3) -> List[str]:
         """
         Busca los fragmentos más relevantes para una query.
         Retorna solo texto (para compatibilidad con triage_service).
         """
+        return [doc["content"] for doc in self.hybrid_search(query, n_results=n_results)]
+
+    def search_documents(self, query: str, n_results: int = 5) -> List[Dict]:
+        """
+        Busca fragmentos y devuelve texto + metadatos.
+        Ideal para el buscador UI.
+        """
+        return self.hybrid_search(query, n_results=n_results)
+
+    def search_documents_dense(self, query: str, n_results: int = 5) -> List[Dict]:
+        """Búsqueda solo vectorial (embedding denso de Chroma)."""
         try:
             results = self.collection.query(
                 query_texts=[query],
-                n_results=n_results
+                n_results=n_results,
+                include=['documents', 'metadatas', 'distances']
             )
-            
-            if results and results['documents']:
-                return results['documents'][0]
+            return self._format_query_results(results)
+        except Exception as e:
+            print(f"Error searching documents: {e}")
             return []
-            
+
+    def hybrid_search(self, query: str, n_results: int = 5) -> List[Dict]:
+        """
+        Búsqueda híbrida léxica (BM25) + vectorial.
+
+        - Consultas cortas de palabras clave (<= KEYWORD_QUERY_MAX_TERMS términos)
+          con coincidencias léxicas: solo BM25, sin calcular embedding.
+        - Resto: fusión por Reciprocal Rank Fusion ponderada de ambas listas.
+
+        Returns:
+            List[Dict]: {"id", "content", "metadata", "score", "match"}
+        """
+        if not query or not query.strip():
+            return []
+        try:
+            lexical = self.lexical_index.search(query, n_results=max(HYBRID_CANDIDATES, n_results))
+
+            # Vía rápida: palabras clave exactas (fármacos, escalas, abreviaturas)
+            if lexical and len(tokenize(query)) <= KEYWORD_QUERY_MAX_TERMS:
+                return [self._lexical_hit(cid, score, "lexical") for cid, score in lexical[:n_results]]
+
+            dense = self.search_documents_dense(query, n_results=max(HYBRID_CANDIDATES, n_results))
+            if not lexical:
+                return dense[:n_results]
+
+            fused: Dict[str, float] = {}
+            hits: Dict[str, Dict] = {}
+            for rank, doc in enumerate(dense):
+                fused[doc["id"]] = fused.get(doc["id"], 0.0) + HYBRID_VECTOR_WEIGHT / (RRF_K + rank + 1)
+                hits[doc["id"]] = doc
+            for rank, (cid, score) in enumerate(lexical):
+                fused[cid] = fused.get(cid, 0.0) + (1 - HYBRID_VECTOR_WEIGHT) / (RRF_K + rank + 1)
+                if cid not in hits:
+                    hits[cid] = self._lexical_hit(cid, score, "lexical")
+
+            ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:n_results]
+            output = []
+            for cid, score in ranked:
+                doc = dict(hits[cid])
+                doc["score"] = score
+                doc["match"] = "hybrid"
+                output.append(doc)
+            return output
+
         except Exception as e:
-            print(f"Error searching context: {e}")
+            print(f"Error searching documents: {e}")
             return []
 
-    def search_documents(self, query: str, n_results: int = 5) -> List[Dict]:
+    def _lexical_hit(self, chunk_id: str, score: float, match: str) -> Dict:
+        doc = self.lexical_index.get(chunk_id) or {"content": "", "metadata": {}}
+        return {"id": chunk_id, "content": doc["content"], "metadata": doc["metadata"], "score": score, "match": match}
+
+    @staticmethod
+    def _format_query_results(results) -> List[Dict]:
+        output = []
+        if results and results['documents']:
+            docs = results['documents'][0]
+            metas = results['metadatas'][0]
+            ids = results['ids'][0]
+            distances = (results.get('distances') or [[None] * len(docs)])[0]
+            for i in range(len(docs)):
+                output.append({
+                    "id": ids[i],
+                    "content": docs[i],
+                    "metadata": metas[i],
+                    "distance": distances[i],
+                    "match": "vector"
+                })
+        return output
+
+    def embed_query(self, query: str) -> List[float]:
+        """Calcula el embedding de una consulta con el mismo modelo que la colección."""
+        return [float(x) for x in self.embedding_function([query])[0]]
+
+    def search_documents_by_embedding(self, embedding: List[float], n_results: int = 5) -> List[Dict]:
         """
-        Busca fragmentos y devuelve texto + metadatos.
-        Ideal para el buscador UI.
+        Igual que search_documents() pero con el embedding ya calculado
+        (permite cachear embeddings de consultas). Incluye la distancia.
         """
         try:
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[embedding],
                 n_results=n_results,
-                include=['documents', 'metadatas']
+                include=['documents', 'metadatas', 'distances']
             )
-            
-            output = []
-            if results and results['documents']:
-                docs = results['documents'][0]
-                metas = results['metadatas'][0]
-                
-                for i in range(len(docs)):
-                    output.append({
-                        "content": docs[i],
-                        "metadata": metas[i]
-                    })
-            return output
-            
+            return self._format_query_results(results)
         except Exception as e:
             print(f"Error searching documents: {e}")
             return []
@@ -170,6 +271,9 @@ class RAGService:
                 where={"source": filename}
             )
             
+            self.ingestion.forget(filename)
+            self._knowledge_base_changed()
+
             # 2. Eliminar archivo físico
             file_path = os.path.join(os.getcwd(), "data", "rag_docs", filename)
             if os.path.exists(file_path):
@@ -0,0 +1,145 @@
+# path: src/services/rescoring_service.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - La configuración actual sale del snapshot de configuración clínica
+"""
+Servicio de re-scoring "what-if" sobre el histórico de 'triage_records'.
+
+Lee los registros de un periodo con una proyección mínima, los puntúa por
+bloques con el scoring vectorizado (components.triage.cohort_scoring) con la
+configuración actual y con una configuración propuesta, y resume cuántos
+pacientes cambiarían de nivel (matrices de transición por PTR, Worst Case y NEWS2).
+"""
+import random
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from db import get_database
+from db.models import PTRConfig, VitalSignAgeConfig
+from services.clinical_config import get_clinical_config
+from components.triage.cohort_scoring import (
+    RESULT_COLUMNS, build_cohort, compile_ptr, compile_vital_signs, score_cohort, score_single
+)
+
+# Campos de triage_records que usa el scoring
+RESCORING_PROJECTION = {
+    "audit_id": 1,
+    "timestamp": 1,
+    "vital_signs": 1,
+    "patient_data.edad": 1,
+    "patient_data.dolor": 1,
+    "patient_data.criterio_geriatrico": 1,
+    "patient_data.criterio_inmunodeprimido": 1,
+    "patient_data.ctx_is_immuno": 1,
+    "patient_data.ctx_is_onco": 1,
+}
+CHUNK_SIZE = 50_000
+
+# Niveles comparados en el resumen: columna -> etiqueta
+TRANSITION_LEVELS = {"ptr_priority": "PTR", "wc_priority": "Worst Case", "news_color": "NEWS2"}
+
+ClinicalConfig = Tuple[Dict[str, PTRConfig], Dict[str, Sequence[VitalSignAgeConfig]]]
+
+
+def load_current_config() -> ClinicalConfig:
+    """Configuración vigente: PTR por metric_key y bandas de edad por signo vital."""
+    snapshot = get_clinical_config()
+    return dict(snapshot.ptr), {key: ref.configs for key, ref in snapshot.vital_signs.items()}
+
+
+def iter_triage_records(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = 5000,
+    db=None,
+) -> Iterator[Dict[str, Any]]:
+    """Recorre los registros de triaje del periodo [start, end) por orden de fecha."""
+    db = db if db is not None else get_database()
+    query: Dict[str, Any] = {}
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    cursor = db["triage_records"].find(query, RESCORING_PROJECTION).sort("timestamp", 1).batch_size(batch_size)
+    yield from cursor
+
+
+def _chunks(records, size: int):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore(records, configs: Sequence[ClinicalConfig], chunk_size: int = CHUNK_SIZE) -> List[pd.DataFrame]:
+    """
+    Puntúa los registros con cada configuración. Cada bloque se convierte una sola
+    vez en cohorte y se evalúa con todas las configuraciones compiladas.
+    Devuelve un DataFrame (RESULT_COLUMNS) por configuración.
+    """
+    compiled = [(compile_ptr(ptr), compile_vital_signs(vital)) for ptr, vital in configs]
+    parts: List[List[pd.DataFrame]] = [[] for _ in compiled]
+    for chunk in _chunks(records, chunk_size):
+        cohort = build_cohort(chunk)
+        for i, (ptr, vital) in enumerate(compiled):
+            parts[i].append(score_cohort(cohort, ptr, vital))
+    return [pd.concat(p, ignore_index=True) if p else pd.DataFrame(columns=RESULT_COLUMNS) for p in parts]
+
+
+def compare(current: pd.DataFrame, proposed: pd.DataFrame) -> Dict[str, Any]:
+    """Resumen de cambios entre dos re-scorings de los mismos registros."""
+    summary: Dict[str, Any] = {"records": len(current), "levels": {}}
+    for column, label in TRANSITION_LEVELS.items():
+        changed = current[column] != proposed[column]
+        summary["levels"][label] = {
+            "changed": int(changed.sum()),
+            "transitions": pd.crosstab(current[column], proposed[column],
+                                       rownames=["actual"], colnames=["propuesta"]),
+        }
+    summary["ptr_score_delta_mean"] = float((proposed["ptr_score"] - current["ptr_score"]).mean()) if len(current) else 0.0
+    return summary
+
+
+def what_if(
+    proposed: ClinicalConfig,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current: Optional[ClinicalConfig] = None,
+    db=None,
+) -> Dict[str, Any]:
+    """Compara la configuración actual (o 'current') con 'proposed' sobre el periodo."""
+    current = current or load_current_config()
+    current_df, proposed_df = rescore(iter_triage_records(start, end, db=db), [current, proposed])
+    summary = compare(current_df, proposed_df)
+    summary["current"] = current_df
+    summary["proposed"] = proposed_df
+    return summary
+
+
+def verify(records: Sequence[Dict[str, Any]], scored: pd.DataFrame, config: ClinicalConfig,
+           sample: int = 1000, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Recalcula una muestra de registros con las funciones por paciente y devuelve
+    las filas que no coinciden exactamente con el resultado vectorizado.
+    """
+    ptr, vital = config
+    compiled_vital = compile_vital_signs(vital)
+    indexes = range(len(records))
+    if sample and sample < len(records):
+        indexes = sorted(random.Random(seed).sample(indexes, sample))
+
+    mismatches = []
+    for i in indexes:
+        expected = score_single(records[i], ptr, compiled_vital)
+        got = scored.iloc[i].to_dict()
+        diff = {k: (got[k], v) for k, v in expected.items() if got[k] != v}
+        if diff:
+            mismatches.append({"index": i, "id": expected["id"], "diff": diff})
+    return mismatches
@@ -0,0 +1,211 @@
+# path: src/services/roster_index.py
+# Creado: 2026-10-17
+"""
+Índice en memoria del cuadrante de personal (turnos + asignaciones fijas).
+
+Se construye con dos consultas por día (usuarios y turnos activos de la fecha) y
+responde "¿quién está en la sala X a la hora T?" y "¿dónde está el usuario U a
+la hora T?" mediante búsquedas por intervalos, sin consultas adicionales.
+
+Aplica la misma regla de prioridad que staff_assignment_service:
+1. Turno activo en ese instante (el primero, en orden de la colección)
+2. Asignación fija (sala_asignada)
+3. Sin asignación
+
+Invalidación: cada índice diario se reconstruye cuando cambia el contador de
+versión de los repositorios de usuarios o turnos (escrituras en este proceso)
+o cuando supera ROSTER_TTL_S (escrituras desde otros procesos o scripts).
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, time as time_class
+from typing import List, Dict, Optional, Any, Tuple
+
+from db.repositories.users import get_users_repository
+from db.repositories.turnos import get_turnos_repository
+
+ROSTER_TTL_S = 30
+ROSTER_MAX_DAYS = 7
+
+
+def _to_time(value) -> time_class:
+    """Convierte "HH:MM" / "HH:MM:SS" o time a time."""
+    if isinstance(value, str):
+        parts = value.split(':')
+        return time_class(int(parts[0]), int(parts[1]), int(parts[2]) if len(parts) > 2 else 0)
+    return value
+
+
+class IntervalIndex:
+    """
+    Índice estático de intervalos cerrados [inicio, fin].
+
+    Intervalos ordenados por inicio con el máximo de 'fin' acumulado: una búsqueda
+    bisecta por inicio y recorre hacia atrás solo mientras algún intervalo anterior
+    pueda seguir abierto (O(log n + k) en la práctica).
+    """
+
+    def __init__(self, intervals: List[Tuple[Any, Any, Any]]):
+        items = sorted(intervals, key=lambda it: it[0])
+        self._starts = [it[0] for it in items]
+        self._items = items
+        self._max_end = []
+        current = None
+        for _, end, _ in items:
+            current = end if current is None or end > current else current
+            self._max_end.append(current)
+
+    def stab(self, point) -> List[Any]:
+        """Valores de los intervalos que contienen 'point'."""
+        found = []
+        i = bisect.bisect_right(self._starts, point) - 1
+        while i >= 0 and self._max_end[i] >= point:
+            start, end, value = self._items[i]
+            if end >= point:
+                found.append(value)
+            i -= 1
+        return found
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RosterIndex:
+    """
+    Cuadrante de un día: turnos activos en la fecha y asignaciones fijas.
+    """
+
+    def __init__(self, day: date, users: List[Dict[str, Any]], shifts: List[Any]):
+        self.day = day
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.user_order: Dict[str, int] = {}
+        self.fixed_by_room: Dict[str, List[str]] = {}
+        for pos, user in enumerate(users):
+            user_id = str(user["_id"])
+            self.users[user_id] = user
+            self.user_order[user_id] = pos
+            sala = user.get("sala_asignada")
+            if sala:
+                self.fixed_by_room.setdefault(sala, []).append(user_id)
+
+        # (seq, turno): seq conserva el orden de la consulta para desempatar solapes
+        self.shifts_by_user: Dict[str, List[Any]] = {}
+        by_room: Dict[str, List[Tuple[time_class, time_class, Any]]] = {}
+        by_user: Dict[str, List[Tuple[time_class, time_class, Any]]] = {}
+        for seq, shift in enumerate(shifts):
+            self.shifts_by_user.setdefault(shift.user_id, []).append(shift)
+            start, end = _to_time(shift.horario_inicio), _to_time(shift.horario_fin)
+            by_room.setdefault(shift.sala_code, []).append((start, end, (seq, shift)))
+            by_user.setdefault(shift.user_id, []).append((start, end, (seq, shift)))
+
+        self._rooms = {sala: IntervalIndex(items) for sala, items in by_room.items()}
+        self._user_shifts = {uid: IntervalIndex(items) for uid, items in by_user.items()}
+
+    def _instant(self, reference_datetime: datetime) -> Optional[time_class]:
+        # Los turnos del índice solo aplican al día indexado
+        if reference_datetime.date() != self.day:
+            return None
+        return reference_datetime.time()
+
+    def user_shift_at(self, user_id: str, reference_datetime: datetime) -> Optional[Any]:
+        """Turno activo del usuario en ese instante (el primero en orden de consulta)."""
+        instant = self._instant(reference_datetime)
+        index = self._user_shifts.get(user_id)
+        if instant is None or index is None:
+            return None
+        matches = index.stab(instant)
+        return min(matches, key=lambda m: m[0])[1] if matches else None
+
+    def user_room(self, user_id: str, reference_datetime: datetime) -> Optional[str]:
+        """¿Dónde está el usuario U a la hora T? (turno activo > asignación fija)."""
+        shift = self.user_shift_at(user_id, reference_datetime)
+        if shift:
+            return shift.sala_code
+        user = self.users.get(user_id)
+        return user.get("sala_asignada") if user else None
+
+    def room_staff(self, sala_code: str, reference_datetime: datetime) -> List[Dict[str, Any]]:
+        """
+        ¿Quién está en la sala X a la hora T? Usuarios activos con la misma
+        estructura que get_room_staff (assignment_type, sala_actual).
+        """
+        staff: Dict[str, str] = {}
+
+        # 1. Turnos de la sala abiertos en T (si su turno efectivo es este)
+        instant = self._instant(reference_datetime)
+        index = self._rooms.get(sala_code)
+        if instant is not None and index is not None:
+            for _, shift in index.stab(instant):
+                user_id = shift.user_id
+                if user_id in staff or user_id not in self.users:
+                    continue
+                current = self.user_shift_at(user_id, reference_datetime)
+                if current is not None and current.sala_code == sala_code:
+                    staff[user_id] = "turno"
+
+        # 2. Asignación fija sin turno activo en T
+        for user_id in self.fixed_by_room.get(sala_code, []):
+            if user_id not in staff and self.user_shift_at(user_id, reference_datetime) is None:
+                staff[user_id] = "fija"
+
+        result = []
+        for user_id in sorted(staff, key=self.user_order.__getitem__):
+            user = self.users[user_id]
+            # Mismo criterio que get_all_users(active_only=True)
+            if user.get("activo") is not True:
+                continue
+            result.append({**user, "assignment_type": staff[user_id], "sala_actual": sala_code})
+        return result
+
+    def user_shifts(self, user_id: str) -> List[Any]:
+        """Turnos del usuario activos en el día indexado."""
+        return list(self.shifts_by_user.get(user_id, []))
+
+
+_cache: "OrderedDict[date, Tuple[tuple, float, RosterIndex]]" = OrderedDict()
+_cache_lock = threading.Lock()
+stats = {"hits": 0, "builds": 0}
+
+
+def _data_version() -> tuple:
+    return (get_users_repository().version, get_turnos_repository().version)
+
+
+def build_roster_index(day: date) -> RosterIndex:
+    """Construye el índice del día con una consulta de usuarios y otra de turnos."""
+    users = get_users_repository().get_all_users(active_only=False)
+    shifts = get_turnos_repository().get_active_shifts(datetime.combine(day, datetime.min.time()))
+    return RosterIndex(day, users, shifts)
+
+
+def get_roster_index(day: Optional[date] = None) -> RosterIndex:
+    """
+    Índice del cuadrante del día (por defecto hoy), reconstruido solo si ha
+    cambiado la versión de usuarios/turnos o ha caducado.
+    """
+    day = day or date.today()
+    version = _data_version()
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(day)
+        if entry and entry[0] == version and now - entry[1] < ROSTER_TTL_S:
+            _cache.move_to_end(day)
+            stats["hits"] += 1
+            return entry[2]
+
+    index = build_roster_index(day)
+    stats["builds"] += 1
+    with _cache_lock:
+        _cache[day] = (version, now, index)
+        _cache.move_to_end(day)
+        while len(_cache) > ROSTER_MAX_DAYS:
+            _cache.popitem(last=False)
+    return index
+
+
+def invalidate_roster_index():
+    """Descarta todos los índices (p. ej. tras cambios masivos externos)."""
+    with _cache_lock:
+        _cache.clear()
@@ -1,4 +1,9 @@
+# path: src/services/second_opinion_service.py
+# Actualizado: 2026-10-17 - Contexto del paciente en consultas por lotes y caché de contexto ensamblado
 import streamlit as st
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 import json
@@ -9,6 +14,16 @@ from db.repositories.prompts import get_prompts_repository
 from db.repositories.people import get_people_repository
 from db import get_database
 
+CONTEXT_CACHE_SIZE = 128
+CONTEXT_CACHE_TTL_S = 600  # Red de seguridad ante ediciones del perfil del paciente
+
+# Campos de triage_records que usa el contexto (evita traer documentos completos)
+TRIAGE_CONTEXT_PROJECTION = {
+    "_id": 0, "audit_id": 1, "timestamp": 1, "triage_result": 1, "vital_signs": 1,
+    "patient_snapshot.texto_medico": 1, "patient_snapshot.dolor": 1,
+    "patient_snapshot.alergias": 1, "patient_snapshot.antecedentes": 1,
+}
+
 class SecondOpinionService:
     """
     Servicio de Segunda Opinión (Reasoning ++).
@@ -20,10 +35,63 @@ class SecondOpinionService:
         self.prompts_repo = get_prompts_repository()
         self.people_repo = get_people_repository()
         self.db = get_database()
+        # (paciente, audit_ids, último timestamp) -> (instante, contexto histórico)
+        self._context_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._context_lock = threading.Lock()
+        self.context_stats = {"hits": 0, "misses": 0}
+
+    def _latest_triage_timestamp(self, patient_code: str) -> Optional[datetime]:
+        """Timestamp del triaje más reciente del paciente (consulta cubierta por índice)."""
+        latest = list(self.db["triage_records"].find(
+            {"patient_id": patient_code}, {"_id": 0, "timestamp": 1}
+        ).sort("timestamp", -1).limit(1))
+        return latest[0].get("timestamp") if latest else None
 
     def _build_patient_context(self, patient_code: str, target_audit_ids: List[str] = None) -> Dict[str, Any]:
         """
         Construye el contexto clínico completo agregando fuentes de datos.
+
+        El perfil y el historial de triajes (con sus adjuntos) se cachean por
+        (paciente, audit_ids seleccionados, timestamp del último triaje): un triaje
+        nuevo cambia la clave. El estado en el flujo se consulta siempre.
+        """
+        ids_key = None if target_audit_ids is None else tuple(sorted(set(target_audit_ids)))
+        key = (patient_code, ids_key, self._latest_triage_timestamp(patient_code))
+        now = time.monotonic()
+        with self._context_lock:
+            entry = self._context_cache.get(key)
+            if entry and now - entry[0] < CONTEXT_CACHE_TTL_S:
+                self._context_cache.move_to_end(key)
+                self.context_stats["hits"] += 1
+                historical = entry[1]
+            else:
+                historical = None
+        if historical is None:
+            historical = self._assemble_historical_context(patient_code, target_audit_ids)
+            with self._context_lock:
+                self.context_stats["misses"] += 1
+                self._context_cache[key] = (now, historical)
+                self._context_cache.move_to_end(key)
+                while len(self._context_cache) > CONTEXT_CACHE_SIZE:
+                    self._context_cache.popitem(last=False)
+
+        context = dict(historical)
+
+        # 4. Flujo Activo (Estado actual)
+        active_flow = self.db["patient_flow"].find_one({"patient_code": patient_code, "activo": True})
+        if active_flow:
+            context["current_status"] = {
+                "location": active_flow.get("sala_code"),
+                "state": active_flow.get("estado"),
+                "entry_time": active_flow.get("entrada").isoformat()
+            }
+
+        return context
+
+    def _assemble_historical_context(self, patient_code: str, target_audit_ids: Optional[List[str]]) -> Dict[str, Any]:
+        """
+        Perfil + historial de triajes con adjuntos en un número fijo de consultas
+        (persona, triajes, adjuntos con $in), independiente de la longitud del historial.
         """
         context = {}
 
@@ -37,29 +105,29 @@ class SecondOpinionService:
             }
 
         # 3. Historial de Triajes (Vitals + Complaints + Files)
-        # Si target_audit_ids es None, NO traemos ninguno por defecto (o lógica de UI)
-        # Aunque la UI pasa la lista. Si es lista vacía, no trae nada.
-        # Modificación: Filtro por IDs
-        
+        # Si target_audit_ids es una lista (vacía o llena), filtramos por ella.
+        # Si es None, se traen todos los triajes del paciente.
         query = {"patient_id": patient_code}
         if target_audit_ids is not None:
-             # Si pasamos una lista (vacía o llena), filtramos por ella.
-             # Si no pasamos nada (None), comportamiento legacy? 
-             # Mejor ser explícitos: la UI manda la lista.
-             query["audit_id"] = {"$in": target_audit_ids}
+            query["audit_id"] = {"$in": list(target_audit_ids)}
+
+        records = list(self.db["triage_records"].find(query, TRIAGE_CONTEXT_PROJECTION).sort("timestamp", -1))
+
+        # Adjuntos de todos los triajes en una sola consulta
+        audit_ids = [r["audit_id"] for r in records if r.get("audit_id")]
+        files_by_audit: Dict[str, List[str]] = {}
+        if audit_ids:
+            f_cursor = self.db["file_imports_records"].find(
+                {"audit_id": {"$in": audit_ids}},
+                {"_id": 0, "audit_id": 1, "file_name": 1, "filename": 1, "file_type": 1}
+            )
+            for f in f_cursor:
+                name = f.get("file_name") or f.get("filename")
+                files_by_audit.setdefault(f.get("audit_id"), []).append(f"{name} ({f.get('file_type')})")
 
-        cursor = self.db["triage_records"].find(query).sort("timestamp", -1)
-        
         triage_history = []
-        for record in cursor:
-            # Buscar archivos adjuntos (metadata)
+        for record in records:
             audit_id = record.get("audit_id")
-            files_meta = []
-            if audit_id:
-                f_cursor = self.db["file_imports"].find({"audit_id": audit_id})
-                for f in f_cursor:
-                    files_meta.append(f"{f.get('filename')} ({f.get('file_type')})")
-            
             triage_history.append({
                 "audit_id": audit_id, # Needed for tracking
                 "date": record.get("timestamp").isoformat(),
@@ -72,21 +140,16 @@ class SecondOpinionService:
                 "ai_analysis_full": record.get("triage_result", {}), # Full AI object
                 "allergies": record.get("patient_snapshot", {}).get("alergias", ""),
                 "background_snapshot": record.get("patient_snapshot", {}).get("antecedentes", ""),
-                "attached_files": files_meta
+                "attached_files": files_by_audit.get(audit_id, [])
             })
         context["triage_history"] = triage_history
-
-        # 4. Flujo Activo (Estado actual)
-        active_flow = self.db["patient_flow"].find_one({"patient_code": patient_code, "activo": True})
-        if active_flow:
-            context["current_status"] = {
-                "location": active_flow.get("sala_code"),
-                "state": active_flow.get("estado"),
-                "entry_time": active_flow.get("entrada").isoformat()
-            }
-
         return context
 
+    def clear_context_cache(self):
+        """Descarta los contextos cacheados."""
+        with self._context_lock:
+            self._context_cache.clear()
+
     def get_available_triages(self, patient_code: str) -> List[Dict[str, Any]]:
         """
         Retorna lista ligera de triajes disponibles para selección.
@@ -138,11 +201,21 @@ class SecondOpinionService:
         # Nota: Para la API, asumimos texto. Si hay multimodalidad, se debe gestionar via API con archivos.
         full_prompt = f"{system_instruction}\n\nCONTEXTO:\n{json.dumps(context, default=str)}\n\nNOTA CLINICA:\n{query_notes}\n{rag_context}"
         
-        # 5. Llamada a Gemini
-        response = self.gemini.generate_content(model_name, full_prompt)
+        # 5. Llamada a Gemini (a través de la pasarela asíncrona)
+        response_data, _ = self.gemini.generate_content(
+            caller_id="second_opinion_service",
+            user_id="api",
+            call_type="clinical_audit",
+            prompt_type="second_opinion_reasoning",
+            prompt_version_id=prompt_config.get("version_id", "active"),
+            model_name=model_name,
+            prompt_content=full_prompt,
+            generation_config={"temperature": 0.2},
+            metadata={"patient_code": patient_code, "rag_used": bool(rag_context)}
+        )
         
         return {
-            "analysis": response if isinstance(response, str) else "Error format", # Simplificación, real sería parsear JSON
+            "analysis": response_data.get("text") or response_data.get("msg", "Error format"),
             "rag_used": bool(rag_context),
             "model_used": model_name
         }
@@ -1,5 +1,6 @@
 # path: src/services/staff_assignment_service.py
 # Creado: 2025-11-26
+# Actualizado: 2026-10-17 - get_room_staff y reporte de conflictos sobre el índice de cuadrante
 """
 Servicio unificado para gestión de asignaciones de personal.
 Resuelve el conflicto entre asignaciones fijas (sala_asignada) y turnos temporales.
@@ -14,6 +15,7 @@ from datetime import datetime, date
 from typing import List, Dict, Optional, Any
 from db.repositories.users import get_users_repository
 from db.repositories.turnos import get_turnos_repository
+from services.roster_index import get_roster_index
 
 
 def _convert_to_time(time_value):
@@ -95,38 +97,8 @@ def get_room_staff(sala_code: str, reference_datetime: Optional[datetime] = None
     if reference_datetime is None:
         reference_datetime = datetime.now()
     
-    users_repo = get_users_repository()
-    turnos_repo = get_turnos_repository()
-    
-    staff = []
-    
-    # 1. Obtener todos los usuarios activos
-    all_users = users_repo.get_all_users()
-    
-    for user in all_users:
-        if not user.get("activo", True):
-            continue
-        
-        user_id = str(user["_id"])
-        current_assignment = get_current_user_assignment(user_id, reference_datetime)
-        
-        if current_assignment == sala_code:
-            # Determinar el tipo de asignación
-            user_shifts = turnos_repo.get_user_shifts(user_id, reference_datetime.date())
-            has_active_shift = any(
-                shift.sala_code == sala_code and
-                datetime.combine(reference_datetime.date(), _convert_to_time(shift.horario_inicio)) <= reference_datetime <= 
-                datetime.combine(reference_datetime.date(), _convert_to_time(shift.horario_fin))
-                for shift in user_shifts
-            )
-            
-            staff.append({
-                **user,
-                "assignment_type": "turno" if has_active_shift else "fija",
-                "sala_actual": current_assignment
-            })
-    
-    return staff
+    # Índice en memoria del día: sin consultas por usuario
+    return get_roster_index(reference_datetime.date()).room_staff(sala_code, reference_datetime)
 
 
 def get_user_assignment_info(user_id: str, reference_datetime: Optional[datetime] = None) -> Dict[str, Any]:
@@ -238,26 +210,21 @@ def get_assignment_conflicts_report() -> List[Dict[str, Any]]:
     Returns:
         Lista de conflictos detectados
     """
-    users_repo = get_users_repository()
-    turnos_repo = get_turnos_repository()
-    
     conflicts = []
     today = date.today()
+    roster = get_roster_index(today)
     
-    all_users = users_repo.get_all_users()
-    
-    for user in all_users:
-        if not user.get("activo", True):
+    for user_id, user in roster.users.items():
+        if user.get("activo") is not True:
             continue
         
-        user_id = str(user["_id"])
         fixed_sala = user.get("sala_asignada")
         
         if not fixed_sala:
             continue
         
-        # Obtener turnos de hoy
-        today_shifts = turnos_repo.get_user_shifts(user_id, today)
+        # Turnos de hoy (ya cargados en el índice)
+        today_shifts = roster.user_shifts(user_id)
         
         for shift in today_shifts:
             if shift.sala_code != fixed_sala:
@@ -1,12 +1,17 @@
 # path: src/services/transcription_service.py
 # Creado: 2025-11-23
+# Actualizado: 2026-10-17 - Modo streaming por tramos (silencios) con caché MD5 por tramo
+# Actualizado: 2026-10-17 - Caché de tramos en 'transcription_segments' por (MD5, prompt, versión)
 """
 Servicio para la lógica de transcripción de audio con Gemini.
 """
 import json
+from typing import Optional, Dict, Any, Iterator
 from services.gemini_client import get_gemini_service
 from core.prompt_manager import PromptManager
 from core.config import get_model_transcription
+from db.repositories.transcription_segments import get_transcription_segments_repository
+from utils.audio_utils import is_wav, split_wav_on_silence, MAX_SEGMENT_S
 
 def transcribir_audio(file_obj=None, prompt_content=None, text_input=None, user_id="system", prompt_type="transcription"):
     """
@@ -44,25 +49,15 @@ def transcribir_audio(file_obj=None, prompt_content=None, text_input=None, user_
         if not file_obj:
             return {"status": "ERROR", "msg": "Se requiere un archivo de audio o texto de entrada."}, prompt
             
-        if hasattr(file_obj, 'getbuffer'):
-            audio_data = bytes(file_obj.getbuffer())
-        elif hasattr(file_obj, 'read'):
-            file_obj.seek(0)
-            audio_data = file_obj.read()
-            file_obj.seek(0)
-        else:
+        audio_data = _leer_audio(file_obj)
+        if audio_data is None:
             return {"status": "ERROR", "msg": "Formato de archivo no soportado para lectura."}, prompt
 
         audio_part = {
-            "mime_type": "audio/wav", 
+            "mime_type": _mime_audio(file_obj),
             "data": audio_data
         }
         
-        if hasattr(file_obj, 'type'):
-            audio_part["mime_type"] = file_obj.type
-        elif hasattr(file_obj, 'name') and file_obj.name.endswith('.mp3'):
-                audio_part["mime_type"] = "audio/mp3"
-        
         final_prompt_content = [prompt, audio_part]
         final_prompt_str = prompt # Para devolver como "prompt usado" (sin el binario)
 
@@ -84,27 +79,166 @@ def transcribir_audio(file_obj=None, prompt_content=None, text_input=None, user_
         metadata={
             "input_type": "text" if text_input else "audio",
             "file_name": getattr(file_obj, 'name', 'unknown') if file_obj else None
-        }
+        },
+        # Solo el modo texto es determinista y barato de direccionar por contenido
+        cache=bool(text_input)
     )
 
     # 4. Post-Procesado de Respuesta
     # Si el prompt era "transcription" (JSON complex), extraer el texto traducido.
     # Si es "clinical_dictation" (Texto plano o JSON simple), devolver texto.
     
-    final_text_result = None
-    
-    if isinstance(response_data, dict):
-        if "translated_ia_text" in response_data:
-            final_text_result = response_data["translated_ia_text"]
-        elif "transcription" in response_data:
-             final_text_result = response_data["transcription"]
-        elif "original_text" in response_data:
-             final_text_result = response_data["original_text"]
-        else:
-             # Fallback JSON dump
-             final_text_result = json.dumps(response_data, ensure_ascii=False)
-    else:
-        final_text_result = str(response_data)
+    final_text_result = _extraer_texto(response_data)
 
     # Devolver TUPLA: (Respuesta Completa API, Texto Extraído)
     return response_data, final_text_result
+
+
+def _leer_audio(file_obj) -> Optional[bytes]:
+    """Lee los bytes de un fichero subido (UploadedFile, BytesIO o fichero abierto)."""
+    if hasattr(file_obj, 'getbuffer'):
+        return bytes(file_obj.getbuffer())
+    if hasattr(file_obj, 'read'):
+        file_obj.seek(0)
+        audio_data = file_obj.read()
+        file_obj.seek(0)
+        return audio_data
+    return None
+
+
+def _mime_audio(file_obj) -> str:
+    if hasattr(file_obj, 'type') and file_obj.type:
+        return file_obj.type
+    if hasattr(file_obj, 'name') and file_obj.name.endswith('.mp3'):
+        return "audio/mp3"
+    return "audio/wav"
+
+
+def _extraer_texto(response_data) -> str:
+    """Extrae el texto transcrito de la respuesta del modelo (según el tipo de prompt)."""
+    if isinstance(response_data, dict):
+        if "translated_ia_text" in response_data:
+            return response_data["translated_ia_text"]
+        if "transcription" in response_data:
+            return response_data["transcription"]
+        if "original_text" in response_data:
+            return response_data["original_text"]
+        if "text" in response_data:
+            return response_data["text"]
+        # Fallback JSON dump
+        return json.dumps(response_data, ensure_ascii=False)
+    return str(response_data)
+
+
+def _segmento_cacheado(md5: str, prompt_type: str, version_id: Optional[str]) -> Optional[str]:
+    """Texto de un tramo ya transcrito con ese prompt y versión (None si no existe)."""
+    try:
+        return get_transcription_segments_repository().get_text(md5, prompt_type, version_id) or None
+    except Exception as e:
+        print(f"Error leyendo tramo de transcripción: {e}")
+        return None
+
+
+def transcribir_audio_streaming(
+    file_obj,
+    user_id: str = "system",
+    prompt_type: str = "transcription",
+    max_segment_s: float = MAX_SEGMENT_S
+) -> Iterator[Dict[str, Any]]:
+    """
+    Transcripción por tramos para dictados largos.
+
+    Divide el WAV por silencios, lanza todos los tramos pendientes a la vez en la
+    pasarela de IA (que limita la concurrencia) y va devolviendo el texto en orden
+    según llegan los resultados. Cada tramo se cachea por su MD5 y el tipo y
+    versión del prompt en 'transcription_segments', así que al reenviar una
+    grabación editada solo se transcriben los tramos que han cambiado. Los
+    tramos no se guardan en 'transcriptions_records': la transcripción
+    auditada es la del dictado completo, que guarda quien llama.
+
+    Yields:
+        dict: {index, total, status, text, partial_text, cached, start_s, end_s}
+    """
+    def _evento(seg, status, text, cached, msg=None):
+        evento = {
+            "index": seg.index, "total": len(segments), "status": status,
+            "text": text, "partial_text": " ".join(t for t in textos if t),
+            "cached": cached, "start_s": seg.start_s, "end_s": seg.end_s
+        }
+        if msg:
+            evento["msg"] = msg
+        return evento
+
+    from services.contingency_service import is_contingency_active
+    if is_contingency_active():
+        yield {"status": "ERROR", "msg": "Modo Contingencia activo: Transcripción IA desactivada.", "suggest_contingency": True}
+        return
+
+    audio_data = _leer_audio(file_obj)
+    if not audio_data or not is_wav(audio_data):
+        # Formatos comprimidos: sin segmentación, una sola llamada
+        response_data, text = transcribir_audio(file_obj, user_id=user_id, prompt_type=prompt_type)
+        status = "ERROR" if response_data.get("status") == "ERROR" else "OK"
+        yield {"index": 0, "total": 1, "status": status, "text": text if status == "OK" else "",
+               "partial_text": text if status == "OK" else "", "cached": False, "msg": response_data.get("msg")}
+        return
+
+    prompt_data = PromptManager().get_prompt(prompt_type)
+    if not prompt_data:
+        yield {"status": "ERROR", "msg": f"No se ha encontrado un prompt activo para '{prompt_type}'."}
+        return
+    prompt = prompt_data.get("content", "")
+    version_id = prompt_data.get("version_id", "unknown")
+    model_name = prompt_data.get("model") or get_model_transcription()
+
+    segments = split_wav_on_silence(audio_data, max_segment_s=max_segment_s)
+    textos = [None] * len(segments)
+
+    # 1. Resolver tramos ya transcritos y lanzar el resto en paralelo
+    service = get_gemini_service()
+    futures = {}
+    for seg in segments:
+        cached_text = _segmento_cacheado(seg.md5, prompt_type, version_id)
+        if cached_text is not None:
+            textos[seg.index] = cached_text
+            continue
+        futures[seg.index] = service.submit_content(
+            caller_id="transcription_service",
+            user_id=user_id,
+            call_type="transcription",
+            prompt_type=prompt_type,
+            prompt_version_id=version_id,
+            model_name=model_name,
+            prompt_content=[prompt, {"mime_type": "audio/wav", "data": seg.wav_bytes}],
+            generation_config={
+                "temperature": 0.2,
+                "response_mime_type": "application/json",
+            },
+            metadata={
+                "input_type": "audio_segment",
+                "segment_index": seg.index,
+                "segment_count": len(segments),
+                "segment_md5": seg.md5,
+                "file_name": getattr(file_obj, 'name', 'unknown')
+            }
+        )
+
+    # 2. Devolver en orden a medida que se completan
+    for seg in segments:
+        future = futures.get(seg.index)
+        if future is None:
+            yield _evento(seg, "OK", textos[seg.index], cached=True)
+            continue
+        try:
+            response_data, _ = future.result()
+        except Exception as e:
+            response_data = {"status": "ERROR", "msg": str(e)}
+
+        if response_data.get("status") == "ERROR":
+            yield _evento(seg, "ERROR", "", cached=False, msg=response_data.get("msg"))
+            continue
+
+        text = _extraer_texto(response_data)
+        textos[seg.index] = text
+        get_transcription_segments_repository().save_text(seg.md5, prompt_type, version_id, text)
+        yield _evento(seg, "OK", text, cached=False)
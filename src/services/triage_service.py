@@ -272,7 +272,8 @@ def llamar_modelo_gemini(motivo, edad, dolor, vital_signs=None, imagen=None, pro
         metadata={
             "patient_age": edad,
             "has_image": bool(imagen)
-        }
+        },
+        cache=True
     )
 
     # 5. Post-procesamiento específico de Triaje
@@ -0,0 +1,272 @@
+# path: src/services/wait_time_service.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - estimate_room_waits: cola real de una sala (simulador del panel ML)
+"""
+Estimación de tiempos de espera con el simulador de cola (services.queue_simulator).
+
+Alimenta la simulación con datos en vivo:
+- Cola: pacientes en salas de espera de box, con la prioridad de queue_manager.
+- Atenciones en curso: pacientes en boxes de atención (tiempo ya transcurrido).
+- Médicos: personal con función 'medico' en boxes de atención según el cuadrante
+  (roster_index); DEFAULT_DOCTORS si el cuadrante no tiene a nadie.
+- Duración de la atención: muestra empírica de 'patient_flow.duracion_minutos'
+  de los pasos cerrados en boxes de atención.
+- Llegadas: media de entradas en salas de espera de box para la hora actual y
+  proporción de niveles de los triajes recientes.
+
+Las estadísticas históricas se recalculan como mucho cada STATS_TTL_S.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db import get_database
+from services.queue_manager import priority_key
+from services.queue_simulator import simulate_queue, REPLICATIONS, PERCENTILES
+
+DEFAULT_DOCTORS = 3
+DEFAULT_SERVICE_MINUTES = 20
+MIN_SERVICE_SAMPLES = 30
+SERVICE_SAMPLE_MAX = 5000
+HISTORY_DAYS = 28
+STATS_TTL_S = 300
+NEW_PATIENT_LEVEL = "Nivel III"
+
+# Muestra de respaldo: cuantiles de una exponencial de media DEFAULT_SERVICE_MINUTES
+_DEFAULT_SERVICE = -DEFAULT_SERVICE_MINUTES * np.log(1 - (np.arange(100) + 0.5) / 100)
+
+
+@dataclass
+class FlowStatistics:
+    service_minutes: np.ndarray
+    service_source: str                        # 'patient_flow' o 'default'
+    arrivals_per_hour: np.ndarray              # (24,) llegadas medias por hora del día
+    arrival_mix: Dict[int, float] = field(default_factory=dict)  # {base_nivel: proporción}
+
+
+@dataclass
+class WaitEstimate:
+    """
+    ETA (minutos desde ahora hasta empezar la atención) por paciente y para un
+    paciente nuevo: {'p10', 'p50', 'p90', 'mean'} (+ 'waited', minutos ya esperados).
+    """
+    etas: Dict[str, Dict[str, float]]
+    new_patient: Dict[str, float]
+    servers: int
+    staffing_source: str
+    service_median: float
+    service_source: str
+    arrivals_per_hour: float
+    elapsed_ms: float
+
+
+_stats_cache: Dict[str, Any] = {"at": 0.0, "stats": None}
+_stats_lock = threading.Lock()
+
+
+def box_rooms(subtipo: str) -> List[str]:
+    """Códigos de las salas activas de box con ese subtipo ('espera' o 'atencion')."""
+    from services.room_service import obtener_salas_por_tipo
+    return [s['codigo'] for s in obtener_salas_por_tipo('box') if s.get('subtipo') == subtipo]
+
+
+def load_flow_statistics(now: Optional[datetime] = None, db=None) -> FlowStatistics:
+    """Duraciones de atención, llegadas por hora y mezcla de niveles de las últimas semanas."""
+    db = db if db is not None else get_database()
+    since = (now or datetime.now()) - timedelta(days=HISTORY_DAYS)
+
+    durations = [
+        d["duracion_minutos"] for d in db["patient_flow"].find(
+            {"sala_tipo": "box", "sala_subtipo": "atencion", "activo": False,
+             "duracion_minutos": {"$gt": 0}, "salida": {"$gte": since}},
+            {"duracion_minutos": 1, "_id": 0},
+        ).sort("salida", -1).limit(SERVICE_SAMPLE_MAX)
+    ]
+    if len(durations) >= MIN_SERVICE_SAMPLES:
+        service, source = np.asarray(durations, dtype=float), "patient_flow"
+    else:
+        service, source = _DEFAULT_SERVICE, "default"
+
+    arrivals = np.zeros(24)
+    for row in db["patient_flow"].aggregate([
+        {"$match": {"sala_tipo": "box", "sala_subtipo": "espera", "entrada": {"$gte": since}}},
+        {"$group": {"_id": {"$hour": "$entrada"}, "n": {"$sum": 1}}},
+    ]):
+        if row["_id"] is not None:
+            arrivals[int(row["_id"])] = row["n"] / HISTORY_DAYS
+
+    levels = {}
+    for row in db["triage_records"].aggregate([
+        {"$match": {"timestamp": {"$gte": since}}},
+        {"$group": {"_id": "$triage_result.final_priority", "n": {"$sum": 1}}},
+    ]):
+        if isinstance(row["_id"], (int, float)) and 1 <= row["_id"] <= 5:
+            levels[int(row["_id"]) * 1000] = levels.get(int(row["_id"]) * 1000, 0) + row["n"]
+    total = sum(levels.values())
+    mix = {base: n / total for base, n in levels.items()} if total else {}
+
+    return FlowStatistics(service, source, arrivals, mix)
+
+
+def get_flow_statistics() -> FlowStatistics:
+    """Estadísticas históricas en memoria (recalculadas como mucho cada STATS_TTL_S)."""
+    with _stats_lock:
+        if _stats_cache["stats"] is not None and time.monotonic() - _stats_cache["at"] < STATS_TTL_S:
+            return _stats_cache["stats"]
+    stats = load_flow_statistics()
+    with _stats_lock:
+        _stats_cache.update(at=time.monotonic(), stats=stats)
+    return stats
+
+
+def invalidate_flow_statistics():
+    with _stats_lock:
+        _stats_cache.update(at=0.0, stats=None)
+
+
+def doctors_on_duty(now: Optional[datetime] = None) -> Tuple[int, str]:
+    """Médicos en boxes de atención según el cuadrante: (número, 'turnos' | 'default')."""
+    from services.roster_index import get_roster_index
+
+    now = now or datetime.now()
+    roster = get_roster_index(now.date())
+    doctors = set()
+    for sala_code in box_rooms('atencion'):
+        for user in roster.room_staff(sala_code, now):
+            if 'medico' in (user.get('funciones') or []):
+                doctors.add(str(user['_id']))
+    if doctors:
+        return len(doctors), "turnos"
+    return DEFAULT_DOCTORS, "default"
+
+
+def _minutes_since(value: Any, now: datetime) -> float:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return 0.0
+    if not isinstance(value, datetime):
+        return 0.0
+    return max(0.0, (now - value.replace(tzinfo=None)).total_seconds() / 60)
+
+
+def _summary(samples: np.ndarray) -> Dict[str, float]:
+    values = np.percentile(samples, PERCENTILES)
+    summary = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values)}
+    summary["mean"] = float(samples.mean())
+    return summary
+
+
+def estimate_waits(
+    queue: Sequence[Dict[str, Any]],
+    in_service: Sequence[Dict[str, Any]] = (),
+    now: Optional[datetime] = None,
+    servers: Optional[int] = None,
+    stats: Optional[FlowStatistics] = None,
+    replications: int = REPLICATIONS,
+    seed: Optional[int] = None,
+) -> WaitEstimate:
+    """
+    Simula la cola y devuelve la ETA de cada paciente (por patient_code) y la de
+    un paciente de NEW_PATIENT_LEVEL que llegara ahora.
+
+    Args:
+        queue: Pacientes en espera (nivel_triaje, wait_start, patient_code).
+        in_service: Pacientes en atención (wait_start/entrada del box).
+        servers: Médicos disponibles (por defecto, según el cuadrante).
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    stats = stats or get_flow_statistics()
+    staffing_source = "parametro"
+    if servers is None:
+        servers, staffing_source = doctors_on_duty(now)
+
+    # Claves de queue_manager en minutos relativos a ahora (base_nivel - minutos esperando)
+    now_ts = now.timestamp()
+    keys = np.array([(priority_key(p) - now_ts) / 60 for p in queue], dtype=float)
+    new_key = (priority_key({"nivel_triaje": NEW_PATIENT_LEVEL}, now) - now_ts) / 60
+    busy = [_minutes_since(p.get("wait_start") or p.get("entrada"), now) for p in in_service]
+    rate_per_hour = float(stats.arrivals_per_hour[now.hour])
+
+    def run(run_keys):
+        return simulate_queue(
+            run_keys, servers, stats.service_minutes, busy_elapsed=busy,
+            arrival_rate_per_min=rate_per_hour / 60, arrival_mix=stats.arrival_mix,
+            replications=replications, seed=seed, keep_samples=True,
+        )
+
+    result = run(keys)
+    # El paciente nuevo se simula aparte (solo le afectan los que van por delante)
+    # para no retrasar a los de menor prioridad de la cola real
+    ahead = run(np.append(keys[keys <= new_key], new_key))
+    etas = {
+        str(p.get("patient_code", i)): {**_summary(result.samples[:, i]), "waited": _minutes_since(p.get("wait_start"), now)}
+        for i, p in enumerate(queue)
+    }
+    return WaitEstimate(
+        etas=etas,
+        new_patient=_summary(ahead.samples[:, -1]),
+        servers=result.servers,
+        staffing_source=staffing_source,
+        service_median=float(np.median(stats.service_minutes)),
+        service_source=stats.service_source,
+        arrivals_per_hour=rate_per_hour,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def _in_service(vista: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Pacientes en los boxes de atención (ocupan a los médicos de la simulación)."""
+    return [p for sala_code in box_rooms('atencion') for p in vista.get(sala_code, [])]
+
+
+def estimate_box_waits(
+    vista: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    waiting_rooms: Optional[List[str]] = None,
+    now: Optional[datetime] = None,
+) -> Tuple[List[Dict[str, Any]], WaitEstimate]:
+    """
+    Cola priorizada de las salas de espera de box y su estimación.
+    Devuelve (cola, estimación); reutiliza 'vista' y 'waiting_rooms' si ya se tienen.
+    """
+    from services.patient_flow_service import obtener_vista_global_salas
+    from services.queue_manager import build_prioritized_queue
+
+    now = now or datetime.now()
+    vista = vista if vista is not None else obtener_vista_global_salas()
+    waiting_rooms = waiting_rooms if waiting_rooms is not None else box_rooms('espera')
+    queue = build_prioritized_queue(vista, waiting_rooms, now)
+    return queue, estimate_waits(queue, _in_service(vista), now)
+
+
+def estimate_room_waits(
+    sala_code: str,
+    queue_length: Optional[int] = None,
+    vista: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    now: Optional[datetime] = None,
+) -> Tuple[List[Dict[str, Any]], WaitEstimate]:
+    """
+    Estimación para la cola real de una sala con las atenciones en curso reales.
+
+    Con 'queue_length' (escenario hipotético) se usan los primeros pacientes de
+    la cola real y, si faltan, se completa con pacientes de NEW_PATIENT_LEVEL
+    que llegan ahora. Devuelve (cola simulada, estimación).
+    """
+    from services.patient_flow_service import obtener_vista_global_salas
+    from services.queue_manager import build_prioritized_queue
+
+    now = now or datetime.now()
+    vista = vista if vista is not None else obtener_vista_global_salas()
+    queue = build_prioritized_queue(vista, [sala_code], now)
+    if queue_length is not None:
+        queue = queue[:queue_length] + [
+            {"patient_code": f"_hipotetico_{i}", "nivel_triaje": NEW_PATIENT_LEVEL, "wait_start": now}
+            for i in range(max(0, queue_length - len(queue)))
+        ]
+    return queue, estimate_waits(queue, _in_service(vista), now)
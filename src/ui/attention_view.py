@@ -1,5 +1,6 @@
 # path: src/ui/attention_view.py
 # Creado: 2025-11-24
+# Actualizado: 2026-10-17 - Cola priorizada desde el índice persistente (build_prioritized_queue)
 """
 Vista de Atención en Box (Consulta Médica).
 Permite seleccionar pacientes de la sala de espera, atenderlos y finalizar su flujo.
@@ -16,6 +17,7 @@ from services.room_service import obtener_salas_por_tipo
 from ui.config.config_loader import load_centro_config
 
 from ui.components.waiting_list import render_waiting_list_component
+from services.queue_manager import build_prioritized_queue
 
 def render_waiting_list(selected_box_code):
     """Muestra la lista de pacientes en salas de espera para ser llamados."""
@@ -30,16 +32,15 @@ def render_waiting_list(selected_box_code):
     salas_espera = [s for s in salas_box if s.get('subtipo') == 'espera']
     codigos_espera = [s['codigo'] for s in salas_espera]
     
-    pacientes_espera = []
-    for codigo in codigos_espera:
-        pacientes_espera.extend(vista_global.get(codigo, []))
+    # Cola priorizada desde el índice incremental por sala
+    pacientes_espera = build_prioritized_queue(vista_global, codigos_espera)
         
     if not pacientes_espera:
         st.info("No hay pacientes en salas de espera.")
         return
 
     # Usar componente reutilizable
-    render_waiting_list_component(pacientes_espera, context="attention", box_code=selected_box_code)
+    render_waiting_list_component(pacientes_espera, context="attention", box_code=selected_box_code, presorted=True)
 
 def render_active_patient(patient_code, box_code):
     """Muestra la ficha del paciente que está siendo atendido."""
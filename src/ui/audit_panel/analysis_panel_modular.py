@@ -11,7 +11,6 @@ from components.analytics.modules.feedback_analysis import render_feedback_analy
 from components.analytics.modules.concordance_analysis import render_concordance_analysis_module
 
 def mostrar_panel_analisis_modular(
-    df_audit_base,
     df_files=None,
     df_trans=None,
     df_feedback=None,
@@ -20,11 +19,12 @@ def mostrar_panel_analisis_modular(
     """
     Panel de Análisis Gráfico Modular.
     Orquesta los submódulos independientes.
+    Los módulos de triaje (KPIs, evolución, triaje, concordancia) consultan los
+    agregados de audit_rollups para su rango; el resto recibe los DataFrames.
     """
     st.subheader("📊 Análisis Gráfico")
 
     # Dataframes base (copias para seguridad)
-    df_analisis = df_audit_base.copy()
     df_files_base = df_files.copy() if df_files is not None else pd.DataFrame()
     df_trans_base = df_trans.copy() if df_trans is not None else pd.DataFrame()
     df_feedback_base = df_feedback.copy() if df_feedback is not None else pd.DataFrame()
@@ -41,9 +41,9 @@ def mostrar_panel_analisis_modular(
         tabs = st.tabs(["🎯 Resumen General", "📈 Evolución Temporal"])
         
         with tabs[0]:
-            render_kpis_module(df_analisis, df_files_base, df_trans_base, key_prefix=f"{key_prefix}_kpis")
+            render_kpis_module(key_prefix=f"{key_prefix}_kpis")
         with tabs[1]:
-            render_evolution_module(df_analisis, df_files_base, key_prefix=f"{key_prefix}_evol")
+            render_evolution_module(key_prefix=f"{key_prefix}_evol")
 
     elif category == "🏥 Actividad Clínica":
         tabs = st.tabs([
@@ -53,9 +53,9 @@ def mostrar_panel_analisis_modular(
         ])
         
         with tabs[0]:
-            render_triage_analysis_module(df_analisis, key_prefix=f"{key_prefix}_triage")
+            render_triage_analysis_module(key_prefix=f"{key_prefix}_triage")
         with tabs[1]:
-            render_concordance_analysis_module(df_analisis, key_prefix=f"{key_prefix}_concordance")
+            render_concordance_analysis_module(key_prefix=f"{key_prefix}_concordance")
         with tabs[2]:
             render_file_analysis_module(df_files_base, key_prefix=f"{key_prefix}_files")
         with tabs[3]:
@@ -0,0 +1,96 @@
+# path: src/ui/audit_panel/debug_modules/query_profiler_panel.py
+# Creado: 2026-10-17
+import json
+import streamlit as st
+import pandas as pd
+from db import get_database
+from db.query_profiler import (
+    PROFILER_ENABLED, SLOW_QUERY_MS, get_query_profiler, get_persisted_profiles
+)
+
+THIS_PROCESS = "Este proceso (en vivo)"
+STATS_COLUMNS = ["count", "total_ms", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "docs", "errors"]
+
+
+def _table(rows, leading, limit=50):
+    if not rows:
+        st.caption("Sin datos.")
+        return
+    df = pd.DataFrame(rows[:limit])
+    st.dataframe(df[[c for c in leading + STATS_COLUMNS if c in df.columns]], use_container_width=True, hide_index=True)
+
+
+def render_query_profiler_panel(key_prefix="query_profiler"):
+    """
+    Perfil de acceso a MongoDB: latencias por colección y por punto de llamada,
+    formas de consulta sin índice (COLLSCAN) y consultas lentas.
+    Permite ver el proceso actual o los perfiles persistidos por otros procesos
+    y exportar el resumen como JSON.
+    """
+    st.markdown("### ⏱️ Perfil de consultas MongoDB")
+    if not PROFILER_ENABLED:
+        st.info("El perfilado está desactivado (MONGO_PROFILER=0).")
+        return
+
+    profiler = get_query_profiler()
+    persisted = {}
+    try:
+        persisted = {p["_id"]: p for p in get_persisted_profiles(get_database()) if p["_id"] != profiler.process}
+    except Exception as e:
+        st.caption(f"No se pudieron leer los perfiles persistidos: {e}")
+
+    source = st.selectbox("Origen", [THIS_PROCESS] + list(persisted.keys()), key=f"{key_prefix}_source")
+    profile = profiler.snapshot() if source == THIS_PROCESS else persisted[source]
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    totals = profile["totals"]
+    collscans = [s for s in profile["shapes"] if s.get("plan") == "COLLSCAN"]
+    c1.metric("Comandos", f"{totals['count']:,}")
+    c2.metric("Tiempo total", f"{totals['total_ms'] / 1000:.1f} s")
+    c3.metric("p95", f"{totals['p95_ms']:.0f} ms")
+    c4.metric("Errores", totals["errors"])
+    c5.metric("Formas con COLLSCAN", len(collscans))
+    st.caption(f"Desde {profile['started_at']} · umbral de consulta lenta: {profile.get('slow_query_ms', SLOW_QUERY_MS):.0f} ms")
+
+    b1, b2, b3 = st.columns(3)
+    if source == THIS_PROCESS:
+        if b1.button("🔄 Refrescar", key=f"{key_prefix}_refresh"):
+            st.rerun()
+        if b2.button("🧹 Reiniciar contadores", key=f"{key_prefix}_reset"):
+            profiler.reset()
+            st.rerun()
+    b3.download_button(
+        "⬇️ Exportar JSON",
+        data=json.dumps(profile, default=str, ensure_ascii=False, indent=2),
+        file_name=f"query_profile_{profile['process'].replace(':', '_')}.json",
+        mime="application/json",
+        key=f"{key_prefix}_export",
+    )
+
+    tab_sites, tab_cols, tab_shapes, tab_slow = st.tabs(
+        ["📍 Puntos de llamada", "🗄️ Colecciones", "🧭 Formas de consulta", "🐢 Consultas lentas"]
+    )
+    with tab_sites:
+        _table(profile["call_sites"], ["call_site", "collection", "command"])
+    with tab_cols:
+        _table(profile["collections"], ["collection"])
+        st.markdown("**Por operación**")
+        _table(profile["operations"], ["collection", "command"])
+    with tab_shapes:
+        if collscans:
+            st.warning(f"{len(collscans)} formas de consulta recorren la colección completa (COLLSCAN): revisar índices.")
+        shapes = pd.DataFrame(profile["shapes"])
+        if shapes.empty:
+            st.caption("Sin datos.")
+        else:
+            shapes["plan"] = shapes["plan"].fillna("pendiente")
+            st.dataframe(
+                shapes[["plan", "collection", "command", "shape", "count", "total_ms", "avg_ms", "max_ms", "call_site"]]
+                .sort_values(["plan", "total_ms"], key=lambda s: s.eq("COLLSCAN") if s.name == "plan" else s, ascending=False),
+                use_container_width=True, hide_index=True,
+            )
+    with tab_slow:
+        if profile["slow_queries"]:
+            st.dataframe(pd.DataFrame(profile["slow_queries"]), use_container_width=True, hide_index=True)
+        else:
+            st.caption("No hay consultas por encima del umbral.")
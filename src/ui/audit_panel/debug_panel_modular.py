@@ -1,6 +1,9 @@
+# path: src/ui/audit_panel/debug_panel_modular.py
+# Actualizado: 2026-10-17 - Sección de perfil de consultas (latencias, COLLSCAN, exportación JSON)
 import streamlit as st
 from db import get_database
 from .debug_modules.collection_inspector import render_collection_inspector
+from .debug_modules.query_profiler_panel import render_query_profiler_panel
 
 def render_debug_panel_modular(key_prefix="debug_modular"):
     """
@@ -8,7 +11,18 @@ def render_debug_panel_modular(key_prefix="debug_modular"):
     Itera sobre las colecciones y renderiza el inspector para cada una.
     """
     st.subheader("🔍 Inspector de MongoDB Atlas")
-    
+
+    view = st.radio(
+        "Vista:",
+        ["🗄️ Colecciones", "⏱️ Perfil de consultas"],
+        horizontal=True,
+        label_visibility="collapsed",
+        key=f"{key_prefix}_view"
+    )
+    if view == "⏱️ Perfil de consultas":
+        render_query_profiler_panel(key_prefix=f"{key_prefix}_profiler")
+        return
+
     try:
         db = get_database()
         all_collections = sorted(db.list_collection_names())
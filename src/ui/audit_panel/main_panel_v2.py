@@ -1,16 +1,15 @@
 # path: src/ui/audit_panel/main_panel_v2.py
+# Actualizado: 2026-10-17 - El análisis de triaje usa agregados (audit_rollups) en lugar de audit_log
 """
 Módulo principal del panel de auditoría (Versión Modular V2).
 """
 
-from datetime import date, datetime, timedelta
 import streamlit as st
 import pandas as pd
 from .raw_data_panel_v2 import mostrar_panel_datos_brutos_v2
 from .analysis_panel_modular import mostrar_panel_analisis_modular
 from .feedback_management import render_feedback_management
 from .debug_panel_modular import render_debug_panel_modular
-from db.repositories.audit import get_audit_repository
 from db.repositories.files import get_file_imports_repository
 from db.repositories.transcriptions import get_transcriptions_repository
 
@@ -41,28 +40,24 @@ def mostrar_registro_auditoria_v2():
         # Cargar repositorios y datos con indicador de carga
         @st.cache_data(ttl=60, show_spinner=False)
         def load_audit_data_v2():
-            audit_repo = get_audit_repository()
+            # audit_log no se carga: sus métricas salen de audit_rollups por rango
             files_repo = get_file_imports_repository()
             trans_repo = get_transcriptions_repository()
             
             return (
-                audit_repo.get_recent(limit=1000),
                 files_repo.get_recent(limit=1000),
                 trans_repo.get_recent(limit=1000),
                 get_feedback_reports(limit=1000)
             )
 
-        audit_records, files_records, trans_records, feedback_records = load_audit_data_v2()
+        files_records, trans_records, feedback_records = load_audit_data_v2()
 
         # Convertir a DataFrames
-        df_audit_base = pd.DataFrame(audit_records)
         df_files = pd.DataFrame(files_records)
         df_trans = pd.DataFrame(trans_records)
         df_feedback = pd.DataFrame(feedback_records)
 
         # Garantizar columnas mínimas
-        if df_audit_base.empty:
-            df_audit_base = pd.DataFrame(columns=["timestamp", "decision_humana", "detalles"])
         if df_files.empty:
             df_files = pd.DataFrame(columns=["timestamp", "file_name", "file_type", "file_md5"])
         elif "file_md5" not in df_files.columns:
@@ -115,28 +110,6 @@ def mostrar_registro_auditoria_v2():
                                 key=f"dl_doc_{rel_path}"
                             )
 
-        # Procesar timestamps
-        if "timestamp" in df_audit_base.columns:
-            df_audit_base["timestamp"] = pd.to_datetime(df_audit_base["timestamp"], errors="coerce")
-            df_audit_base.dropna(subset=["timestamp"], inplace=True)
-            df_audit_base.sort_values(by="timestamp", ascending=False, inplace=True)
-
-            # Expandir detalles si existen
-            if "detalles" in df_audit_base.columns:
-                detalles_df = pd.json_normalize(df_audit_base["detalles"])
-                for col in detalles_df.columns:
-                    if col not in df_audit_base.columns:
-                        df_audit_base[col] = detalles_df[col]
-            
-            # Asegurar que existe audit_id (usar _id si no existe)
-            if "audit_id" not in df_audit_base.columns:
-                if "_id" in df_audit_base.columns:
-                    df_audit_base["audit_id"] = df_audit_base["_id"].astype(str)
-                else:
-                    # Generar IDs temporales si no hay _id
-                    df_audit_base["audit_id"] = [f"AUD-{i:04d}" for i in range(len(df_audit_base))]
-
-
         if not df_files.empty and "timestamp" in df_files.columns:
             df_files["timestamp"] = pd.to_datetime(df_files["timestamp"], errors="coerce")
         if not df_trans.empty and "timestamp" in df_trans.columns:
@@ -144,37 +117,9 @@ def mostrar_registro_auditoria_v2():
         if not df_feedback.empty and "timestamp" in df_feedback.columns:
             df_feedback["timestamp"] = pd.to_datetime(df_feedback["timestamp"], errors="coerce")
 
-        # Parámetros de URL
-        params = st.query_params
-        def get_date_from_params(param_name, default_date):
-            try:
-                return date.fromisoformat(params[param_name])
-            except (KeyError, ValueError):
-                return default_date
-
-        # Rango global de fechas (Solo para Análisis Gráfico por ahora, ya que Datos V2 es modular)
-        if not df_audit_base.empty:
-            min_date = df_audit_base["timestamp"].min().date()
-            max_date = df_audit_base["timestamp"].max().date()
-            if min_date == max_date:
-                max_date = min_date + timedelta(days=1)
-        else:
-            min_date = date(2020, 1, 1)
-            max_date = date.today()
-
-        default_start_analisis = get_date_from_params("analisis_start", min_date)
-        default_end_analisis = get_date_from_params("analisis_end", max_date)
-
-        # Decisiones únicas
-        decisiones_uniques = []
-        if "decision_humana" in df_audit_base.columns:
-            decisiones_uniques = df_audit_base["decision_humana"].dropna().unique().tolist()
-        default_decisions = params.get_all("decisiones") or decisiones_uniques
-
         # Renderizar paneles
         with tab_analisis:
             mostrar_panel_analisis_modular(
-                df_audit_base,
                 df_files,
                 df_trans,
                 df_feedback,
@@ -187,7 +132,7 @@ def mostrar_registro_auditoria_v2():
 
         with tab_datos:
             mostrar_panel_datos_brutos_v2(
-                df_audit_base,
+                None,
                 df_files,
                 df_trans,
                 df_feedback
@@ -1,10 +1,11 @@
 # path: src/ui/components/waiting_list.py
+# Actualizado: 2026-10-17 - Soporte de colas ya ordenadas (presorted) y alert_level precalculado
 import streamlit as st
 from datetime import datetime
 from services.queue_manager import sort_queue, get_wait_time_alert
 from services.patient_flow_service import iniciar_atencion_box
 
-def render_waiting_list_component(patients: list, context: str = "dashboard", box_code: str = None):
+def render_waiting_list_component(patients: list, context: str = "dashboard", box_code: str = None, presorted: bool = False):
     """
     Renderiza una lista de pacientes en espera.
     
@@ -12,13 +13,19 @@ def render_waiting_list_component(patients: list, context: str = "dashboard", bo
         patients: Lista de diccionarios de pacientes.
         context: 'dashboard' (vista general) o 'attention' (para llamar a box).
         box_code: Código del box si el contexto es 'attention'.
+        presorted: Si la lista ya viene priorizada (build_prioritized_queue).
     """
     if not patients:
         st.info("✅ No hay pacientes en espera.")
         return
 
-    # Ordenar por prioridad
-    sorted_patients = sort_queue(patients)
+    # Ordenar por prioridad (salvo que ya venga del índice de colas)
+    if presorted:
+        sorted_patients = patients
+    else:
+        sorted_patients = sort_queue(patients)
+        for p in sorted_patients:
+            p.setdefault('alert_level', get_wait_time_alert(p))
     
     # Renderizar lista usando el componente unificado
     from ui.components.common.patient_card import render_patient_card
@@ -1,7 +1,30 @@
+# path: src/ui/config/knowledge_base_ui.py
+# Actualizado: 2026-10-17 - Carga múltiple y reindexado incremental con progreso
 import streamlit as st
 from services.rag_service import get_rag_service
 import pandas as pd
 
+def _run_ingestion(rag_service) -> bool:
+    """Ejecuta la ingesta incremental de data/rag_docs mostrando el progreso."""
+    progress = st.progress(0.0, text="Preparando ingesta...")
+
+    def _on_progress(done, total, filename, stats):
+        estado = "sin cambios" if stats.get("skipped") else ("error" if stats.get("error") else "indexado")
+        progress.progress(done / max(total, 1), text=f"{done}/{total} · {filename} ({estado})")
+
+    result = rag_service.ingest_library(on_progress=_on_progress)
+    progress.empty()
+
+    st.success(
+        f"✅ {result['processed']} procesados, {result['skipped']} sin cambios · "
+        f"{result['chunks_added']} fragmentos nuevos, {result['chunks_deleted']} eliminados, "
+        f"{result['chunks_unchanged']} reutilizados."
+    )
+    for filename, error in result["errors"].items():
+        st.error(f"❌ {filename}: {error}")
+    return result["failed"] == 0
+
+
 def render_knowledge_base_ui():
     """
     Renderiza la interfaz de gestión de la Base de Conocimiento (RAG).
@@ -28,22 +51,24 @@ def render_knowledge_base_ui():
     st.divider()
 
     # --- CARGA DE DOCUMENTOS ---
-    with st.expander("📤 Subir Nuevo Documento", expanded=True):
-        uploaded_file = st.file_uploader(
-            "Selecciona un archivo", 
+    with st.expander("📤 Subir Nuevos Documentos", expanded=True):
+        uploaded_files = st.file_uploader(
+            "Selecciona uno o varios archivos", 
             type=["pdf", "txt", "md"],
+            accept_multiple_files=True,
             help="Sube protocolos, guías clínicas o normativa interna."
         )
         
-        if uploaded_file:
+        if uploaded_files:
             if st.button("Procesar e Indexar", type="primary"):
-                with st.spinner("Procesando documento... Esto puede tardar unos segundos."):
-                    success = rag_service.ingest_document(uploaded_file, uploaded_file.name)
-                    if success:
-                        st.success(f"✅ {uploaded_file.name} indexado correctamente.")
-                        st.rerun()
-                    else:
-                        st.error("❌ Error al procesar el documento.")
+                for uploaded_file in uploaded_files:
+                    rag_service.save_document(uploaded_file, uploaded_file.name)
+                if _run_ingestion(rag_service):
+                    st.rerun()
+
+        # Reindexado incremental de toda la biblioteca (reanuda si se interrumpió)
+        if st.button("🔄 Reindexar Biblioteca", help="Procesa solo los documentos nuevos o modificados y, dentro de ellos, solo los fragmentos que han cambiado."):
+            _run_ingestion(rag_service)
 
     st.divider()
     
@@ -0,0 +1,86 @@
+# path: src/ui/config/performance_tab.py
+# Creado: 2026-10-17
+"""
+Pestaña de rendimiento de la interfaz: coste de cada rerun de Streamlit por vista.
+Activa el perfilado para la sesión actual y muestra el desglose tipo flamegraph
+del último rerun y los percentiles por vista acumulados en 'rerun_view_stats'.
+"""
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+from db.repositories.rerun_profiles import get_rerun_profiles_repository
+from utils.rerun_profiler import PROFILE_SESSION_KEY, HISTORY_SESSION_KEY
+
+
+def _short(label: str) -> str:
+    return label.rsplit(".", 1)[-1] if "." in label else label
+
+
+def render_flamegraph(frames, key):
+    """Icicle invertido (raíz abajo) con el tiempo propio de cada marco."""
+    fig = go.Figure(go.Icicle(
+        ids=[f["path"] for f in frames],
+        labels=[_short(f["label"]) for f in frames],
+        parents=[f["path"].rsplit(";", 1)[0] if ";" in f["path"] else "" for f in frames],
+        values=[f["self_ms"] for f in frames],
+        branchvalues="remainder",
+        customdata=[[f["label"], f["ms"], f["calls"], f["db_calls"], f["db_ms"]] for f in frames],
+        hovertemplate="<b>%{customdata[0]}</b><br>Total: %{customdata[1]:.1f} ms<br>"
+                      "Llamadas: %{customdata[2]}<br>BD: %{customdata[3]} (%{customdata[4]:.1f} ms)<extra></extra>",
+        tiling=dict(orientation="v", flip="y"),
+    ))
+    fig.update_layout(margin=dict(t=10, l=0, r=0, b=0), height=420)
+    st.plotly_chart(fig, use_container_width=True, key=key)
+
+
+def render_performance_tab():
+    st.subheader("⏱️ Rendimiento de la interfaz (reruns)")
+    st.caption("Mide cuánto tarda cada vista (render_* / mostrar_*) y cargador en caché en cada rerun, "
+               "y cuántas consultas a MongoDB hace. Solo afecta a la sesión donde se activa.")
+
+    st.toggle("Perfilar los reruns de esta sesión", key=PROFILE_SESSION_KEY)
+
+    history = st.session_state.get(HISTORY_SESSION_KEY) or []
+    tab_session, tab_views, tab_recent = st.tabs(["🔥 Esta sesión", "📊 Percentiles por vista", "🕒 Reruns recientes"])
+
+    with tab_session:
+        if not history:
+            st.info("Activa el perfilado e interactúa con la aplicación para ver el desglose del último rerun.")
+        else:
+            options = {f"{r['started_at']:%H:%M:%S} · {r['total_ms']:.0f} ms · {r['db_calls']} consultas BD": r for r in history}
+            rerun = options[st.selectbox("Rerun", list(options.keys()), key="perf_session_rerun")]
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Duración", f"{rerun['total_ms']:.0f} ms")
+            c2.metric("Consultas BD", rerun["db_calls"])
+            c3.metric("Tiempo en BD", f"{rerun['db_ms']:.0f} ms")
+            render_flamegraph(rerun["frames"], key="perf_session_flame")
+            df = pd.DataFrame(rerun["frames"]).sort_values("self_ms", ascending=False)
+            st.dataframe(df[["label", "kind", "calls", "ms", "self_ms", "db_calls", "db_ms"]],
+                         use_container_width=True, hide_index=True)
+
+    repo = get_rerun_profiles_repository()
+    with tab_views:
+        rows = repo.get_view_percentiles()
+        if not rows:
+            st.info("Todavía no hay reruns perfilados.")
+        else:
+            df = pd.DataFrame(rows)
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            top = df[df["kind"] != "rerun"].head(20)
+            fig = go.Figure(go.Bar(x=top["p95_ms"], y=top["view"].map(_short), orientation="h",
+                                   marker_color=top["kind"].map({"view": "#1f77b4", "cache": "#ff7f0e"})))
+            fig.update_layout(yaxis=dict(autorange="reversed"), xaxis_title="p95 (ms)",
+                              margin=dict(t=10, l=0, r=0, b=0), height=30 * len(top) + 60)
+            st.plotly_chart(fig, use_container_width=True, key="perf_views_p95")
+        if st.button("🗑️ Borrar estadísticas de rendimiento", key="perf_clear"):
+            repo.clear()
+            st.rerun()
+
+    with tab_recent:
+        recent = repo.get_recent_reruns(limit=50)
+        if not recent:
+            st.info("No hay reruns persistidos.")
+        else:
+            options = {f"{r['started_at']:%Y-%m-%d %H:%M:%S} · {r.get('user') or '-'} · {r['total_ms']:.0f} ms": r for r in recent}
+            rerun = options[st.selectbox("Rerun", list(options.keys()), key="perf_recent_rerun")]
+            render_flamegraph(rerun["frames"], key="perf_recent_flame")
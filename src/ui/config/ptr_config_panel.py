@@ -1,11 +1,64 @@
+# path: src/ui/config/ptr_config_panel.py
+# Actualizado: 2026-10-17 - Simulación what-if de los cambios sobre el histórico de triajes
 """
 Panel de configuración para la Puntuación Total de Riesgo (PTR).
-Permite editar multiplicadores y reglas de cálculo.
+Permite editar multiplicadores y reglas de cálculo y simular su impacto
+sobre el histórico antes de guardarlos.
 """
+from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
 from db.repositories.ptr_config import get_ptr_config_repository, PTRConfig, PTRRule
 
+
+def _build_config(config: PTRConfig, edited_df: pd.DataFrame, base_mult, geriatric_mult, immuno_mult) -> PTRConfig:
+    """Copia de la configuración con los valores del formulario."""
+    new_rules = []
+    for _, row in edited_df.iterrows():
+        # Validar datos básicos
+        if pd.isna(row["value"]) or pd.isna(row["points"]):
+            continue
+            
+        new_rules.append(PTRRule(
+            operator=row["operator"],
+            value=float(row["value"]),
+            value_max=float(row["value_max"]) if not pd.isna(row["value_max"]) else None,
+            points=float(row["points"]),
+            description=str(row["description"]) if not pd.isna(row["description"]) else None
+        ))
+
+    return config.model_copy(update={
+        "base_multiplier": base_mult,
+        "geriatric_multiplier": geriatric_mult if geriatric_mult > 0 else None,
+        "immuno_multiplier": immuno_mult if immuno_mult > 0 else None,
+        "rules": new_rules,
+    })
+
+
+def _render_what_if(proposed_config: PTRConfig, days: int):
+    """Re-puntúa el histórico con la configuración propuesta y muestra los cambios de nivel."""
+    from services.rescoring_service import load_current_config, what_if
+
+    current = load_current_config()
+    proposed_ptr = dict(current[0])
+    proposed_ptr[proposed_config.metric_key] = proposed_config
+    with st.spinner(f"Re-puntuando los triajes de los últimos {days} días..."):
+        summary = what_if((proposed_ptr, current[1]), start=datetime.now() - timedelta(days=days), current=current)
+
+    level = summary["levels"]["PTR"]
+    st.markdown(f"#### 🔬 Impacto estimado: {proposed_config.name}")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Triajes analizados", f"{summary['records']:,}")
+    c2.metric("Cambian de nivel PTR", f"{level['changed']:,}")
+    c3.metric("Variación media PTR", f"{summary['ptr_score_delta_mean']:+.2f}")
+    if level["changed"]:
+        st.caption("Filas: nivel con la configuración actual · Columnas: nivel con la propuesta (1 = más grave)")
+        st.dataframe(level["transitions"], use_container_width=True)
+    elif summary["records"]:
+        st.success("Ningún triaje del periodo cambiaría de nivel PTR.")
+    else:
+        st.info("No hay triajes en el periodo seleccionado.")
+
 def render_ptr_config_panel():
     st.header("⚙️ Configuración PTR (Puntuación Total de Riesgo)")
     st.info("Ajuste los multiplicadores y reglas para el cálculo automático del nivel de riesgo.")
@@ -125,29 +178,14 @@ def render_ptr_config_panel():
             key=f"editor_ptr_{selected_key}"
         )
 
-        submitted = st.form_submit_button("💾 Guardar Cambios", type="primary")
+        what_if_days = st.slider("Periodo para simular (días)", min_value=7, max_value=365, value=90, step=7)
+        col_save, col_sim = st.columns(2)
+        submitted = col_save.form_submit_button("💾 Guardar Cambios", type="primary")
+        simulate = col_sim.form_submit_button("🔬 Simular impacto en el histórico")
         
         if submitted:
             # Reconstruir objeto config
-            new_rules = []
-            for _, row in edited_df.iterrows():
-                # Validar datos básicos
-                if pd.isna(row["value"]) or pd.isna(row["points"]):
-                    continue
-                    
-                new_rules.append(PTRRule(
-                    operator=row["operator"],
-                    value=float(row["value"]),
-                    value_max=float(row["value_max"]) if not pd.isna(row["value_max"]) else None,
-                    points=float(row["points"]),
-                    description=str(row["description"]) if not pd.isna(row["description"]) else None
-                ))
-            
-            # Actualizar config
-            config.base_multiplier = base_mult
-            config.geriatric_multiplier = geriatric_mult if geriatric_mult > 0 else None
-            config.immuno_multiplier = immuno_mult if immuno_mult > 0 else None
-            config.rules = new_rules
+            config = _build_config(config, edited_df, base_mult, geriatric_mult, immuno_mult)
             
             if repo.save_config(config):
                 st.success("Configuración guardada correctamente.")
@@ -155,4 +193,7 @@ def render_ptr_config_panel():
             else:
                 st.error("Error al guardar la configuración.")
 
+    if simulate:
+        _render_what_if(_build_config(config, edited_df, base_mult, geriatric_mult, immuno_mult), what_if_days)
+
     st.markdown('<div class="debug-footer">src/ui/config/ptr_config_panel.py</div>', unsafe_allow_html=True)
@@ -1,6 +1,7 @@
 # path: src/ui/config_panel.py
 # Creado: 2025-11-23
 # Actualizado: 2025-12-01 - Refactorizado en módulos (Loader, General, Centro)
+# Actualizado: 2026-10-17 - Pestaña de rendimiento (perfilado de reruns por vista)
 """
 Panel de configuración de la aplicación.
 Orquesta las pestañas principales delegando en módulos específicos.
@@ -14,6 +15,7 @@ from ui.config.ai_config_ui import render_ai_config_ui
 from services.permissions_service import has_permission
 
 from ui.config.liquid_ui_tab import render_liquid_ui_tab
+from ui.config.performance_tab import render_performance_tab
 
 def mostrar_panel_configuracion():
     """Muestra el panel de configuración con pestañas modulares."""
@@ -45,6 +47,10 @@ def mostrar_panel_configuracion():
     if has_permission("configuracion", "prompts"): # Usamos el mismo nivel avanzado por ahora
         tabs_map["LiquidUI"] = "🎨 Interface Líquida"
 
+    # Rendimiento de la interfaz (perfilado de reruns)
+    if has_permission("configuracion", "centro"):
+        tabs_map["Rendimiento"] = "⏱️ Rendimiento"
+
     selected_tabs = st.tabs(list(tabs_map.values()))
     
     # Asignar variables a las tabs creadas
@@ -71,4 +77,9 @@ def mostrar_panel_configuracion():
         with tab_liquid:
             render_liquid_ui_tab()
 
+    if "Rendimiento" in tabs_map:
+        tab_perf = selected_tabs[list(tabs_map.keys()).index("Rendimiento")]
+        with tab_perf:
+            render_performance_tab()
+
     st.markdown('<div class="debug-footer">src/ui/config_panel.py</div>', unsafe_allow_html=True)
@@ -1,5 +1,10 @@
 # path: src/ui/ml_predictions_panel.py
 # Creado: 2025-11-26
+# Actualizado: 2026-10-17 - Predicción horaria del día en una sola inferencia
+# Actualizado: 2026-10-17 - Entrenamiento en segundo plano con progreso y registro de versiones
+# Actualizado: 2026-10-17 - Rango P10-P90 del simulador de cola en la predicción de espera
+# Actualizado: 2026-10-17 - Pestaña de anomalías sobre alertas de flujo precalculadas
+# Actualizado: 2026-10-17 - Simulador de espera sobre la cola real de la sala seleccionada
 """
 Panel de predicciones y análisis con Machine Learning.
 """
@@ -23,18 +28,13 @@ def render_ml_predictions_panel():
     col_actions, col_status = st.columns([1, 1])
     
     with col_actions:
-        if st.button("🔄 Re-entrenar Modelos", help="Entrenar modelos con datos actuales"):
-            with st.spinner("Entrenando modelos Random Forest..."):
-                from services.ml_training_service import MLTrainingService
-                trainer = MLTrainingService()
-                result = trainer.train_all()
-                
-                if result.get("status") == "success":
-                    st.success(result.get("msg"))
-                    # Recargar servicio de predicción
-                    get_ml_service().load_models()
-                else:
-                    st.error(f"Error: {result.get('msg')}")
+        if st.button("🔄 Re-entrenar Modelos", help="Entrenar modelos con datos actuales (en segundo plano)"):
+            from services.ml_training_service import start_training_job
+            from services.permissions_service import get_current_user
+            user = get_current_user() or {}
+            st.session_state.ml_training_job = start_training_job(requested_by=user.get("username", "system"))
+            st.rerun()
+        render_training_job_status()
                     
     with col_status:
         service = get_ml_service()
@@ -45,6 +45,9 @@ def render_ml_predictions_panel():
             st.warning("⚠️ Modelos No Cargados")
             st.caption("Usando heurística de respaldo.")
 
+    with st.expander("🗂️ Registro de modelos"):
+        render_model_registry(service)
+
     st.divider()
 
     tabs = st.tabs(["📊 Demanda", "⏱️ Tiempos de Espera", "👥 Staffing", "🔍 Anomalías"])
@@ -62,6 +65,72 @@ def render_ml_predictions_panel():
         render_anomaly_detection_tab(ml_service)
 
 
+@st.fragment(run_every=3)
+def render_training_job_status():
+    """Progreso del entrenamiento en curso (o resultado del último lanzado en la sesión)."""
+    from db.repositories.ml_training_jobs import get_ml_training_jobs_repository
+    jobs = get_ml_training_jobs_repository()
+    job = jobs.get_active_job()
+    if job is None and st.session_state.get("ml_training_job"):
+        job = jobs.get_job(st.session_state.ml_training_job)
+    if job is None:
+        return
+
+    if job["status"] in ("queued", "running"):
+        st.progress(job.get("progress") or 0.0, text=f"⏳ {job.get('stage', 'En cola')}")
+        return
+
+    result = job.get("result") or {}
+    if job["status"] == "success":
+        st.success(result.get("msg", "Entrenamiento completado."))
+        # La versión nueva se carga en segundo plano; las predicciones siguen con la anterior
+        get_ml_service().refresh_models()
+    else:
+        st.error(f"Error: {result.get('msg', 'entrenamiento fallido')}")
+    st.session_state.pop("ml_training_job", None)
+
+
+def render_model_registry(service):
+    """Versiones registradas por modelo, con métricas de holdout, promoción y rollback."""
+    from services.ml_model_registry import get_model_registry, MODEL_NAMES
+    from services.permissions_service import get_current_user
+    registry = get_model_registry()
+    username = (get_current_user() or {}).get("username", "admin")
+    labels = {"demand": "Demanda", "wait_time": "Tiempo de espera"}
+
+    for name in MODEL_NAMES:
+        st.markdown(f"**{labels.get(name, name)}**")
+        versions = registry.list_versions(name)
+        if not versions:
+            st.caption("Sin versiones registradas.")
+            continue
+        rows = [{
+            "activa": "✅" if v["active"] else "",
+            "versión": v["version"],
+            "creada": v["created_at"],
+            "registros": (v.get("training") or {}).get("records"),
+            "MAE holdout": v["metrics"].get("mae"),
+            "MAE referencia": v["metrics"].get("baseline_mae"),
+            "R²": v["metrics"].get("r2"),
+        } for v in versions]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+        col_sel, col_promote, col_rollback = st.columns([2, 1, 1])
+        selected = col_sel.selectbox("Versión", [v["version"] for v in versions], key=f"ml_registry_{name}",
+                                     label_visibility="collapsed")
+        if col_promote.button("⬆️ Promocionar", key=f"ml_promote_{name}"):
+            registry.promote(name, selected, by=username)
+            service.refresh_models()
+            st.rerun()
+        if col_rollback.button("↩️ Rollback", key=f"ml_rollback_{name}"):
+            restored = registry.rollback(name, by=username)
+            if restored:
+                service.refresh_models()
+                st.rerun()
+            else:
+                st.warning("No hay una versión anterior a la que volver.")
+
+
 def render_demand_prediction_tab(ml_service):
     """
     Tab de predicción de demanda.
@@ -89,8 +158,7 @@ def render_demand_prediction_tab(ml_service):
     st.markdown("#### Predicción por Hora")
     
     predictions = []
-    for hora in range(24):
-        pred = ml_service.predict_demand(selected_sala, fecha_pred, hora)
+    for hora, pred in enumerate(ml_service.predict_demand_day(selected_sala, fecha_pred)):
         predictions.append({
             'Hora': f"{hora:02d}:00",
             'Demanda Predicha': pred['demanda_predicha'],
@@ -133,6 +201,10 @@ def render_wait_time_tab(ml_service):
     # Simulador
     st.markdown("#### Simulador de Tiempo de Espera")
     
+    # Una sola lectura de la ocupación para todas las simulaciones de la pestaña
+    from services.patient_flow_service import obtener_vista_global_salas
+    vista = obtener_vista_global_salas()
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -150,11 +222,12 @@ def render_wait_time_tab(ml_service):
             "Pacientes en Espera",
             min_value=0,
             max_value=30,
-            value=5
+            value=min(len(vista.get(selected_sala, [])), 30),
+            help="Por defecto, los pacientes que hay ahora en la sala"
         )
     
     # Calcular predicción
-    pred = ml_service.predict_wait_time(selected_sala, pacientes_espera)
+    pred = ml_service.predict_wait_time(selected_sala, pacientes_espera, vista=vista)
     
     st.divider()
     
@@ -162,7 +235,8 @@ def render_wait_time_tab(ml_service):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Tiempo Predicho", f"{pred['tiempo_predicho_min']} min")
+        rango = f"P10-P90: {pred['tiempo_p10_min']}-{pred['tiempo_p90_min']} min ({pred['modelo_usado']})" if 'tiempo_p90_min' in pred else None
+        st.metric("Tiempo Predicho", f"{pred['tiempo_predicho_min']} min", help=rango)
     
     with col2:
         st.metric("Tiempo por Paciente", f"{pred['tiempo_por_paciente']} min")
@@ -180,7 +254,7 @@ def render_wait_time_tab(ml_service):
     st.markdown("#### Proyección de Tiempos según Carga")
     
     cargas = list(range(0, 31, 5))
-    tiempos = [ml_service.predict_wait_time(selected_sala, c)['tiempo_predicho_min'] for c in cargas]
+    tiempos = [ml_service.predict_wait_time(selected_sala, c, vista=vista)['tiempo_predicho_min'] for c in cargas]
     
     df_projection = pd.DataFrame({
         'Pacientes en Espera': cargas,
@@ -300,39 +374,42 @@ def render_anomaly_detection_tab(ml_service):
     with col2:
         dias_historico = st.slider("Días de Histórico", min_value=7, max_value=90, value=30)
     
-    if st.button("🔍 Detectar Anomalías", type="primary"):
-        with st.spinner("Analizando patrones históricos..."):
-            import time
-            time.sleep(1)
+    # Las alertas las calcula el detector en segundo plano: aquí solo se leen
+    from services.anomaly_detection_service import get_last_processed_hour
+    ultima_hora = get_last_processed_hour()
+    if ultima_hora is None:
+        st.info("La detección de anomalías aún no se ha ejecutado.")
+    else:
+        st.caption(f"Analizado hasta las {ultima_hora.strftime('%d/%m/%Y %H:%M')} (llegadas y salidas por hora frente a la misma franja de semanas anteriores)")
+    
+    anomalies = ml_service.detect_anomalies(selected_sala, dias_historico)
+    
+    if not anomalies:
+        st.success("✅ No se detectaron anomalías significativas")
+    else:
+        st.warning(f"⚠️ Se detectaron {len(anomalies)} anomalías")
+        
+        for anomaly in anomalies:
+            severity_color = {
+                'alta': 'error',
+                'media': 'warning',
+                'baja': 'info'
+            }[anomaly['severidad']]
             
-            anomalies = ml_service.detect_anomalies(selected_sala, dias_historico)
+            tipo_icon = '📈' if anomaly['tipo'] == 'pico_inusual' else '📉'
             
-            if not anomalies:
-                st.success("✅ No se detectaron anomalías significativas")
-            else:
-                st.warning(f"⚠️ Se detectaron {len(anomalies)} anomalías")
+            with st.container(border=True):
+                col_date, col_data = st.columns([1, 3])
                 
-                for anomaly in anomalies:
-                    severity_color = {
-                        'alta': 'error',
-                        'media': 'warning',
-                        'baja': 'info'
-                    }[anomaly['severidad']]
-                    
-                    tipo_icon = '📈' if anomaly['tipo'] == 'pico_inusual' else '📉'
-                    
-                    with st.container(border=True):
-                        col_date, col_data = st.columns([1, 3])
-                        
-                        with col_date:
-                            st.markdown(f"**{anomaly['fecha'].strftime('%d/%m/%Y')}**")
-                            st.caption(f"{tipo_icon} {anomaly['tipo'].replace('_', ' ').title()}")
-                        
-                        with col_data:
-                            getattr(st, severity_color)(
-                                f"Desviación de {anomaly['desviacion']} pacientes "
-                                f"(Esperado: {anomaly['demanda_esperada']}, Real: {anomaly['demanda_real']})"
-                            )
+                with col_date:
+                    st.markdown(f"**{anomaly['fecha'].strftime('%d/%m/%Y %H:00')}**")
+                    st.caption(f"{tipo_icon} {anomaly['tipo'].replace('_', ' ').title()}")
+                
+                with col_data:
+                    getattr(st, severity_color)(
+                        f"{anomaly['metrica'].capitalize()}: desviación de {anomaly['desviacion']} pacientes "
+                        f"(Esperado: {anomaly['demanda_esperada']}, Real: {anomaly['demanda_real']})"
+                    )
 
     st.markdown("---")
     st.caption(f"📍 `src/ui/ml_predictions_panel.py`")
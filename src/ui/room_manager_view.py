@@ -16,6 +16,7 @@ from services.patient_flow_service import (
     rechazar_paciente,
     detectar_errores_salas,
 )
+from services.occupancy_service import reconstruir_ocupacion
 from ui.config.config_loader import load_centro_config
 from components.common.room_card import render_room_card
 
@@ -273,6 +274,8 @@ def mostrar_gestor_salas():
         st.header("📊 Tablero de Control de Salas")
     with col_refresh:
         if st.button("🔄 Actualizar Datos", type="primary", use_container_width=True):
+            # Resincroniza la proyección de ocupación con patient_flow
+            reconstruir_ocupacion()
             st.rerun()
     
     st.markdown("Visión global del estado del centro y herramientas de corrección.")
@@ -1,8 +1,12 @@
 # path: src/ui/waiting_room_dashboard.py
+# Actualizado: 2026-10-17 - Cola e indicador de alertas desde PriorityQueueIndex
+# Actualizado: 2026-10-17 - Tiempos estimados con el simulador de cola (wait_time_service)
 import streamlit as st
 from services.patient_flow_service import obtener_vista_global_salas
 from services.room_service import obtener_salas_por_tipo
 from ui.components.waiting_list import render_waiting_list_component
+from services.queue_manager import count_wait_alerts
+from services.wait_time_service import estimate_box_waits
 
 
 
@@ -38,68 +42,49 @@ def _render_waiting_logic():
     salas_espera = [s for s in salas_box if s.get('subtipo') == 'espera']
     codigos_espera = [s['codigo'] for s in salas_espera]
     
-    pacientes_espera = []
-    for codigo in codigos_espera:
-        pacientes_espera.extend(vista_global.get(codigo, []))
+    # Cola priorizada desde el índice incremental por sala (ya ordenada) y su simulación
+    pacientes_espera, estimacion = estimate_box_waits(vista_global, codigos_espera)
         
     # 2. Estadísticas Rápidas
     total = len(pacientes_espera)
     criticos = sum(1 for p in pacientes_espera if "Rojo" in str(p.get('nivel_triaje', '')) or "Nivel I" in str(p.get('nivel_triaje', '')))
+    fuera_de_plazo = count_wait_alerts(codigos_espera)['critical']
     
     c1, c2, c3 = st.columns(3)
     c1.metric("Total en Espera", total)
     c2.metric("Críticos / Nivel I", criticos, delta_color="inverse")
+    c3.metric("Espera Excedida", fuera_de_plazo, delta_color="inverse")
     
     st.divider()
     
-    # 3. Calcular Tiempos Estimados (Smart Queue)
+    # 3. Tiempos Estimados (Smart Queue)
     # -------------------------------------------------------------------------
-    # Supuesto: 3 Doctores, 15 min media por paciente
-    NUM_DOCTORS = 3 
-    AVG_CONSULT_TIME = 20 # minutos
-    
-    # Ordenar localmente para proyección (Simulando la lógica de sort_queue)
-    # Prioridad: Rojo(1) > Naranja(2) > Amarillo(3) > Verde(4) > Azul(5)
-    def get_priority(p):
-        lvl = str(p.get('nivel_triaje', ''))
-        if "Rojo" in lvl or "Nivel I" in lvl: return 1
-        if "Naranja" in lvl or "Nivel II" in lvl: return 2
-        if "Amarillo" in lvl or "Nivel III" in lvl: return 3
-        if "Verde" in lvl or "Nivel IV" in lvl: return 4
-        return 5
-        
-    # Ordenar por prioridad ASC y luego por hora de llegada ASC
-    pacientes_espera.sort(key=lambda x: (get_priority(x), x.get('wait_start', '')))
-
-    current_accumulated_min = 0
-    for i, p in enumerate(pacientes_espera):
-        # Cada doctor toma un paciente en paralelo.
-        # Si hay 3 docs, los primeros 3 entran "ya" (0 wait).
-        # El 4º espera a que el primero termine (AVG_TIME).
-        
-        # Formula simple: (Posición // Num_Docs) * Avg_Time
-        wait_cycles = i // NUM_DOCTORS
-        est_min = wait_cycles * AVG_CONSULT_TIME
-        
-        # Ajuste: Si ya lleva esperando mucho, el estimado baja? 
-        # No, el estimado es "cuánto falta". 
-        # Pero simplificaremos: "Tiempo Total Estimado de Espera" = est_min
-        # "Cuanto le falta" = max(0, est_min - tiempo_ya_esperado)
-        
-        p['estimated_wait_minutes'] = est_min
+    # ETA de cada paciente: mediana de las réplicas del simulador (médicos del
+    # cuadrante, duraciones reales de atención y llegadas previstas).
+    # La tarjeta muestra "cuánto falta" = total estimado - tiempo ya esperado.
+    for p in pacientes_espera:
+        eta = estimacion.etas.get(str(p.get('patient_code')))
+        if eta is None:
+            continue
+        p['estimated_wait_minutes'] = round(eta['waited'] + eta['p50'])
+        p['estimated_wait_p90_minutes'] = round(eta['waited'] + eta['p90'])
         
     # Visualización de métricas extra
     with st.expander("📊 Métricas de Operación (Smart Room)", expanded=False):
         c_docs, c_avg, c_flow = st.columns(3)
-        c_docs.metric("Doctores Activos", NUM_DOCTORS)
-        c_avg.metric("Tiempo Medio Atención", f"{AVG_CONSULT_TIME} min")
-        next_free = max(0, (len(pacientes_espera) // NUM_DOCTORS) * AVG_CONSULT_TIME)
-        c_flow.metric("Prox. Hueco Est.", f"en {next_free} min")
+        c_docs.metric("Doctores Activos", estimacion.servers,
+                      help="Según el cuadrante" if estimacion.staffing_source == "turnos" else "Valor por defecto: no hay médicos en el cuadrante")
+        c_avg.metric("Tiempo Medio Atención", f"{round(estimacion.service_median)} min",
+                     help="Mediana histórica" if estimacion.service_source == "patient_flow" else "Valor por defecto: sin histórico suficiente")
+        nuevo = estimacion.new_patient
+        c_flow.metric("Espera Paciente Nuevo", f"{round(nuevo['p50'])} min",
+                      help=f"Nivel III que llegara ahora. P10-P90: {round(nuevo['p10'])}-{round(nuevo['p90'])} min")
+        st.caption(f"Simulación: {estimacion.arrivals_per_hour:.1f} llegadas/h previstas · {estimacion.elapsed_ms:.0f} ms")
 
     st.divider()
     
     # 4. Renderizar Lista
     if pacientes_espera:
-        render_waiting_list_component(pacientes_espera, context="dashboard")
+        render_waiting_list_component(pacientes_espera, context="dashboard", presorted=True)
     else:
         st.info("La sala de espera está vacía. ¡Buen trabajo!")
@@ -0,0 +1,170 @@
+# path: src/utils/audio_utils.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Tramo mínimo de al menos una ventana (evita bucle sin avance)
+"""
+Módulo con funciones de utilidad para el procesamiento de audio.
+Segmentación de dictados WAV (PCM) por silencios para la transcripción por tramos.
+"""
+import hashlib
+import io
+import wave
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+# Parámetros de segmentación por defecto
+WINDOW_MS = 30                 # Ventana de análisis de energía
+SILENCE_DBFS = -40.0           # Umbral absoluto: por debajo es silencio
+MIN_SILENCE_MS = 600           # Silencio mínimo para considerar un corte
+MIN_SEGMENT_S = 4.0            # Tramos más cortos se fusionan con el siguiente
+MAX_SEGMENT_S = 45.0           # Corte forzado (en la ventana más silenciosa) si no hay pausas
+
+
+@dataclass
+class AudioSegment:
+    """Tramo de audio listo para enviar al modelo."""
+    index: int
+    start_s: float
+    end_s: float
+    wav_bytes: bytes
+    md5: str
+
+
+def is_wav(audio_bytes: bytes) -> bool:
+    """Comprueba la cabecera RIFF/WAVE."""
+    return len(audio_bytes) > 12 and audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE"
+
+
+def wav_duration_s(audio_bytes: bytes) -> Optional[float]:
+    """Duración de un WAV en segundos (None si no es un WAV legible)."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except (wave.Error, EOFError):
+        return None
+
+
+def _window_dbfs(samples: np.ndarray, sample_width: int, window: int) -> np.ndarray:
+    """Energía (dBFS) por ventana fija; la última ventana incompleta se descarta."""
+    n_windows = len(samples) // window
+    if n_windows == 0:
+        return np.zeros(0)
+    frames = samples[: n_windows * window].astype(np.float64).reshape(n_windows, window)
+    full_scale = float(2 ** (8 * sample_width - 1))
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) / full_scale
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_cut_points(
+    dbfs: np.ndarray,
+    window_s: float,
+    silence_dbfs: float = SILENCE_DBFS,
+    min_silence_ms: int = MIN_SILENCE_MS,
+    min_segment_s: float = MIN_SEGMENT_S,
+    max_segment_s: float = MAX_SEGMENT_S
+) -> List[int]:
+    """
+    Calcula los índices de ventana donde cortar.
+
+    Los cortes se colocan en el centro de cada silencio suficientemente largo.
+    Las decisiones son locales (umbral absoluto y avance secuencial), de modo que
+    editar el final de una grabación no desplaza los cortes anteriores.
+    """
+    min_silence_w = max(1, int(round(min_silence_ms / 1000.0 / window_s)))
+    # Al menos una ventana: cada corte avanza respecto al anterior
+    min_seg_w = max(1, int(min_segment_s / window_s))
+    max_seg_w = max(1, int(max_segment_s / window_s))
+
+    silent = dbfs < silence_dbfs
+    # Centros de los silencios largos
+    candidates = []
+    run_start = None
+    for i, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= min_silence_w:
+                candidates.append((run_start + i) // 2)
+            run_start = None
+
+    cuts = []
+    last = 0
+    ci = 0
+    total = len(dbfs)
+    while True:
+        # Siguiente silencio que respete el tamaño mínimo
+        while ci < len(candidates) and candidates[ci] - last < min_seg_w:
+            ci += 1
+        if ci < len(candidates) and candidates[ci] - last <= max_seg_w:
+            cut = candidates[ci]
+        elif total - last > max_seg_w:
+            # Sin pausas: cortar en la ventana más silenciosa del último tercio permitido
+            lo = last + max(min_seg_w, (2 * max_seg_w) // 3)
+            hi = last + max_seg_w
+            cut = lo + int(np.argmin(dbfs[lo:hi])) if hi > lo else hi
+        else:
+            break
+        if total - cut < min_seg_w:
+            break  # El resto es demasiado corto: se queda en el último tramo
+        cuts.append(cut)
+        last = cut
+    return cuts
+
+
+def split_wav_on_silence(
+    audio_bytes: bytes,
+    silence_dbfs: float = SILENCE_DBFS,
+    min_silence_ms: int = MIN_SILENCE_MS,
+    min_segment_s: float = MIN_SEGMENT_S,
+    max_segment_s: float = MAX_SEGMENT_S
+) -> List[AudioSegment]:
+    """
+    Divide un WAV PCM en tramos separados por silencios.
+
+    Cada tramo se reempaqueta como WAV independiente y lleva el MD5 de sus bytes,
+    que sirve como clave de caché de su transcripción.
+
+    Returns:
+        List[AudioSegment]: Tramos en orden (uno solo si no hay pausas aprovechables).
+    """
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+        params = wf.getparams()
+        raw = wf.readframes(params.nframes)
+
+    if params.sampwidth not in (1, 2, 4):
+        raise ValueError(f"Ancho de muestra no soportado: {params.sampwidth}")
+
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[params.sampwidth]
+    samples = np.frombuffer(raw, dtype=dtype)
+    if params.sampwidth == 1:
+        samples = samples.astype(np.int16) - 128
+    # Mezcla a mono para el análisis (el audio enviado conserva los canales)
+    if params.nchannels > 1:
+        samples = samples[: len(samples) - len(samples) % params.nchannels]
+        samples = samples.reshape(-1, params.nchannels).mean(axis=1)
+
+    window = max(1, int(params.framerate * WINDOW_MS / 1000))
+    window_s = window / float(params.framerate)
+    dbfs = _window_dbfs(samples, params.sampwidth, window)
+    cuts = find_cut_points(dbfs, window_s, silence_dbfs, min_silence_ms, min_segment_s, max_segment_s)
+
+    frame_size = params.sampwidth * params.nchannels
+    bounds = [0] + [c * window for c in cuts] + [params.nframes]
+    segments = []
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as out:
+            out.setnchannels(params.nchannels)
+            out.setsampwidth(params.sampwidth)
+            out.setframerate(params.framerate)
+            out.writeframes(raw[start * frame_size:end * frame_size])
+        wav_bytes = buf.getvalue()
+        segments.append(AudioSegment(
+            index=i,
+            start_s=start / float(params.framerate),
+            end_s=end / float(params.framerate),
+            wav_bytes=wav_bytes,
+            md5=hashlib.md5(wav_bytes).hexdigest()
+        ))
+    return segments
@@ -0,0 +1,228 @@
+# path: src/utils/rerun_profiler.py
+# Creado: 2026-10-17
+"""
+Perfilado del coste de cada rerun de Streamlit, activable por sesión.
+
+Con el perfilado activo en una sesión (st.session_state[PROFILE_SESSION_KEY]),
+profile_rerun() envuelve la ejecución de la app y:
+- Instrumenta una sola vez por proceso las funciones render_* / mostrar_* de
+  ui/, components/ y views/ y los cargadores con st.cache_data/st.cache_resource
+  definidos a nivel de módulo en src/, y reenlaza las referencias ya importadas.
+- Construye el árbol de llamadas del rerun (tiempo total, tiempo propio, número de
+  llamadas y llamadas a MongoDB atribuidas vía el QueryProfiler).
+- Guarda los últimos reruns en la sesión y los persiste en segundo plano
+  (rerun_profiles / rerun_view_stats) para los percentiles por vista.
+
+Sin perfilado activo en ninguna sesión no se instrumenta nada. Una vez instrumentado,
+las sesiones sin perfilado solo pagan la lectura de un thread-local por vista: cada
+rerun se ejecuta en su propio hilo, así que el estado del perfil es por sesión.
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+from streamlit.runtime.caching.cache_utils import CachedFunc
+
+PROFILE_SESSION_KEY = "rerun_profiling"
+HISTORY_SESSION_KEY = "rerun_profiling_history"
+HISTORY_SIZE = 20
+VIEW_PREFIXES = ("render_", "mostrar_")
+VIEW_PACKAGES = ("ui", "components", "views")
+ROOT_LABEL = "rerun"
+
+_SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_wrapped: Dict[int, Tuple[Any, Callable]] = {}  # id(original) -> (original, wrapper)
+_scanned_modules: set = set()
+_modules_seen = 0
+_db_observer_installed = False
+
+
+class _Frame:
+    """Nodo del árbol de llamadas de un rerun (las llamadas repetidas se acumulan)."""
+    __slots__ = ("label", "kind", "calls", "ms", "db_calls", "db_ms", "children")
+
+    def __init__(self, label: str, kind: str):
+        self.label = label
+        self.kind = kind
+        self.calls = 0
+        self.ms = 0.0
+        self.db_calls = 0
+        self.db_ms = 0.0
+        self.children: Dict[str, "_Frame"] = {}
+
+
+def _wrap(fn: Callable, label: str, kind: str) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            return fn(*args, **kwargs)
+        parent = stack[-1]
+        frame = parent.children.get(label)
+        if frame is None:
+            frame = parent.children[label] = _Frame(label, kind)
+        frame.calls += 1
+        stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            frame.ms += (time.perf_counter() - t0) * 1000
+            stack.pop()
+
+    wrapper.__rerun_profiled__ = True
+    if kind == "cache":
+        wrapper.clear = fn.clear
+    return wrapper
+
+
+def _is_app_module(module) -> bool:
+    path = getattr(module, "__file__", None)
+    return bool(path) and os.path.abspath(path).startswith(_SRC_ROOT + os.sep)
+
+
+def _on_db_command(collection: str, command: str, ms: float):
+    stack = getattr(_local, "stack", None)
+    if stack is not None:
+        frame = stack[-1]
+        frame.db_calls += 1
+        frame.db_ms += ms
+
+
+def instrument(namespaces: Iterable[Dict[str, Any]] = ()) -> int:
+    """
+    Envuelve las vistas y cargadores en caché de los módulos de src/ cargados y
+    sustituye las referencias importadas por los envoltorios. Idempotente: solo
+    recorre de nuevo si se han cargado módulos desde la última llamada.
+    Devuelve el número de funciones instrumentadas.
+    """
+    global _modules_seen, _db_observer_installed
+    namespaces = list(namespaces)
+    with _install_lock:
+        if not _db_observer_installed:
+            from db.query_profiler import PROFILER_ENABLED, get_query_profiler
+            if PROFILER_ENABLED:
+                get_query_profiler().add_observer(_on_db_command)
+            _db_observer_installed = True
+
+        modules = [(name, m) for name, m in list(sys.modules.items()) if m is not None and _is_app_module(m)]
+        if len(sys.modules) != _modules_seen:
+            _modules_seen = len(sys.modules)
+            for name, module in modules:
+                if name in _scanned_modules:
+                    continue
+                _scanned_modules.add(name)
+                is_view_module = name.split(".")[0] in VIEW_PACKAGES
+                for attr, value in list(vars(module).items()):
+                    if getattr(value, "__module__", None) != name or hasattr(value, "__rerun_profiled__"):
+                        continue
+                    if isinstance(value, CachedFunc):
+                        kind = "cache"
+                    elif is_view_module and attr.startswith(VIEW_PREFIXES) and inspect.isfunction(value):
+                        kind = "view"
+                    else:
+                        continue
+                    _wrapped[id(value)] = (value, _wrap(value, f"{name}.{attr}", kind))
+        elif not namespaces:
+            return len(_wrapped)
+
+        for ns in [vars(m) for _, m in modules] + namespaces:
+            for attr, value in list(ns.items()):
+                entry = _wrapped.get(id(value))
+                if entry is not None and entry[0] is value:
+                    ns[attr] = entry[1]
+        return len(_wrapped)
+
+
+def flatten(root: _Frame) -> List[Dict[str, Any]]:
+    """Marcos del árbol en preorden con ruta ('rerun;vista;subvista') y tiempo propio."""
+    frames = []
+
+    def visit(frame: _Frame, path: str, depth: int):
+        children_ms = sum(c.ms for c in frame.children.values())
+        frames.append({
+            "path": path,
+            "label": frame.label,
+            "kind": frame.kind,
+            "depth": depth,
+            "calls": frame.calls,
+            "ms": round(frame.ms, 3),
+            "self_ms": round(max(frame.ms - children_ms, 0.0), 3),
+            "db_calls": frame.db_calls,
+            "db_ms": round(frame.db_ms, 3),
+        })
+        for child in sorted(frame.children.values(), key=lambda c: -c.ms):
+            visit(child, f"{path};{child.label}", depth + 1)
+
+    visit(root, root.label, 0)
+    return frames
+
+
+def _session_id() -> Optional[str]:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+
+def _persist(rerun: Dict[str, Any]):
+    try:
+        from db.repositories.rerun_profiles import get_rerun_profiles_repository
+        get_rerun_profiles_repository().save_rerun(rerun)
+    except Exception as e:
+        print(f"Error guardando perfil de rerun: {e}")
+
+
+def is_profiling_enabled() -> bool:
+    return bool(st.session_state.get(PROFILE_SESSION_KEY))
+
+
+@contextmanager
+def profile_rerun(namespace: Optional[Dict[str, Any]] = None, persist: bool = True):
+    """
+    Perfila el bloque (el rerun completo de la app) si la sesión lo tiene activado.
+    'namespace' permite reenlazar también las vistas importadas por el script principal.
+    """
+    if not is_profiling_enabled():
+        yield None
+        return
+
+    instrument([namespace] if namespace is not None else [])
+    root = _Frame(ROOT_LABEL, "rerun")
+    root.calls = 1
+    _local.stack = [root]
+    started_at = datetime.utcnow()
+    t0 = time.perf_counter()
+    try:
+        yield root
+    finally:
+        # st.stop()/st.rerun() terminan el rerun con una excepción: se registra igualmente
+        root.ms = (time.perf_counter() - t0) * 1000
+        _local.stack = None
+        frames = flatten(root)
+        user = (st.session_state.get("current_user") or {}).get("username")
+        rerun = {
+            "session_id": _session_id(),
+            "user": user,
+            "started_at": started_at,
+            "total_ms": frames[0]["ms"],
+            "db_calls": sum(f["db_calls"] for f in frames),
+            "db_ms": round(sum(f["db_ms"] for f in frames), 3),
+            "frames": frames,
+        }
+        history = st.session_state.get(HISTORY_SESSION_KEY) or []
+        st.session_state[HISTORY_SESSION_KEY] = ([rerun] + history)[:HISTORY_SIZE]
+        if persist:
+            threading.Thread(target=_persist, args=(dict(rerun),), name="rerun-profile", daemon=True).start()
@@ -0,0 +1,91 @@
+# path: src/utils/search_utils.py
+# Creado: 2026-10-17
+# Actualizado: 2026-10-17 - Prefijo de identificador para cualquier consulta de una palabra
+"""
+Normalización de texto para la búsqueda indexada de personas.
+
+Cada documento de 'people' guarda un subdocumento 'search' derivado de sus
+campos de nombre e identificación:
+- tokens:   palabras del nombre completo, en minúsculas y sin acentos.
+- prefixes: prefijos (edge n-grams) de cada palabra, para búsqueda mientras se escribe.
+- ids:      identificadores normalizados (patient_code, SS, DNI/NIE/pasaporte).
+Los tres campos son arrays con índice multikey, de modo que una búsqueda es una
+consulta de igualdad (o rango de prefijo en ids) en lugar de un $regex sin anclar.
+"""
+import re
+import unicodedata
+from typing import Dict, Any, List
+
+PREFIX_MIN = 2
+PREFIX_MAX = 12
+
+# Campos de la persona de los que se deriva 'search'
+SEARCH_SOURCE_FIELDS = ("nombre", "apellido1", "apellido2", "patient_code", "num_ss",
+                        "identification_number", "identificaciones")
+
+# Proyección por defecto de las lecturas de 'people': los prefijos solo sirven al índice
+PERSON_PROJECTION = {"search.prefixes": 0}
+
+_WORD_RE = re.compile(r"[a-z0-9ñ]+")
+_ID_STRIP_RE = re.compile(r"[\s\-./]")
+
+
+def fold_text(text: Any) -> str:
+    """Minúsculas y sin diacríticos ('Muñoz Álvarez' -> 'muñoz alvarez'; la ñ se conserva)."""
+    if not text:
+        return ""
+    text = str(text).lower().replace("ñ", "\x00")
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+    return text.replace("\x00", "ñ")
+
+
+def tokenize(text: Any) -> List[str]:
+    """Palabras normalizadas de un texto libre."""
+    return _WORD_RE.findall(fold_text(text))
+
+
+def normalize_identifier(value: Any) -> str:
+    """Identificador en mayúsculas sin espacios, guiones, puntos ni barras."""
+    if not value:
+        return ""
+    return _ID_STRIP_RE.sub("", str(value)).upper()
+
+
+def edge_ngrams(token: str) -> List[str]:
+    return [token[:n] for n in range(PREFIX_MIN, min(len(token), PREFIX_MAX) + 1)]
+
+
+def looks_like_identifier(query: str) -> bool:
+    """Consulta de una sola palabra que contiene algún dígito (DNI, SS, código de paciente)."""
+    compact = query.strip()
+    return bool(compact) and " " not in compact and any(c.isdigit() for c in compact)
+
+
+def identifier_prefix(query: str) -> str:
+    """
+    Identificador normalizado para buscar por prefijo en 'ids' cualquier consulta
+    de una sola palabra, tenga o no dígitos (p.ej. 'PAC' -> códigos 'PAC...').
+    Cadena vacía si la consulta tiene varias palabras o es demasiado corta.
+    """
+    compact = query.strip()
+    if not compact or " " in compact:
+        return ""
+    ident = normalize_identifier(compact)
+    return ident if len(ident) >= PREFIX_MIN else ""
+
+
+def build_person_search_fields(person: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Subdocumento 'search' de una persona."""
+    tokens: List[str] = []
+    for field in ("nombre", "apellido1", "apellido2"):
+        for token in tokenize(person.get(field)):
+            if token not in tokens:
+                tokens.append(token)
+    prefixes = sorted({p for token in tokens for p in edge_ngrams(token)})
+
+    ids = [person.get("patient_code"), person.get("num_ss"), person.get("identification_number")]
+    for ident in person.get("identificaciones") or []:
+        value = ident.get("value") if isinstance(ident, dict) else getattr(ident, "value", None)
+        ids.append(value)
+    ids = sorted({normalize_identifier(v) for v in ids if normalize_identifier(v)})
+    return {"tokens": tokens, "prefixes": prefixes, "ids": ids}
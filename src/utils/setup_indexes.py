@@ -1,5 +1,6 @@
 # path: src/utils/setup_indexes.py
 # Creado: 2025-11-24
+# Actualizado: 2026-10-17 - Índices por entrada y salida para las series horarias de flujo
 """
 Utilidad para crear índices en MongoDB desde la aplicación.
 """
@@ -47,6 +48,21 @@ def crear_indices_patient_flow():
         collection.create_index([("created_at", 1)], name="idx_created_at")
         indices_creados.append("idx_created_at: {created_at: 1}")
         
+        # 8. Un único paso activo por paciente (rechaza movimientos dobles concurrentes)
+        collection.create_index(
+            [("patient_code", 1)],
+            name="idx_patient_activo_unico",
+            unique=True,
+            partialFilterExpression={"activo": True}
+        )
+        indices_creados.append("idx_patient_activo_unico: {patient_code: 1} UNIQUE (activo=true)")
+        
+        # 9-10. Series horarias (detección de anomalías): ventanas por entrada y por salida
+        collection.create_index([("entrada", 1)], name="idx_entrada")
+        indices_creados.append("idx_entrada: {entrada: 1}")
+        collection.create_index([("salida", 1)], name="idx_salida")
+        indices_creados.append("idx_salida: {salida: 1}")
+        
         return True, f"✅ {len(indices_creados)} índices creados correctamente", indices_creados
         
     except Exception as e:
@@ -92,7 +108,8 @@ def verificar_indices_necesarios():
         "idx_estado_activo",
         "idx_tipo_subtipo_activo",
         "idx_flow_id_desc",
-        "idx_created_at"
+        "idx_created_at",
+        "idx_patient_activo_unico"
     ]
     
     indices_existentes = listar_indices_patient_flow()
@@ -1,21 +1,27 @@
+# path: src/views/public_board.py
+# Actualizado: 2026-10-17 - Espera estimada con el simulador de cola; datos desde la vista de ocupación y 'salas'
+# Actualizado: 2026-10-17 - Con sala seleccionada se simula la cola de esa sala
 import streamlit as st
 import time
 from datetime import datetime, timedelta
-from db.repositories.patient_flow import get_patient_flow_repository
 from db.repositories.people import get_people_repository
-from db.repositories.config import get_config_repository
+from db.repositories.salas import get_all_salas
+from services.patient_flow_service import obtener_vista_global_salas
+from services.wait_time_service import estimate_box_waits, estimate_room_waits
 
-def calculate_wait_time(patients_in_queue):
+def calculate_wait_time(vista_salas, room_code=None):
     """
-    Calcula un tiempo de espera estimado simple.
-    En un sistema real, esto usaría un modelo ML o medias históricas.
-    Aquí simulamos o hacemos media simple.
+    Estima la espera de un paciente que llegara ahora y la de cada paciente en cola
+    con el simulador de eventos discretos (médicos del cuadrante, duraciones reales).
+    Con 'room_code' se simula la cola de esa sala; sin él, la de las salas de espera de box.
+    Devuelve (minutos (mediana), minutos (percentil 90), {patient_code: eta}).
     """
-    if not patients_in_queue:
-        return 0
-    
-    # Simulación: 15 min base + 5 min por paciente delante
-    return 15 + (len(patients_in_queue) * 5)
+    if room_code:
+        _, estimacion = estimate_room_waits(room_code, vista=vista_salas)
+    else:
+        _, estimacion = estimate_box_waits(vista_salas)
+    nuevo = estimacion.new_patient
+    return round(nuevo['p50']), round(nuevo['p90']), estimacion.etas
 
 def render_public_board():
     """
@@ -76,40 +82,37 @@ def render_public_board():
     room_id_filter = params.get("room_id")
     mode = params.get("mode", "room") # 'room' or 'internal'
 
-    # Repositorios
-    flow_repo = get_patient_flow_repository()
+    # Datos
+    vista_salas = obtener_vista_global_salas()
+    active_flows = [p for pacientes in vista_salas.values() for p in pacientes]
     people_repo = get_people_repository()
-    config_repo = get_config_repository()
+    rooms = get_all_salas()
 
     # Título
     st.markdown(f"<h1 style='text-align: center;'>🏥 ESTADO DE URGENCIAS - {datetime.now().strftime('%H:%M')}</h1>", unsafe_allow_html=True)
     
     if mode == "internal":
-        render_internal_overview(flow_repo, config_repo)
+        render_internal_overview(rooms, active_flows)
     else:
-        render_room_view(room_id_filter, flow_repo, people_repo, config_repo)
+        render_room_view(room_id_filter, vista_salas, active_flows, people_repo, rooms)
 
-def render_room_view(room_id, flow_repo, people_repo, config_repo):
-    # Obtener todas las salas si no se especifica
-    rooms = config_repo.get_rooms()
-    
-    # Filtrar pacientes
-    active_flows = flow_repo.get_active_flows()
-    
+def render_room_view(room_id, vista_salas, active_flows, people_repo, rooms):
     # Si hay filtro de sala
     target_room_name = "Sala de Espera General"
+    room_code = None
     
     # Filtrar solo pacientes en espera
-    waiting_patients = [f for f in active_flows if f.get('estado') in ['EN_ESPERA_TRIAJE', 'EN_ADMISION', 'DERIVADO']]
+    waiting_patients = [f for f in active_flows if f.get('estado_flujo') in ['EN_ESPERA_TRIAJE', 'EN_ADMISION', 'DERIVADO']]
     
     if room_id:
-        waiting_patients = [f for f in waiting_patients if f.get('sala_actual') == room_id]
-        # Buscar nombre sala
-        r = next((r for r in rooms if str(r['_id']) == room_id), None)
-        if r: target_room_name = r['name']
+        # Buscar sala (el enlace usa el _id; se acepta también el código)
+        r = next((r for r in rooms if room_id in (str(r.get('_id')), r.get('codigo'))), None)
+        room_code = r.get('codigo') if r else room_id
+        waiting_patients = [f for f in waiting_patients if f.get('sala_code') == room_code]
+        if r: target_room_name = r.get('nombre', room_code)
 
     # Estimar tiempo
-    wait_time = calculate_wait_time(waiting_patients)
+    wait_time, wait_time_p90, etas = calculate_wait_time(vista_salas, room_code)
 
     st.markdown(f"<h2 style='text-align: center; color: #17a2b8;'>📍 {target_room_name}</h2>", unsafe_allow_html=True)
 
@@ -135,11 +138,14 @@ def render_room_view(room_id, flow_repo, people_repo, config_repo):
                 # Color borde: Primeros Verde, Resto Gris
                 border_color = "#28a745" if i == 0 else "#6c757d"
                 
+                eta = etas.get(p_flow['patient_code'])
+                aviso = f"Espere su llamada... (aprox. {round(eta['p50'])}')" if eta else "Espere su llamada..."
+                
                 st.markdown(f"""
                     <div class="status-card" style="border-left-color: {border_color};">
-                        <div class="status-header">#{i+1} - {p_flow['estado']}</div>
+                        <div class="status-header">#{i+1} - {p_flow['estado_flujo']}</div>
                         <div class="patient-code">{display_code}</div>
-                        <div>Espere su llamada...</div>
+                        <div>{aviso}</div>
                     </div>
                 """, unsafe_allow_html=True)
 
@@ -147,9 +153,9 @@ def render_room_view(room_id, flow_repo, people_repo, config_repo):
         st.markdown("### ⏱️ Tiempo Estimado")
         st.markdown(f"""
             <div style="background:#222; padding:30px; border-radius:15px; text-align:center;">
-                <div style="font-size:1.5rem; color:#aaa;">Espera media</div>
+                <div style="font-size:1.5rem; color:#aaa;">Espera estimada</div>
                 <div style="font-size:5rem; font-weight:bold; color:#ffc107;">{wait_time}'</div>
-                <div style="font-size:1rem; color:#aaa;">minutos</div>
+                <div style="font-size:1rem; color:#aaa;">minutos (hasta {wait_time_p90}')</div>
             </div>
         """, unsafe_allow_html=True)
         
@@ -157,16 +163,13 @@ def render_room_view(room_id, flow_repo, people_repo, config_repo):
         st.markdown("ℹ️ **Nota:** Los tiempos son aproximados y dependen de la gravedad de los casos en curso.")
 
 
-def render_internal_overview(flow_repo, config_repo):
-    rooms = config_repo.get_rooms()
-    active_flows = flow_repo.get_active_flows()
-    
+def render_internal_overview(rooms, active_flows):
     # Agrupar por sala
     room_stats = {}
     for r in rooms:
         rid = str(r['_id'])
-        count = len([f for f in active_flows if f.get('sala_actual') == rid])
-        room_stats[rid] = {"name": r['name'], "count": count}
+        count = len([f for f in active_flows if f.get('sala_code') == r.get('codigo')])
+        room_stats[rid] = {"name": r.get('nombre', r.get('codigo')), "count": count}
         
     st.markdown("### 📊 Monitor Global de Ocupación")
     
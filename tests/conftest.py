@@ -9,6 +9,25 @@ src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
 print(f"DEBUG: Adding {src_path} to sys.path")
 sys.path.append(src_path)
 
+
+def _allow_bulk_sort_kwarg():
+    """
+    pymongo >= 4.11 passes a 'sort' kwarg to the bulk builder for UpdateOne /
+    ReplaceOne, which mongomock 4.1 does not accept yet. Drop it so repositories
+    using bulk_write can be exercised against mongomock.
+    """
+    from mongomock.collection import BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        original = getattr(BulkOperationBuilder, name)
+
+        def wrapper(self, *args, _original=original, sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+
+        setattr(BulkOperationBuilder, name, wrapper)
+
+
+_allow_bulk_sort_kwarg()
+
 @pytest.fixture
 def mock_mongo_client():
     """Returns a mongomock MongoClient."""
@@ -0,0 +1,150 @@
+# path: tests/unit/core/test_cohort_scoring.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.models import PTRConfig, PTRRule, VitalSignAgeConfig, VitalSignSeverityRange
+from components.triage.cohort_scoring import (
+    build_cohort, compile_ptr, compile_vital_signs, score_cohort, score_single
+)
+from services import rescoring_service
+
+OPERATORS = ["<", "<=", ">", ">=", "==", "between"]
+COLORS = ["green", "yellow", "orange", "red", "black"]
+METRIC_SPANS = {"fc": (20, 200), "spo2": (60, 100), "temp": (33, 42), "pas": (50, 250),
+                "pad": (30, 140), "fr": (4, 45), "gcs": (3, 15), "eva": (0, 10), "dolor": (0, 10)}
+
+
+def _value(rng, metric):
+    lo, hi = METRIC_SPANS[metric]
+    # Mix integers, one-decimal values (threshold edges) and arbitrary floats
+    kind = rng.random()
+    if kind < 0.5:
+        return rng.randint(lo - 5, hi + 5)
+    if kind < 0.8:
+        return round(rng.uniform(lo, hi), 1)
+    return rng.uniform(lo - 5, hi + 5)
+
+
+def _random_ptr_configs(rng):
+    configs = {}
+    for key in ["gcs", "spo2", "pas", "fr", "fc", "temp", "eva"]:
+        lo, hi = METRIC_SPANS[key]
+        rules = []
+        for _ in range(rng.randint(0, 5)):
+            op = rng.choice(OPERATORS)
+            ref = float(rng.randint(lo, hi))
+            rules.append(PTRRule(operator=op, value=ref,
+                                 value_max=ref + rng.randint(0, 20) if op == "between" and rng.random() < 0.9 else None,
+                                 points=float(rng.choice([0, 1, 1, 2, 3, 0.5]))))
+        configs[key] = PTRConfig(metric_key=key, name=key, rules=rules,
+                                 base_multiplier=rng.choice([1.0, 1.5, 2.0, 0.3]),
+                                 geriatric_multiplier=rng.choice([None, 0.0, 1.7, 3.0]),
+                                 immuno_multiplier=rng.choice([None, 2.5, 0.1]))
+    return configs
+
+
+def _random_vital_configs(rng):
+    references = {}
+    for key in ["fc", "spo2", "temp", "pas", "pad", "fr", "gcs"]:
+        lo, hi = METRIC_SPANS[key]
+        bands = []
+        # Overlapping and gapped age bands: the first matching one wins
+        for min_age, max_age in rng.sample([(0, 17), (14, 64), (18, 120), (65, 120), (0, 120)], rng.randint(0, 3)):
+            ranges = []
+            for _ in range(rng.randint(0, 4)):
+                a = rng.randint(lo, hi)
+                ranges.append(VitalSignSeverityRange(min_val=a, max_val=a + rng.randint(0, 30),
+                                                     color=rng.choice(COLORS), priority=rng.randint(0, 4), label="r"))
+            bands.append(VitalSignAgeConfig(min_age=min_age, max_age=max_age, val_min=lo, val_max=hi,
+                                            normal_min=lo + 5, normal_max=hi - 5,
+                                            default_value=(lo + hi) / 2, ranges=ranges))
+        references[key] = bands
+    return references
+
+
+def _random_record(rng, i):
+    keys = list(METRIC_SPANS)
+    rng.shuffle(keys)
+    vital_signs = {}
+    for key in keys:
+        if key == "dolor":
+            continue
+        roll = rng.random()
+        if roll < 0.7:
+            vital_signs[key] = _value(rng, key)
+        elif roll < 0.75:
+            vital_signs[key] = str(_value(rng, key))
+        elif roll < 0.8:
+            vital_signs[key] = "n/d"
+        elif roll < 0.85:
+            vital_signs[key] = None
+    if rng.random() < 0.3:
+        vital_signs["oxigeno_suplementario"] = True
+    if rng.random() < 0.2:
+        vital_signs["pupilas"] = "Lenta"
+    patient_data = {"criterio_geriatrico": rng.random() < 0.3, "ctx_is_onco": rng.random() < 0.2}
+    roll = rng.random()
+    if roll < 0.85:
+        patient_data["edad"] = rng.randint(0, 110)
+    elif roll < 0.9:
+        patient_data["edad"] = None
+    if rng.random() < 0.7:
+        patient_data["dolor"] = rng.randint(0, 10)
+    return {"audit_id": f"TRG-{i}", "vital_signs": vital_signs, "patient_data": patient_data}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cohort_matches_single_patient_functions(seed):
+    rng = random.Random(seed)
+    ptr_configs = _random_ptr_configs(rng)
+    vital_configs = compile_vital_signs(_random_vital_configs(rng))
+    records = [_random_record(rng, i) for i in range(400)]
+
+    df = score_cohort(build_cohort(records), compile_ptr(ptr_configs), vital_configs)
+
+    for i, record in enumerate(records):
+        expected = score_single(record, ptr_configs, vital_configs)
+        row = df.iloc[i].to_dict()
+        assert row == expected, (record, row, expected)
+
+
+def test_ptr_operator_rules_score_points():
+    # PTRRule thresholds used to be ignored (only min/max ranges were read)
+    configs = {"gcs": PTRConfig(metric_key="gcs", name="GCS", base_multiplier=4.0, rules=[
+        PTRRule(operator="<", value=9, points=3), PTRRule(operator="<", value=13, points=2)])}
+    record = {"audit_id": "a", "vital_signs": {"gcs": 8}, "patient_data": {"edad": 50}}
+    expected = score_single(record, configs, {})
+    assert expected["ptr_score"] == 12.0 and expected["ptr_priority"] == 2
+    df = score_cohort(build_cohort([record]), compile_ptr(configs), compile_vital_signs({}))
+    assert df.iloc[0]["ptr_score"] == 12.0
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def test_what_if_reports_transitions(mock_db):
+    rng = random.Random(7)
+    vital = _random_vital_configs(rng)
+    now = datetime.utcnow()
+    mock_db["triage_records"].insert_many([
+        dict(_random_record(rng, i), timestamp=now - timedelta(hours=i)) for i in range(60)
+    ])
+    current = {"gcs": PTRConfig(metric_key="gcs", name="GCS", rules=[PTRRule(operator="<", value=15, points=1)])}
+    proposed = {"gcs": PTRConfig(metric_key="gcs", name="GCS", base_multiplier=10.0,
+                                 rules=[PTRRule(operator="<", value=15, points=1)])}
+
+    summary = rescoring_service.what_if((proposed, vital), start=now - timedelta(hours=29, minutes=30),
+                                        current=(current, vital), db=mock_db)
+
+    assert summary["records"] == 30
+    records = list(rescoring_service.iter_triage_records(now - timedelta(hours=29, minutes=30), db=mock_db))
+    gcs_low = sum(1 for r in records if _as_float(r["vital_signs"].get("gcs")) < 15)
+    assert summary["levels"]["PTR"]["changed"] == gcs_low
+    assert summary["levels"]["Worst Case"]["changed"] == 0
+    assert rescoring_service.verify(records, summary["proposed"], (proposed, vital), sample=0) == []
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+import db.query_profiler as qp
+from db.query_profiler import QueryProfiler, query_shape, find_collscan
+
+_request_ids = iter(range(1, 10_000))
+
+
+def _events(command, reply=None, ms=1.0, database="triaje_db"):
+    """A started/finished event pair shaped like pymongo command monitoring events."""
+    name = next(iter(command))
+    ids = {"connection_id": ("localhost", 27017), "request_id": next(_request_ids)}
+    start = SimpleNamespace(command_name=name, command=command, database_name=database, **ids)
+    end = SimpleNamespace(command_name=name, duration_micros=int(ms * 1000), reply=reply or {}, **ids)
+    return start, end
+
+
+def _run(profiler, command, reply=None, ms=1.0, failed=False):
+    start, end = _events(command, reply, ms)
+    profiler.started(start)
+    (profiler.failed if failed else profiler.succeeded)(end)
+
+
+def repository_lookup(profiler, code):
+    # Stands in for a repository method issuing the command
+    start, end = _events({"find": "people", "filter": {"patient_code": code}, "lsid": {"id": 1}},
+                         reply={"cursor": {"firstBatch": [{"_id": 1}]}}, ms=3)
+    profiler.started(start)
+    profiler.succeeded(end)
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    # Attribute call sites relative to the tests tree, as they are relative to src/ in the app
+    monkeypatch.setattr(qp, "_SRC_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return QueryProfiler(auto_explain=False)
+
+
+def test_records_latency_docs_and_call_sites(profiler):
+    for code in ("A1", "B2"):
+        repository_lookup(profiler, code)
+    _run(profiler, {"aggregate": "patient_flow", "pipeline": [{"$match": {"activo": True}}, {"$group": {"_id": "$sala_code"}}]},
+         reply={"cursor": {"firstBatch": [{}, {}, {}]}}, ms=40)
+    _run(profiler, {"update": "people", "updates": [{"q": {"_id": 1}, "u": {"$set": {"x": 1}}}]}, reply={"n": 1}, ms=2)
+    _run(profiler, {"find": "people", "filter": {}}, ms=8, failed=True)
+    _run(profiler, {"ping": 1})  # ignored
+
+    snap = profiler.snapshot()
+    assert snap["totals"]["count"] == 5
+    assert snap["totals"]["errors"] == 1
+    assert snap["collections"][0]["collection"] == "patient_flow"
+    people = next(c for c in snap["collections"] if c["collection"] == "people")
+    assert people["count"] == 4 and people["docs"] == 3
+    assert people["p50_ms"] == 5 and people["max_ms"] == 8
+
+    site = next(s for s in snap["call_sites"] if s["count"] == 2)
+    assert site["call_site"].startswith("db/test_query_profiler.py:") and site["call_site"].endswith("repository_lookup")
+    assert site["collection"] == "people" and site["command"] == "find"
+
+
+def test_shapes_never_keep_values_and_slow_queries_are_logged(profiler, monkeypatch):
+    monkeypatch.setattr(qp, "SLOW_QUERY_MS", 100)
+    for code in ("SECRET-1", "SECRET-2"):
+        _run(profiler, {"find": "people", "filter": {"patient_code": code, "edad": {"$gt": 70}}}, ms=150)
+
+    snap = profiler.snapshot()
+    assert len(snap["shapes"]) == 1
+    assert snap["shapes"][0]["count"] == 2
+    assert json.loads(snap["shapes"][0]["shape"]) == {"filter": {"patient_code": "?", "edad": {"$gt": "?"}}, "sort": {}}
+    assert len(snap["slow_queries"]) == 2
+    assert "SECRET" not in profiler.export_json()
+    assert query_shape({"$or": [{"a": 1}, {"b": [1, 2]}]}) == {"$or": [{"a": "?"}, {"b": "?"}]}
+
+
+def test_new_shapes_are_explained_once_for_collscan(profiler):
+    client = MagicMock()
+    client.__getitem__.return_value.command.return_value = {
+        "queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}}
+    profiler.attach(client)
+    profiler.auto_explain = True
+    _run(profiler, {"find": "triage_records", "filter": {"motivo": "x"}, "lsid": {"id": 1}, "$db": "triaje_db"})
+    deadline = time.monotonic() + 5
+    while profiler.snapshot()["shapes"][0]["plan"] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    args, kwargs = client.__getitem__.return_value.command.call_args
+    assert args == ("explain", {"find": "triage_records", "filter": {"motivo": "x"}})
+    assert kwargs == {"verbosity": "queryPlanner"}
+    assert profiler.snapshot()["shapes"][0]["plan"] == "COLLSCAN"
+
+    # Same shape again: not re-explained
+    _run(profiler, {"find": "triage_records", "filter": {"motivo": "y"}})
+    assert client.__getitem__.return_value.command.call_count == 1
+    assert not find_collscan({"stages": [{"$cursor": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}]})
+
+
+def test_flush_persists_one_document_per_process(profiler, mock_db):
+    repository_lookup(profiler, "A1")
+    profiler.flush(mock_db)
+    profiler.flush(mock_db)
+    docs = qp.get_persisted_profiles(mock_db)
+    assert len(docs) == 1
+    assert docs[0]["_id"] == profiler.process
+    assert docs[0]["totals"]["count"] == 1
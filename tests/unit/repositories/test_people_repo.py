@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch
+from db.repositories.people import PeopleRepository
+from utils.search_utils import build_person_search_fields, fold_text
+
+
+@pytest.fixture
+def people_repo(mock_db):
+    with patch('db.repositories.people.get_database', return_value=mock_db):
+        return PeopleRepository()
+
+
+def _person(nombre, apellido1, apellido2=None, dni=None, **extra):
+    data = {"nombre": nombre, "apellido1": apellido1, "apellido2": apellido2, "activo": True,
+            "identificaciones": [{"type": "DNI", "value": dni}] if dni else []}
+    data.update(extra)
+    return data
+
+
+@pytest.fixture
+def seeded(people_repo):
+    ids = {
+        "maria": people_repo.create_person(_person("María José", "Gómez", "Núñez", dni="12345678Z", patient_code="GOM001")),
+        "mario": people_repo.create_person(_person("Mario", "Gomezano", None, dni="87654321X", patient_code="GOM002")),
+        "jose": people_repo.create_person(_person("José", "Martínez", "Gómez", dni="11111111H", num_ss="28/1234567/89")),
+        "old": people_repo.create_person(_person("María", "Gómez", None, activo=False)),
+    }
+    return ids
+
+
+def test_search_fields_are_accent_folded():
+    fields = build_person_search_fields(_person("Íñigo", "Muñoz-Álvarez", None, dni="12.345.678-z", patient_code="mun01"))
+    assert fields["tokens"] == ["iñigo", "muñoz", "alvarez"]
+    assert "mu" in fields["prefixes"] and "alva" in fields["prefixes"]
+    assert fields["ids"] == ["12345678Z", "MUN01"]
+    assert fold_text("ÁÉÍÓÚ Ü ñ") == "aeiou u ñ"
+
+
+def test_search_matches_accents_prefixes_and_ranks_exact_tokens_first(people_repo, seeded):
+    names = [p["nombre"] for p in people_repo.search_by_name("gomez")]
+    # Exact token 'gomez' (as first surname, then as second) before the prefix match 'gomezano'
+    assert names == ["María José", "José", "Mario"]
+
+    assert [p["nombre"] for p in people_repo.search_by_name("maría gom")] == ["María José"]
+    assert people_repo.search_by_name("GÓMEZ Núñez")[0]["nombre"] == "María José"
+    assert "search" not in people_repo.search_by_name("gomez")[0]
+
+
+def test_search_identifier_fast_path(people_repo, seeded):
+    assert [p["patient_code"] for p in people_repo.search_by_name("gom002")] == ["GOM002"]
+    assert people_repo.search_by_name("12345678-z")[0]["nombre"] == "María José"
+    assert people_repo.search_by_name("28/1234567/89")[0]["nombre"] == "José"
+    # Identifier prefix while typing
+    assert [p["patient_code"] for p in people_repo.search_by_name("GOM0")] == ["GOM001", "GOM002"]
+
+
+def test_search_code_prefix_without_digits(people_repo, seeded):
+    people_repo.create_person(_person("Ana", "Ruiz", None, patient_code="PAC0042"))
+
+    assert [p["patient_code"] for p in people_repo.search_by_name("PAC")] == ["PAC0042"]
+    assert [p["patient_code"] for p in people_repo.search_by_name("pac")] == ["PAC0042"]
+
+
+def test_default_reads_leave_out_search_prefixes(people_repo, seeded):
+    person = people_repo.get_by_id(seeded["maria"])
+
+    assert "prefixes" not in person["search"]
+    assert person["search"]["ids"] == ["12345678Z", "GOM001"]
+    assert "prefixes" not in people_repo.get_by_patient_code("GOM002")["search"]
+
+
+def test_search_respects_active_only(people_repo, seeded):
+    assert len(people_repo.search_by_name("maria")) == 1
+    assert len(people_repo.search_by_name("maria", active_only=False)) == 2
+
+
+def test_search_fields_follow_updates_and_backfill(people_repo, seeded, mock_db):
+    people_repo.update_person(seeded["mario"], {"apellido1": "Sánchez"})
+    assert [p["nombre"] for p in people_repo.search_by_name("sanchez")] == ["Mario"]
+    assert "Mario" not in [p["nombre"] for p in people_repo.search_by_name("gomezano")]
+
+    # Records created before indexed search have no 'search' until backfilled
+    mock_db.people.insert_one({"nombre": "Lucía", "apellido1": "Pérez", "activo": True})
+    assert people_repo.search_by_name("perez") == []
+    assert people_repo.backfill_search_fields() == 1
+    assert people_repo.search_by_name("lucia")[0]["apellido1"] == "Pérez"
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from services.ai_gateway import AIGateway
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+        self.candidates = []
+        self.prompt_feedback = None
+
+
+class FakeModel:
+    """Local stand-in for genai.GenerativeModel with a configurable async latency."""
+
+    def __init__(self, latency=0.05, failures=0, error=ConnectionError("connection reset")):
+        self.latency = latency
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    async def generate_content_async(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            call_no = self.calls
+        try:
+            await asyncio.sleep(self.latency)
+            if call_no <= self.failures:
+                raise self.error
+            return FakeResponse(json.dumps({"echo": str(prompt)}))
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def fake():
+    model = FakeModel()
+    created = []
+    audits = []
+
+    def factory(model_name, generation_config, safety_settings):
+        created.append(model_name)
+        return model
+
+    gateway = AIGateway(
+        model_factory=factory,
+        audit_sink=audits.append,
+        max_concurrency=2,
+        timeout_s=1.0,
+        max_retries=3,
+        backoff_base_s=0.01,
+        backoff_max_s=0.02,
+    )
+    yield gateway, model, created, audits
+    gateway.close()
+
+
+def _kwargs(prompt, model_name="fake-model"):
+    return dict(
+        caller_id="test",
+        user_id="tester",
+        call_type="test",
+        prompt_type="test_prompt",
+        prompt_version_id="v1",
+        model_name=model_name,
+        prompt_content=prompt,
+    )
+
+
+def test_generate_content_parses_and_audits_in_background(fake):
+    gateway, model, created, audits = fake
+
+    data, raw_prompt = gateway.generate_content(**_kwargs("hola"))
+    gateway.flush_audit()
+
+    assert data == {"echo": "hola"}
+    assert raw_prompt == "hola"
+    assert len(audits) == 1
+    assert audits[0].status == "success"
+    assert audits[0].metadata["attempts"] == 1
+
+
+def test_identical_inflight_prompts_are_coalesced(fake):
+    gateway, model, created, audits = fake
+
+    futures = [gateway.submit(**_kwargs("same prompt")) for _ in range(5)]
+    results = [f.result(timeout=5) for f in futures]
+    gateway.flush_audit()
+
+    assert model.calls == 1
+    assert all(r[0] == {"echo": "same prompt"} for r in results)
+    # Each caller gets its own copy and its own audit entry
+    assert len({id(r[0]) for r in results}) == 5
+    assert sum(a.metadata["coalesced"] for a in audits) == 4
+
+
+def test_concurrency_is_bounded_and_model_reused(fake):
+    gateway, model, created, audits = fake
+
+    futures = [gateway.submit(**_kwargs(f"prompt {i}")) for i in range(8)]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert model.calls == 8
+    assert model.max_active <= 2
+    assert created == ["fake-model"]
+
+
+def test_transient_errors_are_retried(fake):
+    gateway, model, created, audits = fake
+    model.failures = 2
+
+    data, _ = gateway.generate_content(**_kwargs("retry me"))
+    gateway.flush_audit()
+
+    assert data == {"echo": "retry me"}
+    assert model.calls == 3
+    assert audits[0].metadata["attempts"] == 3
+
+
+def test_timeout_returns_contingency_error(fake):
+    gateway, model, created, audits = fake
+    model.latency = 5
+    gateway.timeout_s = 0.05
+    gateway.max_retries = 2
+
+    start = time.perf_counter()
+    data, _ = gateway.generate_content(**_kwargs("slow"))
+    gateway.flush_audit()
+
+    assert time.perf_counter() - start < 2
+    assert data["status"] == "ERROR"
+    assert data["suggest_contingency"] is True
+    assert audits[0].status == "error"
+
+
+def test_cache_hit_skips_model_and_is_audited():
+    from services.ai_response_cache import AIResponseCache
+
+    model = FakeModel(latency=0.01)
+    audits = []
+    gateway = AIGateway(model_factory=lambda *a: model, audit_sink=audits.append, cache=AIResponseCache())
+    try:
+        first, _ = gateway.generate_content(cache=True, **_kwargs("deterministic"))
+        first["mutated"] = True
+        second, _ = gateway.generate_content(cache=True, **_kwargs("  deterministic\r\n"))
+        gateway.flush_audit()
+    finally:
+        gateway.close()
+
+    assert model.calls == 1
+    assert second == {"echo": "deterministic"}
+    assert [a.cache_hit for a in audits] == [False, True]
+    assert audits[1].status == "success"
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+
+import db.repositories.ai_response_cache as cache_repo_module
+from db.repositories.ai_response_cache import get_ai_response_cache_repository
+from services.ai_response_cache import AIResponseCache, cache_key
+
+
+@pytest.fixture
+def shared_repo(mock_db):
+    cache_repo_module._ai_response_cache_repo = None
+    with patch('db.repositories.ai_response_cache.get_database', return_value=mock_db):
+        yield get_ai_response_cache_repository()
+    cache_repo_module._ai_response_cache_repo = None
+
+
+def _entry(value):
+    return {"response": {"value": value}, "raw_response": str(value), "model_name": "m"}
+
+
+def test_key_depends_on_version_and_config_not_whitespace():
+    base = cache_key("m", "v1", "Paciente con dolor\r\n", {"temperature": 0.1})
+
+    assert base == cache_key("m", "v1", "  Paciente con dolor", {"temperature": 0.1})
+    assert base != cache_key("m", "v2", "Paciente con dolor", {"temperature": 0.1})
+    assert base != cache_key("m", "v1", "Paciente con dolor", {"temperature": 0.2})
+    assert base != cache_key("other", "v1", "Paciente con dolor", {"temperature": 0.1})
+
+
+def test_key_depends_on_safety_settings():
+    blocking = [{"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}]
+    permissive = [{"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}]
+    base = cache_key("m", "v1", "Paciente", {"temperature": 0.1}, blocking)
+
+    assert base == cache_key("m", "v1", "Paciente", {"temperature": 0.1}, list(blocking))
+    assert base != cache_key("m", "v1", "Paciente", {"temperature": 0.1}, permissive)
+    assert base != cache_key("m", "v1", "Paciente", {"temperature": 0.1})
+
+
+def test_key_hashes_binary_parts_and_rejects_opaque_objects():
+    audio = {"mime_type": "audio/wav", "data": b"\x00\x01"}
+
+    assert cache_key("m", "v1", ["p", audio], {}) == cache_key("m", "v1", ["p", dict(audio)], {})
+    assert cache_key("m", "v1", ["p", object()], {}) is None
+
+
+def test_ttl_expiry_and_lru_eviction():
+    cache = AIResponseCache(ttl_s=60, max_entries=2)
+    cache.put("a", _entry(1))
+    cache.put("b", _entry(2))
+    cache.get("a")              # "a" becomes most recently used
+    cache.put("c", _entry(3))   # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("a")["response"] == {"value": 1}
+
+    with patch('services.ai_response_cache.time.monotonic', return_value=10**9):
+        assert cache.get("a") is None
+
+
+def test_shared_collection_serves_other_workers(shared_repo):
+    worker_a = AIResponseCache(shared_repo=shared_repo)
+    worker_b = AIResponseCache(shared_repo=shared_repo)
+
+    worker_a.put("k", _entry(42))
+
+    assert worker_b.get("k")["response"] == {"value": 42}
+    assert len(worker_b) == 1  # promoted to the local tier
@@ -0,0 +1,87 @@
+# path: tests/unit/services/test_anomaly_detection_service.py
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+import services.anomaly_detection_service as anomaly_detection
+from db.repositories import flow_anomalies
+from services.ml_predictive_service import MLPredictiveService
+
+
+def _steps(sala, hour, arrivals, minutes=30):
+    """'arrivals' patient_flow steps entering at 'hour' and leaving 'minutes' later."""
+    return [{"sala_code": sala, "entrada": hour + timedelta(minutes=5),
+             "salida": hour + timedelta(minutes=5 + minutes), "activo": False} for _ in range(arrivals)]
+
+
+@pytest.fixture
+def flow_db(mock_db, monkeypatch):
+    monkeypatch.setattr(flow_anomalies, "_flow_anomalies_repo", None)
+    with patch.object(flow_anomalies, "get_database", return_value=mock_db), \
+         patch.object(anomaly_detection, "get_database", return_value=mock_db):
+        yield mock_db
+
+
+def test_hourly_series_counts_arrivals_and_departures(flow_db):
+    hour = anomaly_detection.hour_floor(datetime.now()) - timedelta(hours=3)
+    flow_db.patient_flow.insert_many(_steps("BOX1", hour, 3) + _steps("ESP1", hour, 1, minutes=90))
+    flow_db.patient_flow.insert_one({"sala_code": "ESP1", "entrada": hour, "salida": None, "activo": True})
+
+    series = anomaly_detection.hourly_flow_series(hour - timedelta(hours=1), hour + timedelta(hours=3))
+
+    assert series[("BOX1", hour)] == {"llegadas": 3, "salidas": 3}
+    assert series[("ESP1", hour)] == {"llegadas": 2}
+    assert series[("ESP1", hour + timedelta(hours=1))] == {"salidas": 1}
+
+
+def test_robust_score_ignores_outliers_in_baseline():
+    expected, scale, score = anomaly_detection.robust_score(6, [5, 6, 5, 40, 6, 5])
+    assert expected == 5.5
+    assert abs(score) < 1
+    assert anomaly_detection.robust_score(40, [5, 6, 5, 6, 5, 6])[2] > anomaly_detection.THRESHOLD
+
+
+def test_detection_flags_seasonal_deviation_incrementally(flow_db, monkeypatch):
+    monkeypatch.setattr(anomaly_detection, "BACKFILL_DAYS", 21)
+    monkeypatch.setattr(anomaly_detection, "MIN_BASELINE", 2)
+    now = datetime.now().replace(hour=11, minute=20, second=0, microsecond=0)
+    current = anomaly_detection.hour_floor(now)
+    start = current - timedelta(days=21)
+    spike = current - timedelta(hours=5)  # 06:00, a quiet hour
+    docs, hour = [], start
+    while hour <= current:
+        # Busy days, quiet nights: daytime volume at night is unusual
+        normal = 14 if 8 <= hour.hour < 20 else 1
+        docs += _steps("BOX1", hour, 20 if hour == spike else 0 if hour == current else normal)
+        hour += timedelta(hours=1)
+    flow_db.patient_flow.insert_many(docs)
+
+    first = anomaly_detection.run_anomaly_detection(now=now)
+    flags = anomaly_detection.get_recent_anomalies("BOX1", days=60)
+
+    assert first == {"hours": 21 * 24, "anomalies": 2}
+    assert {(f["metric"], f["hour"], f["tipo"], f["severidad"]) for f in flags} == {
+        ("llegadas", spike, "pico_inusual", "alta"), ("salidas", spike, "pico_inusual", "alta")
+    }
+
+    # Later runs only process the new complete hours: an empty 11:00 is a drop
+    later = now + timedelta(hours=1)
+    assert anomaly_detection.run_anomaly_detection(now=later) == {"hours": 1, "anomalies": 2}
+    assert anomaly_detection.run_anomaly_detection(now=later) == {"hours": 0, "anomalies": 0}
+    drops = [f for f in anomaly_detection.get_recent_anomalies("BOX1", days=60) if f["hour"] == current]
+    assert {(f["metric"], f["tipo"]) for f in drops} == {("llegadas", "baja_inusual"), ("salidas", "baja_inusual")}
+
+
+def test_ml_service_reads_persisted_flags(flow_db):
+    hour = anomaly_detection.hour_floor(datetime.now()) - timedelta(hours=2)
+    flow_anomalies.get_flow_anomalies_repository().save_anomalies([{
+        "sala_code": "BOX1", "metric": "llegadas", "hour": hour, "value": 14, "expected": 4.0,
+        "scale": 2.0, "score": 5.0, "tipo": "pico_inusual", "severidad": "media", "detected_at": datetime.now(),
+    }])
+    anomalies = MLPredictiveService().detect_anomalies("BOX1", 7)
+    assert anomalies == [{
+        "fecha": hour, "metrica": "llegadas", "tipo": "pico_inusual", "demanda_esperada": 4,
+        "demanda_real": 14, "desviacion": 10, "puntuacion": 5.0, "severidad": "media",
+    }]
+    assert MLPredictiveService().detect_anomalies("BOX2", 7) == []
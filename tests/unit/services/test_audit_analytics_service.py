@@ -0,0 +1,142 @@
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import db.repositories.audit_rollups as rollups_module
+import services.audit_analytics_service as analytics
+from services.audit_analytics_service import (
+    refresh_audit_rollups, rebuild_audit_rollups, get_audit_summary, concordance_metrics, parse_level
+)
+
+LEVELS = ["Nivel I", "Nivel II", "Nivel III", "Nivel IV", "Nivel V"]
+
+
+@pytest.fixture(autouse=True)
+def rollups_db(mock_db):
+    rollups_module._audit_rollups_repo = None
+    analytics._last_refresh = 0.0
+    with patch('db.repositories.audit_rollups.get_database', return_value=mock_db):
+        yield mock_db
+    rollups_module._audit_rollups_repo = None
+
+
+def _audit_record(ts, i):
+    ai = LEVELS[i % 5]
+    human = LEVELS[(i + (i % 3 == 0)) % 5]
+    return {
+        "timestamp": ts,
+        "accion": "triaje",
+        "detalles": {
+            "sugerencia_ia": ai,
+            "nivel_corregido": human,
+            "decision_humana": "Confirmado" if ai == human else "Modificado",
+            "calificacion_humana": "Correcto" if i % 2 else "Incorrecto",
+            "dolor": i % 11,
+            "edad": 20 + i % 60,
+        },
+    }
+
+
+def _seed(db, start, days, per_day):
+    records = [
+        _audit_record(start + timedelta(days=d, minutes=7 * i), d * per_day + i)
+        for d in range(days) for i in range(per_day)
+    ]
+    db.audit_log.insert_many(records)
+    db.file_imports_records.insert_many([
+        {"timestamp": r["timestamp"], "file_type": "wav" if n % 4 == 0 else "png", "audit_id": f"a{n // 2}"}
+        for n, r in enumerate(records[::3])
+    ])
+    db.transcriptions_records.insert_many([
+        {"timestamp": r["timestamp"], "language_name": "Español" if n % 3 else "English"}
+        for n, r in enumerate(records[::12])
+    ])
+    return records
+
+
+def test_summary_totals_cover_full_history_beyond_page_limit(rollups_db):
+    # 1,500 triages: more than the 1,000 records the panel used to load
+    records = _seed(rollups_db, datetime(2026, 3, 1), days=10, per_day=150)
+    summary = get_audit_summary(date(2026, 3, 1), date(2026, 3, 10))
+
+    assert summary.triage_total == 1500
+    assert summary.files_total == 500
+    assert summary.transcriptions_total == len(records[::12])
+    assert summary.daily["triage"].tolist() == [150] * 10
+    assert summary.hourly["triage"].sum() == 1500
+
+    expected_hits = sum(1 for r in records if r["detalles"]["sugerencia_ia"] == r["detalles"]["nivel_corregido"])
+    assert summary.concordant() == expected_hits
+    assert summary.count_where("decision", analytics.MODIFIED_DECISIONS) == 1500 - expected_hits
+
+    # The range only reads the matching day documents
+    partial = get_audit_summary(date(2026, 3, 4), date(2026, 3, 5), refresh=False)
+    assert partial.triage_total == 300
+    assert partial.daily["day"].tolist() == [date(2026, 3, 4), date(2026, 3, 5)]
+
+
+def test_refresh_is_incremental_and_idempotent(rollups_db):
+    _seed(rollups_db, datetime(2026, 3, 1), days=3, per_day=20)
+    assert refresh_audit_rollups(force=True)["triage"] == 3
+
+    # Nothing new: no day is rebuilt beyond the overlap window, counts stay the same
+    refresh_audit_rollups(force=True)
+    assert get_audit_summary(date(2026, 3, 1), date(2026, 3, 3), refresh=False).triage_total == 60
+
+    # A late record only touches its own day
+    rollups_db.audit_log.insert_one(_audit_record(datetime(2026, 3, 2, 23, 0), 1))
+    written = refresh_audit_rollups(force=True)
+    assert written["triage"] == 3  # days inside the overlap window are recomputed, not incremented
+    summary = get_audit_summary(date(2026, 3, 1), date(2026, 3, 3), refresh=False)
+    assert summary.triage_total == 61
+    assert summary.daily["triage"].tolist() == [20, 21, 20]
+
+
+def test_rebuild_drops_days_left_without_records(rollups_db):
+    _seed(rollups_db, datetime(2026, 3, 1), days=3, per_day=20)
+    refresh_audit_rollups(force=True)
+
+    # Day 2 is purged from every source; day 3 keeps its triages but loses its transcriptions
+    day2 = {"timestamp": {"$gte": datetime(2026, 3, 2), "$lt": datetime(2026, 3, 3)}}
+    for source in ("audit_log", "file_imports_records", "transcriptions_records"):
+        rollups_db[source].delete_many(day2)
+    rollups_db.transcriptions_records.delete_many({"timestamp": {"$gte": datetime(2026, 3, 3)}})
+
+    written = rebuild_audit_rollups(date(2026, 3, 1), date(2026, 3, 3))
+
+    assert written["triage"] == 2
+    assert rollups_db.audit_rollups.find_one({"_id": "2026-03-02"}) is None
+    assert "transcriptions" not in rollups_db.audit_rollups.find_one({"_id": "2026-03-03"})
+    summary = get_audit_summary(date(2026, 3, 1), date(2026, 3, 3), refresh=False)
+    assert summary.daily["triage"].tolist() == [20, 20]
+    assert summary.transcriptions_total == rollups_db.transcriptions_records.count_documents({})
+
+
+def test_refresh_is_throttled_per_process(rollups_db):
+    _seed(rollups_db, datetime(2026, 3, 1), days=1, per_day=5)
+    assert refresh_audit_rollups()["triage"] == 1
+    assert refresh_audit_rollups() == {}
+
+
+def test_parse_level_accepts_numeric_and_roman_labels():
+    assert parse_level(3) == 3
+    assert parse_level("2") == 2
+    assert parse_level("Nivel IV") == 4
+    assert parse_level("Nivel III (Urgencia)") == 3
+    assert parse_level("Nivel V") == 5
+    assert parse_level("Pendiente") is None
+    assert parse_level(None) is None
+
+
+def test_concordance_metrics_match_per_record_computation(rollups_db):
+    records = _seed(rollups_db, datetime(2026, 3, 1), days=2, per_day=40)
+    metrics = concordance_metrics(get_audit_summary(date(2026, 3, 1), date(2026, 3, 2)).cells)
+
+    # Reference: the per-record computation done before rollups existed
+    pairs = [(parse_level(r["detalles"]["sugerencia_ia"]), parse_level(r["detalles"]["nivel_corregido"])) for r in records]
+    assert metrics["n"] == len(pairs)
+    assert metrics["accuracy"] == pytest.approx(sum(a == h for a, h in pairs) / len(pairs))
+    assert metrics["over_triage"] == pytest.approx(sum(a < h for a, h in pairs) / len(pairs))
+    assert metrics["under_triage"] == pytest.approx(sum(a > h for a, h in pairs) / len(pairs))
+    assert int(metrics["confusion"].values.sum()) == len(pairs)
+    assert metrics["confusion"].loc[1, 5] == sum(1 for a, h in pairs if (h, a) == (1, 5))
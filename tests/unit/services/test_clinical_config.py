@@ -0,0 +1,82 @@
+# path: tests/unit/services/test_clinical_config.py
+from unittest.mock import patch
+
+import pytest
+
+import services.clinical_config as clinical_config
+from db.models import PTRConfig, PTRRule, VitalSignAgeConfig, VitalSignReference
+from db.repositories import config_versions, ptr_config, triage_config
+from db.repositories.vital_signs_repo import VitalSignsRepository
+
+
+def _band(min_age, max_age, normal_min):
+    return VitalSignAgeConfig(min_age=min_age, max_age=max_age, val_min=0, val_max=300,
+                              normal_min=normal_min, normal_max=normal_min + 40, default_value=normal_min + 20)
+
+
+@pytest.fixture
+def clinical_db(mock_db, monkeypatch):
+    with patch('db.repositories.base.get_database', return_value=mock_db), \
+         patch('db.repositories.config_versions.get_database', return_value=mock_db):
+        monkeypatch.setattr(ptr_config, "_ptr_config_repo", None)
+        monkeypatch.setattr(triage_config, "_triage_config_repo", None)
+        monkeypatch.setattr(config_versions, "_config_versions_repo", None)
+        monkeypatch.setattr(clinical_config, "_snapshot", None)
+        monkeypatch.setattr(clinical_config, "_next_check", 0.0)
+        # Overlapping and gapped bands: the first matching band wins
+        mock_db.vital_signs_references.insert_many([
+            VitalSignReference(name="FC", key="fc", unit="ppm", configs=[
+                _band(0, 1, 100), _band(0, 14, 70), _band(10, 64, 60), _band(80, 120, 55)
+            ]).model_dump(by_alias=True, exclude={"id"}),
+            VitalSignReference(name="SpO2", key="spo2", unit="%", configs=[
+                _band(0, 150, 94)
+            ]).model_dump(by_alias=True, exclude={"id"}),
+        ])
+        ptr_config.get_ptr_config_repository()  # seeds the PTR defaults (a config write) up front
+        yield mock_db
+
+
+def test_age_lookup_matches_repository(clinical_db):
+    snapshot = clinical_config.get_clinical_config()
+    repo = VitalSignsRepository()
+    for age in list(range(-2, 160)) + [12.5, 64.5]:
+        expected = {m: repo.get_config(m, age) for m in clinical_config.VITAL_SIGN_METRICS}
+        assert snapshot.vital_configs_for_age(age) == expected, age
+
+
+def test_hot_path_does_not_query(clinical_db):
+    first = clinical_config.get_clinical_config()
+    with patch.object(clinical_config, "_load", side_effect=AssertionError("reloaded")), \
+         patch.object(config_versions.ConfigVersionsRepository, "get_version", side_effect=AssertionError("queried")):
+        for _ in range(100):
+            assert clinical_config.get_clinical_config() is first
+
+
+def test_local_write_is_visible_immediately(clinical_db):
+    before = clinical_config.get_clinical_config()
+    gcs = before.ptr_config("gcs")
+    ptr_config.get_ptr_config_repository().save_config(
+        gcs.model_copy(update={"base_multiplier": 9.0, "rules": [PTRRule(operator="<", value=15, points=1)]})
+    )
+    after = clinical_config.get_clinical_config()
+    assert after is not before
+    assert after.ptr_config("gcs").base_multiplier == 9.0
+    assert before.ptr_config("gcs").base_multiplier == gcs.base_multiplier
+
+
+def test_remote_write_picked_up_on_version_check(clinical_db):
+    before = clinical_config.get_clinical_config()
+    # Another process: data change plus version bump, without touching this process' counter
+    clinical_db.ptr_config.update_one({"metric_key": "fc"}, {"$set": {"base_multiplier": 7.0}})
+    config_versions.get_config_versions_repository().bump(config_versions.CLINICAL_CONFIG)
+
+    assert clinical_config.get_clinical_config() is before  # within the check interval
+    clinical_config.invalidate_clinical_config()
+    assert clinical_config.get_clinical_config().ptr_config("fc").base_multiplier == 7.0
+
+
+def test_failed_reload_keeps_previous_snapshot(clinical_db):
+    before = clinical_config.get_clinical_config()
+    config_versions.bump_config_version(config_versions.CLINICAL_CONFIG)
+    with patch.object(clinical_config, "_load", side_effect=RuntimeError("db down")):
+        assert clinical_config.get_clinical_config() is before
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch
+
+import db.repositories.ui_rules_repository as rules_repo_module
+import services.dynamic_ui_rules_engine as engine_module
+from db.models_rules import UIRule, RuleCondition, RuleAction, LogicOperator, ConditionOperator, ActionType, RuleStatus
+from services.dynamic_ui_rules_engine import DynamicRulesEngine
+
+
+@pytest.fixture
+def engine(mock_db):
+    rules_repo_module._repo = None
+    DynamicRulesEngine._instance = None
+    with patch('db.repositories.ui_rules_repository.get_database', return_value=mock_db), \
+         patch.object(DynamicRulesEngine, '_ensure_migration'):
+        engine = DynamicRulesEngine()
+        engine.invalidate_cache()
+        for rule in engine._get_default_rules():
+            engine.repo.create_rule(rule)
+        mock_db.ui_rules.update_many({}, {"$set": {"status": RuleStatus.ACTIVE.value}})
+        engine.invalidate_cache()
+        yield engine
+    DynamicRulesEngine._instance = None
+    rules_repo_module._repo = None
+
+
+def test_default_rules_fire_on_matching_patients(engine):
+    septic = {"vital_signs": {"temperature": "38.5", "heart_rate": 120}, "edad": 80, "texto_medico": "Fiebre"}
+    result = engine.evaluate(septic)
+    assert [a["type"] for a in result["alerts"]] == ["critical", "warning"]
+    assert result["highlights"] == ["temperature", "heart_rate", "systolic_bp"]
+    assert result["suggestions"] == ["qSOFA", "Test Riesgo Caídas"]
+
+    # Missing nested fields never match; non-dict intermediates are tolerated
+    assert engine.evaluate({"vital_signs": None, "texto_medico": None}) == {"alerts": [], "highlights": [], "suggestions": []}
+    assert engine.evaluate({"vital_signs": "n/a", "edad": 5})["alerts"] == [{"type": "info", "message": "👶 Protocolo Pediátrico Activo."}]
+    assert engine.evaluate({"texto_medico": "Dolor en el PECHO"})["suggestions"] == ["Electrocardiograma (ECG)"]
+
+
+def test_evaluate_many_reads_rules_once_and_keeps_order(engine):
+    patients = [{"edad": 5}, {"edad": 40}, {"vital_signs": {"oxygen_saturation": 88}}]
+    with patch.object(engine.repo, 'get_active_rules', wraps=engine.repo.get_active_rules) as fetch:
+        engine.invalidate_cache()
+        results = engine.evaluate_many(patients)
+        engine.evaluate({"edad": 90})
+    assert fetch.call_count == 1
+    assert [len(r["alerts"]) for r in results] == [1, 0, 1]
+    assert results == [engine.evaluate(p) for p in patients]
+
+
+def test_rule_save_invalidates_compiled_rules(engine):
+    assert engine.evaluate({"edad": 30})["alerts"] == []
+    rule_id = engine.repo.create_rule(UIRule(
+        name="Adulto joven",
+        conditions=RuleCondition(field="edad", operator=ConditionOperator.LESS_EQUAL, value="30"),
+        actions=[RuleAction(type=ActionType.ALERT, level="info", message="adulto")],
+    ))
+    assert engine.evaluate({"edad": 30})["alerts"] == []  # still a draft
+    engine.repo.publish_version(rule_id)
+    assert engine.evaluate({"edad": 30})["alerts"] == [{"type": "info", "message": "adulto"}]
+    engine.repo.archive_rule(rule_id)
+    assert engine.evaluate({"edad": 30})["alerts"] == []
+
+
+def test_compiled_condition_semantics():
+    def check(condition, data):
+        return engine_module.compile_condition(condition)(data, {})
+
+    leaf = lambda op, value, field="x": RuleCondition(field=field, operator=op, value=value)
+    assert check(leaf(ConditionOperator.GREATER_THAN, 5), {"x": "7"})
+    assert not check(leaf(ConditionOperator.GREATER_THAN, 5), {"x": "abc"})  # str > int: error -> False
+    assert check(leaf(ConditionOperator.EQUALS, "7"), {"x": 7})
+    assert check(leaf(ConditionOperator.IN, ["a", "b"]), {"x": "a"})
+    assert check(leaf(ConditionOperator.NOT_CONTAINS, "Tos"), {"x": "fiebre"})
+    assert not check(RuleCondition(logic=LogicOperator.AND, rules=[]), {"x": 1})  # empty group
+    assert not check(RuleCondition(field="x"), {"x": 1})  # no operator
+
+    # Short-circuit: the second branch is never read once the first one decides
+    reads = []
+    class Tracking(dict):
+        def get(self, key, default=None):
+            reads.append(key)
+            return super().get(key, default)
+    group = RuleCondition(logic=LogicOperator.OR, rules=[leaf(ConditionOperator.EQUALS, 1, "a"), leaf(ConditionOperator.EQUALS, 1, "b")])
+    assert check(group, Tracking(a=1, b=1))
+    assert reads == ["a"]
@@ -0,0 +1,162 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import db.repositories.his_outbox as outbox_module
+import services.his_outbox_service as his
+from db.repositories.his_outbox import get_his_outbox_repository
+from services.his_outbox_service import HISOutboxDispatcher, enqueue_clinical_data
+from services.notification_service import send_clinical_data
+from db.repositories.notification_config import get_his_config, save_webhook_config
+
+HIS_CONFIG = {"enabled": True, "url": "https://his.example/fhir", "auth_token": "t0k", "batch_size": 20}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no json")
+        return self._body
+
+
+class FakeSession:
+    """Records batch POSTs; 'responder' maps the posted batch to a FakeResponse."""
+
+    def __init__(self, responder=None):
+        self.calls = []
+        self.responder = responder or (lambda batch: FakeResponse(200))
+
+    def post(self, url, data, headers, timeout):
+        batch = json.loads(data)
+        self.calls.append({"url": url, "batch": batch, "headers": headers})
+        return self.responder(batch)
+
+
+@pytest.fixture(autouse=True)
+def outbox_db(mock_db):
+    outbox_module._his_outbox_repo = None
+    with patch('db.repositories.his_outbox.get_database', return_value=mock_db):
+        yield mock_db
+    outbox_module._his_outbox_repo = None
+
+
+def _dispatcher(session, **kwargs):
+    return HISOutboxDispatcher(repo=get_his_outbox_repository(), session=session,
+                               config_loader=lambda: HIS_CONFIG, **kwargs)
+
+
+def _bundle(i):
+    return {"resourceType": "Bundle", "type": "collection", "entry": [{"resource": {"id": str(i)}}]}
+
+
+def test_send_clinical_data_is_a_single_idempotent_insert(outbox_db):
+    record = {"patient_id": "P1", "datos_paciente": {"nombre": "Ana Ruiz"}, "resultado": {}}
+    key = send_clinical_data(record, idempotency_key="TRG-1-P1")
+    assert send_clinical_data(record, idempotency_key="TRG-1-P1") == key
+
+    docs = list(outbox_db.his_outbox.find())
+    assert len(docs) == 1
+    assert docs[0]["_id"] == "TRG-1-P1"
+    assert docs[0]["status"] == "pending"
+    assert docs[0]["payload"]["resourceType"] == "Bundle"
+
+
+def test_dispatcher_batches_per_endpoint_and_marks_delivered(outbox_db):
+    for i in range(45):
+        enqueue_clinical_data(_bundle(i), idempotency_key=f"K{i:02d}")
+    session = FakeSession()
+
+    assert _dispatcher(session).run_once() == 45
+    assert sorted(len(c["batch"]["entry"]) for c in session.calls) == [5, 20, 20]
+    entry = session.calls[0]["batch"]["entry"][0]
+    assert entry["request"]["ifNoneExist"].startswith(f"identifier={his.IDEMPOTENCY_SYSTEM}|K")
+    assert "Idempotency-Key" in session.calls[0]["headers"]
+    assert outbox_db.his_outbox.count_documents({"status": "delivered"}) == 45
+
+
+def test_transient_failure_is_retried_with_backoff_then_dead_lettered(outbox_db):
+    enqueue_clinical_data(_bundle(1), idempotency_key="K1")
+    session = FakeSession(lambda batch: FakeResponse(503))
+    dispatcher = _dispatcher(session, max_attempts=3, backoff_base_s=60)
+
+    dispatcher.run_once()
+    doc = outbox_db.his_outbox.find_one({"_id": "K1"})
+    assert doc["status"] == "pending"
+    assert doc["attempts"] == 1
+    assert doc["next_attempt_at"] > datetime.now() + timedelta(seconds=20)
+
+    # Not due yet: nothing is claimed
+    assert dispatcher.run_once() == 0
+
+    for _ in range(2):
+        outbox_db.his_outbox.update_one({"_id": "K1"}, {"$set": {"next_attempt_at": datetime.now()}})
+        dispatcher.run_once()
+    doc = outbox_db.his_outbox.find_one({"_id": "K1"})
+    assert doc["status"] == "dead"
+    assert doc["last_error"] == "HTTP 503"
+
+
+def test_per_entry_rejection_only_dead_letters_that_message(outbox_db):
+    for i in range(3):
+        enqueue_clinical_data(_bundle(i), idempotency_key=f"K{i}")
+
+    def responder(batch):
+        statuses = ["400 Bad Request" if e["resource"]["identifier"]["value"] == "K1" else "201 Created"
+                    for e in batch["entry"]]
+        return FakeResponse(200, {"resourceType": "Bundle", "type": "batch-response",
+                                  "entry": [{"response": {"status": s}} for s in statuses]})
+
+    _dispatcher(FakeSession(responder)).run_once()
+    statuses = {d["_id"]: d["status"] for d in outbox_db.his_outbox.find()}
+    assert statuses == {"K0": "delivered", "K1": "dead", "K2": "delivered"}
+
+
+def test_expired_lease_is_reclaimed(outbox_db):
+    enqueue_clinical_data(_bundle(1), idempotency_key="K1")
+    repo = get_his_outbox_repository()
+    assert len(repo.claim_batch(["his"], 10, lease_s=60)) == 1
+    # Still leased: a second worker cannot take it
+    assert repo.claim_batch(["his"], 10, lease_s=60) == []
+
+    outbox_db.his_outbox.update_one({"_id": "K1"}, {"$set": {"lease_until": datetime.now() - timedelta(seconds=1)}})
+    session = FakeSession()
+    assert _dispatcher(session).run_once() == 1
+    assert outbox_db.his_outbox.find_one({"_id": "K1"})["status"] == "delivered"
+
+
+def test_disabled_endpoint_leaves_messages_pending(outbox_db):
+    enqueue_clinical_data(_bundle(1), idempotency_key="K1")
+    dispatcher = HISOutboxDispatcher(repo=get_his_outbox_repository(), session=FakeSession(),
+                                     config_loader=lambda: {"enabled": False})
+    assert dispatcher.run_once() == 0
+    assert outbox_db.his_outbox.find_one({"_id": "K1"})["attempts"] == 0
+
+
+def test_his_config_never_falls_back_to_generic_webhook(outbox_db):
+    # Generic webhooks must not receive patient bundles
+    with patch('db.repositories.notification_config.get_database', return_value=outbox_db):
+        save_webhook_config({"enabled": True, "type": "generic", "url": "https://hooks.example/any"})
+        config = get_his_config()
+    assert not config["enabled"]
+
+    enqueue_clinical_data(_bundle(1), idempotency_key="K1")
+    session = FakeSession()
+    dispatcher = HISOutboxDispatcher(repo=get_his_outbox_repository(), session=session,
+                                     config_loader=lambda: config)
+    assert dispatcher.run_once() == 0
+    assert session.calls == []
+    assert outbox_db.his_outbox.find_one({"_id": "K1"})["status"] == "pending"
+
+
+def test_his_endpoint_without_auth_is_not_used(outbox_db):
+    enqueue_clinical_data(_bundle(1), idempotency_key="K1")
+    session = FakeSession()
+    dispatcher = HISOutboxDispatcher(repo=get_his_outbox_repository(), session=session,
+                                     config_loader=lambda: {**HIS_CONFIG, "auth_token": ""})
+    assert dispatcher.run_once() == 0
+    assert session.calls == []
@@ -0,0 +1,97 @@
+import uuid
+
+import chromadb
+import pytest
+
+from services.lexical_index import LexicalIndex, tokenize
+from services.rag_ingestion import RAGIngestionPipeline
+from services.rag_service import RAGService
+
+
+def test_tokenize_keeps_clinical_tokens():
+    assert tokenize("Escala NEWS2 y Glasgow <8; Adrenalina 1 mg IV") == [
+        "escala", "news2", "glasgow", "8", "adrenalina", "1", "mg", "iv"
+    ]
+    assert tokenize("Hipotensión") == tokenize("hipotension")
+
+
+def test_bm25_ranks_rare_terms_and_persists(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.replace_source(
+        "sepsis.md",
+        ["s1", "s2"],
+        ["Sepsis: calcular qSOFA y NEWS2 al ingreso", "Sepsis: iniciar antibiótico en la primera hora"],
+        [{"source": "sepsis.md"}, {"source": "sepsis.md"}],
+    )
+    index.replace_source(
+        "tce.md",
+        ["t1"],
+        ["Traumatismo craneal: valorar Glasgow y pupilas"],
+        [{"source": "tce.md"}],
+    )
+
+    assert index.search("news2")[0][0] == "s1"
+    assert index.search("glasgow")[0][0] == "t1"
+
+    reloaded = LexicalIndex(str(tmp_path))
+    assert len(reloaded) == 3
+    assert reloaded.search("qsofa")[0][0] == "s1"
+
+    reloaded.remove_source("sepsis.md")
+    assert reloaded.search("news2") == []
+    assert len(LexicalIndex(str(tmp_path))) == 1
+
+
+class HashEmbedder:
+    def __call__(self, texts):
+        return [[float((hash(w) % 97)) for w in (t.split() + ["x"] * 4)[:4]] for t in texts]
+
+
+@pytest.fixture
+def rag(tmp_path):
+    collection = chromadb.EphemeralClient().create_collection(f"kb_{uuid.uuid4().hex}", embedding_function=None)
+    service = object.__new__(RAGService)
+    service.collection = collection
+    service.lexical_index = LexicalIndex(str(tmp_path / "lexical"))
+    service.ingestion = RAGIngestionPipeline(
+        collection, str(tmp_path / "manifest.json"),
+        embedding_function=HashEmbedder(), max_workers=0, lexical_index=service.lexical_index,
+    )
+    docs = {
+        "sepsis.md": "Código sepsis: qSOFA y NEWS2 elevados, lactato y hemocultivos.",
+        "anafilaxia.md": "Anafilaxia: adrenalina intramuscular 0,5 mg, repetir a los 5 minutos.",
+        "tce.md": "Traumatismo craneoencefálico: Glasgow menor de 9 indica intubación.",
+    }
+    for name, text in docs.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    service.ingestion.ingest_directory(str(tmp_path))
+    return service
+
+
+def test_ingestion_builds_lexical_index(rag):
+    assert len(rag.lexical_index) == rag.collection.count() == 3
+
+
+def test_keyword_query_uses_lexical_fast_path(rag, monkeypatch):
+    def no_dense(*args, **kwargs):
+        raise AssertionError("dense search must not run for keyword queries")
+
+    monkeypatch.setattr(rag, "search_documents_dense", no_dense)
+    results = rag.search_documents("adrenalina", n_results=1)
+
+    assert results[0]["metadata"]["source"] == "anafilaxia.md"
+    assert results[0]["match"] == "lexical"
+
+
+def test_long_query_fuses_lexical_and_vector(rag, monkeypatch):
+    def dense(query, n_results=5):
+        # Dense side prefers the wrong document; BM25 must pull the right one up
+        return [
+            {"id": cid, "content": "", "metadata": {"source": src}, "distance": d, "match": "vector"}
+            for cid, src, d in [("x", "tce.md", 0.1)]
+        ]
+
+    monkeypatch.setattr(rag, "search_documents_dense", dense)
+    results = rag.search_context("paciente con sospecha de sepsis y NEWS2 alto tras cirugía", n_results=2)
+
+    assert any("NEWS2" in text for text in results)
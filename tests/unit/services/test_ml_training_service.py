@@ -0,0 +1,170 @@
+# path: tests/unit/services/test_ml_training_service.py
+import os
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import services.ml_model_registry as ml_model_registry
+import services.ml_training_service as ml_training_service
+from db.repositories import ml_training_jobs
+from services.ml_model_registry import ModelRegistry
+from services.ml_predictive_service import MLPredictiveService
+
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value, dtype=float)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    monkeypatch.setattr(ml_model_registry, "_registry", registry)
+    monkeypatch.setattr(ml_model_registry, "MODELS_DIR", str(tmp_path))  # no legacy files
+    return registry
+
+
+@pytest.fixture
+def training_db(mock_db):
+    now = datetime.now()
+    records = []
+    for i in range(400):
+        ts = now - timedelta(hours=i)
+        level = 1 + i % 5
+        records.append({
+            "status": "completed",
+            "timestamp": ts,
+            "triage_result": {"final_priority": level},
+            "wait_time_minutes": 10 * level + ts.hour,
+            "patient_data": {"nombre": "x" * 50},
+        })
+    records.append({"status": "pending", "timestamp": now, "wait_time_minutes": 999})
+    mock_db.triage_records.insert_many(records)
+    return mock_db
+
+
+def _train(training_db, **kwargs):
+    with patch.object(ml_training_service, "get_database", return_value=training_db):
+        service = ml_training_service.MLTrainingService(n_jobs=1, n_estimators=5, chunk_size=64)
+        return service, service.train_all(progress=lambda p, stage: None, **kwargs)
+
+
+def test_register_promote_rollback(registry):
+    v1 = registry.register("demand", ConstantModel(1), {"mae": 2.0}, {}, {})
+    v2 = registry.register("demand", ConstantModel(2), {"mae": 1.0}, {}, {})
+    assert registry.get_active_version("demand") is None
+
+    assert registry.promote("demand", v1) is None
+    assert registry.promote("demand", v2) == v1
+    assert [v["version"] for v in registry.list_versions("demand") if v["active"]] == [v2]
+    assert registry.load("demand")[1].value == 2
+
+    assert registry.rollback("demand") == v1
+    assert registry.get_active_version("demand") == v1
+    with pytest.raises(ValueError):
+        registry.promote("demand", "missing")
+
+
+def test_train_all_streams_chunks_and_records_holdout(registry, training_db):
+    service, result = _train(training_db)
+    df = service.fetch_training_data(progress=lambda p, stage: None)
+
+    assert result["status"] == "success"
+    assert len(df) == 400  # only completed records
+    assert list(df.columns) == ["arrival_time", "triage_level", "wait_time_minutes"]
+    for name in ("demand", "wait_time"):
+        info = result["versions"][name]
+        assert info["promoted"]
+        assert registry.get_active_version(name) == info["version"]
+        metrics = registry.get_meta(name, info["version"])["metrics"]
+        assert {"mae", "r2", "baseline_mae", "holdout_rows"} <= set(metrics)
+    wait = result["versions"]["wait_time"]["metrics"]
+    assert wait["mae"] < wait["baseline_mae"]
+
+
+def test_worse_model_is_registered_but_not_promoted(registry, training_db):
+    _, first = _train(training_db)
+    active = registry.get_active_version("wait_time")
+    with patch.object(ml_training_service.MLTrainingService, "_should_promote", return_value=False):
+        _, second = _train(training_db)
+    assert not second["versions"]["wait_time"]["promoted"]
+    assert registry.get_active_version("wait_time") == active
+    assert len(registry.list_versions("wait_time")) == 2
+
+
+def test_hot_swap_keeps_serving_until_new_version_is_loaded(registry):
+    v1 = registry.register("wait_time", ConstantModel(10), {}, {}, {})
+    registry.promote("wait_time", v1)
+    service = MLPredictiveService()
+    old_model = service.models["wait_time"]
+
+    v2 = registry.register("wait_time", ConstantModel(20), {}, {}, {})
+    registry.promote("wait_time", v2)
+    assert service.models["wait_time"] is old_model  # nothing reloaded behind the caller's back
+    assert service.refresh_models(wait=True)
+    assert service.model_versions["wait_time"] == ("registry", v2)
+    assert service.models["wait_time"].value == 20
+    assert not service.refresh_models(wait=True)  # unchanged version: no reload
+
+
+def test_training_job_progress(registry, training_db, monkeypatch):
+    monkeypatch.setattr(ml_training_jobs, "_ml_training_jobs_repo", None)
+    with patch.object(ml_training_jobs, "get_database", return_value=training_db), \
+         patch.object(ml_training_service, "get_database", return_value=training_db):
+        jobs = ml_training_jobs.get_ml_training_jobs_repository()
+        job_id = jobs.create_job("tester", {"n_jobs": 1})
+        assert jobs.get_active_job()["_id"] == jobs.get_job(job_id)["_id"]
+
+        ml_training_service.run_training_job(job_id, n_jobs=1)
+
+        job = jobs.get_job(job_id)
+        assert job["status"] == "success"
+        assert job["progress"] == 1.0
+        assert [e["progress"] for e in job["log"]] == sorted(e["progress"] for e in job["log"])
+        assert jobs.get_active_job() is None
+
+
+def test_long_fit_keeps_job_heartbeat_alive(registry, training_db, monkeypatch):
+    monkeypatch.setattr(ml_training_jobs, "_ml_training_jobs_repo", None)
+    monkeypatch.setattr(ml_training_jobs, "HEARTBEAT_INTERVAL", timedelta(milliseconds=20))
+    seen = []
+
+    def slow_train_all(self, progress=None, job_id=None, **kwargs):
+        # A single long fit with no progress updates: only the heartbeat thread writes
+        job = jobs.get_job(job_id)
+        jobs.collection.update_one({"_id": job["_id"]}, {"$set": {"heartbeat_at": datetime.now() - timedelta(hours=1)}})
+        time.sleep(0.2)
+        seen.append(jobs.get_active_job())
+        return {"status": "success"}
+
+    with patch.object(ml_training_jobs, "get_database", return_value=training_db), \
+         patch.object(ml_training_service.MLTrainingService, "train_all", slow_train_all):
+        jobs = ml_training_jobs.get_ml_training_jobs_repository()
+        job_id = jobs.create_job("tester", {"n_jobs": 1})
+        ml_training_service.run_training_job(job_id, n_jobs=1)
+
+    assert seen[0] is not None and str(seen[0]["_id"]) == job_id
+    assert jobs.get_job(job_id)["status"] == "success"
+
+
+def test_training_job_runs_from_project_root(registry, training_db, monkeypatch):
+    # The subprocess must see .streamlit/secrets.toml, which lives in the project root
+    monkeypatch.setattr(ml_training_jobs, "_ml_training_jobs_repo", None)
+    monkeypatch.setenv("PYTHONPATH", "/opt/extra")
+    monkeypatch.setattr(ml_training_service, "REGISTRY_DIR", registry.root)
+    with patch.object(ml_training_jobs, "get_database", return_value=training_db), \
+         patch.object(ml_training_service.subprocess, "Popen") as popen:
+        popen.return_value.pid = 4321
+        job_id = ml_training_service.start_training_job("tester", n_jobs=1)
+
+    kwargs = popen.call_args.kwargs
+    assert kwargs["cwd"] == ml_training_service.PROJECT_ROOT
+    assert os.path.isdir(os.path.join(kwargs["cwd"], "src", "services"))
+    assert kwargs["env"]["PYTHONPATH"].split(os.pathsep) == [ml_training_service.SRC_DIR, "/opt/extra"]
+    assert ml_training_jobs.get_ml_training_jobs_repository().get_job(job_id)["pid"] == 4321
@@ -94,3 +94,74 @@ def test_send_webhook_success(mock_get_config, mock_post):
     success = _send_webhook(notification)
     assert success == True
     mock_post.assert_called_once()
+
+
+class FakePushError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = MagicMock(status_code=status_code)
+
+
+@pytest.fixture
+def push_setup(mock_db):
+    import db.repositories.people as people_module
+    import services.push_delivery as push_module
+    from services.push_delivery import PushDeliveryEngine
+
+    sent = []
+
+    def fake_send(subscription_info, **kwargs):
+        sent.append(subscription_info["endpoint"])
+        if subscription_info["endpoint"].endswith("/gone"):
+            raise FakePushError(410)
+        return MagicMock(status_code=201)
+
+    people_module._people_repo = None
+    push_module._engine = PushDeliveryEngine(send_fn=fake_send, max_workers=4)
+    with patch('db.repositories.people.get_database', return_value=mock_db), \
+         patch('db.repositories.notification_config.get_vapid_config',
+               return_value={"private_key": "k", "subject": "mailto:a@b.c"}):
+        yield mock_db, sent
+    push_module._engine.close()
+    push_module._engine = None
+    people_module._people_repo = None
+
+
+def test_push_fan_out_prunes_expired_and_writes_status_once(push_setup, mock_db_notifications):
+    mock_db, sent = push_setup
+    ids = []
+    for i in range(5):
+        subs = [{"endpoint": f"https://push.test/{i}/ok"}]
+        if i % 2 == 0:
+            subs.append({"endpoint": f"https://push.test/{i}/gone"})
+        ids.append(str(mock_db.people.insert_one({"push_subscriptions": subs}).inserted_id))
+
+    with patch.object(mock_db.people, 'find', wraps=mock_db.people.find) as people_find:
+        notif_id = create_notification(
+            title="Broadcast", message="Shift", channels=[NotificationChannel.PUSH],
+            recipients=ids + ["admin"]
+        )
+        assert people_find.call_count == 1
+
+    assert len(sent) == 8
+    doc = mock_db_notifications.find_one({"_id": ObjectId(notif_id)})
+    assert doc["sent_status"]["push"] == True
+    assert doc["delivery"]["push"] == {"sent": 5, "failed": 3, "expired": 3}
+    # Expired subscriptions removed, valid ones kept
+    for person in mock_db.people.find():
+        assert [s["endpoint"].rsplit("/", 1)[1] for s in person["push_subscriptions"]] == ["ok"]
+
+
+@patch('services.notification_service._send_webhook', return_value=False)
+@patch('services.notification_service._send_email', return_value=True)
+def test_channel_results_written_in_single_update(mock_email, mock_webhook, mock_db_notifications):
+    with patch.object(mock_db_notifications, 'update_one', wraps=mock_db_notifications.update_one) as update:
+        notif_id = create_notification(
+            title="Multi", message="Body",
+            channels=[NotificationChannel.IN_APP, NotificationChannel.EMAIL, NotificationChannel.WEBHOOK]
+        )
+        assert update.call_count == 1
+
+    doc = mock_db_notifications.find_one({"_id": ObjectId(notif_id)})
+    assert doc["sent_status"]["email"] == True
+    assert doc["sent_status"]["webhook"] == False
@@ -0,0 +1,147 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import db.repositories.room_occupancy as occupancy_repo
+import services.occupancy_service as occupancy
+from db.repositories.people import PeopleRepository
+from services.patient_service import actualizar_paciente_con_auditoria
+from services.occupancy_service import (
+    registrar_entrada,
+    registrar_salida,
+    obtener_ocupacion,
+    obtener_version_ocupacion,
+    reconstruir_ocupacion,
+)
+
+
+@pytest.fixture(autouse=True)
+def occupancy_db(mock_db):
+    occupancy_repo._room_occupancy_repo = None
+    occupancy._VISTA_CACHE.update({"version": None, "vista": {}})
+    with patch('db.repositories.room_occupancy.get_database', return_value=mock_db), \
+         patch('services.occupancy_service.get_database', return_value=mock_db), \
+         patch('services.occupancy_service._nombre_sala', side_effect=lambda code: f"Sala {code}"):
+        yield mock_db
+    occupancy_repo._room_occupancy_repo = None
+
+
+def _flujo(patient_code, sala_code, minutes_ago=0):
+    return {
+        "flow_id": f"FLOW_{patient_code}",
+        "patient_code": patient_code,
+        "sala_code": sala_code,
+        "sala_tipo": "box",
+        "sala_subtipo": "espera",
+        "estado": "DERIVADO",
+        "activo": True,
+        "entrada": datetime.now() - timedelta(minutes=minutes_ago),
+    }
+
+
+def test_entrada_reads_person_once(occupancy_db):
+    occupancy_db.people.insert_one({"patient_code": "P1", "nombre": "Ana", "apellido1": "Ruiz"})
+
+    assert registrar_entrada(_flujo("P1", "ESP1")) == True
+
+    vista = obtener_ocupacion()
+    assert list(vista.keys()) == ["ESP1"]
+    item = vista["ESP1"][0]
+    assert item["nombre_completo"] == "Ana Ruiz"
+    assert item["sala_nombre"] == "Sala ESP1"
+
+
+def test_move_reads_fresh_person_fields(occupancy_db):
+    occupancy_db.people.insert_one({"patient_code": "P1", "nombre": "Ana", "apellido1": "Ruiz"})
+    registrar_entrada(_flujo("P1", "ESP1"))
+
+    occupancy_db.people.update_one({"patient_code": "P1"}, {"$set": {"apellido1": "Ruiz Gil"}})
+    registrar_entrada(_flujo("P1", "BOX1"))
+
+    assert obtener_ocupacion()["BOX1"][0]["nombre_completo"] == "Ana Ruiz Gil"
+
+
+def test_person_edits_refresh_projection(occupancy_db):
+    with patch('db.repositories.people.get_database', return_value=occupancy_db):
+        people = PeopleRepository()
+    person_id = people.create_person({"patient_code": "P1", "nombre": "Ana", "apellido1": "Ruiz", "activo": True})
+    registrar_entrada(_flujo("P1", "ESP1"))
+    version = obtener_version_ocupacion()
+
+    people.update_person(person_id, {"nombre": "Ana María"})
+
+    assert obtener_version_ocupacion() > version
+    item = obtener_ocupacion()["ESP1"][0]
+    assert item["nombre"] == "Ana María"
+    assert item["nombre_completo"] == "Ana María Ruiz"
+
+
+def test_audited_patient_update_refreshes_projection(occupancy_db):
+    occupancy_db.people.insert_one({
+        "patient_code": "ARG01", "nombre": "Ana", "apellido1": "Ruiz", "activo": True, "num_ss": "111",
+        "identificaciones": [{"type": "DNI", "value": "12345678Z", "inactive_at": None}],
+    })
+    registrar_entrada(_flujo("ARG01", "ESP1"))
+
+    with patch('services.patient_service.get_database', return_value=occupancy_db):
+        actualizar_paciente_con_auditoria(
+            "ARG01", "Ana", "Ruiz", "Gil", datetime(1990, 1, 1), "111", "12345678Z", "DNI"
+        )
+
+    assert obtener_ocupacion()["ESP1"][0]["nombre_completo"] == "Ana Ruiz Gil"
+
+
+def test_move_reuses_projected_person(occupancy_db):
+    occupancy_db.people.insert_one({"patient_code": "P1", "nombre": "Ana", "apellido1": "Ruiz"})
+    registrar_entrada(_flujo("P1", "ESP1"))
+
+    # The move must not need 'people' anymore
+    occupancy_db.people.delete_many({})
+    registrar_entrada(_flujo("P1", "BOX1"))
+
+    vista = obtener_ocupacion()
+    assert "ESP1" not in vista
+    assert vista["BOX1"][0]["nombre_completo"] == "Ana Ruiz"
+
+
+def test_salida_bumps_version(occupancy_db):
+    registrar_entrada(_flujo("P1", "ESP1"), persona={"nombre": "Ana"})
+    version = obtener_version_ocupacion()
+
+    registrar_salida("P1")
+
+    assert obtener_version_ocupacion() > version
+    assert obtener_ocupacion() == {}
+
+
+def test_unchanged_version_skips_snapshot(occupancy_db):
+    registrar_entrada(_flujo("P1", "ESP1"), persona={"nombre": "Ana"})
+    obtener_ocupacion()
+
+    repo = occupancy_repo.get_room_occupancy_repository()
+    with patch.object(repo, 'get_snapshot', wraps=repo.get_snapshot) as spy:
+        vista = obtener_ocupacion()
+        # Callers may mutate the returned items without touching the memo
+        vista["ESP1"][0]["estimated_wait_minutes"] = 10
+        again = obtener_ocupacion()
+
+    spy.assert_not_called()
+    assert "estimated_wait_minutes" not in again["ESP1"][0]
+
+
+def test_reconstruir_from_patient_flow(occupancy_db):
+    occupancy_db.people.insert_many([
+        {"patient_code": "P1", "nombre": "Ana"},
+        {"patient_code": "P2", "nombre": "Luis"},
+    ])
+    occupancy_db.patient_flow.insert_many([
+        _flujo("P2", "ESP1", minutes_ago=5),
+        _flujo("P1", "ESP1", minutes_ago=30),
+        {**_flujo("P3", "ESP1"), "activo": False},
+    ])
+
+    reconstruir_ocupacion()
+
+    vista = obtener_ocupacion()
+    # Ordered by arrival, inactive steps excluded
+    assert [p["patient_code"] for p in vista["ESP1"]] == ["P1", "P2"]
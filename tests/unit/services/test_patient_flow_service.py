@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import db.repositories.room_occupancy as occupancy_repo
+import services.occupancy_service as occupancy
+from services.patient_flow_service import mover_paciente, finalizar_flujo, clear_all_data
+
+
+SALAS = {
+    "ESP1": {"tipo": "box", "subtipo": "espera", "nombre": "Espera Box"},
+    "BOX1": {"tipo": "box", "subtipo": "atencion", "nombre": "Box 1"},
+}
+
+
+@pytest.fixture(autouse=True)
+def flow_db(mock_db):
+    occupancy_repo._room_occupancy_repo = None
+    occupancy._VISTA_CACHE.update({"version": None, "vista": {}})
+    with patch('services.patient_flow_service.get_database', return_value=mock_db), \
+         patch('db.repositories.salas.get_database', return_value=mock_db), \
+         patch('db.repositories.room_occupancy.get_database', return_value=mock_db), \
+         patch('services.occupancy_service.get_database', return_value=mock_db), \
+         patch('services.occupancy_service._nombre_sala', side_effect=lambda code: code), \
+         patch('services.patient_flow_service._get_sala_info', side_effect=lambda code: SALAS[code]):
+        mock_db.salas.insert_many([
+            {"codigo": "ESP1", "plazas_disponibles": 9},
+            {"codigo": "BOX1", "plazas_disponibles": 1},
+        ])
+        mock_db.patient_flow.insert_one({
+            "flow_id": "FLOW_P1", "patient_code": "P1", "secuencia": 1,
+            "sala_code": "ESP1", "sala_tipo": "box", "sala_subtipo": "espera",
+            "estado": "DERIVADO", "activo": True,
+            "entrada": datetime.now() - timedelta(minutes=20),
+        })
+        yield mock_db
+    occupancy_repo._room_occupancy_repo = None
+
+
+def _plazas(db, codigo):
+    return db.salas.find_one({"codigo": codigo})["plazas_disponibles"]
+
+
+def test_mover_paciente_closes_and_opens_step(flow_db):
+    assert mover_paciente("P1", "BOX1", "EN_ATENCION") == True
+
+    pasos = list(flow_db.patient_flow.find({"patient_code": "P1"}).sort("secuencia", 1))
+    assert [p["activo"] for p in pasos] == [False, True]
+    assert pasos[0]["duracion_minutos"] >= 19
+    assert pasos[1]["secuencia"] == 2
+    assert pasos[1]["sala_code"] == "BOX1"
+    assert _plazas(flow_db, "ESP1") == 10
+    assert _plazas(flow_db, "BOX1") == 0
+
+
+def test_mover_paciente_rejects_stale_secuencia(flow_db):
+    assert mover_paciente("P1", "BOX1", "EN_ATENCION", secuencia_esperada=1) == True
+    # A second nurse still looking at step 1
+    assert mover_paciente("P1", "BOX1", "EN_ATENCION", secuencia_esperada=1) == False
+
+    assert flow_db.patient_flow.count_documents({"patient_code": "P1"}) == 2
+    assert _plazas(flow_db, "BOX1") == 0
+
+
+def test_mover_paciente_concurrent_move_keeps_capacity(flow_db):
+    def other_nurse_moves_first(code):
+        # Another writer closes the step between our read and our write
+        flow_db.patient_flow.update_one({"secuencia": 1}, {"$set": {"activo": False}})
+        return SALAS[code]
+
+    with patch('services.patient_flow_service._get_sala_info', side_effect=other_nurse_moves_first):
+        assert mover_paciente("P1", "BOX1", "EN_ATENCION") == False
+
+    assert flow_db.patient_flow.count_documents({"patient_code": "P1"}) == 1
+    assert _plazas(flow_db, "ESP1") == 9
+    assert _plazas(flow_db, "BOX1") == 1
+
+
+def test_finalizar_flujo_only_once(flow_db):
+    assert finalizar_flujo("P1", "ALTA") == True
+    assert finalizar_flujo("P1", "ALTA") == False
+    assert _plazas(flow_db, "ESP1") == 10
+
+
+def test_clear_all_data_empties_occupancy(flow_db):
+    occupancy.reconstruir_ocupacion()
+    assert "ESP1" in occupancy.obtener_ocupacion()
+
+    clear_all_data()
+
+    assert flow_db.patient_flow.count_documents({}) == 0
+    assert occupancy.obtener_ocupacion() == {}
@@ -1,6 +1,16 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from services.permissions_service import has_permission, get_available_tabs
+import db.repositories.roles as roles_module
+from db.repositories.roles import DEFAULT_ROLES
+from services.permissions_service import (
+    has_permission, get_available_tabs, compile_role, clear_permissions_cache
+)
+
+@pytest.fixture(autouse=True)
+def clean_permissions_cache():
+    clear_permissions_cache()
+    yield
+    clear_permissions_cache()
 
 @pytest.fixture
 def mock_role_repo():
@@ -59,3 +69,43 @@ def test_get_available_tabs(mock_session_state, mock_role_repo):
     assert "📋 Admisión" in tabs
     assert "🩺 Triaje" not in tabs
     assert "⚙️ Configuración" in tabs
+
+
+def _legacy_has_permission(role_def, module, action):
+    # Reference: the per-call evaluation done before roles were compiled
+    if role_def["code"] == "superadministrador":
+        return True
+    module_perms = role_def.get("permissions", {}).get(module, {})
+    if not module_perms:
+        return False
+    if isinstance(module_perms, bool):
+        return module_perms
+    if action == "general":
+        return any(module_perms.values())
+    return bool(module_perms.get(action, False))
+
+def test_compiled_roles_match_legacy_evaluation():
+    custom = {"code": "custom", "permissions": {"admision": True, "triaje": False, "auditoria": {}}}
+    actions = ["view", "create", "edit", "delete", "manage", "export", "general", "centro", "prompts"]
+    for role_def in DEFAULT_ROLES + [custom]:
+        compiled = compile_role(role_def)
+        modules = list(role_def["permissions"]) + ["unknown"]
+        for module in modules:
+            for action in actions:
+                assert compiled.allows(module, action) == _legacy_has_permission(role_def, module, action), \
+                    (role_def["code"], module, action)
+
+def test_role_is_fetched_once_and_invalidated_on_role_writes(mock_session_state, mock_role_repo):
+    mock_session_state["current_user"] = {"rol": "usuario"}
+    mock_role_repo.return_value = {"code": "usuario", "permissions": {"triaje": {"view": True}}}
+
+    for _ in range(100):
+        assert has_permission("triaje", "view") == True
+        get_available_tabs()
+    assert mock_role_repo.call_count == 1
+
+    # A role update bumps the version -> recompiled on the next check
+    mock_role_repo.return_value = {"code": "usuario", "permissions": {"triaje": {"view": False}}}
+    roles_module._bump_roles_version()
+    assert has_permission("triaje", "view") == False
+    assert mock_role_repo.call_count == 2
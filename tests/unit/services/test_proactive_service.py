@@ -0,0 +1,104 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from services.proactive_service import ProactiveService, _LRU, normalize_query, text_delta
+
+
+class FakeRAG:
+    """Bag-of-letters embedding so that near-identical texts are near-identical vectors."""
+
+    def __init__(self):
+        self.embeds = 0
+        self.searches = 0
+        self.kb_version = 0
+        self.source = "dolor_toracico.pdf"
+
+    def embed_query(self, text):
+        self.embeds += 1
+        vec = np.zeros(26)
+        for c in text:
+            if "a" <= c <= "z":
+                vec[ord(c) - 97] += 1
+        return vec.tolist()
+
+    def search_documents_by_embedding(self, embedding, n_results=1):
+        self.searches += 1
+        return [{"content": "...", "metadata": {"source": self.source}}]
+
+
+@pytest.fixture
+def rag():
+    fake = FakeRAG()
+    ProactiveService.clear_cache()
+    with patch('services.proactive_service.get_rag_service', return_value=fake):
+        yield fake
+    ProactiveService.clear_cache()
+
+
+def test_normalization_and_delta():
+    assert normalize_query("  Dolor TORÁCICO,  opresivo! ") == "dolor toracico opresivo"
+    assert text_delta("dolor toracico", "dolor toracico opresivo") == 9
+    assert text_delta("dolor toracico", "dolor abdominal") == 9
+
+
+def test_small_edits_are_debounced(rag):
+    state = {}
+    first = ProactiveService.check_context_and_suggest("Paciente con dolor torácico", state)
+    again = ProactiveService.check_context_and_suggest("Paciente con dolor torácico.", state)
+    typed = ProactiveService.check_context_and_suggest("Paciente con dolor torácico de", state)
+
+    assert first == again == typed == ["📚 Protocolo Relacionado: dolor_toracico.pdf"]
+    assert rag.embeds == 1
+    assert rag.searches == 1
+
+
+def test_result_cache_is_keyed_by_normalized_text(rag):
+    ProactiveService.check_context_and_suggest("Cefalea intensa súbita", {})
+    ProactiveService.check_context_and_suggest("cefalea   INTENSA subita", {})
+
+    assert rag.embeds == 1
+    assert rag.searches == 1
+
+
+def test_similar_embedding_reuses_previous_result(rag):
+    state = {}
+    ProactiveService.check_context_and_suggest("dolor toracico opresivo irradiado", state)
+    # Big enough edit to pass the debounce, but same letters -> cosine ~ 1
+    ProactiveService.check_context_and_suggest("opresivo irradiado dolor toracico", state)
+
+    assert rag.embeds == 2
+    assert rag.searches == 1
+    assert ProactiveService.stats["similar_hits"] == 1
+
+
+def test_short_text_is_ignored(rag):
+    assert ProactiveService.check_context_and_suggest("dolor", {}) == []
+    assert rag.embeds == 0
+
+
+def test_result_changes_after_knowledge_base_ingest(rag):
+    state = {}
+    before = ProactiveService.check_context_and_suggest("Paciente con dolor torácico", state)
+
+    # What RAGService.ingest_document does after indexing a new protocol
+    rag.source = "sindrome_coronario.pdf"
+    rag.kb_version += 1
+    after = ProactiveService.check_context_and_suggest("Paciente con dolor torácico", state)
+    cached = ProactiveService.check_context_and_suggest("Paciente con dolor torácico", {})
+
+    assert before == ["📚 Protocolo Relacionado: dolor_toracico.pdf"]
+    assert after == cached == ["📚 Protocolo Relacionado: sindrome_coronario.pdf"]
+    assert rag.searches == 2
+
+
+def test_lru_entries_expire():
+    cache = _LRU(maxsize=4, ttl_s=60)
+    with patch('services.proactive_service.time.monotonic', return_value=1000.0):
+        cache.put("k", ["v"])
+    with patch('services.proactive_service.time.monotonic', return_value=1059.0):
+        assert cache.get("k") == ["v"]
+    with patch('services.proactive_service.time.monotonic', return_value=1061.0):
+        assert cache.get("k") is None
+    assert len(cache) == 0
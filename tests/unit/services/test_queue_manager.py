@@ -52,3 +52,78 @@ def test_get_wait_time_alert():
     assert get_wait_time_alert(p_normal) == "normal"
     assert get_wait_time_alert(p_warn) == "warning"
     assert get_wait_time_alert(p_crit) == "critical"
+
+
+# ---------------------------------------------------------------------------
+# PriorityQueueIndex
+# ---------------------------------------------------------------------------
+import random
+from services.queue_manager import PriorityQueueIndex, build_prioritized_queue, get_room_queue
+
+LEVELS = ["Nivel I (Rojo)", "Nivel II", "Nivel III (Amarillo)", "Verde", "Nivel V", ""]
+
+
+def _random_patients(n, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now()
+    return [
+        {
+            "patient_code": f"P{i}",
+            "nivel_triaje": rng.choice(LEVELS),
+            "wait_start": now - timedelta(minutes=rng.randint(0, 600), seconds=rng.randint(0, 59)),
+        }
+        for i in range(n)
+    ]
+
+
+def test_index_matches_sort_queue():
+    patients = _random_patients(300)
+    index = PriorityQueueIndex()
+    for p in patients:
+        index.push(p)
+
+    assert [p["patient_code"] for p in index.ordered()] == [p["patient_code"] for p in sort_queue(patients)]
+    assert index.peek()["patient_code"] == sort_queue(patients)[0]["patient_code"]
+
+
+def test_index_sync_is_incremental():
+    patients = _random_patients(50)
+    index = PriorityQueueIndex()
+    index.sync(patients)
+
+    leaving = patients[:10]
+    staying = patients[10:]
+    upgraded = dict(staying[0], nivel_triaje="Nivel I")
+    current = [upgraded] + staying[1:]
+
+    index.sync(current)
+
+    assert len(index) == 40
+    assert all(p["patient_code"] not in index for p in leaving)
+    assert [p["patient_code"] for p in index.ordered()] == [p["patient_code"] for p in sort_queue(current)]
+
+
+def test_index_alerts_match_get_wait_time_alert():
+    patients = _random_patients(200)
+    index = PriorityQueueIndex()
+    index.sync(patients)
+    now = datetime.now()
+
+    expected = {"normal": 0, "warning": 0, "critical": 0}
+    for p in patients:
+        level = get_wait_time_alert(p)
+        expected[level] += 1
+        assert index.alert_for(p["patient_code"], now) == level
+
+    assert index.alert_counts(now) == expected
+
+
+def test_build_prioritized_queue_merges_rooms():
+    patients = _random_patients(60)
+    vista = {"ESP_A": patients[:30], "ESP_B": patients[30:]}
+
+    merged = build_prioritized_queue(vista, ["ESP_A", "ESP_B"])
+
+    assert [p["patient_code"] for p in merged] == [p["patient_code"] for p in sort_queue(patients)]
+    assert all("alert_level" in p for p in merged)
+    assert len(get_room_queue("ESP_A")) == 30
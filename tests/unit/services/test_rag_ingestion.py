@@ -0,0 +1,120 @@
+import os
+import uuid
+
+import chromadb
+import pytest
+
+from services.rag_ingestion import RAGIngestionPipeline
+from services.rag_service import RAGService
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+
+def _paragraphs(n, tag=""):
+    return "\n\n".join(f"Protocolo {i}{tag}: " + ("texto clínico " * 40) for i in range(n))
+
+
+@pytest.fixture
+def pipeline_factory(tmp_path):
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(f"kb_{uuid.uuid4().hex}", embedding_function=None)
+    manifest = str(tmp_path / "manifest.json")
+
+    def make(embedder=None):
+        return RAGIngestionPipeline(
+            collection,
+            manifest_path=manifest,
+            embedding_function=embedder or CountingEmbedder(),
+            embed_batch_size=8,
+            max_workers=0,
+        )
+
+    return make, collection, tmp_path
+
+
+def _write(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def test_first_ingestion_embeds_in_batches(pipeline_factory):
+    make, collection, tmp = pipeline_factory
+    embedder = CountingEmbedder()
+    _write(tmp, "a.md", _paragraphs(20))
+
+    result = make(embedder).ingest_directory(str(tmp))
+
+    assert result["processed"] == 1
+    assert result["chunks_added"] == collection.count() > 8
+    assert max(embedder.batches) <= 8
+
+
+def test_reingest_unchanged_library_is_skipped(pipeline_factory):
+    make, collection, tmp = pipeline_factory
+    _write(tmp, "a.md", _paragraphs(10))
+    _write(tmp, "b.txt", _paragraphs(10, "b"))
+    make().ingest_directory(str(tmp))
+
+    embedder = CountingEmbedder()
+    result = make(embedder).ingest_directory(str(tmp))
+
+    assert result["skipped"] == 2
+    assert embedder.batches == []
+
+
+def test_small_edit_only_touches_changed_chunks(pipeline_factory):
+    make, collection, tmp = pipeline_factory
+    path = _write(tmp, "a.md", _paragraphs(20))
+    make().ingest_directory(str(tmp))
+    before = collection.count()
+
+    _write(tmp, "a.md", _paragraphs(20).replace("Protocolo 19:", "Protocolo 19 (revisado):"))
+    embedder = CountingEmbedder()
+    result = make(embedder).ingest_directory(str(tmp))
+
+    assert result["processed"] == 1
+    assert 1 <= result["chunks_added"] <= 2
+    assert result["chunks_added"] == result["chunks_deleted"]
+    assert result["chunks_unchanged"] >= before - 2
+    assert sum(embedder.batches) == result["chunks_added"]
+    assert collection.count() == before
+
+
+def test_interrupted_run_resumes(pipeline_factory):
+    make, collection, tmp = pipeline_factory
+    for name in ("a.md", "b.md", "c.md"):
+        _write(tmp, name, _paragraphs(5, name))
+
+    class Boom(Exception):
+        pass
+
+    def stop_after_first(done, total, filename, stats):
+        raise Boom()
+
+    with pytest.raises(Boom):
+        make().ingest_directory(str(tmp), on_progress=stop_after_first)
+
+    result = make().ingest_directory(str(tmp))
+
+    assert result["skipped"] == 1
+    assert result["processed"] == 2
+
+
+def test_empty_document_is_not_ingested(pipeline_factory, monkeypatch):
+    make, collection, tmp = pipeline_factory
+    service = object.__new__(RAGService)
+    service.ingestion = make()
+    monkeypatch.setattr(service, "save_document", lambda file_obj, filename: _write(tmp, filename, file_obj))
+
+    assert service.ingest_document("  \n\n ", "vacio.md") is False
+    assert service.ingest_document(_paragraphs(3), "protocolo.md") is True
+    assert {m["source"] for m in collection.get()["metadatas"]} == {"protocolo.md"}
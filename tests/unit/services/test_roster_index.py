@@ -0,0 +1,123 @@
+import random
+import pytest
+from datetime import datetime, date, time, timedelta
+from unittest.mock import patch
+
+import db.repositories.users as users_module
+import db.repositories.turnos as turnos_module
+import services.roster_index as roster
+from db.models import Turno
+from services.roster_index import IntervalIndex, RosterIndex, get_roster_index
+from services.staff_assignment_service import get_room_staff, get_assignment_conflicts_report
+
+DAY = date(2026, 10, 17)
+ROOMS = ["BOX1", "BOX2", "TRI1"]
+
+
+@pytest.fixture(autouse=True)
+def roster_db(mock_db):
+    users_module._users_repo = None
+    turnos_module._turnos_repo = None
+    roster.invalidate_roster_index()
+    with patch('db.repositories.users.get_database', return_value=mock_db), \
+         patch('db.repositories.turnos.get_database', return_value=mock_db):
+        yield mock_db
+    users_module._users_repo = None
+    turnos_module._turnos_repo = None
+    roster.invalidate_roster_index()
+
+
+def _shift(user_id, sala, start, end, day=DAY):
+    return Turno(
+        user_id=user_id, sala_code=sala,
+        fecha_desde=datetime.combine(day, time.min), fecha_hasta=datetime.combine(day, time.min),
+        horario_inicio=start, horario_fin=end,
+    )
+
+
+def _brute_force_room_staff(users, shifts, sala, ref):
+    # Reference: the per-user resolution applied before the index existed
+    def active(shift):
+        start = datetime.combine(ref.date(), datetime.strptime(shift.horario_inicio, "%H:%M").time())
+        end = datetime.combine(ref.date(), datetime.strptime(shift.horario_fin, "%H:%M").time())
+        return start <= ref <= end
+
+    staff = []
+    for user in users:
+        if user.get("activo") is not True:
+            continue
+        uid = str(user["_id"])
+        own = [s for s in shifts if s.user_id == uid]
+        current = next((s for s in own if active(s)), None)
+        assignment = current.sala_code if current else user.get("sala_asignada")
+        if assignment == sala:
+            kind = "turno" if any(s.sala_code == sala and active(s) for s in own) else "fija"
+            staff.append((uid, kind))
+    return staff
+
+
+def test_interval_index_stab():
+    index = IntervalIndex([(1, 5, "a"), (2, 3, "b"), (4, 10, "c"), (11, 12, "d")])
+    assert sorted(index.stab(3)) == ["a", "b"]
+    assert sorted(index.stab(5)) == ["a", "c"]
+    assert index.stab(10.5) == []
+    assert index.stab(0) == []
+
+
+def test_room_staff_matches_per_user_resolution():
+    rng = random.Random(3)
+    users = [
+        {"_id": f"u{i}", "nombre_completo": f"User {i}", "activo": rng.random() > 0.1,
+         "sala_asignada": rng.choice(ROOMS + [None])}
+        for i in range(60)
+    ]
+    shifts = []
+    for _ in range(120):
+        start = rng.randint(0, 22)
+        end = rng.randint(start + 1, 23)
+        shifts.append(_shift(f"u{rng.randint(0, 59)}", rng.choice(ROOMS), f"{start:02d}:00", f"{end:02d}:30"))
+
+    index = RosterIndex(DAY, users, shifts)
+    for hour in range(0, 24, 3):
+        ref = datetime.combine(DAY, time(hour, 15))
+        for sala in ROOMS:
+            got = [(u["_id"], u["assignment_type"]) for u in index.room_staff(sala, ref)]
+            assert got == _brute_force_room_staff(users, shifts, sala, ref)
+
+
+def test_user_room_prefers_active_shift():
+    users = [{"_id": "u1", "activo": True, "sala_asignada": "BOX1"}]
+    index = RosterIndex(DAY, users, [_shift("u1", "TRI1", "08:00", "15:00")])
+    assert index.user_room("u1", datetime.combine(DAY, time(9))) == "TRI1"
+    assert index.user_room("u1", datetime.combine(DAY, time(16))) == "BOX1"
+    # Shifts only apply to the indexed day
+    assert index.user_room("u1", datetime.combine(DAY + timedelta(days=1), time(9))) == "BOX1"
+
+
+def test_get_room_staff_uses_cached_index_and_invalidates_on_writes(roster_db):
+    uid = users_module.get_users_repository().create_user(
+        {"nombre_completo": "Ana", "sala_asignada": "BOX1"}
+    )
+    ref = datetime.combine(date.today(), time(10))
+
+    assert [u["assignment_type"] for u in get_room_staff("BOX1", ref)] == ["fija"]
+    builds = roster.stats["builds"]
+    for _ in range(20):
+        get_room_staff("BOX1", ref)
+    assert roster.stats["builds"] == builds
+
+    # New shift -> index rebuilt and the user moves to the shift room
+    turnos_module.get_turnos_repository().create(_shift(uid, "BOX2", "09:00", "11:00", day=date.today()))
+    assert get_room_staff("BOX1", ref) == []
+    assert [u["assignment_type"] for u in get_room_staff("BOX2", ref)] == ["turno"]
+    assert roster.stats["builds"] == builds + 1
+
+    conflicts = get_assignment_conflicts_report()
+    assert [(c["fixed_sala"], c["shift_sala"]) for c in conflicts] == [("BOX1", "BOX2")]
+
+
+def test_get_roster_index_rebuilds_after_ttl(roster_db, monkeypatch):
+    first = get_roster_index(DAY)
+    assert get_roster_index(DAY) is first
+    monkeypatch.setattr(roster, "ROSTER_TTL_S", 0)
+    assert get_roster_index(DAY) is not first
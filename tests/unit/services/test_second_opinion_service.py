@@ -0,0 +1,92 @@
+import pytest
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from services.second_opinion_service import SecondOpinionService
+
+
+class CountingDB:
+    """Wraps a mongomock database and counts find/find_one calls per collection."""
+
+    def __init__(self, db):
+        self._db = db
+        self.calls = Counter()
+
+    def __getitem__(self, name):
+        db, calls = self._db, self.calls
+
+        class _Collection:
+            def __getattr__(self, attr):
+                target = getattr(db[name], attr)
+                if attr in ("find", "find_one", "aggregate"):
+                    calls[name] += 1
+                return target
+
+        return _Collection()
+
+
+@pytest.fixture
+def service(mock_db):
+    people_repo = MagicMock()
+    people_repo.get_by_patient_code.side_effect = lambda code: mock_db.people.find_one({"patient_code": code})
+    counting = CountingDB(mock_db)
+    with patch('services.second_opinion_service.get_database', return_value=counting), \
+         patch('services.second_opinion_service.get_gemini_service'), \
+         patch('services.second_opinion_service.get_prompts_repository'), \
+         patch('services.second_opinion_service.get_people_repository', return_value=people_repo):
+        svc = SecondOpinionService()
+    svc.counting = counting
+    return svc
+
+
+def _seed_history(db, patient_code="P1", n=30):
+    base = datetime(2026, 1, 1, 8, 0)
+    db.people.insert_one({"patient_code": patient_code, "edad": 70, "gender": "F", "clinical_history": "HTA"})
+    for i in range(n):
+        audit_id = f"A{i:03d}"
+        db.triage_records.insert_one({
+            "audit_id": audit_id, "patient_id": patient_code, "timestamp": base + timedelta(days=i),
+            "triage_result": {"resumen_clinico": f"motivo {i}", "nivel_triaje": 3},
+            "patient_snapshot": {"texto_medico": "dolor", "dolor": i % 10},
+            "vital_signs": {"saturacion": 95},
+        })
+        for j in range(i % 3):
+            db.file_imports_records.insert_one({"audit_id": audit_id, "file_name": f"f{i}_{j}.png", "file_type": "png"})
+    db.patient_flow.insert_one({"patient_code": patient_code, "activo": True, "sala_code": "BOX1",
+                                "estado": "EN_ATENCION", "entrada": base})
+
+
+def test_context_uses_fixed_number_of_queries(service, mock_db):
+    _seed_history(mock_db, n=30)
+    context = service._build_patient_context("P1")
+
+    assert len(context["triage_history"]) == 30
+    assert context["triage_history"][0]["audit_id"] == "A029"  # most recent first
+    assert context["triage_history"][0]["attached_files"] == ["f29_0.png (png)", "f29_1.png (png)"]
+    assert context["patient_profile"]["background"] == "HTA"
+    assert context["current_status"]["location"] == "BOX1"
+    # latest-timestamp probe + records, one $in for all attachments, one flow lookup
+    assert service.counting.calls == Counter({"triage_records": 2, "file_imports_records": 1, "patient_flow": 1})
+
+
+def test_context_cache_hits_until_a_new_triage_arrives(service, mock_db):
+    _seed_history(mock_db, n=5)
+    first = service._build_patient_context("P1", target_audit_ids=["A001", "A003"])
+    second = service._build_patient_context("P1", target_audit_ids=["A003", "A001"])
+    assert second == first
+    assert [t["audit_id"] for t in second["triage_history"]] == ["A003", "A001"]
+    assert service.context_stats == {"hits": 1, "misses": 1}
+
+    # A different selection is a different key
+    service._build_patient_context("P1", target_audit_ids=["A001"])
+    assert service.context_stats["misses"] == 2
+
+    # A newer triage for the patient changes the latest timestamp -> rebuilt
+    mock_db.triage_records.insert_one({"audit_id": "A100", "patient_id": "P1", "timestamp": datetime(2026, 6, 1)})
+    service._build_patient_context("P1", target_audit_ids=["A001", "A003"])
+    assert service.context_stats["misses"] == 3
+
+    # The flow status is always read fresh
+    mock_db.patient_flow.update_one({"patient_code": "P1"}, {"$set": {"sala_code": "BOX2"}})
+    assert service._build_patient_context("P1", target_audit_ids=["A001", "A003"])["current_status"]["location"] == "BOX2"
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import wave
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import db.repositories.transcription_segments as segments_module
+import db.repositories.transcriptions as transcriptions_module
+from core.transcription_handler import save_transcription
+from services.transcription_service import transcribir_audio_streaming
+from utils.audio_utils import find_cut_points, split_wav_on_silence
+
+RATE = 16000
+
+
+def _wav(pattern):
+    """pattern: list of (seconds, freq) where freq=None means silence."""
+    chunks = []
+    for seconds, freq in pattern:
+        t = np.arange(int(seconds * RATE)) / RATE
+        chunk = np.zeros_like(t) if freq is None else 0.5 * np.sin(2 * np.pi * freq * t)
+        chunks.append((chunk * 32767).astype(np.int16))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(np.concatenate(chunks).tobytes())
+    buf.seek(0)
+    buf.name = "dictado.wav"
+    return buf
+
+
+SPEECH_A = [(5, 220), (1, None), (5, 330), (1, None), (5, 440)]
+
+
+def test_split_on_silence_cuts_inside_pauses():
+    segments = split_wav_on_silence(_wav(SPEECH_A).getvalue())
+
+    assert len(segments) == 3
+    assert segments[0].start_s == 0
+    assert 5 < segments[0].end_s < 6
+    assert 11 < segments[1].end_s < 12
+    assert abs(segments[-1].end_s - 17) < 0.01
+
+
+def test_long_audio_without_pauses_is_force_cut():
+    segments = split_wav_on_silence(_wav([(100, 220)]).getvalue(), max_segment_s=45)
+
+    assert len(segments) == 3
+    assert all(s.end_s - s.start_s <= 45.01 for s in segments)
+
+
+def test_min_segment_shorter_than_window_still_advances():
+    # Silences of 30 windows between 10-window speech bursts
+    dbfs = np.tile(np.r_[np.zeros(10), np.full(30, -90.0)], 5)
+
+    cuts = find_cut_points(dbfs, window_s=0.03, min_silence_ms=300, min_segment_s=0.01, max_segment_s=0.6)
+
+    assert cuts == sorted(set(cuts))
+    assert all(b > a for a, b in zip([0] + cuts, cuts))
+
+
+def test_editing_the_end_keeps_earlier_segment_hashes():
+    original = split_wav_on_silence(_wav(SPEECH_A).getvalue())
+    edited = split_wav_on_silence(_wav(SPEECH_A[:4] + [(6, 550)]).getvalue())
+
+    assert [s.md5 for s in original[:2]] == [s.md5 for s in edited[:2]]
+    assert original[2].md5 != edited[2].md5
+
+
+class FakeGemini:
+    def __init__(self):
+        self.calls = []
+
+    def submit_content(self, **kwargs):
+        self.calls.append(kwargs["metadata"]["segment_index"])
+        future = Future()
+        future.set_result(({"transcription": f"tramo {kwargs['metadata']['segment_index']}"}, ""))
+        return future
+
+
+@pytest.fixture
+def streaming_env(mock_db):
+    transcriptions_module._transcriptions_repo = None
+    segments_module._transcription_segments_repo = None
+    fake = FakeGemini()
+    prompt = {"content": "Transcribe", "version_id": "v1", "model": "fake"}
+    with patch('db.repositories.base.get_database', return_value=mock_db), \
+         patch('db.repositories.transcription_segments.get_database', return_value=mock_db), \
+         patch('services.transcription_service.get_gemini_service', return_value=fake), \
+         patch('services.transcription_service.PromptManager') as pm, \
+         patch('services.contingency_service.is_contingency_active', return_value=False):
+        pm.return_value.get_prompt.return_value = prompt
+        yield fake
+    transcriptions_module._transcriptions_repo = None
+    segments_module._transcription_segments_repo = None
+
+
+def test_streaming_yields_in_order_and_reuses_segment_cache(streaming_env):
+    fake = streaming_env
+
+    first = list(transcribir_audio_streaming(_wav(SPEECH_A)))
+    assert [e["index"] for e in first] == [0, 1, 2]
+    assert first[-1]["partial_text"] == "tramo 0 tramo 1 tramo 2"
+    assert fake.calls == [0, 1, 2]
+
+    fake.calls.clear()
+    second = list(transcribir_audio_streaming(_wav(SPEECH_A[:4] + [(6, 550)])))
+
+    assert fake.calls == [2]
+    assert [e["cached"] for e in second] == [True, True, False]
+
+
+def test_same_audio_with_another_prompt_type_is_not_cached(streaming_env):
+    fake = streaming_env
+
+    list(transcribir_audio_streaming(_wav(SPEECH_A), prompt_type="transcription"))
+    fake.calls.clear()
+    events = list(transcribir_audio_streaming(_wav(SPEECH_A), prompt_type="clinical_dictation"))
+
+    assert fake.calls == [0, 1, 2]
+    assert not any(e["cached"] for e in events)
+
+
+def test_one_dictation_creates_one_audited_transcription(streaming_env, mock_db):
+    audio = _wav(SPEECH_A)
+    events = list(transcribir_audio_streaming(audio, prompt_type="clinical_dictation"))
+
+    # As native_voice_input does: only the whole recording is audited
+    text = events[-1]["partial_text"]
+    save_transcription(hashlib.md5(audio.getvalue()).hexdigest(), {"original_text": text, "translated_ia_text": text}, source="AI")
+
+    assert mock_db["transcriptions_records"].count_documents({}) == 1
+    assert mock_db["transcription_segments"].count_documents({}) == 3
@@ -0,0 +1,182 @@
+# path: tests/unit/services/test_wait_time_service.py
+import heapq
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import services.wait_time_service as wait_time_service
+from services.queue_simulator import simulate_queue
+from services.roster_index import RosterIndex
+from services.ml_predictive_service import MLPredictiveService
+
+
+def _reference(keys, servers, service, arrival_rate, mix, replications, horizon, seed):
+    """Plain per-replication event loop (heap of server free times) for comparison."""
+    rng = np.random.default_rng(seed)
+    bases = sorted(mix)
+    probs = np.array([mix[b] for b in bases])
+    starts = np.empty((replications, len(keys)))
+    for r in range(replications):
+        count = rng.poisson(arrival_rate * horizon)
+        times = rng.random(count) * horizon
+        levels = rng.choice(bases, size=count, p=probs)
+        pending = [(k, i) for i, k in enumerate(keys)]
+        heapq.heapify(pending)
+        arrivals = sorted(zip(times, levels + times))
+        free = [0.0] * servers
+        left = len(keys)
+        while left:
+            t = heapq.heappop(free)
+            while arrivals and arrivals[0][0] <= t:
+                heapq.heappush(pending, (arrivals.pop(0)[1], -1))
+            key, i = heapq.heappop(pending)
+            if i >= 0:
+                starts[r, i] = t
+                left -= 1
+            heapq.heappush(free, t + service[rng.integers(len(service))])
+    return starts
+
+
+def test_constant_service_matches_closed_form():
+    # Queue given out of order: ETAs follow priority, (position // doctors) * service
+    result = simulate_queue([3000, 1000, 5000, 2000, 3010, 4000, 1010], servers=3, service_minutes=[20],
+                            replications=50, seed=1)
+    order = np.argsort([3000, 1000, 5000, 2000, 3010, 4000, 1010], kind="stable")
+    expected = np.empty(7)
+    expected[order] = (np.arange(7) // 3) * 20
+    np.testing.assert_array_equal(result.percentile(50), expected)
+
+
+def test_vectorized_engine_matches_reference_event_loop():
+    rng = np.random.default_rng(0)
+    keys = rng.choice([1000, 2000, 3000, 4000, 5000], 15) - rng.integers(0, 90, 15)
+    service = rng.lognormal(3, 0.5, 500)
+    mix = {1000: 0.1, 2000: 0.2, 3000: 0.4, 4000: 0.3}
+    kwargs = dict(arrival_rate_per_min=0.08, arrival_mix=mix, replications=3000, horizon_min=600)
+
+    fast = simulate_queue(keys, 3, service, seed=3, **kwargs)
+    slow = _reference(keys, 3, service, 0.08, mix, 3000, 600, seed=4)
+
+    np.testing.assert_allclose(fast.mean, slow.mean(axis=0), rtol=0.03, atol=1)
+    np.testing.assert_allclose(fast.percentile(90), np.percentile(slow, 90, axis=0), rtol=0.05, atol=2)
+
+
+def test_only_more_urgent_arrivals_overtake():
+    keys = [3000, 5000]
+    calm = simulate_queue(keys, 1, [30], arrival_rate_per_min=1.0, arrival_mix={5000: 1.0}, seed=0)
+    busy = simulate_queue(keys, 1, [30], arrival_rate_per_min=1.0, arrival_mix={1000: 1.0}, seed=0)
+    np.testing.assert_array_equal(calm.percentile(50), [0, 30])
+    assert busy.percentile(50)[0] == 0
+    assert busy.percentile(10)[1] > 60
+
+
+def test_in_progress_visits_delay_the_queue():
+    result = simulate_queue([3000], servers=1, service_minutes=[10, 20, 30], busy_elapsed=[15], seed=0,
+                            replications=2000, keep_samples=True)
+    # Remaining time of the visit in progress: 20 - 15 or 30 - 15
+    assert set(np.unique(result.samples)) == {5.0, 15.0}
+    assert 5 <= result.percentile(50)[0] <= 15
+    overdue = simulate_queue([3000], servers=1, service_minutes=[10], busy_elapsed=[45], seed=0)
+    assert overdue.percentile(50)[0] == 1
+
+
+@pytest.fixture
+def flow_db(mock_db):
+    now = datetime.now()
+    mock_db.patient_flow.insert_many([
+        {"sala_tipo": "box", "sala_subtipo": "atencion", "activo": False, "duracion_minutos": 10,
+         "entrada": now - timedelta(hours=i, minutes=10), "salida": now - timedelta(hours=i)}
+        for i in range(40)
+    ])
+    wait_time_service.invalidate_flow_statistics()
+    with patch.object(wait_time_service, "get_database", return_value=mock_db):
+        yield mock_db
+    wait_time_service.invalidate_flow_statistics()
+
+
+def test_estimate_uses_flow_history(flow_db):
+    now = datetime.now()
+    queue = [{"patient_code": f"P{i}", "nivel_triaje": "Nivel III", "wait_start": now - timedelta(minutes=30 - i)}
+             for i in range(4)]
+    estimate = wait_time_service.estimate_waits(queue, now=now, servers=2, seed=0)
+
+    assert estimate.service_source == "patient_flow"
+    assert estimate.service_median == 10
+    assert [round(estimate.etas[f"P{i}"]["p50"]) for i in range(4)] == [0, 0, 10, 10]
+    assert round(estimate.etas["P0"]["waited"]) == 30
+    assert round(estimate.new_patient["p50"]) == 20  # behind the four Nivel III patients
+
+
+def test_new_patient_does_not_delay_lower_priority(flow_db):
+    now = datetime.now()
+    queue = [{"patient_code": "V", "nivel_triaje": "Nivel V", "wait_start": now}]
+    estimate = wait_time_service.estimate_waits(queue, now=now, servers=1, seed=0)
+    assert estimate.etas["V"]["p50"] == 0
+    assert estimate.new_patient["p50"] == 0
+
+
+def test_doctors_on_duty_from_roster():
+    users = [
+        {"_id": "u1", "activo": True, "sala_asignada": "BOX1", "funciones": ["medico"]},
+        {"_id": "u2", "activo": True, "sala_asignada": "BOX1", "funciones": ["enfermero"]},
+        {"_id": "u3", "activo": True, "sala_asignada": "ESPERA1", "funciones": ["medico"]},
+    ]
+    roster = RosterIndex(date.today(), users, [])
+    with patch.object(wait_time_service, "box_rooms", return_value=["BOX1"]), \
+         patch("services.roster_index.get_roster_index", return_value=roster):
+        assert wait_time_service.doctors_on_duty() == (1, "turnos")
+    with patch.object(wait_time_service, "box_rooms", return_value=[]):
+        assert wait_time_service.doctors_on_duty() == (wait_time_service.DEFAULT_DOCTORS, "default")
+
+
+def _rooms(subtipo):
+    return {"espera": ["ESP1"], "atencion": ["ATN1", "ATN2"]}[subtipo]
+
+
+def test_ml_wait_prediction_uses_simulation(flow_db):
+    service = MLPredictiveService()
+    with patch.object(wait_time_service, "doctors_on_duty", return_value=(2, "turnos")), \
+         patch.object(wait_time_service, "box_rooms", side_effect=_rooms):
+        short, long = service.predict_wait_time("ESP1", 1, vista={}), service.predict_wait_time("ESP1", 9, vista={})
+    assert short["modelo_usado"] == long["modelo_usado"] == "Simulación"
+    assert short["tiempo_predicho_min"] < long["tiempo_predicho_min"]
+    assert long["tiempo_p10_min"] <= long["tiempo_predicho_min"] <= long["tiempo_p90_min"]
+
+
+def test_ml_wait_prediction_uses_room_queue_and_in_service(flow_db):
+    now = datetime.now()
+    urgent = [{"patient_code": f"U{i}", "nivel_triaje": "Nivel I", "wait_start": now - timedelta(minutes=5)}
+              for i in range(2)]
+    busy = [{"patient_code": f"B{i}", "wait_start": now - timedelta(minutes=1)} for i in range(2)]
+    service = MLPredictiveService()
+    with patch.object(wait_time_service, "doctors_on_duty", return_value=(2, "turnos")), \
+         patch.object(wait_time_service, "box_rooms", side_effect=_rooms):
+        idle = service.predict_wait_time("ESP1", 0, vista={})
+        doctors_busy = service.predict_wait_time("ESP1", 0, vista={"ATN1": busy[:1], "ATN2": busy[1:]})
+        queue, estimate = wait_time_service.estimate_room_waits("ESP1", 3, vista={"ESP1": urgent}, now=now)
+
+    assert idle["tiempo_predicho_min"] == 0
+    assert doctors_busy["tiempo_predicho_min"] > 0
+    # Real patients first, padded with hypothetical Nivel III arrivals up to the scenario size
+    assert [p["patient_code"] for p in queue] == ["U0", "U1", "_hipotetico_0"]
+    assert [p["nivel_triaje"] for p in queue] == ["Nivel I", "Nivel I", "Nivel III"]
+    assert len(estimate.etas) == 3
+
+
+def test_public_board_estimates_the_selected_room(flow_db):
+    from views.public_board import calculate_wait_time
+    now = datetime.now()
+    # A non-box room with its own queue; the box waiting room is empty
+    consulta = [{"patient_code": f"C{i}", "nivel_triaje": "Nivel I", "sala_code": "CONS1",
+                 "wait_start": now - timedelta(minutes=5)} for i in range(3)]
+    vista = {"ESP1": [], "CONS1": consulta}
+    with patch.object(wait_time_service, "doctors_on_duty", return_value=(1, "turnos")), \
+         patch.object(wait_time_service, "box_rooms", side_effect=_rooms):
+        box_p50, _, box_etas = calculate_wait_time(vista)
+        room_p50, room_p90, room_etas = calculate_wait_time(vista, "CONS1")
+
+    assert box_p50 == 0 and box_etas == {}
+    assert set(room_etas) == {"C0", "C1", "C2"}
+    assert room_p50 > 0 and room_p90 >= room_p50
@@ -37,3 +37,64 @@ def test_load_level_logic(ml_service):
     assert ml_service._get_load_level(2) == 'baja'
     assert ml_service._get_load_level(8) == 'media'
     assert ml_service._get_load_level(15) == 'alta'
+
+
+class CountingModel:
+    """Fake regressor: demand = hour + 100 * day_of_week, counting predict calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+
+    def predict(self, X):
+        self.calls += 1
+        self.rows += len(X)
+        return X['hour'].to_numpy() + 100 * X['day_of_week'].to_numpy()
+
+
+@pytest.fixture
+def fake_model_service(ml_service):
+    model = CountingModel()
+    ml_service.models['demand'] = model
+    ml_service._grid_cache.clear()
+    return ml_service, model
+
+
+def test_demand_grid_single_predict_and_matches_scalar(fake_model_service):
+    service, model = fake_model_service
+    inicio = date(2026, 10, 12)  # Monday
+    grid = service.predict_demand_grid(["S1", "S2", "S3"], inicio, date(2026, 10, 25))
+
+    assert grid.shape == (3, 14, 24)
+    assert model.calls == 1
+    assert model.rows == 7 * 24  # only unique (hour, weekday) pairs
+    for d in (0, 6, 13):
+        for hora in (0, 11, 23):
+            fecha = date.fromordinal(inicio.toordinal() + d)
+            single = service.predict_demand("S2", fecha, hora)
+            assert single['demanda_predicha'] == round(grid[1, d, hora])
+
+
+def test_demand_grid_memoized_per_model_version(fake_model_service, monkeypatch):
+    service, model = fake_model_service
+    inicio = date(2026, 10, 12)
+    service.predict_demand_grid(["S1"], inicio, date(2026, 10, 18))
+    service.predict_demand_grid(["S1"], inicio, date(2026, 10, 18))
+    assert model.calls == 1
+    assert service.grid_stats["hits"] >= 1
+
+    # A new model file version invalidates the memoized grid
+    monkeypatch.setattr(service, "_demand_model_version", lambda: 12345.0)
+    service.predict_demand_grid(["S1"], inicio, date(2026, 10, 18))
+    assert model.calls == 2
+
+
+def test_recommend_staffing_range_matches_single_day(fake_model_service):
+    service, model = fake_model_service
+    inicio = date(2026, 10, 12)
+    week = service.recommend_staffing_range(["S1", "S2"], inicio, date(2026, 10, 18))
+    assert len(week) == 14
+    assert model.calls == 1
+
+    fecha = date(2026, 10, 15)
+    assert week[("S2", fecha)] == service.recommend_staffing("S2", fecha)
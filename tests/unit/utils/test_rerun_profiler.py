@@ -0,0 +1,132 @@
+import sys
+import types
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import db.query_profiler as qp
+import db.repositories.rerun_profiles as rerun_repo_module
+import utils.rerun_profiler as rp
+from utils.rerun_profiler import profile_rerun, PROFILE_SESSION_KEY, HISTORY_SESSION_KEY
+
+BOARD_SRC = '''
+def render_card(i):
+    db_call()
+    return i
+
+def render_board():
+    rows = load_rows()
+    return [render_card(i) for i in rows]
+
+def helper():
+    return 1
+'''
+
+DATA_SRC = '''
+import streamlit as st
+
+@st.cache_data
+def load_rows():
+    db_call()
+    return [1, 2, 3]
+'''
+
+
+def _module(name, source, **globals_):
+    module = types.ModuleType(name)
+    module.__file__ = f"/fake/src/{name.replace('.', '/')}.py"
+    module.__dict__.update(globals_)
+    exec(source, module.__dict__)
+    return module
+
+
+def _db_call():
+    # One monitored MongoDB command, as the query profiler would see it
+    profiler = qp.get_query_profiler()
+    ids = {"connection_id": ("h", 1), "request_id": id(object())}
+    profiler.started(SimpleNamespace(command_name="find", command={"find": "people", "filter": {}}, database_name="db", **ids))
+    profiler.succeeded(SimpleNamespace(command_name="find", duration_micros=2000, reply={}, **ids))
+
+
+@pytest.fixture
+def app(monkeypatch):
+    data = _module("services.fake_data", DATA_SRC, db_call=_db_call)
+    board = _module("ui.fake_board", BOARD_SRC, db_call=_db_call, load_rows=data.load_rows)
+    monkeypatch.setitem(sys.modules, "services.fake_data", data)
+    monkeypatch.setitem(sys.modules, "ui.fake_board", board)
+    page = _module("ui.fake_page", "from ui.fake_board import render_board\n")  # imported before instrumenting
+    monkeypatch.setitem(sys.modules, "ui.fake_page", page)
+    modules = {m.__name__: m for m in (data, board, page)}
+    monkeypatch.setattr(rp, "_is_app_module", lambda m: m in modules.values())
+    monkeypatch.setattr(rp, "_wrapped", {})
+    monkeypatch.setattr(rp, "_scanned_modules", set())
+    monkeypatch.setattr(rp, "_modules_seen", 0)
+    monkeypatch.setattr(qp, "PROFILER_ENABLED", True)
+    session = {PROFILE_SESSION_KEY: True}
+    monkeypatch.setattr(rp, "st", SimpleNamespace(session_state=session))
+    data.load_rows.clear()
+    return SimpleNamespace(board=board, page=page, data=data, session=session)
+
+
+def test_rerun_tree_times_views_cached_loaders_and_db_calls(app):
+    with profile_rerun(persist=False) as root:
+        assert app.page.render_board() == [1, 2, 3]
+    assert root is not None
+
+    frames = {f["label"]: f for f in app.session[HISTORY_SESSION_KEY][0]["frames"]}
+    assert set(frames) == {"rerun", "ui.fake_board.render_board", "services.fake_data.load_rows", "ui.fake_board.render_card"}
+    assert frames["ui.fake_board.render_card"]["calls"] == 3
+    assert frames["ui.fake_board.render_card"]["db_calls"] == 3
+    assert frames["services.fake_data.load_rows"]["kind"] == "cache"
+    assert frames["services.fake_data.load_rows"]["db_calls"] == 1
+    assert frames["services.fake_data.load_rows"]["path"] == "rerun;ui.fake_board.render_board;services.fake_data.load_rows"
+    board = frames["ui.fake_board.render_board"]
+    assert board["ms"] >= frames["ui.fake_board.render_card"]["ms"] and board["self_ms"] >= 0
+    assert "ui.fake_board.helper" not in frames  # only render_* / mostrar_* entry points
+
+    # Second rerun: the cached loader hits, so no DB call is attributed to it
+    with profile_rerun(persist=False):
+        app.page.render_board()
+    latest = {f["label"]: f for f in app.session[HISTORY_SESSION_KEY][0]["frames"]}
+    assert latest["services.fake_data.load_rows"]["db_calls"] == 0
+    assert app.session[HISTORY_SESSION_KEY][0]["db_calls"] == 3
+
+
+def test_disabled_session_records_nothing(app):
+    app.session[PROFILE_SESSION_KEY] = False
+    with profile_rerun(persist=False) as root:
+        app.board.render_board()
+    assert root is None
+    assert HISTORY_SESSION_KEY not in app.session
+    assert rp._wrapped == {}  # nothing instrumented while no session profiles
+
+
+def test_rerun_is_recorded_when_streamlit_stops_the_script(app):
+    class StopException(Exception):
+        pass
+
+    with pytest.raises(StopException):
+        with profile_rerun(persist=False):
+            app.page.render_board()
+            raise StopException()
+    assert app.session[HISTORY_SESSION_KEY][0]["frames"][0]["calls"] == 1
+
+
+def test_view_percentiles_are_accumulated_per_view(mock_db):
+    rerun_repo_module._rerun_profiles_repo = None
+    with patch('db.repositories.rerun_profiles.get_database', return_value=mock_db):
+        repo = rerun_repo_module.get_rerun_profiles_repository()
+    from datetime import datetime
+    for ms in range(1, 101):
+        repo.save_rerun({"session_id": "s", "started_at": datetime.utcnow(), "total_ms": ms, "frames": [
+            {"path": "rerun", "label": "rerun", "kind": "rerun", "calls": 1, "ms": ms, "db_calls": 0},
+            {"path": "rerun;v", "label": "ui.x.render_v", "kind": "view", "calls": 2, "ms": ms / 2, "db_calls": 4},
+        ]})
+    rows = {r["view"]: r for r in repo.get_view_percentiles()}
+    assert rows["rerun"]["reruns"] == 100
+    assert rows["rerun"]["p50_ms"] == pytest.approx(50.5)
+    assert rows["ui.x.render_v"]["db_calls_per_rerun"] == 4
+    assert rows["ui.x.render_v"]["calls_per_rerun"] == 2
+    assert len(repo.get_recent_reruns(limit=10)) == 10
+    rerun_repo_module._rerun_profiles_repo = None